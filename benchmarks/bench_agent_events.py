@@ -0,0 +1,105 @@
+"""
+Per-run overhead of agent event logging: the old astream_events + print_agent_step path versus
+ainvoke + AgentEventSink (tool callbacks only, lazy JSON formatting on a queue listener thread).
+
+Runs a scripted ReAct agent (no network) whose tool returns a large payload, so that the cost of
+serializing and previewing tool outputs shows up.
+
+Usage:
+    python benchmarks/bench_agent_events.py [--runs 20] [--tool-calls 5] [--output-kb 2048]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+from tests.fake_models import ToolCallingFakeChatModel
+from src.utils import logger, print_agent_step
+from src.agent_events import AgentEventSink, setup_agent_event_logging, stop_agent_event_logging
+
+
+def build_agent(tool_calls: int, output_kb: int):
+    payload = "x" * (output_kb * 1024)
+
+    @tool
+    def get_file_contents(owner: str, repo: str, path: str) -> str:
+        """Returns a (large) file."""
+        return payload
+
+    responses = [AIMessage(content="", tool_calls=[{
+        "name": "get_file_contents", "args": {"owner": "octo", "repo": "repo", "path": f"file_{i}.py"},
+        "id": f"call_{i}"}]) for i in range(tool_calls)]
+    responses.append(AIMessage(content="done"))
+    return create_react_agent(ToolCallingFakeChatModel(responses=responses), [get_file_contents])
+
+
+async def run_streaming(agent, agent_input):
+    """Previous implementation: consume every event and log tool steps with print_agent_step."""
+    final_answer = None
+    async for event in agent.astream_events(agent_input):
+        print_agent_step(event)
+        if event.get("event") == "on_chain_end":
+            output = event.get("data", {}).get("output", {})
+            if isinstance(output, dict) and "messages" in output:
+                final_messages = output.get("messages", [])
+                if final_messages and hasattr(final_messages[-1], 'content'):
+                    final_answer = final_messages[-1].content
+    return final_answer
+
+
+async def run_with_sink(agent, agent_input):
+    """Current implementation: plain ainvoke with the tool-event sink attached."""
+    result = await agent.ainvoke(agent_input, config={"callbacks": [AgentEventSink("issue", 1)]})
+    return result["messages"][-1].content
+
+
+async def measure(runner, args) -> list:
+    timings = []
+    for _ in range(args.runs):
+        agent = build_agent(args.tool_calls, args.output_kb)
+        started = time.perf_counter()
+        answer = await runner(agent, {"messages": [("user", "hi")]})
+        timings.append(time.perf_counter() - started)
+        assert answer == "done"
+    return timings
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--tool-calls", type=int, default=5)
+    parser.add_argument("--output-kb", type=int, default=2048)
+    args = parser.parse_args()
+
+    # Both paths write to /dev/null so only formatting/dispatch overhead is compared
+    devnull = open(os.devnull, "w")
+    for handler in logger.handlers + logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler):
+            handler.setStream(devnull)
+    setup_agent_event_logging(stream=devnull)
+
+    # Warm up imports/graph compilation once for each path
+    await run_streaming(build_agent(1, 1), {"messages": [("user", "hi")]})
+    await run_with_sink(build_agent(1, 1), {"messages": [("user", "hi")]})
+
+    before = await measure(run_streaming, args)
+    after = await measure(run_with_sink, args)
+    stop_agent_event_logging()
+
+    print(f"{args.runs} runs, {args.tool_calls} tool calls/run, {args.output_kb} KiB tool output")
+    for name, timings in (("astream_events + print_agent_step", before), ("ainvoke + AgentEventSink", after)):
+        print(f"  {name:<36} mean {statistics.mean(timings) * 1000:8.2f} ms/run, "
+              f"median {statistics.median(timings) * 1000:8.2f} ms/run")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+"""
+Offline end-to-end throughput benchmark of the issue/PR processing loops.
+
+Starts the stand-in GitHub MCP server (fake_github_mcp.py) over stdio, builds the real Issue and
+PR agents on top of the scripted chat model (fake_llm.py), and runs the real
+`issue_processing_loop` / `pr_processing_loop` from main.py for a fixed duration. Nothing touches
+Docker, GitHub or an LLM provider.
+
+Reports items/minute, MCP calls per processed item (by tool) and cycle latency, all read from the
+metrics registry the loops already update.
+
+Usage:
+    python benchmarks/bench_processing_loops.py --issues 200 --prs 50 --duration 30
+    python benchmarks/bench_processing_loops.py --issues 50000 --prs 5000 --per-page 100 --duration 120
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_mcp_adapters.client import MultiServerMCPClient
+
+from fake_llm import ScriptedGitHubChatModel
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--issues", type=int, default=200, help="Open issues in the synthetic repo (10 to 50k).")
+    parser.add_argument("--prs", type=int, default=50, help="Open pull requests in the synthetic repo.")
+    parser.add_argument("--body-chars", type=int, default=800, help="Size of each issue/PR body.")
+    parser.add_argument("--owner-replied-ratio", type=float, default=0.3,
+                        help="Share of items whose last comment is already by the owner.")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run the loops for.")
+    parser.add_argument("--interval", type=float, default=0, help="Loop interval (ISSUE/PR_FETCH_INTERVAL_SECONDS).")
+    parser.add_argument("--per-page", type=int, default=30, help="MAX_ITEMS_PER_PAGE.")
+    parser.add_argument("--page-delay", type=float, default=0, help="GITHUB_PAGE_DELAY_SECONDS.")
+    parser.add_argument("--mcp-latency-ms", type=float, default=0, help="Simulated latency per MCP call.")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="Simulated latency per LLM call.")
+    parser.add_argument("--loops", choices=("both", "issue", "pr"), default="both")
+    parser.add_argument("--verbose", action="store_true", help="Keep INFO/WARNING logging from the loops.")
+    return parser.parse_args()
+
+
+async def run(args):
+    # Configure the code under test before importing it
+    os.environ["MAX_ITEMS_PER_PAGE"] = str(args.per_page)
+    os.environ["GITHUB_PAGE_DELAY_SECONDS"] = str(args.page_delay)
+    os.environ.setdefault("STATE_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="repo-assistant-bench-"),
+                                                        "state.sqlite3"))
+    os.environ.setdefault("AGENT_EVENT_LOG_FILE", os.devnull)
+
+    import main
+    from src.agent import create_repo_agent
+    from src.agent_events import setup_agent_event_logging
+    from src.mcp_client import _filter_and_wrap_tools
+    from src.metrics import instrument_tools, instrument_llm, ITEMS_PROCESSED, MCP_TOOL_LATENCY, CYCLE_DURATION
+    from src.tool_cache import wrap_tools_with_cache
+    from src.utils import logger
+
+    if not args.verbose:
+        # The loops warn for every PR returned by list_issues; keep the report readable
+        logging.getLogger().setLevel(logging.ERROR)
+        logger.setLevel(logging.ERROR)
+    setup_agent_event_logging()
+
+    owner, repo = "octo", "demo"
+    server_env = {
+        **os.environ,
+        "FAKE_GH_OWNER": owner, "FAKE_GH_REPO": repo,
+        "FAKE_GH_ISSUES": str(args.issues), "FAKE_GH_PRS": str(args.prs),
+        "FAKE_GH_BODY_CHARS": str(args.body_chars),
+        "FAKE_GH_OWNER_REPLIED_RATIO": str(args.owner_replied_ratio),
+        "FAKE_GH_LATENCY_MS": str(args.mcp_latency_ms),
+    }
+    server_config = {"github": {
+        "command": sys.executable,
+        "args": [os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_github_mcp.py")],
+        "transport": "stdio",
+        "env": server_env,
+    }}
+
+    async with MultiServerMCPClient(server_config) as client:
+        # As _finalize_tools: MCP calls are timed per tool, read-only ones served through the tool cache
+        tools = wrap_tools_with_cache(instrument_tools(_filter_and_wrap_tools(client.get_tools())))
+        llm = instrument_llm(ScriptedGitHubChatModel(owner=owner, repo=repo,
+                                                     latency_seconds=args.llm_latency_ms / 1000))
+        readme = "# demo\nA synthetic repository for benchmarks."
+        structure = "demo/\n├── README.md\n├── main.py\n└── src/\n    └── agent.py"
+        issue_agent = await create_repo_agent(llm, tools, owner, repo, readme, True, repo_structure=structure)
+        pr_agent = await create_repo_agent(llm, tools, owner, repo, readme, False, repo_structure=structure)
+
+        loops = []
+        if args.loops in ("both", "issue"):
+            loops.append(main.issue_processing_loop(issue_agent, tools, owner, repo, args.interval))
+        if args.loops in ("both", "pr"):
+            loops.append(main.pr_processing_loop(pr_agent, tools, owner, repo, args.interval))
+
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(loop) for loop in loops]
+        await asyncio.sleep(args.duration)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+        # Let responses to calls cancelled mid-flight arrive before the session is closed
+        await asyncio.sleep(0.5)
+
+    calls_by_tool = {tool.name: int(MCP_TOOL_LATENCY.count(tool=tool.name)) for tool in tools}
+    total_calls = sum(calls_by_tool.values())
+    processed = {kind: int(ITEMS_PROCESSED.value(item_type=kind)) for kind in ("issue", "pr")}
+    total_processed = sum(processed.values())
+
+    print(f"\nSynthetic repo: {args.issues} issues, {args.prs} PRs; ran {elapsed:.1f}s "
+          f"(interval {args.interval}s, {args.per_page}/page, MCP +{args.mcp_latency_ms}ms, "
+          f"LLM +{args.llm_latency_ms}ms)")
+    print(f"  items processed:    {processed['issue']} issues, {processed['pr']} PRs "
+          f"-> {total_processed / elapsed * 60:.1f} items/min")
+    print(f"  MCP calls:          {total_calls} total, "
+          f"{total_calls / total_processed if total_processed else float('nan'):.1f} per processed item")
+    for name, count in sorted(calls_by_tool.items(), key=lambda kv: -kv[1]):
+        if count:
+            print(f"      {name:<28} {count}")
+    for loop in ("issue", "pr"):
+        cycles = CYCLE_DURATION.count(loop=loop)
+        if cycles:
+            print(f"  {loop + ' cycle latency:':<22}{CYCLE_DURATION.sum(loop=loop) / cycles * 1000:.1f} ms mean "
+                  f"over {int(cycles)} cycles")
+
+
+if __name__ == '__main__':
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,257 @@
+"""
+Stand-in GitHub MCP server (stdio) backed by a synthetic repository, for offline benchmarks.
+
+It exposes the subset of github-mcp-server tools that Repo Assistant uses, with the same names,
+arguments and JSON response shapes. Data is generated deterministically from the settings below
+and kept in memory, so comments posted by the agent are visible to the next polling cycle.
+
+Environment:
+    FAKE_GH_OWNER / FAKE_GH_REPO    Repository coordinates (default: octo / demo).
+    FAKE_GH_ISSUES / FAKE_GH_PRS    Number of open issues / pull requests (default: 200 / 50).
+    FAKE_GH_BODY_CHARS              Size of each issue/PR body (default: 800).
+    FAKE_GH_OWNER_REPLIED_RATIO     Share of items whose last comment is by the owner (default: 0.3).
+    FAKE_GH_LATENCY_MS              Simulated latency added to every call (default: 0).
+    FAKE_GH_SEED                    Random seed (default: 0).
+"""
+import asyncio
+import base64
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from mcp.server.fastmcp import FastMCP
+
+OWNER = os.getenv("FAKE_GH_OWNER", "octo")
+REPO = os.getenv("FAKE_GH_REPO", "demo")
+NUM_ISSUES = int(os.getenv("FAKE_GH_ISSUES", 200))
+NUM_PRS = int(os.getenv("FAKE_GH_PRS", 50))
+BODY_CHARS = int(os.getenv("FAKE_GH_BODY_CHARS", 800))
+OWNER_REPLIED_RATIO = float(os.getenv("FAKE_GH_OWNER_REPLIED_RATIO", 0.3))
+LATENCY_SECONDS = float(os.getenv("FAKE_GH_LATENCY_MS", 0)) / 1000
+SEED = int(os.getenv("FAKE_GH_SEED", 0))
+
+_WORDS = ("error", "install", "crash", "agent", "tool", "config", "docker", "token", "timeout", "model",
+          "readme", "python", "windows", "linux", "support", "feature", "request", "docs", "test", "build")
+_CONTRIBUTORS = [f"contributor{i}" for i in range(50)]
+_FILES = ["README.md", "main.py", "webui.py", "src/agent.py", "src/utils.py", "src/mcp_client.py",
+          "src/github_processor.py", "src/prompts.py", "tests/test_agent.py", "pyproject.toml"]
+
+
+class SyntheticRepo:
+    """In-memory issues, pull requests, comments and files of one synthetic repository."""
+
+    def __init__(self):
+        rng = random.Random(SEED)
+        now = datetime.now(timezone.utc)
+        self.items: Dict[int, Dict[str, Any]] = {}
+        self.comments: Dict[int, List[Dict[str, Any]]] = {}
+        self.next_comment_id = 1
+        total = NUM_ISSUES + NUM_PRS
+        pr_numbers = set(rng.sample(range(1, total + 1), NUM_PRS)) if NUM_PRS else set()
+        for number in range(1, total + 1):
+            is_pr = number in pr_numbers
+            author = rng.choice(_CONTRIBUTORS)
+            item = {
+                "number": number,
+                "title": " ".join(rng.choice(_WORDS) for _ in range(6)).capitalize(),
+                "body": self._text(rng, BODY_CHARS),
+                "state": "open",
+                "user": {"login": author},
+                "labels": [{"name": rng.choice(("bug", "enhancement", "question"))}],
+                "html_url": f"https://github.com/{OWNER}/{REPO}/{'pull' if is_pr else 'issues'}/{number}",
+                "updated_at": (now - timedelta(minutes=number)).isoformat(),
+                "created_at": (now - timedelta(days=30, minutes=number)).isoformat(),
+            }
+            if is_pr:
+                item["pull_request"] = {"url": f"https://api.github.com/repos/{OWNER}/{REPO}/pulls/{number}"}
+                item["head"] = {"ref": f"feature-{number}"}
+                item["base"] = {"ref": "main"}
+            self.items[number] = item
+            comments = []
+            for _ in range(rng.randint(0, 4)):
+                comments.append(self._comment(rng.choice(_CONTRIBUTORS), self._text(rng, 200)))
+            if rng.random() < OWNER_REPLIED_RATIO:
+                comments.append(self._comment(OWNER, "Thanks, we are looking into it."))
+            self.comments[number] = comments
+        # Most recently updated first, as requested with sort=updated&direction=desc
+        self.order: List[int] = sorted(self.items, key=lambda n: self.items[n]["updated_at"], reverse=True)
+
+    @staticmethod
+    def _text(rng: random.Random, size: int) -> str:
+        words = []
+        length = 0
+        while length < size:
+            word = rng.choice(_WORDS)
+            words.append(word)
+            length += len(word) + 1
+        return " ".join(words)
+
+    def _comment(self, login: str, body: str) -> Dict[str, Any]:
+        comment = {"id": self.next_comment_id, "user": {"login": login}, "body": body,
+                   "created_at": datetime.now(timezone.utc).isoformat()}
+        self.next_comment_id += 1
+        return comment
+
+    def touch(self, number: int):
+        self.items[number]["updated_at"] = datetime.now(timezone.utc).isoformat()
+        if number in self.order:  # Closed items are no longer listed
+            self.order.remove(number)
+            self.order.insert(0, number)
+
+    def list_items(self, pulls_only: bool, page: int, per_page: int) -> List[Dict[str, Any]]:
+        numbers = [n for n in self.order if "pull_request" in self.items[n]] if pulls_only else self.order
+        start = (max(page, 1) - 1) * per_page
+        return [self.items[n] for n in numbers[start:start + per_page]]
+
+
+repo_data = SyntheticRepo()
+mcp = FastMCP("fake-github", log_level="WARNING")
+
+
+async def _respond(payload: Any) -> str:
+    if LATENCY_SECONDS:
+        await asyncio.sleep(LATENCY_SECONDS)
+    return json.dumps(payload)
+
+
+def _item(number: int) -> Optional[Dict[str, Any]]:
+    return repo_data.items.get(int(number))
+
+
+@mcp.tool()
+async def get_me() -> str:
+    """Get details of the authenticated GitHub user."""
+    return await _respond({"login": OWNER, "id": 1, "type": "User"})
+
+
+@mcp.tool()
+async def list_issues(owner: str, repo: str, state: str = "open", sort: str = "created", direction: str = "desc",
+                      page: int = 1, perPage: int = 30) -> str:
+    """List issues in a GitHub repository (pull requests included, as in the GitHub API)."""
+    return await _respond(repo_data.list_items(False, page, perPage))
+
+
+@mcp.tool()
+async def get_issue(owner: str, repo: str, issue_number: int) -> str:
+    """Get details of a specific issue in a GitHub repository."""
+    return await _respond(_item(issue_number) or {"message": "Not Found"})
+
+
+@mcp.tool()
+async def get_issue_comments(owner: str, repo: str, issue_number: int, page: int = 1, per_page: int = 100) -> str:
+    """Get comments for a GitHub issue."""
+    comments = repo_data.comments.get(int(issue_number), [])
+    start = (max(page, 1) - 1) * per_page
+    return await _respond(comments[start:start + per_page])
+
+
+@mcp.tool()
+async def add_issue_comment(owner: str, repo: str, issue_number: int, body: str) -> str:
+    """Add a comment to an existing issue."""
+    if _item(issue_number) is None:
+        return await _respond({"message": "Not Found"})
+    comment = repo_data._comment(OWNER, body)
+    repo_data.comments[int(issue_number)].append(comment)
+    repo_data.touch(int(issue_number))
+    return await _respond(comment)
+
+
+@mcp.tool()
+async def update_issue(owner: str, repo: str, issue_number: int, state: Optional[str] = None,
+                       title: Optional[str] = None, body: Optional[str] = None,
+                       labels: Optional[List[str]] = None) -> str:
+    """Update an existing issue in a GitHub repository."""
+    item = _item(issue_number)
+    if item is None:
+        return await _respond({"message": "Not Found"})
+    if state == "closed" and item["state"] != "closed":
+        item["state"] = "closed"
+        repo_data.order.remove(int(issue_number))
+    if title:
+        item["title"] = title
+    if labels is not None:
+        item["labels"] = [{"name": label} for label in labels]
+    return await _respond(item)
+
+
+@mcp.tool()
+async def search_issues(q: str, page: int = 1, perPage: int = 30) -> str:
+    """Search for issues and pull requests across GitHub repositories."""
+    terms = [term for term in q.lower().split() if ":" not in term]
+    matches = [repo_data.items[n] for n in repo_data.order
+               if any(term in repo_data.items[n]["title"].lower() for term in terms)]
+    start = (max(page, 1) - 1) * perPage
+    return await _respond({"total_count": len(matches), "items": matches[start:start + perPage]})
+
+
+@mcp.tool()
+async def list_pull_requests(owner: str, repo: str, state: str = "open", sort: str = "created",
+                             direction: str = "desc", page: int = 1, perPage: int = 30) -> str:
+    """List and filter repository pull requests."""
+    return await _respond(repo_data.list_items(True, page, perPage))
+
+
+@mcp.tool()
+async def get_pull_request(owner: str, repo: str, pullNumber: int) -> str:
+    """Get details of a specific pull request."""
+    return await _respond(_item(pullNumber) or {"message": "Not Found"})
+
+
+@mcp.tool()
+async def get_pull_request_files(owner: str, repo: str, pullNumber: int) -> str:
+    """Get the list of files changed in a pull request."""
+    rng = random.Random(SEED * 100_003 + int(pullNumber))
+    files = []
+    for filename in rng.sample(_FILES, rng.randint(1, 5)):
+        additions, deletions = rng.randint(1, 200), rng.randint(0, 80)
+        patch = "\n".join(f"+{rng.choice(_WORDS)} = {rng.randint(0, 99)}" for _ in range(min(additions, 40)))
+        files.append({"filename": filename, "status": "modified", "additions": additions,
+                      "deletions": deletions, "changes": additions + deletions, "patch": patch})
+    return await _respond(files)
+
+
+@mcp.tool()
+async def get_pull_request_comments(owner: str, repo: str, pullNumber: int) -> str:
+    """Get the review comments on a pull request."""
+    return await _respond([])
+
+
+@mcp.tool()
+async def get_pull_request_reviews(owner: str, repo: str, pullNumber: int) -> str:
+    """Get the reviews on a pull request."""
+    return await _respond([])
+
+
+@mcp.tool()
+async def get_pull_request_status(owner: str, repo: str, pullNumber: int) -> str:
+    """Get the combined status of all status checks for a pull request."""
+    return await _respond({"state": "success", "total_count": 1, "statuses": []})
+
+
+@mcp.tool()
+async def create_pull_request_review(owner: str, repo: str, pullNumber: int, event: str,
+                                     body: Optional[str] = None) -> str:
+    """Create a review on a pull request."""
+    return await _respond({"id": pullNumber, "state": event, "body": body or ""})
+
+
+@mcp.tool()
+async def get_file_contents(owner: str, repo: str, path: str, branch: Optional[str] = None) -> str:
+    """Get the contents of a file or directory from a GitHub repository."""
+    if path not in _FILES:
+        return await _respond({"message": "Not Found"})
+    text = f"# {path}\n" + SyntheticRepo._text(random.Random(path), 4000)
+    return await _respond({"name": path.rsplit("/", 1)[-1], "path": path, "type": "file", "encoding": "base64",
+                           "content": base64.b64encode(text.encode("utf-8")).decode("ascii")})
+
+
+@mcp.tool()
+async def search_code(q: str, page: int = 1, perPage: int = 30) -> str:
+    """Search for code across GitHub repositories."""
+    return await _respond({"total_count": 1, "items": [{"name": "agent.py", "path": "src/agent.py"}]})
+
+
+if __name__ == '__main__':
+    mcp.run()
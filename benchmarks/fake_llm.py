@@ -0,0 +1,74 @@
+"""
+Scripted chat model for offline benchmarks.
+
+It plays a fixed, realistic tool-calling script per agent run, keyed on the item in the user
+prompt: issues get their comments read and a reply posted, pull requests get their changed files
+read and a review comment posted. Token usage is estimated from message sizes (~4 chars/token)
+so the usage/cost accounting path is exercised as well.
+"""
+import asyncio
+import re
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+_ITEM_PATTERN = re.compile(r"(Issue|Pull Request) #(\d+)")
+
+
+class ScriptedGitHubChatModel(BaseChatModel):
+    owner: str
+    repo: str
+    latency_seconds: float = 0.0
+    model_name: str = "gpt-4o-mini"
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-github"
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        return self
+
+    def _next_message(self, messages: List[BaseMessage]) -> AIMessage:
+        # The script position is the number of model turns since the last user prompt
+        prompt_index = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+        step = sum(1 for m in messages[prompt_index:] if isinstance(m, AIMessage))
+        match = _ITEM_PATTERN.search(str(messages[prompt_index].content))
+        kind, number = (match.group(1), int(match.group(2))) if match else ("Issue", 0)
+        base_args = {"owner": self.owner, "repo": self.repo}
+
+        if kind == "Issue":
+            script = [
+                ("get_issue_comments", {**base_args, "issue_number": number}),
+                ("add_issue_comment", {**base_args, "issue_number": number,
+                                       "body": "Thanks for the report! Could you share the full traceback?"}),
+            ]
+        else:
+            # The file list is only needed when the prompt has no pre-computed change analysis
+            needs_files = "*   Size:" not in str(messages[prompt_index].content)
+            script = [
+                *([("get_pull_request_files", {**base_args, "pullNumber": number})] if needs_files else []),
+                ("add_issue_comment", {**base_args, "issue_number": number,
+                                       "body": "Thanks for the contribution! Maintainers will review the code."}),
+            ]
+        if step < len(script):
+            name, args = script[step]
+            return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{number}_{step}"}])
+        return AIMessage(content=f"Processed {kind} #{number}.")
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        message = self._next_message(messages)
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        output_tokens = max(len(str(message.content)) // 4, 10)
+        message.usage_metadata = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                                  "total_tokens": input_tokens + output_tokens}
+        message.response_metadata = {"model_name": self.model_name}
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return self._generate(messages, stop, **kwargs)
@@ -0,0 +1,363 @@
+# cluster.py
+"""
+Sharded mode: one coordinator lists the repositories' open issues/PRs and enqueues the eligible ones
+in a durable work queue (src/work_queue.py); any number of worker processes, on one or more nodes,
+lease items from the queue and process them with the same process_issue/process_pr as main.py.
+
+Workers keep their leases alive with heartbeats; if a worker dies, its leases expire and the items
+are leased again by another worker.
+
+Usage:
+    python cluster.py coordinator [--config repos.toml]
+    python cluster.py worker [--config repos.toml] [--concurrency 2]
+
+Without --config, the single repository from GITHUB_OWNER/GITHUB_REPO is served. Coordinator and
+workers must use the same WORK_QUEUE_URL (default: a SQLite file in the local cache dir).
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from langchain_core.tools import BaseTool
+
+from src.utils import logger, get_llm_model
+from src.mcp_client import setup_mcp_tools_from_manifest_cache, MCPConnection
+from src.agent_events import setup_agent_event_logging
+from src.metrics import (
+    start_metrics_server, CYCLE_DURATION, LISTING_LATENCY, ELIGIBILITY_CHECK_LATENCY, ITEMS_PROCESSED,
+    ITEMS_SKIPPED, ERRORS, QUEUE_DEPTH
+)
+from src.repo_config import load_daemon_config, RepoConfig
+from src.scheduler import PollingScheduler, AdaptiveInterval
+from src.work_queue import open_work_queue, WorkQueue, WorkItem, WORK_QUEUE_ITEMS
+from src.tool_cache import observe_listing
+from src.github_processor import (
+    process_issue, process_pr, fetch_all_github_items, find_tool, is_last_update_by_owner, deprioritized_numbers
+)
+from daemon import build_repo_agents
+
+mcp_connection: Optional[MCPConnection] = None
+
+# Per item type: listing tool, html_url marker, processing function
+ITEM_TYPES = {
+    "issue": ("list_issues", "issues", process_issue),
+    "pr": ("list_pull_requests", "pull", process_pr),
+}
+
+
+def load_repo_configs(config_path: Optional[str]) -> List[RepoConfig]:
+    """
+    Repositories from a daemon config file, or the single repository of GITHUB_OWNER/GITHUB_REPO.
+
+    Raises:
+        KeyError: If no config file is given and GITHUB_OWNER/GITHUB_REPO are missing.
+        ValueError: If the config file is invalid.
+    """
+    if config_path:
+        return load_daemon_config(config_path).repos
+    return [RepoConfig(owner=os.environ["GITHUB_OWNER"], repo=os.environ["GITHUB_REPO"],
+                       llm_provider=os.getenv("LLM_PROVIDER", "openai"),
+                       llm_model=os.getenv("LLM_MODEL_NAME", "gpt-4o"),
+                       issue_interval=int(os.getenv("ISSUE_FETCH_INTERVAL_SECONDS", 300)),
+                       pr_interval=int(os.getenv("PR_FETCH_INTERVAL_SECONDS", 300)))]
+
+
+# --- Coordinator ---
+
+async def enqueue_cycle(queue: WorkQueue, tools: List[BaseTool], owner: str, repo: str, item_type: str,
+                        max_items: int) -> int:
+    """
+    Lists a repository's open items of one type (most recently updated first) and enqueues up to
+    `max_items` eligible ones that are not already queued.
+
+    Returns:
+        The number of items enqueued.
+    """
+    repo_key = f"{owner}/{repo}"
+    log_prefix = f"[Coordinator {item_type} {repo_key}]"
+    list_tool_name, url_marker, _ = ITEM_TYPES[item_type]
+    list_tool = find_tool(tools, list_tool_name)
+    if not list_tool:
+        return 0
+
+    cycle_start_time = time.time()
+    enqueued = 0
+    try:
+        with LISTING_LATENCY.time(item_type=item_type):
+            open_items = await fetch_all_github_items(
+                list_tool, {"owner": owner, "repo": repo, "state": "open", "sort": "updated", "direction": "desc"})
+        QUEUE_DEPTH.set(len(open_items), item_type=item_type)
+        observe_listing(tools, owner, repo, open_items)
+        queued = await asyncio.to_thread(queue.active_numbers, repo_key, item_type)
+        cooling_down = await asyncio.to_thread(deprioritized_numbers, owner, repo, item_type)
+        logger.info(f"{log_prefix} Fetched {len(open_items)} open items, {len(queued)} already queued.")
+
+        for item_data in open_items:
+            if enqueued >= max_items:
+                break
+            number = item_data.get("number")
+            if not number or url_marker not in item_data.get("html_url", ""):
+                ITEMS_SKIPPED.inc(item_type=item_type, reason="missing_number" if not number else f"not_an_{item_type}")
+                continue
+            if number in queued:
+                ITEMS_SKIPPED.inc(item_type=item_type, reason="already_queued")
+                continue
+            if number in cooling_down:
+                ITEMS_SKIPPED.inc(item_type=item_type, reason="runaway_cooldown")
+                continue
+            with ELIGIBILITY_CHECK_LATENCY.time(item_type=item_type):
+                is_owner_update = await is_last_update_by_owner(number, item_type, owner, repo, tools)
+            if is_owner_update:
+                ITEMS_SKIPPED.inc(item_type=item_type, reason="owner_update")
+                continue
+            if await asyncio.to_thread(queue.enqueue, repo_key, item_type, number, item_data):
+                logger.info(f"{log_prefix} Enqueued #{number}.")
+                enqueued += 1
+    except Exception as e:
+        ERRORS.inc(stage=f"{item_type}_fetch")
+        logger.error(f"{log_prefix} Error during fetch/enqueue: {e}", exc_info=True)
+
+    retention = float(os.getenv("WORK_QUEUE_DONE_RETENTION_SECONDS", 86400))
+    if retention > 0:
+        try:
+            purged = await asyncio.to_thread(queue.purge_done, retention)
+            if purged:
+                logger.info(f"{log_prefix} Purged {purged} finished queue items.")
+        except Exception as e:
+            logger.error(f"{log_prefix} Error purging finished queue items: {e}")
+
+    for status, count in (await asyncio.to_thread(queue.stats)).items():
+        WORK_QUEUE_ITEMS.set(count, status=status)
+    CYCLE_DURATION.observe(time.time() - cycle_start_time, loop=f"{item_type}_enqueue")
+    return enqueued
+
+
+async def run_coordinator(queue: WorkQueue, tools: List[BaseTool], repo_configs: List[RepoConfig],
+                          stop_event: asyncio.Event):
+    """Runs the enqueue cycles of all repositories until `stop_event` is set."""
+    max_items = int(os.getenv("COORDINATOR_MAX_ENQUEUE", 10))
+    scheduler = PollingScheduler(max_concurrency=int(os.getenv("COORDINATOR_MAX_CONCURRENCY", 2)))
+    for repo_config in repo_configs:
+        owner, repo = repo_config.owner, repo_config.repo
+        # A cycle that enqueued items is a hit for the adaptive polling interval
+        if repo_config.enable_issues:
+            name = f"enqueue-issues:{repo_config.full_name}"
+            scheduler.add_job(name, lambda o=owner, r=repo: enqueue_cycle(queue, tools, o, r, "issue", max_items),
+                              repo_config.issue_interval,
+                              adaptive=AdaptiveInterval.from_env(name, repo_config.issue_interval))
+        if repo_config.enable_prs:
+            name = f"enqueue-prs:{repo_config.full_name}"
+            scheduler.add_job(name, lambda o=owner, r=repo: enqueue_cycle(queue, tools, o, r, "pr", max_items),
+                              repo_config.pr_interval,
+                              adaptive=AdaptiveInterval.from_env(name, repo_config.pr_interval))
+    scheduler_task = asyncio.create_task(scheduler.run())
+    try:
+        await stop_event.wait()
+    finally:
+        scheduler_task.cancel()
+        await asyncio.gather(scheduler_task, return_exceptions=True)
+
+
+# --- Worker ---
+
+class QueueWorker:
+    """
+    Leases items from the work queue and processes them, `concurrency` at a time.
+
+    Agents are built lazily, the first time an item of a repository is leased, and shared by the
+    worker's slots; LLM clients are shared per (provider, model).
+    """
+
+    def __init__(self, queue: WorkQueue, tools: List[BaseTool], repo_configs: List[RepoConfig],
+                 worker_id: Optional[str] = None, concurrency: int = 1, lease_seconds: float = 120.0,
+                 poll_interval: float = 5.0):
+        self.queue = queue
+        self.tools = tools
+        self.repo_configs = {repo_config.full_name: repo_config for repo_config in repo_configs}
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.concurrency = max(1, concurrency)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._llms: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._agents: Dict[str, asyncio.Task] = {}
+
+    async def _get_agents(self, repo_key: str) -> Optional[Tuple[Any, Any]]:
+        repo_config = self.repo_configs.get(repo_key)
+        if repo_config is None:
+            return None
+        if repo_key not in self._agents:  # Tasks, so concurrent slots wait for the same build
+            llm_key = (repo_config.llm_provider, repo_config.llm_model)
+
+            async def build():
+                if llm_key not in self._llms:
+                    self._llms[llm_key] = asyncio.create_task(
+                        asyncio.to_thread(get_llm_model, provider=llm_key[0], model_name=llm_key[1]))
+                try:
+                    llm = await self._llms[llm_key]
+                except Exception:
+                    self._llms.pop(llm_key, None)
+                    raise
+                return await build_repo_agents(repo_config, llm, self.tools)
+
+            self._agents[repo_key] = asyncio.create_task(build())
+        agents = None
+        try:
+            agents = await self._agents[repo_key]
+        finally:
+            if agents is None:
+                self._agents.pop(repo_key, None)  # Retry the setup with the next item of this repository
+        return agents
+
+    async def _get_llm(self, repo_key: str) -> Optional[Any]:
+        """The LLM client of a repository whose agents are built (see _get_agents)."""
+        repo_config = self.repo_configs[repo_key]
+        task = self._llms.get((repo_config.llm_provider, repo_config.llm_model))
+        return await task if task is not None else None
+
+    async def _run_with_heartbeat(self, item: WorkItem, coro) -> bool:
+        """Runs `coro` while renewing the lease. Returns False if the lease was lost (the run is cancelled)."""
+        task = asyncio.create_task(coro)
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.lease_seconds / 3)
+                if done:
+                    task.result()
+                    return True
+                if not await asyncio.to_thread(self.queue.heartbeat, item.id, self.worker_id, self.lease_seconds):
+                    logger.warning(f"[Worker {self.worker_id}] Lost the lease of {item.item_type} "
+                                   f"#{item.item_number} ({item.repo}); cancelling its run.")
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    return False
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    async def process_item(self, item: WorkItem):
+        """Processes one leased item, then completes it, or fails it for a retry."""
+        log_prefix = f"[Worker {self.worker_id}] {item.item_type} #{item.item_number} ({item.repo})"
+        owner, repo = item.repo.split("/", 1)
+        try:
+            agents = await self._get_agents(item.repo)
+            if agents is None:
+                raise RuntimeError("repository is not configured or could not be set up on this worker")
+            agent = agents[0] if item.item_type == "issue" else agents[1]
+            if agent is None:
+                raise RuntimeError(f"{item.item_type} processing is disabled for this repository")
+
+            # The item may have waited in the queue: skip it if the owner has replied since it was enqueued
+            if await is_last_update_by_owner(item.item_number, item.item_type, owner, repo, self.tools):
+                logger.info(f"{log_prefix} Skipping (last update by owner since it was enqueued).")
+                ITEMS_SKIPPED.inc(item_type=item.item_type, reason="owner_update")
+            else:
+                logger.info(f"{log_prefix} Processing (attempt {item.attempts}).")
+                process_func = ITEM_TYPES[item.item_type][2]
+                if item.item_type == "pr":  # PRs are pre-analyzed with the worker's tools (and LLM for large ones)
+                    run = process_func(item.payload, agent, owner, repo, self.tools, await self._get_llm(item.repo))
+                else:
+                    run = process_func(item.payload, agent, owner, repo)
+                if not await self._run_with_heartbeat(item, run):
+                    return
+                ITEMS_PROCESSED.inc(item_type=item.item_type)
+            await asyncio.to_thread(self.queue.complete, item.id, self.worker_id)
+        except Exception as e:
+            ERRORS.inc(stage=f"{item.item_type}_process")
+            logger.error(f"{log_prefix} Failed: {e}", exc_info=True)
+            await asyncio.to_thread(self.queue.fail, item.id, self.worker_id, str(e),
+                                    float(os.getenv("WORK_RETRY_DELAY_SECONDS", 60)))
+
+    async def _slot(self):
+        while True:
+            item = await asyncio.to_thread(self.queue.lease, self.worker_id, self.lease_seconds)
+            if item is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            await self.process_item(item)
+
+    async def run(self):
+        """Runs the worker's slots until cancelled."""
+        logger.info(f"[Worker {self.worker_id}] Started with {self.concurrency} slots.")
+        await asyncio.gather(*(self._slot() for _ in range(self.concurrency)))
+
+
+# --- Entry point ---
+
+async def main(role: str, config_path: Optional[str], concurrency: int, worker_id: Optional[str]):
+    global mcp_connection
+    try:
+        repo_configs = load_repo_configs(config_path)
+        queue = open_work_queue()
+    except KeyError as e:
+        logger.critical(f"FATAL: Missing required environment variable: {e}. Exiting.")
+        return
+    except ValueError as e:
+        logger.critical(f"FATAL: {e}. Exiting.")
+        return
+
+    stop_event = asyncio.Event()
+    try:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+    except NotImplementedError:
+        logger.warning("Signal handlers are not supported on this platform. Manual shutdown required.")
+
+    setup_agent_event_logging()
+    metrics_port = int(os.getenv("METRICS_PORT", 0))
+    if metrics_port:
+        start_metrics_server(metrics_port, host=os.getenv("METRICS_HOST", "127.0.0.1"))
+
+    tools, mcp_connection = await setup_mcp_tools_from_manifest_cache()
+    if not mcp_connection and not tools:
+        logger.critical("FATAL: Failed to initialize MCP client. Exiting.")
+        queue.close()
+        return
+    if mcp_connection:
+        # Tools from the manifest cache fail on every call if the servers never connect: stop as on a cold cache
+        mcp_connection.add_failure_callback(lambda error: (
+            logger.critical(f"FATAL: MCP connection failed: {error}. Exiting."), stop_event.set()))
+
+    try:
+        if role == "coordinator":
+            logger.info(f"Coordinator for {', '.join(r.full_name for r in repo_configs)}.")
+            await run_coordinator(queue, tools, repo_configs, stop_event)
+        else:
+            worker = QueueWorker(queue, tools, repo_configs, worker_id=worker_id, concurrency=concurrency,
+                                 lease_seconds=float(os.getenv("WORK_LEASE_SECONDS", 120)),
+                                 poll_interval=float(os.getenv("WORK_POLL_INTERVAL_SECONDS", 5)))
+            worker_task = asyncio.create_task(worker.run())
+            await stop_event.wait()
+            # Cancelled runs keep their leases until they expire, then another worker picks them up
+            worker_task.cancel()
+            await asyncio.gather(worker_task, return_exceptions=True)
+    finally:
+        if mcp_connection:
+            await mcp_connection.aclose()
+            mcp_connection = None
+        queue.close()
+        logger.info(f"Repo Assistant {role} shutdown complete.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a coordinator or a worker of a sharded deployment.")
+    parser.add_argument("role", choices=("coordinator", "worker"))
+    parser.add_argument("--config", default=os.getenv("REPO_ASSISTANT_CONFIG"),
+                        help="TOML file listing the repositories (default: GITHUB_OWNER/GITHUB_REPO)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("WORKER_CONCURRENCY", 1)),
+                        help="Items a worker processes at the same time")
+    parser.add_argument("--worker-id", default=None, help="Worker name in leases (default: host-pid-random)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.role, args.config, args.concurrency, args.worker_id))
+    except KeyboardInterrupt:
+        logger.info("KeyboardInterrupt detected. Shutdown complete.")
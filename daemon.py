@@ -0,0 +1,198 @@
+# daemon.py
+"""
+Multi-repository mode: serves every repository listed in a TOML config file (see
+src/repo_config.py) from one process, sharing the MCP servers/sessions and LLM clients, with one
+scheduler running the issue and PR cycles of all repositories.
+
+Usage:
+    python daemon.py --config repos.toml
+"""
+import argparse
+import asyncio
+import os
+import signal
+from typing import Any, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.utils import logger, get_llm_model
+from src.mcp_client import setup_mcp_tools_from_manifest_cache, MCPConnection
+from src.agent import create_repo_agent, ingest_repo, extract_readme_from_ingest
+from src.knowledge_pack import build_knowledge_pack
+from src.startup import StartupPipeline, StartupError
+from src.agent_events import setup_agent_event_logging
+from src.metrics import start_metrics_server
+from src.repo_config import load_daemon_config, RepoConfig
+from src.scheduler import PollingScheduler, AdaptiveInterval
+from src.github_processor import fetch_readme_content
+from main import run_issue_cycle, run_pr_cycle, cycle_found_work
+
+mcp_connection: Optional[MCPConnection] = None  # Shared by all repositories
+
+
+async def build_repo_agents(repo_config: RepoConfig, llm: Any, tools: list) -> Optional[Tuple[Any, Any]]:
+    """
+    Ingests one repository and builds its Issue and PR agents (None for a disabled item type).
+    Returns None, after logging, if the repository cannot be set up, so other repositories still start.
+    """
+    owner, repo = repo_config.owner, repo_config.repo
+    try:
+        try:
+            ingest = await ingest_repo(f"https://github.com/{owner}/{repo}")
+        except Exception as ingest_err:
+            logger.warning(f"[{repo_config.full_name}] Repository ingest failed, agents will start without "
+                           f"the repo structure: {ingest_err}")
+            ingest = None
+        readme = extract_readme_from_ingest(ingest[2]) if ingest else None
+        if readme is None:
+            readme = await fetch_readme_content(tools, owner, repo)
+            if "Error" in readme or "Could not" in readme:
+                logger.warning(f"[{repo_config.full_name}] Proceeding without README content. Reason: {readme}")
+                readme = "(README content unavailable)"
+        repo_structure = ingest[1] if ingest else "(Repository structure unavailable)"
+        knowledge_pack = await build_knowledge_pack(f"https://github.com/{owner}/{repo}", ingest[2] if ingest else None)
+
+        issue_agent = pr_agent = None
+        if repo_config.enable_issues:
+            issue_agent = await create_repo_agent(llm, tools, owner, repo, readme, is_issue_agent=True,
+                                                  repo_structure=repo_structure,
+                                                  extra_instructions=repo_config.issue_instructions,
+                                                  knowledge_pack=knowledge_pack)
+        if repo_config.enable_prs:
+            pr_agent = await create_repo_agent(llm, tools, owner, repo, readme, is_issue_agent=False,
+                                               repo_structure=repo_structure,
+                                               extra_instructions=repo_config.pr_instructions,
+                                               knowledge_pack=knowledge_pack)
+        if (repo_config.enable_issues and not issue_agent) or (repo_config.enable_prs and not pr_agent):
+            raise ValueError("create_repo_agent returned None")
+        return issue_agent, pr_agent
+    except Exception as e:
+        logger.error(f"[{repo_config.full_name}] Failed to set up repository, skipping it: {e}", exc_info=True)
+        return None
+
+
+async def run_polled_cycle(item_type: str, agent: Any, tools: list, owner: str, repo: str, llm: Any) -> bool:
+    """Runs an issue or PR cycle; returns whether it processed an item (a hit for adaptive polling)."""
+    cycle = run_issue_cycle if item_type == "issue" else run_pr_cycle
+    await cycle(agent, tools, owner, repo, llm)
+    return cycle_found_work(item_type, owner, repo)
+
+
+async def main(config_path: str):
+    global mcp_connection
+    try:
+        config = load_daemon_config(config_path)
+    except ValueError as e:
+        logger.critical(f"FATAL: {e}. Exiting.")
+        return
+    logger.info(f"Multi-repo mode: {len(config.repos)} repositories from {config_path}: "
+                f"{', '.join(repo_config.full_name for repo_config in config.repos)}")
+
+    stop_event = asyncio.Event()
+    try:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+    except NotImplementedError:
+        logger.warning("Signal handlers are not supported on this platform. Manual shutdown required.")
+
+    setup_agent_event_logging()
+    metrics_port = int(os.getenv("METRICS_PORT", 0))
+    if metrics_port:
+        start_metrics_server(metrics_port, host=os.getenv("METRICS_HOST", "127.0.0.1"))
+
+    # --- Startup: one MCP connection and one LLM client per (provider, model), then every repository ---
+    async def start_mcp(_):
+        global mcp_connection
+        tools, mcp_connection = await setup_mcp_tools_from_manifest_cache()
+        if not mcp_connection and not tools:
+            raise RuntimeError("Failed to initialize MCP client.")
+        if mcp_connection:
+            # Tools from the manifest cache fail on every call if the servers never connect: stop as on a cold cache
+            mcp_connection.add_failure_callback(lambda error: (
+                logger.critical(f"FATAL: MCP connection failed: {error}. Exiting."), stop_event.set()))
+        return tools
+
+    def llm_builder(provider: str, model_name: str):
+        async def build_llm(_):
+            return await asyncio.to_thread(get_llm_model, provider=provider, model_name=model_name)
+
+        return build_llm
+
+    def repo_builder(repo_config: RepoConfig, llm_step: str):
+        async def build(deps: Dict[str, Any]):
+            return await build_repo_agents(repo_config, deps[llm_step], deps["mcp"])
+
+        return build
+
+    startup = StartupPipeline()
+    startup.add_step("mcp", start_mcp)
+    for provider, model_name in {(r.llm_provider, r.llm_model) for r in config.repos}:
+        startup.add_step(f"llm:{provider}:{model_name}", llm_builder(provider, model_name))
+    for repo_config in config.repos:
+        llm_step = f"llm:{repo_config.llm_provider}:{repo_config.llm_model}"
+        startup.add_step(f"repo:{repo_config.full_name}", repo_builder(repo_config, llm_step),
+                         depends_on=("mcp", llm_step))
+    try:
+        results = await startup.run()
+    except StartupError as startup_err:
+        logger.critical(f"{startup_err}. Exiting.", exc_info=startup_err.error)
+        if mcp_connection:
+            await mcp_connection.aclose()
+        return
+    logger.info(startup.timing_report())
+    tools = results["mcp"]
+
+    # --- One scheduler for the cycles of all repositories ---
+    scheduler = PollingScheduler(max_concurrency=config.max_concurrency)
+    started_repos = 0
+    for repo_config in config.repos:
+        agents = results[f"repo:{repo_config.full_name}"]
+        if agents is None:
+            continue
+        issue_agent, pr_agent = agents
+        initial_delay = started_repos * config.stagger_seconds
+        owner, repo = repo_config.owner, repo_config.repo
+        llm = results[f"llm:{repo_config.llm_provider}:{repo_config.llm_model}"]
+        if issue_agent:
+            name = f"issues:{repo_config.full_name}"
+            scheduler.add_job(name, lambda a=issue_agent, o=owner, r=repo, m=llm: run_polled_cycle("issue", a, tools, o, r, m),
+                              repo_config.issue_interval, initial_delay,
+                              adaptive=AdaptiveInterval.from_env(name, repo_config.issue_interval))
+        if pr_agent:
+            name = f"prs:{repo_config.full_name}"
+            scheduler.add_job(name, lambda a=pr_agent, o=owner, r=repo, m=llm: run_polled_cycle("pr", a, tools, o, r, m),
+                              repo_config.pr_interval, initial_delay,
+                              adaptive=AdaptiveInterval.from_env(name, repo_config.pr_interval))
+        started_repos += 1
+    if not started_repos:
+        logger.critical("FATAL: No repository could be set up. Exiting.")
+        if mcp_connection:
+            await mcp_connection.aclose()
+        return
+
+    scheduler_task = asyncio.create_task(scheduler.run())
+    logger.info(f"Serving {started_repos} repositories. Waiting for shutdown signal (Ctrl+C)...")
+    try:
+        await stop_event.wait()
+    finally:
+        logger.info("Shutting down: cancelling scheduled cycles...")
+        scheduler_task.cancel()
+        await asyncio.gather(scheduler_task, return_exceptions=True)
+        if mcp_connection:
+            await mcp_connection.aclose()
+            mcp_connection = None
+        logger.info("Repo Assistant daemon shutdown complete.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve several repositories from one process.")
+    parser.add_argument("--config", default=os.getenv("REPO_ASSISTANT_CONFIG", "repos.toml"),
+                        help="TOML file listing the repositories (default: REPO_ASSISTANT_CONFIG or repos.toml)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.config))
+    except KeyboardInterrupt:
+        logger.info("KeyboardInterrupt detected. Shutdown complete.")
@@ -12,44 +12,297 @@ load_dotenv()
 # Import LangChain/MCP components first
 from langchain_core.tools import BaseTool
 from langchain_core.runnables import Runnable
-from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_core.language_models import BaseChatModel
 
 # Import local modules. Ensure .env loading happens before config values are used.
 # Best practice is often to load .env explicitly early or ensure config loads it.
 # We will load and validate config within main() for clarity here.
 from src.utils import logger, get_llm_model
-from src.mcp_client import setup_mcp_client_and_tools
-from src.agent import create_repo_agent
+from src.mcp_client import setup_mcp_tools_from_manifest_cache, MCPConnection
+from src.agent import create_repo_agent, ingest_repo, extract_readme_from_ingest
+from src.knowledge_pack import build_knowledge_pack
+from src.startup import StartupPipeline, StartupError
+from src.scheduler import AdaptiveInterval
+from src.agent_events import setup_agent_event_logging
+from src.metrics import (
+    start_metrics_server, CYCLE_DURATION, LISTING_LATENCY, ELIGIBILITY_CHECK_LATENCY, ITEMS_PROCESSED,
+    ITEMS_SKIPPED, ERRORS, QUEUE_DEPTH
+)
 from src.github_processor import (
     process_issue, process_pr, fetch_all_github_items, find_tool,
-    is_last_update_by_owner,
-    fetch_readme_content
+    is_last_update_by_owner, deprioritized_numbers,
+    fetch_readme_content, triage_issue_backlog, previous_triages
 )
+from src.triage import triage_settings
+from src.prefetch import start_prefetch
+from src.tool_cache import observe_listing
 
 # --- Global Variables ---
 # For state management and graceful shutdown
-mcp_client_instance: Optional[MultiServerMCPClient] = None
+mcp_connection: Optional[MCPConnection] = None  # Background MCP client (tools may come from the manifest cache)
 background_tasks: List[asyncio.Task] = []
-last_processed_issue_id: Optional[int] = None  # Track last processed ID to avoid immediate re-processing
-last_processed_pr_id: Optional[int] = None
+last_processed_issue_ids: Dict[str, Optional[int]] = {}  # Per "owner/repo": last processed ID to avoid immediate re-processing
+last_processed_pr_ids: Dict[str, Optional[int]] = {}
+
+
+# --- Processing Cycle Logic ---
+
+async def run_issue_cycle(
+        agent_executor: Runnable,
+        tools: List[BaseTool],
+        owner: str, repo: str,
+        llm: Optional[BaseChatModel] = None
+) -> bool:
+    """
+    Runs one issue cycle for a repository: fetches open issues, finds the single most relevant one
+    (latest updated, not by owner, not the last processed), and processes it. With `llm`, up to
+    ISSUE_TRIAGE_BATCH_SIZE eligible issues are batch-triaged first and only one that needs a full
+    agent run is processed (see triage_issue_backlog).
+
+    Returns:
+        False if fetching/selecting issues failed, True otherwise.
+    """
+    repo_key = f"{owner}/{repo}"
+    log_prefix = f"[Issue Loop {repo_key}]"
+    list_issues_tool = find_tool(tools, "list_issues")
+    if not list_issues_tool:
+        return False
+
+    cycle_start_time = time.time()
+    target_issue_data: Optional[Dict[str, Any]] = None
+    fetch_ok = True
+    try:
+        # 1. Fetch all open issues, sorted descending by update time
+        with LISTING_LATENCY.time(item_type="issue"):
+            open_issues = await fetch_all_github_items(
+                list_issues_tool,
+                {"owner": owner, "repo": repo, "state": "open", "sort": "updated", "direction": "desc"}
+            )
+        QUEUE_DEPTH.set(len(open_issues), item_type="issue")
+        observe_listing(tools, owner, repo, open_issues)  # Lets unchanged comment threads be served from memory
+        logger.info(f"{log_prefix} Fetched {len(open_issues)} open issues.")
+        cooling_down = await asyncio.to_thread(deprioritized_numbers, owner, repo, 'issue')
+
+        # 2. Find the first eligible issue (most recent first), or a batch of them for triage
+        settings = triage_settings()
+        batch_size = settings["batch_size"] if llm is not None else 0
+        # Untriaged candidates not yet scanned: the scan only widens past the first eligible issue while
+        # enough of them remain for a batch triage to run (each scanned issue costs eligibility calls)
+        triaged = await asyncio.to_thread(previous_triages, owner, repo, open_issues) if batch_size > 0 else {}
+        untriaged_numbers = {number for number, category in triaged.items() if category is None}
+        untriaged_left = len(untriaged_numbers)
+        untriaged_eligible = 0
+        eligible_issues = []
+        for issue_data in open_issues:
+            issue_id = issue_data.get("number")
+            if not issue_id:
+                logger.warning(f"{log_prefix} Skipping issue with missing number.")
+                ITEMS_SKIPPED.inc(item_type="issue", reason="missing_number")
+                continue
+            untriaged = issue_id in untriaged_numbers
+            untriaged_left -= 1 if untriaged else 0
+
+            if "issues" not in issue_data.get("html_url", ""):
+                logger.warning(f"{log_prefix} Skipping issue with missing html_url.")
+                ITEMS_SKIPPED.inc(item_type="issue", reason="not_an_issue")
+                continue
+
+            # a) Skip if it was the very last item processed in the previous cycle
+            if issue_id == last_processed_issue_ids.get(repo_key):
+                logger.debug(f"{log_prefix} Issue #{issue_id} was the last processed. Checking next.")
+                ITEMS_SKIPPED.inc(item_type="issue", reason="last_processed")
+                continue  # Check the next newest issue
+
+            # Skip issues cooling down after runs that hit their deadline or step limit
+            if issue_id in cooling_down:
+                logger.info(f"{log_prefix} Skipping Issue #{issue_id} (deprioritized after timed-out runs).")
+                ITEMS_SKIPPED.inc(item_type="issue", reason="runaway_cooldown")
+                continue
+
+            # b) Check if the last update (comment) was by the owner
+            with ELIGIBILITY_CHECK_LATENCY.time(item_type="issue"):
+                is_owner_update = await is_last_update_by_owner(issue_id, 'issue', owner, repo, tools)
+            if is_owner_update:
+                logger.debug(f"{log_prefix} Skipping Issue #{issue_id} (last update by owner).")
+                ITEMS_SKIPPED.inc(item_type="issue", reason="owner_update")
+                continue  # Owner updated last, check the next newest issue
+
+            # c) Found an eligible target!
+            if batch_size > 0:
+                eligible_issues.append(issue_data)
+                untriaged_eligible += 1 if untriaged else 0
+                if len(eligible_issues) < batch_size and \
+                        untriaged_eligible + untriaged_left >= max(1, settings["min_backlog"]):
+                    continue
+                break
+            target_issue_data = issue_data
+            logger.info(f"{log_prefix} Found eligible target Issue #{issue_id} to process.")
+            break  # Stop searching, process this one
+
+        if eligible_issues:
+            target_issue_data = await triage_issue_backlog(eligible_issues, open_issues, llm, tools, owner, repo,
+                                                           previous=triaged)
+            if target_issue_data:
+                logger.info(f"{log_prefix} Issue #{target_issue_data.get('number')} needs an agent run "
+                            f"(out of {len(eligible_issues)} eligible issues).")
+
+        # 3. Process the target issue if one was found
+        if target_issue_data:
+            issue_id_to_process = target_issue_data.get("number")
+            # Warm the tool cache for the next issues while the agent works on this one
+            start_prefetch(tools, owner, repo, open_issues, target_issue_data, "issue")
+            try:
+                await process_issue(target_issue_data, agent_executor, owner, repo)
+                ITEMS_PROCESSED.inc(item_type="issue")
+                # Update tracker ONLY after successful processing attempt
+                last_processed_issue_ids[repo_key] = issue_id_to_process
+            except Exception as process_err:
+                ERRORS.inc(stage="issue_process")
+                logger.error(f"{log_prefix} Error processing Issue #{issue_id_to_process}: {process_err}",
+                             exc_info=True)
+                # Decide if the last processed ID should be reset on processing error.
+                # Resetting allows retrying it next cycle if it's still eligible.
+                last_processed_issue_ids[repo_key] = None
+        else:
+            logger.info(f"{log_prefix} No eligible new issues found to process in this cycle.")
+            # Reset tracker if nothing was processed, so the newest is eligible next time
+            last_processed_issue_ids[repo_key] = None
+
+    except Exception as e:
+        fetch_ok = False
+        ERRORS.inc(stage="issue_fetch")
+        logger.error(f"{log_prefix} Error during fetch/selection: {e}", exc_info=True)
+        last_processed_issue_ids[repo_key] = None  # Reset tracker on fetch error
+
+    CYCLE_DURATION.observe(time.time() - cycle_start_time, loop="issue")
+    return fetch_ok
+
+
+async def run_pr_cycle(
+        agent_executor: Runnable,
+        tools: List[BaseTool],
+        owner: str, repo: str,
+        llm: Optional[BaseChatModel] = None
+) -> bool:
+    """
+    Runs one PR cycle for a repository: fetches open PRs, finds the single most relevant one
+    (latest updated, not by owner, not the last processed), and processes it. `llm` enables
+    the map-reduce review of very large PRs (see process_pr).
+
+    Returns:
+        False if fetching/selecting PRs failed, True otherwise.
+    """
+    repo_key = f"{owner}/{repo}"
+    log_prefix = f"[PR Loop {repo_key}]"
+    list_prs_tool = find_tool(tools, "list_pull_requests")
+    if not list_prs_tool:
+        return False
+
+    cycle_start_time = time.time()
+    target_pr_data: Optional[Dict[str, Any]] = None
+    fetch_ok = True
+    try:
+        # 1. Fetch all open PRs, sorted descending by update time
+        with LISTING_LATENCY.time(item_type="pr"):
+            open_prs = await fetch_all_github_items(
+                list_prs_tool,
+                {"owner": owner, "repo": repo, "state": "open", "sort": "updated", "direction": "desc"}
+            )
+        QUEUE_DEPTH.set(len(open_prs), item_type="pr")
+        observe_listing(tools, owner, repo, open_prs)
+        logger.info(f"{log_prefix} Fetched {len(open_prs)} open PRs.")
+        cooling_down = await asyncio.to_thread(deprioritized_numbers, owner, repo, 'pr')
+
+        # 2. Find the first eligible PR (most recent first)
+        for pr_data in open_prs:
+            pr_id = pr_data.get("number")
+            if not pr_id:
+                logger.warning(f"{log_prefix} Skipping PR with missing number.")
+                ITEMS_SKIPPED.inc(item_type="pr", reason="missing_number")
+                continue
+
+            if "pull" not in pr_data.get("html_url", ""):
+                logger.warning(f"{log_prefix} Skipping pr with missing html_url.")
+                ITEMS_SKIPPED.inc(item_type="pr", reason="not_a_pr")
+                continue
+
+            # a) Skip if it was the last processed
+            if pr_id == last_processed_pr_ids.get(repo_key):
+                logger.debug(f"{log_prefix} PR #{pr_id} was the last processed. Checking next.")
+                ITEMS_SKIPPED.inc(item_type="pr", reason="last_processed")
+                continue
+
+            # Skip PRs cooling down after runs that hit their deadline or step limit
+            if pr_id in cooling_down:
+                logger.info(f"{log_prefix} Skipping PR #{pr_id} (deprioritized after timed-out runs).")
+                ITEMS_SKIPPED.inc(item_type="pr", reason="runaway_cooldown")
+                continue
+
+            # b) Check if the last update (comment) was by the owner
+            # Note: PR updates might be more complex than just comments (commits, reviews).
+            # is_last_update_by_owner uses comment check, which is a good proxy.
+            with ELIGIBILITY_CHECK_LATENCY.time(item_type="pr"):
+                is_owner_update = await is_last_update_by_owner(pr_id, 'pr', owner, repo, tools)
+            if is_owner_update:
+                logger.debug(f"{log_prefix} Skipping PR #{pr_id} (last update by owner).")
+                ITEMS_SKIPPED.inc(item_type="pr", reason="owner_update")
+                continue
+
+            # c) Found an eligible target!
+            target_pr_data = pr_data
+            logger.info(f"{log_prefix} Found eligible target PR #{pr_id} to process.")
+            break
+
+        # 3. Process the target PR if one was found
+        if target_pr_data:
+            pr_id_to_process = target_pr_data.get("number")
+            # Warm the tool cache for the next PRs while the agent works on this one
+            start_prefetch(tools, owner, repo, open_prs, target_pr_data, "pr")
+            try:
+                await process_pr(target_pr_data, agent_executor, owner, repo, tools, llm)
+                ITEMS_PROCESSED.inc(item_type="pr")
+                # Update tracker ONLY after successful processing attempt
+                last_processed_pr_ids[repo_key] = pr_id_to_process
+            except Exception as process_err:
+                ERRORS.inc(stage="pr_process")
+                logger.error(f"{log_prefix} Error processing PR #{pr_id_to_process}: {process_err}", exc_info=True)
+                last_processed_pr_ids[repo_key] = None  # Allow retry next cycle
+        else:
+            logger.info(f"{log_prefix} No eligible new PRs found to process in this cycle.")
+            last_processed_pr_ids[repo_key] = None  # Reset tracker
+
+    except Exception as e:
+        fetch_ok = False
+        ERRORS.inc(stage="pr_fetch")
+        logger.error(f"{log_prefix} Error during fetch/selection: {e}", exc_info=True)
+        last_processed_pr_ids[repo_key] = None  # Reset tracker on fetch error
+
+    CYCLE_DURATION.observe(time.time() - cycle_start_time, loop="pr")
+    return fetch_ok
 
 
 # --- Processing Loop Logic ---
 
+def cycle_found_work(item_type: str, owner: str, repo: str) -> bool:
+    """Whether the last issue/PR cycle of a repository processed an item (a hit for adaptive polling)."""
+    processed_ids = last_processed_issue_ids if item_type == "issue" else last_processed_pr_ids
+    return processed_ids.get(f"{owner}/{repo}") is not None
+
+
 async def issue_processing_loop(
         agent_executor: Runnable,
         tools: List[BaseTool],
-        owner: str, repo: str, interval: int
+        owner: str, repo: str, interval: int,
+        llm: Optional[BaseChatModel] = None
 ):
     """
-    Periodically fetches open issues, finds the single most relevant one
-    (latest updated, not by owner, not the last processed), and processes it.
+    Periodically runs an issue cycle (see run_issue_cycle) for one repository, every `interval`
+    seconds adapted to the repository's activity (see AdaptiveInterval).
     """
-    global last_processed_issue_id  # Allow modification of global tracker
-    list_issues_tool = find_tool(tools, "list_issues")
-    if not list_issues_tool:
+    if not find_tool(tools, "list_issues"):
         logger.error("Critical: 'list_issues' tool not found. Stopping issue processing loop.")
         return
+    poller = AdaptiveInterval.from_env(f"issues:{owner}/{repo}", interval)
 
     # Initialize next fetch time to start the first cycle immediately
     next_fetch_time = time.time()
@@ -67,94 +320,38 @@ async def issue_processing_loop(
                 break  # Exit the loop cleanly if cancelled during sleep
         # If wait_time <= 0, the previous cycle took too long, start immediately
 
-        # 2. Schedule the *next* cycle's start time based on the current time + interval
+        # 2. Fetch, select and process
         current_fetch_start_time = time.time()
-        next_fetch_time = current_fetch_start_time + interval
-        logger.info(f"[Issue Loop] Starting fetch cycle at {time.strftime('%Y-%m-%d %H:%M:%S')}. "
-                    f"Next cycle planned ~{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(next_fetch_time))}.")
-
-        target_issue_data: Optional[Dict[str, Any]] = None
-        fetch_error = False
+        logger.info(f"[Issue Loop] Starting fetch cycle at {time.strftime('%Y-%m-%d %H:%M:%S')}.")
         try:
-            # 3. Fetch all open issues, sorted descending by update time
-            open_issues = await fetch_all_github_items(
-                list_issues_tool,
-                {"owner": owner, "repo": repo, "state": "open", "sort": "updated", "direction": "desc"}
-            )
-            logger.info(f"[Issue Loop] Fetched {len(open_issues)} open issues.")
-
-            # 4. Find the first eligible issue (most recent first)
-            for issue_data in open_issues:
-                issue_id = issue_data.get("number")
-                if not issue_id:
-                    logger.warning("[Issue Loop] Skipping issue with missing number.")
-                    continue
-
-                if "issues" not in issue_data.get("html_url", ""):
-                    logger.warning("[Issue Loop] Skipping issue with missing html_url.")
-                    continue
-
-                # a) Skip if it was the very last item processed in the previous cycle
-                if issue_id == last_processed_issue_id:
-                    logger.debug(f"[Issue Loop] Issue #{issue_id} was the last processed. Checking next.")
-                    continue  # Check the next newest issue
-
-                # b) Check if the last update (comment) was by the owner
-                is_owner_update = await is_last_update_by_owner(issue_id, 'issue', owner, repo, tools)
-                if is_owner_update:
-                    logger.debug(f"[Issue Loop] Skipping Issue #{issue_id} (last update by owner).")
-                    continue  # Owner updated last, check the next newest issue
-
-                # c) Found an eligible target!
-                target_issue_data = issue_data
-                logger.info(f"[Issue Loop] Found eligible target Issue #{issue_id} to process.")
-                break  # Stop searching, process this one
-
-            # 5. Process the target issue if one was found
-            if target_issue_data:
-                issue_id_to_process = target_issue_data.get("number")
-                try:
-                    await process_issue(target_issue_data, agent_executor, owner, repo)
-                    # Update tracker ONLY after successful processing attempt
-                    last_processed_issue_id = issue_id_to_process
-                except Exception as process_err:
-                    logger.error(f"[Issue Loop] Error processing Issue #{issue_id_to_process}: {process_err}",
-                                 exc_info=True)
-                    # Decide if last_processed_issue_id should be reset on processing error.
-                    # Resetting allows retrying it next cycle if it's still eligible.
-                    last_processed_issue_id = None
-            else:
-                logger.info("[Issue Loop] No eligible new issues found to process in this cycle.")
-                # Reset tracker if nothing was processed, so the newest is eligible next time
-                last_processed_issue_id = None
-
+            fetch_ok = await run_issue_cycle(agent_executor, tools, owner, repo, llm)
         except asyncio.CancelledError:
             logger.info("[Issue Loop] Task cancelled during fetch/process.")
             break  # Exit loop cleanly
-        except Exception as e:
-            fetch_error = True
-            logger.error(f"[Issue Loop] Error during fetch/selection: {e}", exc_info=True)
-            last_processed_issue_id = None  # Reset tracker on fetch error
 
-        if fetch_error:
+        if not fetch_ok:
             logger.warning("[Issue Loop] Fetch/selection failed. Waiting for next scheduled cycle.")
-            # The loop will naturally wait until `next_fetch_time` already calculated
+
+        # 3. Schedule the *next* cycle's start time: sooner after a cycle that found work, later when idle
+        next_fetch_time = current_fetch_start_time + poller.record(cycle_found_work("issue", owner, repo))
+        logger.info(f"[Issue Loop] Next cycle planned "
+                    f"~{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(next_fetch_time))}.")
 
 
 async def pr_processing_loop(
         agent_executor: Runnable,
         tools: List[BaseTool],
-        owner: str, repo: str, interval: int
+        owner: str, repo: str, interval: int,
+        llm: Optional[BaseChatModel] = None
 ):
     """
-    Periodically fetches open PRs, finds the single most relevant one
-    (latest updated, not by owner, not the last processed), and processes it.
+    Periodically runs a PR cycle (see run_pr_cycle) for one repository, every `interval` seconds
+    adapted to the repository's activity (see AdaptiveInterval).
     """
-    global last_processed_pr_id  # Allow modification of global tracker
-    list_prs_tool = find_tool(tools, "list_pull_requests")
-    if not list_prs_tool:
+    if not find_tool(tools, "list_pull_requests"):
         logger.error("Critical: 'list_pull_requests' tool not found. Stopping PR processing loop.")
         return
+    poller = AdaptiveInterval.from_env(f"prs:{owner}/{repo}", interval)
 
     # Initialize next fetch time to start the first cycle immediately
     next_fetch_time = time.time()
@@ -172,76 +369,33 @@ async def pr_processing_loop(
                 break
         # If wait_time <= 0, start immediately
 
-        # 2. Schedule the *next* cycle's start time
+        # 2. Fetch, select and process
         current_fetch_start_time = time.time()
-        next_fetch_time = current_fetch_start_time + interval
-        logger.info(f"[PR Loop] Starting fetch cycle at {time.strftime('%Y-%m-%d %H:%M:%S')}. "
-                    f"Next cycle planned ~{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(next_fetch_time))}.")
-
-        target_pr_data: Optional[Dict[str, Any]] = None
-        fetch_error = False
+        logger.info(f"[PR Loop] Starting fetch cycle at {time.strftime('%Y-%m-%d %H:%M:%S')}.")
         try:
-            # 3. Fetch all open PRs, sorted descending by update time
-            open_prs = await fetch_all_github_items(
-                list_prs_tool,
-                {"owner": owner, "repo": repo, "state": "open", "sort": "updated", "direction": "desc"}
-            )
-            logger.info(f"[PR Loop] Fetched {len(open_prs)} open PRs.")
-
-            # 4. Find the first eligible PR (most recent first)
-            for pr_data in open_prs:
-                pr_id = pr_data.get("number")
-                if not pr_id:
-                    logger.warning("[PR Loop] Skipping PR with missing number.")
-                    continue
-
-                if "pull" not in pr_data.get("html_url", ""):
-                    logger.warning("[PR Loop] Skipping pr with missing html_url.")
-                    continue
-
-                # a) Skip if it was the last processed
-                if pr_id == last_processed_pr_id:
-                    logger.debug(f"[PR Loop] PR #{pr_id} was the last processed. Checking next.")
-                    continue
-
-                # b) Check if the last update (comment) was by the owner
-                # Note: PR updates might be more complex than just comments (commits, reviews).
-                # is_last_update_by_owner uses comment check, which is a good proxy.
-                is_owner_update = await is_last_update_by_owner(pr_id, 'pr', owner, repo, tools)
-                if is_owner_update:
-                    logger.debug(f"[PR Loop] Skipping PR #{pr_id} (last update by owner).")
-                    continue
-
-                # c) Found an eligible target!
-                target_pr_data = pr_data
-                logger.info(f"[PR Loop] Found eligible target PR #{pr_id} to process.")
-                break
-
-            # 5. Process the target PR if one was found
-            if target_pr_data:
-                pr_id_to_process = target_pr_data.get("number")
-                try:
-                    await process_pr(target_pr_data, agent_executor, owner, repo)
-                    # Update tracker ONLY after successful processing attempt
-                    last_processed_pr_id = pr_id_to_process
-                except Exception as process_err:
-                    logger.error(f"[PR Loop] Error processing PR #{pr_id_to_process}: {process_err}", exc_info=True)
-                    last_processed_pr_id = None  # Allow retry next cycle
-            else:
-                logger.info("[PR Loop] No eligible new PRs found to process in this cycle.")
-                last_processed_pr_id = None  # Reset tracker
-
+            fetch_ok = await run_pr_cycle(agent_executor, tools, owner, repo, llm)
         except asyncio.CancelledError:
             logger.info("[PR Loop] Task cancelled during fetch/process.")
             break
-        except Exception as e:
-            fetch_error = True
-            logger.error(f"[PR Loop] Error during fetch/selection: {e}", exc_info=True)
-            last_processed_pr_id = None  # Reset tracker on fetch error
 
-        if fetch_error:
+        if not fetch_ok:
             logger.warning("[PR Loop] Fetch/selection failed. Waiting for next scheduled cycle.")
 
+        # 3. Schedule the *next* cycle's start time
+        next_fetch_time = current_fetch_start_time + poller.record(cycle_found_work("pr", owner, repo))
+        logger.info(f"[PR Loop] Next cycle planned ~{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(next_fetch_time))}.")
+
+
+# --- MCP Client Lifecycle ---
+async def stop_mcp_client():
+    """Stops the MCP client, cancelling the background connection if it is still starting."""
+    global mcp_connection
+    if mcp_connection:
+        await mcp_connection.aclose()
+        mcp_connection = None
+    else:
+        logger.info("MCP client was not running or not initialized.")
+
 
 # --- Graceful Shutdown Handler ---
 async def shutdown(signal_event: asyncio.Event):
@@ -266,17 +420,7 @@ async def shutdown(signal_event: asyncio.Event):
     logger.info("Background tasks cancellation process complete.")
 
     # Stop the MCP client using its async context manager exit method
-    global mcp_client_instance
-    if mcp_client_instance:
-        logger.info("Stopping MCP client...")
-        try:
-            # Call the async exit method correctly
-            await mcp_client_instance.__aexit__(None, None, None)
-            logger.info("MCP client stopped successfully.")
-        except Exception as e:
-            logger.error(f"Error stopping MCP client: {e}", exc_info=True)
-    else:
-        logger.info("MCP client was not running or not initialized.")
+    await stop_mcp_client()
 
     logger.info("Repo Assistant shutdown complete.")
 
@@ -285,7 +429,7 @@ async def shutdown(signal_event: asyncio.Event):
 async def main():
     """Sets up all components, starts processing loops, and handles shutdown."""
     logger.info("Starting Repo Assistant (Cycle-Based Processing)...")
-    global mcp_client_instance, background_tasks  # Declare intent to modify globals
+    global mcp_connection, background_tasks  # Declare intent to modify globals
     signal_event = asyncio.Event()  # Event to signal shutdown initiation
 
     # --- Load and Validate Configuration ---
@@ -297,6 +441,7 @@ async def main():
         LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "gpt-4o")
         ISSUE_INTERVAL = int(os.getenv("ISSUE_FETCH_INTERVAL_SECONDS", 300))
         PR_INTERVAL = int(os.getenv("PR_FETCH_INTERVAL_SECONDS", 300))
+        METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # 0 disables the metrics endpoint
 
         # Validate intervals
         if ISSUE_INTERVAL <= 0 or PR_INTERVAL <= 0:
@@ -329,57 +474,104 @@ async def main():
     except Exception as e:
         logger.error(f"Error setting up signal handlers: {e}", exc_info=True)
 
+    # --- Structured agent events (tool calls) are written as JSON lines from a background thread ---
+    setup_agent_event_logging()
+
+    # --- Optional Metrics Endpoint ---
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT, host=os.getenv("METRICS_HOST", "127.0.0.1"))
+
     # --- Main Application Logic ---
     try:
-        # 1. Setup MCP Client and Filtered Tools
-        filtered_tools, mcp_client = await setup_mcp_client_and_tools()
-        if not mcp_client:
-            logger.critical("Failed to initialize MCP client. Exiting.")
-            return
-        mcp_client_instance = mcp_client  # Store globally for shutdown
-        if not filtered_tools:
-            logger.warning("MCP client initialized, but no usable tools were found. Functionality may be limited.")
-            # Consider if you want to exit if tools are essential
-            # return
-
-        # 2. Fetch README Content
-        readme_content = await fetch_readme_content(filtered_tools, GITHUB_OWNER, GITHUB_REPO)
-        if "Error" in readme_content or "Could not" in readme_content:
-            logger.warning(f"Proceeding without README content. Reason: {readme_content}")
-            readme_content = "(README content unavailable)"  # Provide fallback for agent
-
-        # 3. Setup LLM
+        # 1-4. Startup pipeline: MCP startup, repository ingest and LLM construction run concurrently;
+        # the README comes from the ingest when possible and both agents share that single ingest.
+        async def start_mcp(_):
+            global mcp_connection
+            # With a warm manifest cache the tools are returned immediately and the servers connect in the background
+            tools, mcp_connection = await setup_mcp_tools_from_manifest_cache()
+            if not mcp_connection and not tools:  # Cassette replay serves tools without a connection
+                raise RuntimeError("Failed to initialize MCP client.")
+            if mcp_connection:
+                # Tools from the manifest cache fail on every call if the servers never connect: exit as on a cold cache
+                mcp_connection.add_failure_callback(lambda error: (
+                    logger.critical(f"FATAL: MCP connection failed: {error}. Exiting."),
+                    asyncio.create_task(shutdown(signal_event))))
+            if not tools:
+                logger.warning("MCP client initialized, but no usable tools were found. Functionality may be limited.")
+            return tools
+
+        async def ingest(_):
+            try:
+                return await ingest_repo(f"https://github.com/{GITHUB_OWNER}/{GITHUB_REPO}")
+            except Exception as ingest_err:
+                logger.warning(f"Repository ingest failed, agents will start without the repo structure: {ingest_err}")
+                return None
+
+        async def build_llm(_):
+            # Provider backends are imported lazily, so build the model off the event loop
+            return await asyncio.to_thread(get_llm_model, provider=LLM_PROVIDER, model_name=LLM_MODEL_NAME)
+
+        async def load_readme(deps):
+            readme = extract_readme_from_ingest(deps["ingest"][2]) if deps["ingest"] else None
+            if readme is not None:
+                logger.info("Using README.md content from the repository ingest.")
+                return readme
+            readme = await fetch_readme_content(deps["mcp"], GITHUB_OWNER, GITHUB_REPO)
+            if "Error" in readme or "Could not" in readme:
+                logger.warning(f"Proceeding without README content. Reason: {readme}")
+                readme = "(README content unavailable)"  # Provide fallback for agent
+            return readme
+
+        async def load_knowledge(deps):
+            # Optional: agents fall back to reading files through MCP without it
+            return await build_knowledge_pack(f"https://github.com/{GITHUB_OWNER}/{GITHUB_REPO}",
+                                              deps["ingest"][2] if deps["ingest"] else None)
+
+        def agent_builder(is_issue_agent: bool):
+            async def build_agent(deps):
+                repo_structure = deps["ingest"][1] if deps["ingest"] else "(Repository structure unavailable)"
+                agent = await create_repo_agent(deps["llm"], deps["mcp"], GITHUB_OWNER, GITHUB_REPO, deps["readme"],
+                                                is_issue_agent=is_issue_agent, repo_structure=repo_structure,
+                                                knowledge_pack=deps["knowledge"])
+                if not agent:
+                    raise ValueError(f"{'Issue' if is_issue_agent else 'PR'} create_repo_agent returned None")
+                return agent
+
+            return build_agent
+
+        startup = StartupPipeline()
+        startup.add_step("mcp", start_mcp)
+        startup.add_step("ingest", ingest)
+        startup.add_step("llm", build_llm)
+        startup.add_step("readme", load_readme, depends_on=("ingest", "mcp"))
+        startup.add_step("knowledge", load_knowledge, depends_on=("ingest",))
+        startup.add_step("issue_agent", agent_builder(True), depends_on=("llm", "mcp", "ingest", "readme", "knowledge"))
+        startup.add_step("pr_agent", agent_builder(False), depends_on=("llm", "mcp", "ingest", "readme", "knowledge"))
         try:
-            llm = get_llm_model(provider=LLM_PROVIDER, model_name=LLM_MODEL_NAME)
-        except (ValueError, Exception) as llm_err:
-            logger.critical(f"Failed to initialize LLM: {llm_err}. Exiting.", exc_info=True)
-            # Cleanup MCP client if LLM fails after client start
-            if mcp_client_instance: await mcp_client_instance.__aexit__(None, None, None)
+            results = await startup.run()
+        except StartupError as startup_err:
+            logger.critical(f"{startup_err}. Exiting.", exc_info=startup_err.error)
+            logger.info(startup.timing_report())
+            await stop_mcp_client()
             return
+        filtered_tools = results["mcp"]
+        issue_agent = results["issue_agent"]
+        pr_agent = results["pr_agent"]
+        logger.info(startup.timing_report())
 
-        # 4. Create Agent Executor
-        try:
-            issue_agent = await create_repo_agent(llm, filtered_tools, GITHUB_OWNER, GITHUB_REPO, readme_content,
-                                            is_issue_agent=True)
-            if not issue_agent: raise ValueError("Issue create_repo_agent returned None")
-            pr_agent = await create_repo_agent(llm, filtered_tools, GITHUB_OWNER, GITHUB_REPO, readme_content,
-                                         is_issue_agent=False)
-            if not pr_agent: raise ValueError("PR create_repo_agent returned None")
-        except Exception as agent_err:
-            logger.critical(f"Failed to create agent executor: {agent_err}. Exiting.", exc_info=True)
-            if mcp_client_instance: await mcp_client_instance.__aexit__(None, None, None)
-            return
+        if signal_event.is_set():
+            return  # Shut down during startup (signal or failed MCP connection)
 
         # 5. Start Background Processing Loops
         logger.info("Starting background processing loops...")
         task1 = asyncio.create_task(
             issue_processing_loop(
-                issue_agent, filtered_tools, GITHUB_OWNER, GITHUB_REPO, ISSUE_INTERVAL
+                issue_agent, filtered_tools, GITHUB_OWNER, GITHUB_REPO, ISSUE_INTERVAL, results["llm"]
             )
         )
         task2 = asyncio.create_task(
             pr_processing_loop(
-                pr_agent, filtered_tools, GITHUB_OWNER, GITHUB_REPO, PR_INTERVAL
+                pr_agent, filtered_tools, GITHUB_OWNER, GITHUB_REPO, PR_INTERVAL, results["llm"]
             )
         )
         background_tasks = [task1, task2]  # Store tasks for cancellation
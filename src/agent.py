@@ -1,25 +1,68 @@
+import os
 import pdb
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from langchain_core.tools import BaseTool
 from langchain_core.runnables import Runnable
 from langchain_core.language_models import BaseChatModel
 from langgraph.prebuilt import create_react_agent
 from src.prompts import ISSUE_SYSTEM_PROMPT_TEMPLATE, PR_SYSTEM_PROMPT_TEMPLATE, README_CONTENT_PLACEHOLDER, \
-    FQA_SYSTEM_PROMPT_TEMPLATE
+    FQA_SYSTEM_PROMPT_TEMPLATE, KNOWLEDGE_PACK_PROMPT_TEMPLATE
 from src.utils import logger
+from src.cassette import get_cassette
+from src.compaction import ConversationCompactor
+from src.knowledge_pack import KnowledgePack, split_ingest_files, build_knowledge_pack, make_knowledge_tool
 from gitingest import ingest, ingest_async
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
 
 from . import utils
 
 
+async def ingest_repo(repo_url: str) -> Tuple[str, str, str]:
+    """
+    Clones and ingests a repository with gitingest.
+
+    Returns:
+        A tuple of (summary, repo_structure, content) where repo_structure has the
+        "Directory structure:" header lines stripped.
+    """
+    cassette = get_cassette()
+    if cassette is not None:
+        # Recorded like a tool call so that replays get the same repository context offline
+        summary, repo_structure, content = await cassette.tool_call(
+            "gitingest", {"repo_url": repo_url}, lambda: ingest_async(repo_url))
+    else:
+        summary, repo_structure, content = await ingest_async(repo_url)
+    repo_structure = "\n".join(repo_structure.split("\n")[2:])
+    return summary, repo_structure, content
+
+
+def extract_readme_from_ingest(content: str) -> Optional[str]:
+    """Returns the root README.md text from a gitingest content digest, or None if absent."""
+    for path, text in split_ingest_files(content).items():
+        if path.lower() == "readme.md":
+            return text
+    return None
+
+
+def with_knowledge_pack(tools: List[BaseTool], system_prompt: str,
+                        knowledge_pack: Optional[KnowledgePack]) -> Tuple[List[BaseTool], str]:
+    """Adds the repo_knowledge tool and the pack's root overview to an agent's tools and system prompt."""
+    if knowledge_pack is None:
+        return tools, system_prompt
+    system_prompt += KNOWLEDGE_PACK_PROMPT_TEMPLATE.format(root_overview=knowledge_pack.describe("", max_chars=3000))
+    return [*tools, make_knowledge_tool(knowledge_pack)], system_prompt
+
+
 async def create_repo_agent(
         llm: BaseChatModel,
         tools: List[BaseTool],
         repo_owner: str,
         repo_name: str,
         readme_content: str,
-        is_issue_agent: bool = True
+        is_issue_agent: bool = True,
+        repo_structure: Optional[str] = None,
+        extra_instructions: Optional[str] = None,
+        knowledge_pack: Optional[KnowledgePack] = None
 ) -> Optional[Runnable]:
     """
     Creates and configures a LangChain ReAct agent for repository assistance tasks.
@@ -30,6 +73,12 @@ async def create_repo_agent(
         repo_owner: The owner of the target GitHub repository.
         repo_name: The name of the target GitHub repository.
         readme_content: The fetched content of the repository's README.md.
+        is_issue_agent: Whether to build the Issue agent (True) or the PR agent (False).
+        repo_structure: A pre-computed repository tree (see ingest_repo). The repository
+            is ingested here when omitted.
+        extra_instructions: Optional repository-specific instructions appended to the system prompt.
+        knowledge_pack: Optional precomputed repository digest (see build_knowledge_pack), exposed
+            to the agent as the repo_knowledge tool.
 
     Returns:
         A LangChain Runnable (agent executor) instance, or None if creation fails.
@@ -45,9 +94,9 @@ async def create_repo_agent(
 
     # Prepare the system prompt with dynamic repository info and README content
     try:
-        github_url = f"https://github.com/{repo_owner}/{repo_name}"
-        summary, repo_structure, content = await ingest_async(github_url)
-        repo_structure = "\n".join(repo_structure.split("\n")[2:])
+        if repo_structure is None:
+            github_url = f"https://github.com/{repo_owner}/{repo_name}"
+            summary, repo_structure, content = await ingest_repo(github_url)
         if is_issue_agent:
             system_prompt = ISSUE_SYSTEM_PROMPT_TEMPLATE.format(
                 repo_owner=repo_owner,
@@ -63,6 +112,9 @@ async def create_repo_agent(
     except KeyError as e:
         logger.error(f"Failed to format system prompt - missing key: {e}")
         return None
+    if extra_instructions:
+        system_prompt += f"\n\n**Repository-Specific Instructions:**\n{extra_instructions.strip()}\n"
+    tools, system_prompt = with_knowledge_pack(tools, system_prompt, knowledge_pack)
 
     try:
         # create_react_agent sets up the necessary agent executor runnable
@@ -86,7 +138,7 @@ async def create_repo_agent(
 async def create_repo_fqa_agent(
         llm: BaseChatModel,
         tools: List[BaseTool],
-        memory: MemorySaver,
+        memory: BaseCheckpointSaver,
         repo_url: str,
         repo_docs_url: Optional[str] = "",
 ) -> Optional[Runnable]:
@@ -109,8 +161,7 @@ async def create_repo_fqa_agent(
         logger.warning("No tools provided to the agent. It might lack capabilities.")
         return None
 
-    summary, repo_structure, content = await ingest_async(repo_url)
-    repo_structure = "\n".join(repo_structure.split("\n")[2:])
+    summary, repo_structure, content = await ingest_repo(repo_url)
     repo_owner, repo_name = utils.extract_github_owner_repo(repo_url)
     system_prompt = FQA_SYSTEM_PROMPT_TEMPLATE.format(
         repo_url=repo_url,
@@ -119,6 +170,7 @@ async def create_repo_fqa_agent(
         repo_owner=repo_owner,
         repo_name=repo_name
     )
+    tools, system_prompt = with_knowledge_pack(tools, system_prompt, await build_knowledge_pack(repo_url, content))
 
     try:
         # create_react_agent sets up the necessary agent executor runnable
@@ -127,7 +179,11 @@ async def create_repo_fqa_agent(
             llm,
             tools,
             prompt=system_prompt,
-            checkpointer=memory
+            checkpointer=memory,
+            # Keeps long threads near a constant context size (0 disables compaction)
+            pre_model_hook=ConversationCompactor(
+                llm, max_tokens=int(os.getenv("FQA_COMPACTION_MAX_TOKENS", 24000)),
+                keep_recent_tokens=int(os.getenv("FQA_COMPACTION_KEEP_RECENT_TOKENS", 8000)))
         )
         logger.info("LangChain ReAct agent executor created successfully.")
         return agent_executor
@@ -0,0 +1,150 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import reprlib
+import sys
+import time
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Structured agent events go to their own logger so they can be routed (and formatted) independently
+event_logger = logging.getLogger("RepoAssistant.events")
+
+PREVIEW_CHARS = 300
+
+_preview_repr = reprlib.Repr()
+_preview_repr.maxstring = PREVIEW_CHARS
+_preview_repr.maxother = PREVIEW_CHARS
+_preview_repr.maxlist = _preview_repr.maxdict = _preview_repr.maxtuple = 20
+_preview_repr.maxlevel = 4
+
+
+def preview(value: Any, limit: int = PREVIEW_CHARS) -> str:
+    """Short text preview of a value whose cost does not grow with the size of the value."""
+    content = getattr(value, "content", value)  # ToolMessage -> its content
+    if isinstance(content, str):
+        return content if len(content) <= limit else content[:limit] + "..."
+    return _preview_repr.repr(content)
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that defers all formatting to the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The default implementation formats the message on the caller's thread; we enqueue the
+        # record as-is so that previews and JSON serialization happen on the listener thread.
+        return record
+
+
+class JsonEventFormatter(logging.Formatter):
+    """Formats agent event records (see AgentEventSink) as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "event": record.getMessage(),
+        }
+        fields = getattr(record, "agent_event", None)
+        if fields:
+            for key, value in fields.items():
+                if key == "input":
+                    event[key] = value if isinstance(value, (str, int, float, bool, type(None), dict, list)) \
+                        else preview(value)
+                elif key == "output":
+                    event["output_preview"] = preview(value)
+                else:
+                    event[key] = value
+        if record.exc_info:
+            event["exc"] = self.formatException(record.exc_info)
+        return json.dumps(event, default=preview, ensure_ascii=False)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_agent_event_logging(stream=None) -> logging.Logger:
+    """
+    Routes agent events through a non-blocking queue to a JSON-lines handler running on a
+    background thread. Writes to AGENT_EVENT_LOG_FILE if set, otherwise to stderr. Idempotent.
+    """
+    global _listener
+    if _listener is not None:
+        return event_logger
+
+    log_file = os.getenv("AGENT_EVENT_LOG_FILE", "")
+    if stream is not None:
+        target: logging.Handler = logging.StreamHandler(stream)
+    elif log_file:
+        target = logging.FileHandler(log_file, encoding="utf-8")
+    else:
+        target = logging.StreamHandler(sys.stderr)
+    target.setFormatter(JsonEventFormatter())
+
+    event_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    event_logger.handlers = [_LazyQueueHandler(event_queue)]
+    event_logger.setLevel(logging.INFO)
+    event_logger.propagate = False
+    _listener = logging.handlers.QueueListener(event_queue, target, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_agent_event_logging)
+    return event_logger
+
+
+def stop_agent_event_logging():
+    """Flushes queued events and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class AgentEventSink(BaseCallbackHandler):
+    """
+    Logs tool starts/ends of an agent run as structured events.
+
+    Only tool callbacks are subscribed (chain, LLM, chat model, retriever and custom events are
+    skipped by the callback manager), and the handler only stores references: previews and
+    serialization happen lazily in JsonEventFormatter on the logging listener thread.
+    """
+    run_inline = True
+    ignore_chain = True
+    ignore_llm = True
+    ignore_chat_model = True
+    ignore_retriever = True
+    ignore_custom_event = True
+
+    def __init__(self, item_type: str = "", item_number: Optional[int] = None):
+        self.context = {"item_type": item_type, "item_number": item_number}
+        self._started: Dict[UUID, tuple] = {}  # run_id -> (tool name, perf_counter at start)
+
+    def _finish(self, run_id: UUID):
+        tool_name, started = self._started.pop(run_id, (None, None))
+        return tool_name, round(time.perf_counter() - started, 3) if started else None
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID,
+                      inputs: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        tool_name = (serialized or {}).get("name")
+        self._started[run_id] = (tool_name, time.perf_counter())
+        if event_logger.isEnabledFor(logging.INFO):
+            event_logger.info("tool_start", extra={"agent_event": {
+                **self.context, "tool": tool_name, "run_id": str(run_id),
+                "input": inputs if inputs is not None else input_str}})
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+        tool_name, duration = self._finish(run_id)
+        if event_logger.isEnabledFor(logging.INFO):
+            event_logger.info("tool_end", extra={"agent_event": {
+                **self.context, "tool": tool_name, "run_id": str(run_id), "duration_s": duration,
+                "output": output}})
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        tool_name, duration = self._finish(run_id)
+        event_logger.warning("tool_error", extra={"agent_event": {
+            **self.context, "tool": tool_name, "run_id": str(run_id), "duration_s": duration,
+            "error": repr(error)[:PREVIEW_CHARS]}})
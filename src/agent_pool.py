@@ -0,0 +1,82 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from .utils import logger
+from .metrics import REGISTRY, CACHE_HITS
+
+AGENT_POOL_BUILDS = REGISTRY.counter(
+    "repo_assistant_agent_pool_builds_total", "Agents built by an agent pool, by outcome.", ["pool", "outcome"])
+AGENT_POOL_EVICTIONS = REGISTRY.counter(
+    "repo_assistant_agent_pool_evictions_total", "Least recently used agents evicted from an agent pool.", ["pool"])
+AGENT_POOL_SIZE = REGISTRY.gauge("repo_assistant_agent_pool_size", "Agents held by an agent pool.", ["pool"])
+
+
+class AgentPool:
+    """
+    Keeps up to `max_size` agents, keyed e.g. by (repo URL, docs URL), evicting the least recently
+    used one when full.
+
+    Builds are single-flight: concurrent `get` calls for a key that is being built wait for that one
+    build instead of starting their own. A failed build (exception or None) is not cached.
+    """
+
+    def __init__(self, build: Callable[[Hashable], Awaitable[Optional[Any]]], max_size: int = 8,
+                 name: str = "fqa"):
+        self._build = build
+        self.max_size = max(1, max_size)
+        self.name = name
+        self._agents: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._building: Dict[Hashable, asyncio.Future] = {}
+        AGENT_POOL_SIZE.set_function(lambda: len(self._agents), pool=name)
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._agents
+
+    async def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns the agent for `key`, building it if needed.
+
+        Returns:
+            The agent, or None if the build returned None.
+        Raises:
+            Exception: Whatever the build raised (to every caller waiting on that build).
+        """
+        if key in self._agents:
+            self._agents.move_to_end(key)
+            CACHE_HITS.inc(cache=f"agent_pool_{self.name}")
+            return self._agents[key]
+
+        building = self._building.get(key)
+        if building is None:
+            building = asyncio.ensure_future(self._build_and_store(key))
+            self._building[key] = building
+        else:
+            logger.info(f"[Agent Pool {self.name}] Waiting for the agent of {key} being built.")
+        # Shielded so a caller that goes away (e.g. a closed browser tab) doesn't cancel the shared build
+        return await asyncio.shield(building)
+
+    async def _build_and_store(self, key: Hashable) -> Optional[Any]:
+        try:
+            logger.info(f"[Agent Pool {self.name}] Building agent for {key} ({len(self._agents)}/{self.max_size} pooled).")
+            agent = await self._build(key)
+            AGENT_POOL_BUILDS.inc(pool=self.name, outcome="ok" if agent is not None else "failed")
+            if agent is not None:
+                self._agents[key] = agent
+                while len(self._agents) > self.max_size:
+                    evicted_key, _ = self._agents.popitem(last=False)
+                    AGENT_POOL_EVICTIONS.inc(pool=self.name)
+                    logger.info(f"[Agent Pool {self.name}] Evicted least recently used agent for {evicted_key}.")
+            return agent
+        except Exception:
+            AGENT_POOL_BUILDS.inc(pool=self.name, outcome="failed")
+            raise
+        finally:
+            self._building.pop(key, None)
+
+    def discard(self, key: Hashable):
+        """Drops the agent of `key`, if pooled (the next `get` rebuilds it)."""
+        self._agents.pop(key, None)
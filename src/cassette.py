@@ -0,0 +1,299 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter as CallCounter, defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, message_to_dict, messages_from_dict, messages_to_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import BaseTool, StructuredTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from src.utils import logger, get_cache_dir
+from src.metrics import REGISTRY
+
+CASSETTE_VERSION = 1
+
+CASSETTE_EVENTS = REGISTRY.counter(
+    "repo_assistant_cassette_events_total", "Cassette interactions by kind (tool, llm) and result.",
+    ["kind", "result"])
+
+
+class CassetteMissError(Exception):
+    """Raised in strict replay mode when a request has no recorded response."""
+
+
+def _digest(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:24]
+
+
+def tool_request_key(tool_name: str, arguments: Dict[str, Any]) -> str:
+    return _digest({"tool": tool_name, "args": arguments})
+
+
+def llm_request_key(messages: List[BaseMessage], tool_names: List[str]) -> str:
+    """Key of a chat request; run-specific fields (message ids, usage, provider metadata) are ignored."""
+    normalized = []
+    for message in messages_to_dict(messages):
+        data = {k: v for k, v in message["data"].items()
+                if k not in ("id", "response_metadata", "usage_metadata", "additional_kwargs")}
+        normalized.append({"type": message["type"], "data": data})
+    return _digest({"messages": normalized, "tools": sorted(tool_names)})
+
+
+class Cassette:
+    """
+    Records MCP tool calls and LLM exchanges to a gzip'd JSON-lines file, or replays them.
+
+    Each interaction is appended as its own gzip member, so a recording survives a crash. In replay
+    mode, requests are matched by a hash of the request (tool name + arguments, or the normalized
+    chat messages); identical requests are served in recorded order. A request that was not
+    recorded falls back to the next unplayed interaction of the same tool (or the next LLM
+    response), unless `strict` is set, in which case CassetteMissError is raised.
+    """
+
+    def __init__(self, path: str, mode: str, strict: bool = False):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unsupported cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.strict = strict
+        self._lock = threading.Lock()
+        self.tool_manifest: List[Dict[str, Any]] = []
+        self._tool_entries: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._tool_entries_by_name: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._llm_entries: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._llm_sequence: List[Dict[str, Any]] = []
+
+        if mode == "record":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with gzip.open(path, "wt", encoding="utf-8") as f:
+                f.write(json.dumps({"type": "header", "version": CASSETTE_VERSION, "created_at": time.time()}) + "\n")
+            logger.info(f"Recording MCP tool calls and LLM exchanges to cassette {path}")
+        else:
+            self._load()
+            logger.info(f"Replaying cassette {path}: {sum(map(len, self._tool_entries.values()))} tool calls, "
+                        f"{len(self._llm_sequence)} LLM responses, {len(self.tool_manifest)} tools")
+
+    # --- Storage ---
+
+    def _append(self, record: Dict[str, Any]):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+
+    def _load(self):
+        for record in read_cassette(self.path):
+            kind = record.get("type")
+            if kind == "tool_manifest":
+                self.tool_manifest = record["tools"]
+            elif kind == "tool":
+                self._tool_entries[record["key"]].append(record)
+                self._tool_entries_by_name[record["name"]].append(record)
+            elif kind == "llm":
+                self._llm_entries[record["key"]].append(record)
+                self._llm_sequence.append(record)
+
+    # --- Tools ---
+
+    def record_tool_manifest(self, tools: List[BaseTool]):
+        from src.mcp_client import _tool_to_manifest_entry  # Imported here: src.mcp_client depends on this module
+        self.tool_manifest = [_tool_to_manifest_entry(tool) for tool in tools]
+        self._append({"type": "tool_manifest", "tools": self.tool_manifest})
+
+    async def tool_call(self, tool_name: str, arguments: Dict[str, Any], call: Callable[[], Awaitable[Any]]) -> Any:
+        key = tool_request_key(tool_name, arguments)
+        if self.mode == "record":
+            output = await call()
+            self._append({"type": "tool", "key": key, "name": tool_name, "args": arguments, "output": output})
+            CASSETTE_EVENTS.inc(kind="tool", result="recorded")
+            return output
+
+        entry = self._take(self._tool_entries[key])
+        if entry is None:
+            CASSETTE_EVENTS.inc(kind="tool", result="miss")
+            if self.strict:
+                raise CassetteMissError(f"No recorded response for tool '{tool_name}' with args {arguments}")
+            entry = next((e for e in self._tool_entries_by_name[tool_name] if not e.get("_played")), None)
+            if entry is None:
+                logger.warning(f"Cassette has no response for tool '{tool_name}'; returning an error message.")
+                return f"Error: no recorded response for tool '{tool_name}' in cassette {self.path}."
+            logger.warning(f"Cassette miss for tool '{tool_name}' {arguments}; serving the next recorded call.")
+            entry["_played"] = True
+        else:
+            CASSETTE_EVENTS.inc(kind="tool", result="replayed")
+        return entry["output"]
+
+    # --- LLM ---
+
+    async def llm_call(self, messages: List[BaseMessage], tool_names: List[str],
+                       call: Optional[Callable[[], Awaitable[AIMessage]]]) -> AIMessage:
+        if self.mode == "record":
+            return self._record_llm(messages, tool_names, await call())
+        return self._replay_llm(messages, tool_names)
+
+    def llm_call_sync(self, messages: List[BaseMessage], tool_names: List[str],
+                      call: Optional[Callable[[], AIMessage]]) -> AIMessage:
+        """llm_call for synchronous model calls."""
+        if self.mode == "record":
+            return self._record_llm(messages, tool_names, call())
+        return self._replay_llm(messages, tool_names)
+
+    def _record_llm(self, messages: List[BaseMessage], tool_names: List[str], response: AIMessage) -> AIMessage:
+        self._append({"type": "llm", "key": llm_request_key(messages, tool_names), "request_messages": len(messages),
+                      "response": message_to_dict(response)})
+        CASSETTE_EVENTS.inc(kind="llm", result="recorded")
+        return response
+
+    def _replay_llm(self, messages: List[BaseMessage], tool_names: List[str]) -> AIMessage:
+        key = llm_request_key(messages, tool_names)
+        entry = self._take(self._llm_entries[key])
+        if entry is None:
+            CASSETTE_EVENTS.inc(kind="llm", result="miss")
+            if self.strict:
+                raise CassetteMissError(f"No recorded LLM response for a request of {len(messages)} messages")
+            entry = next((e for e in self._llm_sequence if not e.get("_played")), None)
+            if entry is None:
+                raise CassetteMissError(f"Cassette {self.path} has no LLM responses left to replay")
+            logger.warning("Cassette miss for an LLM request; serving the next recorded response.")
+            entry["_played"] = True
+        else:
+            CASSETTE_EVENTS.inc(kind="llm", result="replayed")
+        return messages_from_dict([entry["response"]])[0]
+
+    @staticmethod
+    def _take(entries: Deque[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        while entries:
+            entry = entries.popleft()
+            if not entry.get("_played"):
+                entry["_played"] = True
+                return entry
+        return None
+
+
+def read_cassette(path: str) -> List[Dict[str, Any]]:
+    """Reads all records of a cassette file."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class CassetteChatModel(BaseChatModel):
+    """Chat model that records the wrapped model's responses, or replays them without the model."""
+    cassette: Any
+    inner: Any = None  # The real model (or its tool-bound runnable); None in replay mode
+    tool_names: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        tool_names = [convert_to_openai_tool(tool)["function"]["name"] for tool in tools]
+        inner = self.inner.bind_tools(tools, **kwargs) if self.inner is not None else None
+        return self.model_copy(update={"inner": inner, "tool_names": tool_names})
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        async def call_inner() -> AIMessage:
+            # Callbacks are reported once, by this model; the inner call must not report them again
+            return await self.inner.ainvoke(messages, config={"callbacks": []}, stop=stop, **kwargs)
+
+        message = await self.cassette.llm_call(messages, self.tool_names,
+                                               call_inner if self.inner is not None else None)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        def call_inner() -> AIMessage:
+            return self.inner.invoke(messages, config={"callbacks": []}, stop=stop, **kwargs)
+
+        message = self.cassette.llm_call_sync(messages, self.tool_names,
+                                              call_inner if self.inner is not None else None)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def wrap_tools_for_cassette(tools: List[BaseTool], cassette: Cassette) -> List[BaseTool]:
+    """Routes each tool call through the cassette; records the tool manifest when recording."""
+    if cassette.mode == "record":
+        cassette.record_tool_manifest(tools)
+
+    def wrap(tool: BaseTool) -> BaseTool:
+        async def call_through_cassette(**arguments: Any) -> Any:
+            return await cassette.tool_call(tool.name, arguments, lambda: tool.ainvoke(arguments))
+
+        args_schema = tool.args_schema
+        if args_schema is not None and not isinstance(args_schema, dict):
+            args_schema = args_schema.model_json_schema()
+        return StructuredTool(name=tool.name, description=tool.description,
+                              args_schema=args_schema or {"type": "object", "properties": {}},
+                              coroutine=call_through_cassette)
+
+    return [wrap(tool) for tool in tools]
+
+
+def replay_tools(cassette: Cassette) -> List[BaseTool]:
+    """Builds tools from the recorded manifest that are served entirely from the cassette."""
+    def make_tool(entry: Dict[str, Any]) -> BaseTool:
+        tool_name = entry["name"]
+
+        async def replay_call(**arguments: Any) -> Any:
+            return await cassette.tool_call(tool_name, arguments, None)
+
+        return StructuredTool(name=tool_name, description=entry.get("description") or "",
+                              args_schema=entry.get("args_schema") or {"type": "object", "properties": {}},
+                              coroutine=replay_call)
+
+    return [make_tool(entry) for entry in cassette.tool_manifest]
+
+
+_cassette: Optional[Cassette] = None
+
+
+def get_cassette() -> Optional[Cassette]:
+    """
+    Returns the process-wide cassette configured by CASSETTE_MODE ("record" or "replay"; unset
+    disables it), CASSETTE_PATH (default <cache dir>/cassettes/cassette.jsonl.gz) and
+    CASSETTE_STRICT (replay misses raise instead of falling back).
+    """
+    global _cassette
+    mode = os.getenv("CASSETTE_MODE", "").strip().lower()
+    if not mode or mode == "off":
+        return None
+    if _cassette is None:
+        path = os.getenv("CASSETTE_PATH") or str(get_cache_dir("cassettes") / "cassette.jsonl.gz")
+        strict = os.getenv("CASSETTE_STRICT", "false").lower() in ("1", "true", "yes")
+        _cassette = Cassette(path, mode, strict=strict)
+    return _cassette
+
+
+def summarize_cassette(path: str) -> Dict[str, Any]:
+    """Counts calls per tool, LLM calls and recorded token usage of a cassette."""
+    tool_calls: CallCounter = CallCounter()
+    llm_calls = input_tokens = output_tokens = 0
+    for record in read_cassette(path):
+        if record.get("type") == "tool":
+            tool_calls[record["name"]] += 1
+        elif record.get("type") == "llm":
+            llm_calls += 1
+            usage = record["response"]["data"].get("usage_metadata") or {}
+            input_tokens += usage.get("input_tokens", 0)
+            output_tokens += usage.get("output_tokens", 0)
+    return {"tool_calls": dict(tool_calls), "llm_calls": llm_calls,
+            "input_tokens": input_tokens, "output_tokens": output_tokens}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Summarize one or more cassette files.")
+    parser.add_argument("paths", nargs="+")
+    for cassette_path in parser.parse_args().paths:
+        summary = summarize_cassette(cassette_path)
+        print(f"{cassette_path}: {sum(summary['tool_calls'].values())} tool calls, {summary['llm_calls']} LLM calls, "
+              f"{summary['input_tokens']} input / {summary['output_tokens']} output tokens")
+        for name, count in sorted(summary["tool_calls"].items(), key=lambda kv: -kv[1]):
+            print(f"    {name:<32} {count}")
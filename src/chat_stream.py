@@ -0,0 +1,102 @@
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+
+from .metrics import REGISTRY
+
+TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    "repo_assistant_webui_time_to_first_token_seconds",
+    "Delay between a web UI question and the first streamed answer token.")
+
+
+def _text_of(content: Any) -> str:
+    """Text of a message content (a string, or a list of content blocks for some providers)."""
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content or [])
+
+
+def _truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}\n… ({len(text) - limit} more characters)"
+
+
+def cap_history(history: List[Dict[str, Any]], max_messages: int) -> List[Dict[str, Any]]:
+    """Keeps the last `max_messages` rendered chat messages (the agent's memory is not affected)."""
+    return history[-max_messages:] if max_messages and len(history) > max_messages else history
+
+
+class ChatTurnRenderer:
+    """
+    Renders one agent turn, streamed with stream_mode="messages", into Gradio "messages" chat history
+    entries, in place: answer tokens are appended to the current assistant message as they arrive, and
+    each tool call becomes a collapsible entry (metadata title) with truncated arguments and output.
+    """
+
+    def __init__(self, history: List[Dict[str, Any]], started_at: Optional[float] = None,
+                 preview_chars: int = 800):
+        self.history = history
+        self.started_at = started_at or time.time()
+        self.preview_chars = preview_chars
+        self.first_token_at: Optional[float] = None
+        self._answer: Optional[Dict[str, Any]] = None  # Assistant message receiving tokens
+        self._ai_message: Optional[BaseMessage] = None  # Accumulated chunks of the current model message
+        self._tool_entries: Dict[str, Dict[str, Any]] = {}  # tool_call_id -> history entry
+
+    def _accumulate(self, message: BaseMessage) -> BaseMessage:
+        if isinstance(message, AIMessageChunk) and isinstance(self._ai_message, AIMessageChunk) \
+                and self._ai_message.id == message.id:
+            self._ai_message = self._ai_message + message
+        else:
+            self._ai_message = message
+            self._answer = None  # A new model message starts a new answer bubble
+        return self._ai_message
+
+    def on_message(self, message: BaseMessage) -> bool:
+        """Renders one streamed message (chunk). Returns True if the history changed."""
+        changed = False
+        if isinstance(message, (AIMessage, AIMessageChunk)):
+            accumulated = self._accumulate(message)
+            text = _text_of(message.content)
+            if text:
+                if self.first_token_at is None:
+                    self.first_token_at = time.time()
+                    TIME_TO_FIRST_TOKEN.observe(self.first_token_at - self.started_at)
+                if self._answer is None:
+                    self._answer = {"role": "assistant", "content": ""}
+                    self.history.append(self._answer)
+                self._answer["content"] += text
+                changed = True
+            for tool_call in accumulated.tool_calls:
+                if not tool_call.get("id") or not tool_call.get("name"):
+                    continue
+                entry = self._tool_entries.get(tool_call["id"])
+                if entry is None:
+                    entry = {"role": "assistant", "content": "",
+                             "metadata": {"title": "", "id": tool_call["id"], "status": "pending"}}
+                    self._tool_entries[tool_call["id"]] = entry
+                    self.history.append(entry)
+                    self._answer = None  # Text after a tool call goes below it
+                args = json.dumps(tool_call.get("args") or {}, ensure_ascii=False)
+                title = f"🔧 {tool_call['name']}({args if len(args) <= 120 else args[:120] + '…'})"
+                if entry["metadata"]["title"] != title:
+                    entry["metadata"]["title"] = title
+                    changed = True
+        elif isinstance(message, ToolMessage):
+            entry = self._tool_entries.get(message.tool_call_id)
+            if entry is None:
+                entry = {"role": "assistant", "content": "",
+                         "metadata": {"title": f"🔧 {message.name or 'tool'}", "id": message.tool_call_id}}
+                self._tool_entries[message.tool_call_id] = entry
+                self.history.append(entry)
+            output = _truncate(_text_of(message.content), self.preview_chars).replace("```", "`\u200b``")
+            entry["content"] = f"```\n{output}\n```"
+            entry["metadata"]["status"] = "done"
+            if getattr(message, "status", None) == "error":
+                entry["metadata"]["title"] = "❌ " + entry["metadata"]["title"].removeprefix("🔧 ")
+            self._answer = None
+            changed = True
+        return changed
@@ -0,0 +1,291 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP, BaseCheckpointSaver, ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple,
+    get_checkpoint_id, get_checkpoint_metadata
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.types import TASKS
+
+from src.utils import logger, get_cache_dir
+from src.compaction import is_summary_message
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_threads_updated_at ON threads (updated_at);
+"""
+
+
+def compact_messages(messages: List[BaseMessage], max_messages: int, tool_output_chars: int) -> List[BaseMessage]:
+    """
+    Bounds a conversation before it is stored: tool outputs of earlier turns (before the latest user
+    message) are cut to `tool_output_chars`, and the oldest turns are dropped, at a user message so
+    tool calls stay paired with their results, until at most `max_messages` remain (the latest turn
+    is always kept whole). A leading summary of older turns (see ConversationCompactor) is always
+    kept and is not a user turn.
+    """
+    summary = messages[:1] if messages and is_summary_message(messages[0]) else []
+    messages = messages[len(summary):]
+    last_human = max((i for i, message in enumerate(messages) if isinstance(message, HumanMessage)), default=0)
+    compacted = []
+    for i, message in enumerate(messages):
+        if i < last_human and isinstance(message, ToolMessage) and isinstance(message.content, str) \
+                and len(message.content) > tool_output_chars:
+            dropped = len(message.content) - tool_output_chars
+            message = message.model_copy(update={
+                "content": f"{message.content[:tool_output_chars]}\n[... {dropped} characters compacted]"})
+        compacted.append(message)
+
+    budget = max(max_messages - len(summary), 1)
+    if max_messages and len(compacted) > budget:
+        start = next((i for i, message in enumerate(compacted)
+                      if isinstance(message, HumanMessage) and len(compacted) - i <= budget), last_human)
+        compacted = compacted[start:]
+    return summary + compacted
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    LangGraph checkpointer persisted to a local SQLite file, with bounded storage for long-running servers:
+
+    - only the latest `max_checkpoints` checkpoints of each thread are kept (no full history);
+    - the "messages" channel is compacted with `compact_messages` before it is stored;
+    - threads idle for `idle_seconds` are deleted (checked at most once a minute, on writes).
+
+    Nothing is cached in memory; calls are synchronous (a lock serializes them) and the async
+    methods run them in a worker thread.
+    """
+
+    get_next_version = InMemorySaver.get_next_version
+
+    def __init__(self, path: str, max_checkpoints: int = 3, max_messages: int = 80, tool_output_chars: int = 2000,
+                 idle_seconds: float = 7 * 24 * 3600, serde=None):
+        super().__init__(serde=serde)
+        self.path = path
+        self.max_checkpoints = max(2, max_checkpoints)  # The parent's writes hold the latest checkpoint's sends
+        self.max_messages = max_messages
+        self.tool_output_chars = tool_output_chars
+        self.idle_seconds = idle_seconds
+        self._next_eviction = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    # --- Reads ---
+
+    def _to_tuple(self, row: sqlite3.Row) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id = row["thread_id"], row["checkpoint_ns"], row["checkpoint_id"]
+        parent_id = row["parent_checkpoint_id"]
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ? AND checkpoint_ns = ? "
+            "AND checkpoint_id = ? ORDER BY task_id, idx", (thread_id, checkpoint_ns, checkpoint_id)).fetchall()
+        sends = []
+        if parent_id:
+            sends = self._conn.execute(
+                "SELECT type, value FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+                "AND channel = ? ORDER BY task_path, task_id, idx", (thread_id, checkpoint_ns, parent_id, TASKS)
+            ).fetchall()
+        checkpoint = self.serde.loads_typed((row["type"], row["checkpoint"]))
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                     "checkpoint_id": checkpoint_id}},
+            checkpoint={**checkpoint, "pending_sends": [self.serde.loads_typed((s["type"], s["value"])) for s in sends]},
+            metadata=self.serde.loads_typed((row["metadata_type"], row["metadata"])),
+            parent_config=({"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                             "checkpoint_id": parent_id}} if parent_id else None),
+            pending_writes=[(w["task_id"], w["channel"], self.serde.loads_typed((w["type"], w["value"])))
+                            for w in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            if checkpoint_id:
+                row = self._conn.execute(
+                    "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id)).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1", (thread_id, checkpoint_ns)).fetchone()
+            return self._to_tuple(row) if row else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query, params = "SELECT * FROM checkpoints WHERE 1 = 1", []
+        if config:
+            query += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(config["configurable"]["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            query += " AND checkpoint_id < ?"
+            params.append(get_checkpoint_id(before))
+        query += " ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            results = []
+            for row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                checkpoint_tuple = self._to_tuple(row)
+                if filter and not all(checkpoint_tuple.metadata.get(key) == value for key, value in filter.items()):
+                    continue
+                results.append(checkpoint_tuple)
+        yield from results
+
+    # --- Writes ---
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        stored = {k: v for k, v in checkpoint.items() if k != "pending_sends"}
+        messages = stored.get("channel_values", {}).get("messages")
+        if isinstance(messages, list) and messages and isinstance(messages[0], BaseMessage):
+            stored["channel_values"] = {**stored["channel_values"], "messages": compact_messages(
+                messages, self.max_messages, self.tool_output_chars)}
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(stored)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                     checkpoint_type, checkpoint_blob, metadata_type, metadata_blob))
+                stale_ids = [row[0] for row in self._conn.execute(
+                    "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?", (thread_id, checkpoint_ns, self.max_checkpoints))]
+                for table in ("checkpoints", "writes"):
+                    self._conn.executemany(
+                        f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                        [(thread_id, checkpoint_ns, stale_id) for stale_id in stale_ids])
+                self._conn.execute("INSERT OR REPLACE INTO threads VALUES (?, ?)", (thread_id, now))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if self.idle_seconds and now >= self._next_eviction:
+            self._next_eviction = now + 60
+            self.evict_idle_threads()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, value_blob = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel,
+                         value_type, value_blob, task_path))
+        # Special writes (errors, interrupts, ...) have negative indexes and are replaced; regular ones are
+        # written once per task
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   [row for row in rows if row[4] < 0])
+            self._conn.executemany("INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   [row for row in rows if row[4] >= 0])
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Deletes all checkpoints and writes of a thread."""
+        with self._lock:
+            for table in ("checkpoints", "writes", "threads"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    def evict_idle_threads(self) -> int:
+        """Deletes the threads not updated for `idle_seconds`. Returns how many were deleted."""
+        cutoff = time.time() - self.idle_seconds
+        with self._lock:
+            thread_ids = [row[0] for row in self._conn.execute(
+                "SELECT thread_id FROM threads WHERE updated_at < ?", (cutoff,))]
+        for thread_id in thread_ids:
+            self.delete_thread(thread_id)
+        if thread_ids:
+            logger.info(f"[Checkpoints] Evicted {len(thread_ids)} conversation threads idle for over "
+                        f"{self.idle_seconds:.0f}s.")
+        return len(thread_ids)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Async API (runs the SQLite calls off the event loop) ---
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        for checkpoint_tuple in await asyncio.to_thread(
+                lambda: list(self.list(config, filter=filter, before=before, limit=limit))):
+            yield checkpoint_tuple
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def open_webui_checkpointer() -> SQLiteCheckpointSaver:
+    """Opens the web UI's conversation store (WEBUI_CHECKPOINT_DB, defaulting to the local cache dir)."""
+    path = os.getenv("WEBUI_CHECKPOINT_DB") or str(get_cache_dir() / "webui_checkpoints.sqlite3")
+    logger.info(f"Opening conversation checkpoints at {path}")
+    return SQLiteCheckpointSaver(
+        path,
+        max_messages=int(os.getenv("WEBUI_THREAD_MAX_MESSAGES", 80)),
+        tool_output_chars=int(os.getenv("WEBUI_TOOL_OUTPUT_KEEP_CHARS", 2000)),
+        idle_seconds=float(os.getenv("WEBUI_THREAD_IDLE_SECONDS", 7 * 24 * 3600)),
+    )
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.tools import BaseTool
+
+from .utils import logger
+from .metrics import REGISTRY
+
+COMMENT_THREAD_LOOKUPS = REGISTRY.counter(
+    "repo_assistant_comment_thread_lookups_total",
+    "Comment thread reads served by the thread cache, by result (hit, incremental, full).", ["result"])
+COMMENT_THREAD_COMMENTS_FETCHED = REGISTRY.counter(
+    "repo_assistant_comment_thread_comments_fetched_total",
+    "Comments downloaded to fill or refresh cached comment threads.")
+
+ThreadKey = Tuple[str, str, int]
+Fetch = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+def parse_comments(result: Any) -> Optional[List[Dict[str, Any]]]:
+    """The comment list of a get_issue_comments result (list, {"content": list} or JSON string), or None."""
+    if isinstance(result, str):
+        try:
+            result = json.loads(result)
+        except json.JSONDecodeError:
+            return None
+    if isinstance(result, dict) and isinstance(result.get("content"), list):
+        result = result["content"]
+    return result if isinstance(result, list) else None
+
+
+@dataclass
+class CommentThread:
+    comments: List[Dict[str, Any]] = field(default_factory=list)
+    fetched_at: float = 0.0
+    # The item's updated_at (as listed) when the thread was synced; None once known to be stale
+    synced_updated_at: Optional[str] = None
+
+
+class CommentThreadCache:
+    """
+    Comment threads of issues and PRs kept in memory and refreshed incrementally: only comments
+    newer than the cached ones are downloaded (with the tool's `since` argument if it has one,
+    otherwise from the last, partially filled page on). The eligibility check (full thread) and the
+    agent's get_issue_comments calls (the page they ask for) are both served from here.
+
+    A thread is served without any call while the item's updated_at from the latest listing (see
+    observe_listing) matches the one it was synced at, or for `fresh_seconds` after a refresh when
+    the listing is unknown. At most `max_threads` threads and `max_comments` comments are kept
+    (least recently used threads are evicted first).
+    """
+
+    def __init__(self, max_threads: int = 500, max_comments: int = 20000, fresh_seconds: float = 120.0,
+                 per_page: int = 100, max_pages: int = 50):
+        self.max_threads = max_threads
+        self.max_comments = max_comments
+        self.fresh_seconds = fresh_seconds
+        self.per_page = per_page
+        self.max_pages = max_pages
+        self._threads: "OrderedDict[ThreadKey, CommentThread]" = OrderedDict()
+        self._listed: "OrderedDict[ThreadKey, str]" = OrderedDict()  # Latest listed updated_at per item
+        self._inflight: Dict[ThreadKey, asyncio.Task] = {}
+        self._comment_count = 0
+
+    def __len__(self) -> int:
+        return len(self._threads)
+
+    def observe_listing(self, owner: str, repo: str, items: List[Dict[str, Any]]):
+        """Records the updated_at of listed issues/PRs, used to tell whether a cached thread is still current."""
+        for item in items:
+            if item.get("number") and item.get("updated_at"):
+                key = (owner, repo, int(item["number"]))
+                self._listed[key] = item["updated_at"]
+                self._listed.move_to_end(key)
+        while len(self._listed) > self.max_threads * 4:
+            self._listed.popitem(last=False)
+
+    def mark_stale(self, owner: str, repo: str, number: Optional[Any] = None):
+        """Makes the next read of the thread (or of all the repository's threads) refresh it."""
+        for key, thread in self._threads.items():
+            if key[:2] == (owner, repo) and (number is None or key[2] == int(number)):
+                thread.synced_updated_at = None
+                thread.fetched_at = 0.0
+
+    def _is_current(self, key: ThreadKey, thread: CommentThread) -> bool:
+        listed = self._listed.get(key)
+        if listed is not None and thread.synced_updated_at is not None:
+            return listed == thread.synced_updated_at
+        return time.monotonic() - thread.fetched_at < self.fresh_seconds
+
+    def _store(self, key: ThreadKey, comments: List[Dict[str, Any]], synced_updated_at: Optional[str]):
+        previous = self._threads.pop(key, None)
+        self._comment_count -= len(previous.comments) if previous else 0
+        self._threads[key] = CommentThread(comments, time.monotonic(), synced_updated_at)
+        self._comment_count += len(comments)
+        while len(self._threads) > 1 and (len(self._threads) > self.max_threads
+                                          or self._comment_count > self.max_comments):
+            _, evicted = self._threads.popitem(last=False)
+            self._comment_count -= len(evicted.comments)
+
+    async def get(self, tool: BaseTool, owner: str, repo: str, number: Any,
+                  fetch: Optional[Fetch] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Returns the full comment thread of an item, refreshing it first if it may have changed.
+
+        Args:
+            tool: The get_issue_comments tool.
+            fetch: Calls the tool with the given args (defaults to tool.ainvoke), e.g. in a lower-priority lane.
+
+        Returns:
+            The comments (oldest first), or None if the tool's result could not be parsed.
+        """
+        key = (owner, repo, int(number))
+        thread = self._threads.get(key)
+        if thread is not None and self._is_current(key, thread):
+            self._threads.move_to_end(key)
+            COMMENT_THREAD_LOOKUPS.inc(result="hit")
+            return thread.comments
+        task = self._inflight.get(key)
+        if task is not None:
+            return await asyncio.shield(task)  # Share the refresh in flight
+        task = asyncio.ensure_future(self._refresh(tool, key, thread, fetch or tool.ainvoke))
+        self._inflight[key] = task
+        try:
+            return await task
+        finally:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    async def _fetch_pages(self, key: ThreadKey, fetch: Fetch, first_page: int,
+                           per_page_arg: str) -> Optional[List[Dict[str, Any]]]:
+        comments: List[Dict[str, Any]] = []
+        for page in range(first_page, first_page + self.max_pages):
+            batch = parse_comments(await fetch({"owner": key[0], "repo": key[1], "issue_number": key[2],
+                                                "page": page, per_page_arg: self.per_page}))
+            if batch is None:
+                return None
+            comments.extend(batch)
+            if len(batch) < self.per_page:
+                break
+        return comments
+
+    async def _refresh(self, tool: BaseTool, key: ThreadKey, thread: Optional[CommentThread],
+                       fetch: Fetch) -> Optional[List[Dict[str, Any]]]:
+        listed = self._listed.get(key)  # The state the thread will be synced at
+        args = tool.args or {}
+        per_page_arg = next((name for name in ("per_page", "perPage") if name in args), None)
+        params = {"owner": key[0], "repo": key[1], "issue_number": key[2]}
+
+        if thread is not None and thread.comments and "since" in args:
+            since = max(c.get("updated_at") or c.get("created_at") or "" for c in thread.comments)
+            fetched = parse_comments(await fetch({**params, "since": since}))
+            if fetched is not None:
+                by_id = {comment.get("id"): comment for comment in thread.comments}
+                by_id.update({comment.get("id"): comment for comment in fetched})  # Edited or new
+                comments = sorted(by_id.values(), key=lambda c: c.get("created_at") or "")
+                COMMENT_THREAD_LOOKUPS.inc(result="incremental")
+                COMMENT_THREAD_COMMENTS_FETCHED.inc(len(fetched))
+                self._store(key, comments, listed)
+                return comments
+
+        if thread is not None and thread.comments and "page" in args and per_page_arg:
+            # Re-read from the last (partially filled) page: earlier pages are unchanged unless comments were deleted
+            first_page = len(thread.comments) // self.per_page + 1
+            fetched = await self._fetch_pages(key, fetch, first_page, per_page_arg)
+            first_known = thread.comments[(first_page - 1) * self.per_page:][:1]
+            # If that page no longer starts with the same comment, earlier ones were deleted: read it all again
+            if fetched is not None and (not first_known
+                                        or fetched[:1] and fetched[0].get("id") == first_known[0].get("id")):
+                comments = thread.comments[:(first_page - 1) * self.per_page] + fetched
+                COMMENT_THREAD_LOOKUPS.inc(result="incremental")
+                COMMENT_THREAD_COMMENTS_FETCHED.inc(len(fetched))
+                self._store(key, comments, listed)
+                return comments
+
+        COMMENT_THREAD_LOOKUPS.inc(result="full")
+        if "page" in args and per_page_arg:
+            comments = await self._fetch_pages(key, fetch, 1, per_page_arg)
+        else:
+            comments = parse_comments(await fetch(params))
+        if comments is None:
+            logger.warning(f"Could not parse the comments of {key[0]}/{key[1]}#{key[2]}; not caching them.")
+            return None
+        COMMENT_THREAD_COMMENTS_FETCHED.inc(len(comments))
+        self._store(key, comments, listed)
+        return comments
@@ -0,0 +1,126 @@
+import json
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, RemoveMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.constants import TAG_NOSTREAM
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+
+from .prompts import CONVERSATION_SUMMARY_PROMPT_TEMPLATE
+from .utils import logger
+from .metrics import REGISTRY
+
+CONVERSATION_COMPACTIONS = REGISTRY.counter(
+    "repo_assistant_conversation_compactions_total",
+    "Conversation compactions before an LLM call, by kind (tool output stubs or summary of older turns).", ["kind"])
+
+SUMMARY_MARKER = "conversation_summary"  # additional_kwargs flag of the message holding the summary
+
+
+def is_summary_message(message: BaseMessage) -> bool:
+    """Whether `message` is the summary of older turns kept at the start of a compacted conversation."""
+    return bool(message.additional_kwargs.get(SUMMARY_MARKER))
+
+
+def _user_turn_starts(messages: List[BaseMessage]) -> List[int]:
+    return [i for i, message in enumerate(messages) if isinstance(message, HumanMessage) and not is_summary_message(message)]
+
+
+def stub_tool_outputs(messages: List[BaseMessage], before: int, min_chars: int = 300) -> List[BaseMessage]:
+    """
+    Replaces the outputs of tool calls made before index `before` (i.e. in earlier turns) that are longer
+    than `min_chars` with a short stub naming the call, so the agent can re-fetch them if needed.
+    """
+    calls = {}
+    for message in messages[:before]:
+        if isinstance(message, AIMessage):
+            for tool_call in message.tool_calls:
+                calls[tool_call["id"]] = (tool_call["name"], tool_call.get("args") or {})
+    stubbed = []
+    for i, message in enumerate(messages):
+        if i < before and isinstance(message, ToolMessage) and len(str(message.content)) > min_chars \
+                and not message.additional_kwargs.get("stubbed"):
+            name, args = calls.get(message.tool_call_id, (message.name or "the tool", {}))
+            message = message.model_copy(update={
+                "content": f"[Output of {name}({json.dumps(args, ensure_ascii=False)}) omitted to keep the "
+                           f"conversation short ({len(str(message.content))} characters). Call {name} again "
+                           f"with the same arguments if you need it.]",
+                "additional_kwargs": {**message.additional_kwargs, "stubbed": True}})
+        stubbed.append(message)
+    return stubbed
+
+
+def _format_for_summary(messages: List[BaseMessage], max_chars_per_message: int = 1500) -> str:
+    lines = []
+    for message in messages:
+        text = str(message.content)[:max_chars_per_message]
+        if isinstance(message, HumanMessage):
+            lines.append(f"User: {text}")
+        elif isinstance(message, AIMessage):
+            if text:
+                lines.append(f"Assistant: {text}")
+            for tool_call in message.tool_calls:
+                lines.append(f"Assistant called {tool_call['name']}({json.dumps(tool_call.get('args') or {})})")
+        elif isinstance(message, ToolMessage):
+            lines.append(f"Tool {message.name or ''} returned: {text}")
+    return "\n".join(lines)
+
+
+class ConversationCompactor:
+    """
+    pre_model_hook for the FQA agent keeping each LLM call's context near `max_tokens`.
+
+    When the conversation is over `max_tokens` (approximate count), tool outputs of earlier turns are first
+    replaced by stubs; if that is not enough, the oldest turns, leaving about `keep_recent_tokens` of recent
+    turns (at least the current one), are summarized by the LLM into one message, which is updated again
+    at the next compaction. The compacted messages replace the thread's state, so later turns start small.
+    """
+
+    def __init__(self, llm: BaseChatModel, max_tokens: int = 24000, keep_recent_tokens: int = 8000,
+                 stub_min_chars: int = 300):
+        self.llm = llm
+        self.max_tokens = max_tokens
+        self.keep_recent_tokens = keep_recent_tokens
+        self.stub_min_chars = stub_min_chars
+
+    async def _summarize(self, messages: List[BaseMessage]) -> Optional[HumanMessage]:
+        previous = [m for m in messages if is_summary_message(m)]
+        prompt = CONVERSATION_SUMMARY_PROMPT_TEMPLATE.format(
+            previous_summary=f"Summary of the conversation before that:\n{previous[-1].content}\n\n" if previous else "",
+            conversation=_format_for_summary([m for m in messages if not is_summary_message(m)]))
+        try:
+            # Not streamed to the UI (messages stream mode), but still traced and counted by callbacks
+            response = await self.llm.ainvoke(prompt, config={"tags": [TAG_NOSTREAM, "compaction"]})
+        except Exception as e:
+            logger.warning(f"Conversation summary failed, keeping the older turns: {e}")
+            return None
+        return HumanMessage(content=f"Summary of the earlier conversation:\n{response.content}",
+                            additional_kwargs={SUMMARY_MARKER: True})
+
+    async def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        messages: List[BaseMessage] = state["messages"]
+        if not self.max_tokens or count_tokens_approximately(messages) <= self.max_tokens:
+            # No state change. (Not "llm_input_messages": that channel would keep a stale copy of the
+            # conversation in the state and in every checkpoint.)
+            return {"messages": []}
+
+        turn_starts = _user_turn_starts(messages)
+        current_turn = turn_starts[-1] if turn_starts else 0
+        compacted = stub_tool_outputs(messages, current_turn, self.stub_min_chars)
+        if any(old is not new for old, new in zip(messages, compacted)):
+            CONVERSATION_COMPACTIONS.inc(kind="stub")
+        tokens = count_tokens_approximately(compacted)
+
+        if tokens > self.max_tokens:
+            # Keep the most recent turns that fit in keep_recent_tokens (always the current one)
+            split = next((start for start in turn_starts
+                          if count_tokens_approximately(compacted[start:]) <= self.keep_recent_tokens), current_turn)
+            if split > 0:
+                summary = await self._summarize(compacted[:split])
+                if summary is not None:
+                    compacted = [summary, *compacted[split:]]
+                    CONVERSATION_COMPACTIONS.inc(kind="summary")
+        logger.info(f"Compacted conversation from ~{count_tokens_approximately(messages)} to "
+                    f"~{count_tokens_approximately(compacted)} tokens.")
+        return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES), *compacted]}
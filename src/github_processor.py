@@ -3,11 +3,23 @@ import json
 import os
 import base64
 import pdb
-from typing import List, Dict, Any, Optional
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Set, Tuple, Callable, Awaitable
 from langchain_core.tools import BaseTool
+from langchain_core.language_models import BaseChatModel
 from langchain_core.runnables import Runnable
 from src.prompts import ISSUE_PROCESSING_USER_PROMPT_TEMPLATE, PR_PROCESSING_USER_PROMPT_TEMPLATE
-from src.utils import logger, print_agent_step
+from langgraph.errors import GraphRecursionError
+from src.utils import logger
+from src.agent_events import AgentEventSink
+from src.metrics import AGENT_RUN_DURATION, AGENT_RUNS
+from src.state_store import get_state_store
+from src.usage import UsageTracker, BudgetExceededError, plan_run_budget, BUDGET_EVENTS, ECONOMY_METADATA_KEY
+from src.pr_analysis import analyze_pull_request
+from src.pr_review import ChunkedPRReviewer, needs_chunked_review
+from src.prompts import PR_CHUNKED_REVIEW_SECTION_TEMPLATE
+from src.triage import IssueTriage, triage_issues, triage_settings
 
 
 # --- Tool Finding Helper ---
@@ -42,6 +54,7 @@ async def fetch_all_github_items(tool: BaseTool, base_params: Dict[str, Any]) ->
         logger.error("Cannot fetch items: Tool not provided.")
         return []
     MAX_ITEMS_PER_PAGE = int(os.getenv("MAX_ITEMS_PER_PAGE", 30))
+    PAGE_DELAY_SECONDS = float(os.getenv("GITHUB_PAGE_DELAY_SECONDS", 0.5))
     while True:
         try:
             params_for_page = {
@@ -87,7 +100,7 @@ async def fetch_all_github_items(tool: BaseTool, base_params: Dict[str, Any]) ->
 
             page += 1
             # Optional: Add a small delay between page requests to be polite to the API
-            await asyncio.sleep(0.5)
+            await asyncio.sleep(PAGE_DELAY_SECONDS)
 
         except Exception as e:
             logger.error(f"Error fetching page {page} for {tool.name}: {e}", exc_info=True)
@@ -221,7 +234,8 @@ async def is_last_update_by_owner(
 
     try:
         logger.debug(f"Invoking {comments_tool.name} with params: {params}")
-        comments_result = await comments_tool.ainvoke(params)
+        read_full_thread = getattr(comments_tool, "read_full_thread", None)  # Served by the comment thread cache
+        comments_result = await (read_full_thread(params) if read_full_thread else comments_tool.ainvoke(params))
 
         # --- Parse comments_result (might be list or dict wrapping list) ---
         comments_list = []
@@ -261,6 +275,265 @@ async def is_last_update_by_owner(
         return False  # Error occurred, assume not owner to be safe
 
 
+# --- Agent Run Helper ---
+# Statuses of runs that ran away (hit their deadline or step limit); such items are deprioritized
+RUNAWAY_STATUSES = ("timeout", "step_limit")
+
+
+def get_run_limits(item_type: str) -> Tuple[float, int]:
+    """
+    Returns the wall-clock deadline (seconds) and recursion/step limit for one agent run, from
+    ISSUE_/PR_RUN_DEADLINE_SECONDS and ISSUE_/PR_RECURSION_LIMIT (0 disables a limit).
+    """
+    prefix = "ISSUE" if item_type == "issue" else "PR"
+    deadline = float(os.getenv(f"{prefix}_RUN_DEADLINE_SECONDS", 600) or 0)
+    recursion_limit = int(os.getenv(f"{prefix}_RECURSION_LIMIT", 25) or 0)
+    return deadline, recursion_limit
+
+
+def deprioritized_numbers(owner: str, repo: str, item_type: str) -> Set[int]:
+    """
+    Numbers of the items cooling down after runaway runs: after n consecutive timeouts or step-limit
+    stops an item is skipped for RUNAWAY_COOLDOWN_SECONDS * 2^(n-1) (0 disables this). Reads the run
+    history of the whole repository in one query; blocking, so call it in a thread once per cycle.
+    """
+    cooldown = float(os.getenv("RUNAWAY_COOLDOWN_SECONDS", 3600) or 0)
+    if cooldown <= 0:
+        return set()
+    try:
+        runs_by_item = get_state_store().recent_runs_by_item(f"{owner}/{repo}", item_type, limit=5)
+    except Exception as e:
+        logger.error(f"Failed to read the {item_type} run history of {owner}/{repo}: {e}", exc_info=True)
+        return set()
+    now = time.time()
+    cooling_down = set()
+    for item_number, runs in runs_by_item.items():
+        runaway_streak = 0
+        for run in runs:
+            if run["status"] not in RUNAWAY_STATUSES:
+                break
+            runaway_streak += 1
+        if runaway_streak and now - (runs[0]["finished_at"] or 0) < cooldown * 2 ** (runaway_streak - 1):
+            cooling_down.add(item_number)
+    return cooling_down
+
+
+def _record_run(repo_full_name: str, item_type: str, item_number: int, started_at: float, status: str,
+                tracker: Optional[UsageTracker] = None):
+    """Persists a run record; failures are logged and never interrupt processing."""
+    AGENT_RUNS.inc(item_type=item_type, status=status)
+    try:
+        get_state_store().record_run(
+            repo_full_name, item_type, item_number, started_at, time.time(), status,
+            model=tracker.model if tracker else None,
+            input_tokens=tracker.input_tokens if tracker else 0,
+            output_tokens=tracker.output_tokens if tracker else 0,
+            cached_tokens=tracker.cached_tokens if tracker else 0,
+            cost_usd=tracker.cost_usd if tracker else 0.0)
+    except Exception as e:
+        logger.error(f"Failed to record run for {item_type} #{item_number}: {e}", exc_info=True)
+
+
+async def run_agent_on_item(
+        agent_executor: Runnable,
+        agent_input: Dict[str, Any],
+        item_type: str,  # 'issue' or 'pr'
+        item_number: int,
+        owner: str,
+        repo: str,
+        prepare_input: Optional[Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]] = None
+) -> Optional[str]:
+    """
+    Runs the agent on one item under the configured LLM budgets and per-item deadline and step
+    limit (see get_run_limits), logging its token usage and cost and recording the run in the
+    state store. A run that exceeds its deadline is cancelled, including in-flight tool calls.
+
+    `prepare_input`, if given, is awaited first with the run's config (callbacks) and returns the
+    agent input, so preliminary LLM calls count towards the run's usage, budget and deadline.
+
+    Returns:
+        The agent's final message, or None if the run was skipped or stopped early.
+    """
+    label = f"{'Issue' if item_type == 'issue' else 'PR'} #{item_number}"
+    repo_full_name = f"{owner}/{repo}"
+    started_at = time.time()
+
+    budget = plan_run_budget(get_state_store().daily_cost())
+    if budget.mode == "exhausted":
+        logger.warning(f"Skipping {label}: {budget.reason}.")
+        BUDGET_EVENTS.inc(scope="day", action="skipped")
+        _record_run(repo_full_name, item_type, item_number, started_at, "skipped_budget")
+        return None
+    if budget.mode == "economy":
+        logger.warning(f"Running {label} in economy mode (recursion limit {budget.recursion_limit}): {budget.reason}.")
+        BUDGET_EVENTS.inc(scope="day", action="economy")
+
+    tracker = UsageTracker(budget_usd=budget.budget_usd, label=label)
+    # Tool starts/ends are logged by the event sink; nothing else needs to be streamed out of the run
+    config: Dict[str, Any] = {"callbacks": [tracker, AgentEventSink(item_type, item_number)]}
+    deadline, recursion_limit = get_run_limits(item_type)
+    if budget.recursion_limit:
+        recursion_limit = min(recursion_limit, budget.recursion_limit) if recursion_limit else budget.recursion_limit
+    if recursion_limit:
+        config["recursion_limit"] = recursion_limit
+    if budget.mode == "economy":
+        config["metadata"] = {ECONOMY_METADATA_KEY: True}  # Cascade routing keeps the steps on the small model
+
+    final_answer = None
+    status = "error"
+    run_timeout = asyncio.timeout(deadline or None)
+    try:
+        async with run_timeout:
+            if prepare_input is not None:
+                agent_input = await prepare_input({key: value for key, value in config.items()
+                                                   if key in ("callbacks", "metadata")})
+            result = await agent_executor.ainvoke(agent_input, config=config)
+        final_messages = result.get("messages", []) if isinstance(result, dict) else []
+        if final_messages and hasattr(final_messages[-1], 'content'):
+            final_answer = final_messages[-1].content
+        status = "completed"
+    except BudgetExceededError as e:
+        status = "budget_exceeded"
+        final_answer = None
+        BUDGET_EVENTS.inc(scope="item", action="stopped")
+        logger.warning(f"Stopped agent run for {label}: {e}")
+    except GraphRecursionError:
+        status = "step_limit"
+        final_answer = None
+        logger.warning(f"Stopped agent run for {label}: step limit ({recursion_limit}) reached.")
+    except TimeoutError:
+        if not run_timeout.expired():
+            raise  # Raised by a tool or client, not by our deadline
+        status = "timeout"
+        final_answer = None
+        logger.warning(f"Cancelled agent run for {label}: exceeded its {deadline:.0f}s deadline.")
+    finally:
+        logger.info(f"LLM usage for {label}: {tracker.summary()}")
+        _record_run(repo_full_name, item_type, item_number, started_at, status, tracker)
+    return final_answer
+
+
+# --- Batch Issue Triage ---
+TRIAGED_STATUS_PREFIX = "triaged_"  # Run record status of a triage decision: triaged_<category>
+
+
+def _updated_at(item_data: Dict[str, Any]) -> float:
+    try:
+        return datetime.fromisoformat(item_data["updated_at"].replace("Z", "+00:00")).timestamp()
+    except (KeyError, AttributeError, ValueError):
+        return float("inf")  # Unknown: consider it updated since any triage
+
+
+def previous_triages(owner: str, repo: str, issues: List[Dict[str, Any]]) -> Dict[int, Optional[str]]:
+    """
+    The triage category of each of `issues` (by number) if it was triaged after its last update, else None.
+    Reads the run history of the whole repository in one query; blocking, so call it in a thread.
+    """
+    try:
+        runs_by_issue = get_state_store().recent_runs_by_item(f"{owner}/{repo}", "issue", limit=5)
+    except Exception as e:
+        logger.error(f"Failed to read the issue run history of {owner}/{repo}: {e}", exc_info=True)
+        runs_by_issue = {}
+    decisions = {}
+    for issue_data in issues:
+        if not issue_data.get("number"):
+            continue
+        decisions[issue_data["number"]] = None
+        for run in runs_by_issue.get(issue_data["number"], []):
+            if run["status"].startswith(TRIAGED_STATUS_PREFIX):
+                if (run["finished_at"] or 0) >= _updated_at(issue_data):
+                    decisions[issue_data["number"]] = run["status"][len(TRIAGED_STATUS_PREFIX):]
+                break
+    return decisions
+
+
+async def _apply_triage(triage: IssueTriage, comment_tool: Optional[BaseTool], owner: str, repo: str) -> bool:
+    """Posts the triage reply of needs_info / duplicate_candidate issues. Returns False if posting failed."""
+    if triage.category not in ("needs_info", "duplicate_candidate"):
+        return True
+    if comment_tool is None:
+        return False
+    body = triage.reply.strip()
+    if triage.category == "duplicate_candidate" and f"#{triage.duplicate_of}" not in body:
+        body += f"\n\nThis looks like a possible duplicate of #{triage.duplicate_of}."
+    try:
+        await comment_tool.ainvoke({"owner": owner, "repo": repo, "issue_number": triage.number, "body": body})
+        return True
+    except Exception as e:
+        logger.error(f"Failed to post the triage reply on issue #{triage.number}: {e}", exc_info=True)
+        return False
+
+
+async def triage_issue_backlog(
+        eligible_issues: List[Dict[str, Any]],
+        open_issues: List[Dict[str, Any]],
+        llm: BaseChatModel,
+        tools: List[BaseTool],
+        owner: str,
+        repo: str,
+        previous: Optional[Dict[int, Optional[str]]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Batch triage of the eligible issues (most relevant first): when at least ISSUE_TRIAGE_MIN_BACKLOG
+    of them were not triaged since their last update, they are classified with one structured-output
+    LLM call per batch (see triage_issues). needs_info and duplicate_candidate issues get the triage's
+    reply as a comment (only with ISSUE_TRIAGE_COMMENT=true), spam is left alone, and decisions are
+    recorded in the state store so issues are not triaged again until updated.
+
+    Args:
+        previous: The issues' earlier triage decisions, if already loaded this cycle (see previous_triages).
+
+    Returns:
+        The first eligible issue that needs a full agent run (see process_issue), or None.
+    """
+    repo_full_name = f"{owner}/{repo}"
+    settings = triage_settings()
+    if previous is None:
+        previous = await asyncio.to_thread(previous_triages, owner, repo, eligible_issues)
+    decisions = {issue["number"]: previous.get(issue["number"]) for issue in eligible_issues}
+    untriaged = [issue for issue in eligible_issues if decisions[issue["number"]] is None]
+
+    if settings["batch_size"] > 0 and len(untriaged) >= max(1, settings["min_backlog"]):
+        budget = plan_run_budget(get_state_store().daily_cost())
+        tracker = UsageTracker(budget_usd=budget.budget_usd, label=f"triage of {len(untriaged)} issues")
+        started_at, status, results = time.time(), "error", {}
+        if budget.mode == "exhausted":
+            status = "skipped_budget"
+        else:
+            try:
+                results = await triage_issues(llm, untriaged, repo_full_name, open_issues,
+                                              config={"callbacks": [tracker]})
+                status = "completed"
+            except BudgetExceededError as e:
+                status = "budget_exceeded"
+                BUDGET_EVENTS.inc(scope="item", action="stopped")
+                logger.warning(f"Stopped batch triage for {repo_full_name}: {e}")
+            finally:
+                logger.info(f"LLM usage for batch triage of {len(untriaged)} issues: {tracker.summary()}")
+        _record_run(repo_full_name, "issue_triage", 0, started_at, status, tracker)
+
+        comment_tool = find_tool(tools, "add_issue_comment") \
+            if os.getenv("ISSUE_TRIAGE_COMMENT", "false").lower() in ("1", "true", "yes") else None
+        applied = await asyncio.gather(*(_apply_triage(triage, comment_tool, owner, repo) for triage in results.values()))
+        for triage, ok in zip(results.values(), applied):
+            logger.info(f"Triage of issue #{triage.number}: {triage.category} ({triage.reason})")
+            if not ok and comment_tool is not None:
+                continue  # Not recorded: triaged again next cycle
+            decisions[triage.number] = triage.category
+            try:
+                now = time.time()
+                get_state_store().record_run(repo_full_name, "issue", triage.number, now, now,
+                                             TRIAGED_STATUS_PREFIX + triage.category)
+            except Exception as e:
+                logger.error(f"Failed to record the triage of issue #{triage.number}: {e}", exc_info=True)
+
+    # Untriaged issues (small backlog or failed batch) still go to the agent
+    for issue in eligible_issues:
+        if decisions[issue["number"]] in (None, "valid_needs_agent"):
+            return issue
+    return None
+
+
 # --- Issue Processor ---
 async def process_issue(
         issue_data: Dict[str, Any],
@@ -297,30 +570,20 @@ async def process_issue(
     # Construct the input message list for the agent
     agent_input = {"messages": [("user", user_prompt_content)]}
 
+    run_started = time.perf_counter()
     try:
         logger.info(f"Invoking agent for Issue #{issue_number}...")
-        # final_answer = f"(Agent did not produce final answer for Issue #{issue_number})"  # Default/fallback
-
-        # Stream events to observe the agent's process (tool calls, thoughts)
-        # final_answer = await agent_executor.ainvoke(agent_input)
-        async for event in agent_executor.astream_events(agent_input):
-            print_agent_step(event)  # Log intermediate steps via utility function
-            # Capture the final answer from the main chain's end event
-            if event.get("event") == "on_chain_end":  # Adjust based on agent type if needed
-                output = event.get("data", {}).get("output", {})
-                if isinstance(output, dict) and "messages" in output:
-                    final_messages = output.get("messages", [])
-                    if final_messages and hasattr(final_messages[-1], 'content'):
-                        final_answer = final_messages[-1].content
+        final_answer = await run_agent_on_item(agent_executor, agent_input, "issue", issue_number, owner, repo)
 
         # Log the agent's final summary/confirmation message
         logger.info(f"Agent finished processing Issue #{issue_number}. Final confirmation: {final_answer}")
-        # NOTE: Actions (commenting, closing) are performed by the agent itself via tool calls during the stream.
+        # NOTE: Actions (commenting, closing) are performed by the agent itself via tool calls during the run.
 
     except Exception as e:
         logger.error(f"Unhandled error during agent invocation for Issue #{issue_number}: {e}", exc_info=True)
         # Depending on the error, you might want to retry or flag the issue.
     finally:
+        AGENT_RUN_DURATION.observe(time.perf_counter() - run_started, item_type="issue")
         logger.info(f"===== Finished processing Issue #{issue_number} =====")
 
 
@@ -329,11 +592,17 @@ async def process_pr(
         pr_data: Dict[str, Any],
         agent_executor: Runnable,
         owner: str,
-        repo: str
+        repo: str,
+        tools: Optional[List[BaseTool]] = None,
+        llm: Optional[BaseChatModel] = None
 ):
     """
     Processes a single PR by formatting the user prompt and invoking the
     ReAct agent to perform the complete analysis and required actions (commenting only).
+    When `tools` are given, the PR's diff is analyzed first (see analyze_pull_request) and the
+    summary is included in the prompt, so the agent starts with the PR's scope and hotspots.
+    When `llm` is also given, very large PRs (see needs_chunked_review) are first reviewed in
+    map-reduce mode (see ChunkedPRReviewer) and the agent writes its comment from those notes.
     """
     pr_number = pr_data.get("number")
     if not pr_number:
@@ -342,9 +611,18 @@ async def process_pr(
 
     logger.info(f"===== Processing PR #{pr_number} =====")
 
+    pr_analysis = "(Not available: use `get_pull_request_files` to see the changes.)"
+    analysis = None
+    files_tool = find_tool(tools, "get_pull_request_files") if tools else None
+    if files_tool and os.getenv("PR_ANALYSIS_ENABLED", "true").lower() not in ("0", "false", "no"):
+        analysis = await analyze_pull_request(files_tool, find_tool(tools, "get_pull_request"), owner, repo,
+                                              pr_number, pr_data)
+        if analysis is not None:
+            pr_analysis = analysis.to_prompt()
+
     # Prepare the user prompt with specific PR details
-    try:
-        user_prompt_content = PR_PROCESSING_USER_PROMPT_TEMPLATE.format(
+    def format_prompt(pr_analysis: str) -> str:
+        return PR_PROCESSING_USER_PROMPT_TEMPLATE.format(
             pr_number=pr_number,
             pr_title=pr_data.get("title", "(No Title)"),
             pr_url=pr_data.get("html_url", ""),
@@ -352,8 +630,12 @@ async def process_pr(
             pr_head_branch=pr_data.get("head", {}).get("ref", "unknown_branch"),
             pr_base_branch=pr_data.get("base", {}).get("ref", "unknown_branch"),
             pr_body=pr_data.get("body", "") if pr_data.get("body") else "(No Description)",
+            pr_analysis=pr_analysis,
             repo_name=repo
         )
+
+    try:
+        user_prompt_content = format_prompt(pr_analysis)
     except KeyError as e:
         logger.error(f"Failed to format PR prompt for #{pr_number} - missing key: {e}. Skipping.")
         return
@@ -361,21 +643,18 @@ async def process_pr(
     # Construct the input message list for the agent
     agent_input = {"messages": [("user", user_prompt_content)]}
 
+    prepare_input = None
+    if analysis is not None and llm is not None and needs_chunked_review(analysis):
+        async def prepare_input(config: Dict[str, Any]) -> Dict[str, Any]:
+            notes = await ChunkedPRReviewer.from_env(llm).review(pr_data, analysis, config)
+            return {"messages": [("user", format_prompt(
+                pr_analysis + PR_CHUNKED_REVIEW_SECTION_TEMPLATE.format(notes=notes)))]}
+
+    run_started = time.perf_counter()
     try:
         logger.info(f"Invoking agent for PR #{pr_number}...")
-        # final_answer = f"(Agent did not produce final answer for PR #{pr_number})"  # Default/fallback
-
-        # final_answer = await agent_executor.ainvoke(agent_input)
-        # Stream events to observe the agent's process
-        async for event in agent_executor.astream_events(agent_input):
-            print_agent_step(event)  # Log intermediate steps
-            # Capture the final answer
-            if event.get("event") == "on_chain_end":
-                output = event.get("data", {}).get("output", {})
-                if isinstance(output, dict) and "messages" in output:
-                    final_messages = output.get("messages", [])
-                    if final_messages and hasattr(final_messages[-1], 'content'):
-                        final_answer = final_messages[-1].content
+        final_answer = await run_agent_on_item(agent_executor, agent_input, "pr", pr_number, owner, repo,
+                                               prepare_input=prepare_input)
 
         # Log the agent's final summary/confirmation message
         logger.info(f"Agent finished processing PR #{pr_number}. Final confirmation: {final_answer}")
@@ -384,4 +663,5 @@ async def process_pr(
     except Exception as e:
         logger.error(f"Unhandled error during agent invocation for PR #{pr_number}: {e}", exc_info=True)
     finally:
+        AGENT_RUN_DURATION.observe(time.perf_counter() - run_started, item_type="pr")
         logger.info(f"===== Finished processing PR #{pr_number} =====")
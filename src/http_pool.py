@@ -0,0 +1,170 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from .utils import logger
+from .metrics import REGISTRY
+
+LLM_HTTP_CONNECTIONS = REGISTRY.gauge(
+    "repo_assistant_llm_http_connections",
+    "Open connections of the shared LLM HTTP pools, by endpoint and state (active, idle).", ["endpoint", "state"])
+LLM_HTTP_PENDING_REQUESTS = REGISTRY.gauge(
+    "repo_assistant_llm_http_pending_requests",
+    "LLM requests waiting for a free connection of the endpoint's shared pool.", ["endpoint"])
+LLM_HTTP_POOL_UTILIZATION = REGISTRY.gauge(
+    "repo_assistant_llm_http_pool_utilization",
+    "Active connections of the endpoint's shared LLM HTTP pool over its connection limit.", ["endpoint"])
+
+
+def endpoint_key(base_url: str) -> str:
+    """The pool key of a provider URL: scheme, host and port (e.g. https://api.openai.com:443)."""
+    parts = urlsplit(base_url if "://" in base_url else f"http://{base_url}")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    return f"{parts.scheme}://{(parts.hostname or '').lower()}:{port}"
+
+
+def _pool_stats(pool: Any) -> Dict[str, int]:
+    """Active/idle connections and waiting requests of an httpcore connection pool."""
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    pending = sum(1 for request in list(getattr(pool, "_requests", [])) if getattr(request, "connection", None) is None)
+    return {"active": len(connections) - idle, "idle": idle, "pending": pending}
+
+
+class _LoopBoundAsyncTransport(httpx.AsyncBaseTransport):
+    """
+    An async transport with one connection pool per event loop: asyncio connections cannot be
+    reused from another loop, and models built once are used from the loops of e.g. the web UI
+    and the processing loops.
+    """
+
+    def __init__(self, **transport_kwargs: Any):
+        self._transport_kwargs = transport_kwargs
+        self._transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = \
+            weakref.WeakKeyDictionary()
+
+    @property
+    def transports(self) -> List[httpx.AsyncHTTPTransport]:
+        return list(self._transports.values())
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        loop = asyncio.get_running_loop()
+        transport = self._transports.get(loop)
+        if transport is None:
+            transport = self._transports[loop] = httpx.AsyncHTTPTransport(**self._transport_kwargs)
+        return await transport.handle_async_request(request)
+
+    async def aclose(self):
+        transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+class EndpointPool:
+    """
+    The process-wide connection pools (one sync, one async) of one provider endpoint, shared by
+    every model talking to it. Clients built on them (see `clients`) only add the timeouts.
+    """
+
+    def __init__(self, endpoint: str, limits: httpx.Limits, timeout: httpx.Timeout, http2: bool = False):
+        self.endpoint = endpoint
+        self.limits = limits
+        self.timeout = timeout
+        self.sync_transport = httpx.HTTPTransport(limits=limits, http2=http2)
+        self.async_transport = _LoopBoundAsyncTransport(limits=limits, http2=http2)
+        self._clients: Optional[tuple] = None
+        for state in ("active", "idle"):
+            LLM_HTTP_CONNECTIONS.set_function(lambda state=state: self.stats()[state], endpoint=endpoint, state=state)
+        LLM_HTTP_PENDING_REQUESTS.set_function(lambda: self.stats()["pending"], endpoint=endpoint)
+        LLM_HTTP_POOL_UTILIZATION.set_function(
+            lambda: self.stats()["active"] / self.limits.max_connections if self.limits.max_connections else 0.0,
+            endpoint=endpoint)
+
+    def clients(self) -> tuple:
+        """A shared (httpx.Client, httpx.AsyncClient) pair on this endpoint's pools."""
+        if self._clients is None:
+            self._clients = (httpx.Client(transport=self.sync_transport, timeout=self.timeout, follow_redirects=True),
+                             httpx.AsyncClient(transport=self.async_transport, timeout=self.timeout,
+                                               follow_redirects=True))
+        return self._clients
+
+    def stats(self) -> Dict[str, int]:
+        """Active/idle connections and waiting requests over the sync and async pools."""
+        totals = {"active": 0, "idle": 0, "pending": 0}
+        for transport in [self.sync_transport, *self.async_transport.transports]:
+            for state, count in _pool_stats(transport._pool).items():
+                totals[state] += count
+        return totals
+
+
+_pools: Dict[str, EndpointPool] = {}
+_pools_lock = threading.Lock()  # get_llm_model runs in worker threads
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401 (optional dependency of httpx[http2])
+        return True
+    except ImportError:
+        return False
+
+
+def get_endpoint_pool(base_url: str) -> Optional[EndpointPool]:
+    """
+    Returns the shared pool of a provider endpoint, created on first use with LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS, LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS, LLM_HTTP_TIMEOUT_SECONDS,
+    LLM_HTTP_CONNECT_TIMEOUT_SECONDS and LLM_HTTP2 (needs the h2 package).
+
+    Returns:
+        The pool, or None if LLM_SHARED_HTTP_POOLS is false or `base_url` is empty (the provider's
+        own default client is used then).
+    """
+    if not base_url or os.getenv("LLM_SHARED_HTTP_POOLS", "true").lower() in ("0", "false", "no"):
+        return None
+    endpoint = endpoint_key(base_url)
+    with _pools_lock:
+        pool = _pools.get(endpoint)
+        if pool is None:
+            limits = httpx.Limits(max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", 100)),
+                                  max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)),
+                                  keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS", 60)))
+            timeout = httpx.Timeout(float(os.getenv("LLM_HTTP_TIMEOUT_SECONDS", 600)),
+                                    connect=float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT_SECONDS", 10)))
+            http2 = os.getenv("LLM_HTTP2", "false").lower() in ("1", "true", "yes")
+            if http2 and not _http2_available():
+                logger.warning("LLM_HTTP2 is set but the 'h2' package is not installed; using HTTP/1.1.")
+                http2 = False
+            pool = _pools[endpoint] = EndpointPool(endpoint, limits, timeout, http2)
+            logger.info(f"Shared LLM HTTP pool for {endpoint}: {limits.max_connections} connections, "
+                        f"{limits.max_keepalive_connections} kept alive for {limits.keepalive_expiry:.0f}s"
+                        f"{', HTTP/2' if http2 else ''}")
+        return pool
+
+
+def openai_http_clients(base_url: str) -> Dict[str, Any]:
+    """The HTTP client (and timeout) kwargs of ChatOpenAI/AzureChatOpenAI for `base_url` ({} if pools are off)."""
+    pool = get_endpoint_pool(base_url)
+    if pool is None:
+        return {}
+    http_client, http_async_client = pool.clients()
+    # The timeout is also passed to the model: the OpenAI SDK sends its own with every request
+    return {"http_client": http_client, "http_async_client": http_async_client, "timeout": pool.timeout}
+
+
+def use_shared_pool_for_ollama(llm: Any, base_url: str) -> Any:
+    """Points a ChatOllama's clients at the shared pool of `base_url` (ChatOllama takes no HTTP client argument)."""
+    pool = get_endpoint_pool(base_url)
+    if pool is None:
+        return llm
+    from ollama import AsyncClient, Client
+
+    headers = (llm.client_kwargs or {}).get("headers")
+    llm._client = Client(host=base_url, headers=headers, transport=pool.sync_transport, timeout=pool.timeout)
+    llm._async_client = AsyncClient(host=base_url, headers=headers, transport=pool.async_transport,
+                                    timeout=pool.timeout)
+    return llm
@@ -0,0 +1,385 @@
+import argparse
+import ast
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.tools import BaseTool, StructuredTool
+
+from src.utils import logger, get_cache_dir, extract_github_owner_repo
+from src.cassette import get_cassette
+from src.metrics import CACHE_HITS
+
+KNOWLEDGE_PACK_VERSION = 1
+
+# gitingest separates files in its content digest with "====...\nFile: <path>\n====...\n"
+INGEST_FILE_HEADER = re.compile(r"^={48}\nFile: (?P<path>[^\n]+)\n={48}\n", re.MULTILINE)
+
+# Definitions of the most common non-Python languages (JS/TS, Go, Rust, Java/C#/Kotlin, shell), one per line
+_SYMBOL_PATTERNS = [
+    re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*([A-Za-z_$][\w$]*)"),
+    re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:public\s+|private\s+|protected\s+)?(?:static\s+)?"
+               r"(?:final\s+)?(?:abstract\s+)?(?:data\s+)?(class|interface|enum|struct|trait|type)\s+([A-Za-z_$][\w$]*)"),
+    re.compile(r"^\s*(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s*)?"
+               r"(?:\([^)]*\)|[A-Za-z_$][\w$]*)\s*=>"),
+    re.compile(r"^func\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)"),
+    re.compile(r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?fn\s+([A-Za-z_]\w*)"),
+    re.compile(r"^\s*(?:function\s+)?([A-Za-z_][\w-]*)\s*\(\)\s*\{"),
+]
+_MARKDOWN_HEADING = re.compile(r"^(#{1,3})\s+(.+?)\s*#*\s*$")
+_MAX_SYMBOLS_PER_FILE = 40
+
+
+def split_ingest_files(content: str) -> Dict[str, str]:
+    """Splits a gitingest content digest into {path: text}."""
+    matches = list(INGEST_FILE_HEADER.finditer(content or ""))
+    files = {}
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(content)
+        files[match.group("path").strip().lstrip("/")] = content[match.end():end].rstrip("\n")
+    return files
+
+
+# --- Per-file digest ---
+
+def _first_sentence(text: str, limit: int = 200) -> str:
+    text = " ".join(text.strip().split())
+    match = re.match(r"(.+?[.!?])(\s|$)", text)
+    sentence = match.group(1) if match else text
+    return sentence if len(sentence) <= limit else sentence[:limit - 1] + "…"
+
+
+def _leading_comment(text: str) -> str:
+    """Text of the comment block at the top of a file (after a shebang / encoding line)."""
+    lines = []
+    for line in text.splitlines()[:40]:
+        stripped = line.strip()
+        if not lines and (not stripped or stripped.startswith("#!") or "coding" in stripped[:20]):
+            continue
+        match = re.match(r"^(?:#+|//+|/\*+|\*+/?|<!--|--|;+|%+)\s?(.*?)(?:\*/|-->)?$", stripped)
+        if not match or (not stripped.startswith(("#", "/", "*", "<!--", "--", ";", "%"))):
+            break
+        if match.group(1):
+            lines.append(match.group(1))
+        elif lines:
+            break
+    return " ".join(lines)
+
+
+def _symbol_name(symbol: str) -> str:
+    """"async def run(a, b) L12" -> "run", "## Usage L3" -> "Usage"."""
+    if symbol.startswith("#"):
+        return symbol.rsplit(" L", 1)[0].lstrip("# ")
+    words = symbol.rsplit(" L", 1)[0].split("(", 1)[0].split(":", 1)[0].split()
+    return words[-1] if words else symbol
+
+
+def _comment_purpose(text: str) -> str:
+    purpose = _first_sentence(_leading_comment(text))
+    return purpose if len(purpose.split()) >= 3 else ""  # Not a file name, section marker or ignore patterns
+
+
+def _python_digest(text: str) -> Optional[Tuple[str, List[str]]]:
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return None
+    symbols = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+            args = ", ".join(arg.arg for arg in node.args.args)
+            symbols.append(f"{prefix} {node.name}({args}) L{node.lineno}")
+        elif isinstance(node, ast.ClassDef):
+            methods = [item.name for item in node.body
+                       if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and
+                       (not item.name.startswith("_") or item.name == "__init__")]
+            shown = ", ".join(methods[:10]) + (", …" if len(methods) > 10 else "")
+            symbols.append(f"class {node.name} L{node.lineno}" + (f": {shown}" if methods else ""))
+        elif isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name) \
+                and node.targets[0].id.isupper():
+            symbols.append(f"{node.targets[0].id} L{node.lineno}")
+    docstring = ast.get_docstring(tree)
+    return (_first_sentence(docstring) if docstring else _comment_purpose(text)), symbols
+
+
+def digest_file(path: str, text: str) -> Dict[str, Any]:
+    """Purpose (docstring, leading comment or first heading), key symbols with line numbers, and size of a file."""
+    extension = os.path.splitext(path)[1].lower()
+    purpose, symbols = "", []
+    python = _python_digest(text) if extension in (".py", ".pyi") else None
+    if python:
+        purpose, symbols = python
+    elif extension in (".md", ".rst", ".txt", ".mdx"):
+        for number, line in enumerate(text.splitlines(), 1):
+            heading = _MARKDOWN_HEADING.match(line)
+            if heading:
+                symbols.append(f"{heading.group(1)} {heading.group(2)} L{number}")
+        paragraph = next((block for block in re.split(r"\n\s*\n", text)
+                          if block.strip() and not block.lstrip().startswith(("#", "<", "[![", "!["))), "")
+        purpose = _first_sentence(paragraph)
+    else:
+        purpose = _comment_purpose(text)
+        for number, line in enumerate(text.splitlines(), 1):
+            for pattern in _SYMBOL_PATTERNS:
+                match = pattern.match(line)
+                if match:
+                    symbols.append(f"{' '.join(match.groups())} L{number}")
+                    break
+            if len(symbols) > _MAX_SYMBOLS_PER_FILE:
+                break
+    if len(symbols) > _MAX_SYMBOLS_PER_FILE:
+        symbols = symbols[:_MAX_SYMBOLS_PER_FILE] + ["…"]
+    return {
+        "hash": hashlib.sha1(text.encode("utf-8", "replace")).hexdigest(),
+        "lines": len(text.splitlines()),
+        "bytes": len(text.encode("utf-8", "replace")),
+        "purpose": purpose,
+        "symbols": symbols,
+    }
+
+
+# --- Pack ---
+
+class KnowledgePack:
+    """
+    Digest of a repository at a commit: per file (purpose, key symbols, size) and per directory
+    (purpose, file and line counts), for orienting agents without reading files one by one.
+    """
+
+    def __init__(self, repo_url: str, commit_sha: Optional[str], files: Dict[str, Dict[str, Any]],
+                 built_at: Optional[float] = None):
+        self.repo_url = repo_url
+        self.commit_sha = commit_sha
+        self.files = files
+        self.built_at = built_at or time.time()
+        self.dirs = self._digest_dirs()
+
+    def _digest_dirs(self) -> Dict[str, Dict[str, Any]]:
+        dirs: Dict[str, Dict[str, Any]] = {"": {"files": 0, "lines": 0, "purpose": ""}}
+        for path, digest in self.files.items():
+            parts = path.split("/")
+            for depth in range(len(parts)):
+                directory = "/".join(parts[:depth])
+                entry = dirs.setdefault(directory, {"files": 0, "lines": 0, "purpose": ""})
+                entry["files"] += 1
+                entry["lines"] += digest["lines"]
+        for directory, entry in dirs.items():
+            prefix = f"{directory}/" if directory else ""
+            for name in ("README.md", "readme.md", "__init__.py", "index.ts", "index.js", "mod.rs", "doc.go"):
+                if self.files.get(prefix + name, {}).get("purpose"):
+                    entry["purpose"] = self.files[prefix + name]["purpose"]
+                    break
+        return dirs
+
+    def _children(self, directory: str) -> Tuple[List[str], List[str]]:
+        prefix = f"{directory}/" if directory else ""
+        subdirs, files = set(), []
+        for path in self.files:
+            if path.startswith(prefix):
+                rest = path[len(prefix):]
+                if "/" in rest:
+                    subdirs.add(prefix + rest.split("/", 1)[0])
+                else:
+                    files.append(path)
+        return sorted(subdirs), sorted(files)
+
+    def describe(self, path: str = "", max_chars: int = 6000) -> str:
+        """Digest of a directory (its subdirectories and files) or of a file."""
+        path = path.strip().strip("/")
+        if path in self.files:
+            digest = self.files[path]
+            lines = [f"{path} ({digest['lines']} lines, {digest['bytes']} bytes)"]
+            if digest["purpose"]:
+                lines.append(f"Purpose: {digest['purpose']}")
+            if digest["symbols"]:
+                lines.append("Symbols:")
+                lines.extend(f"  {symbol}" for symbol in digest["symbols"])
+            return "\n".join(lines)[:max_chars]
+        if path not in self.dirs:
+            return ""
+        entry = self.dirs[path]
+        lines = [f"{path or '(repository root)'}/ — {entry['files']} files, {entry['lines']} lines"
+                 + (f". {entry['purpose']}" if entry["purpose"] else "")]
+        subdirs, files = self._children(path)
+        for subdir in subdirs:
+            sub = self.dirs[subdir]
+            lines.append(f"  {subdir}/ ({sub['files']} files, {sub['lines']} lines)"
+                         + (f": {sub['purpose']}" if sub["purpose"] else ""))
+        for file_path in files:
+            digest = self.files[file_path]
+            names = ", ".join([name for name in map(_symbol_name, digest["symbols"]) if not name.startswith("_")][:8])
+            lines.append(f"  {file_path} ({digest['lines']} lines)"
+                         + (f": {digest['purpose']}" if digest["purpose"] else "")
+                         + (f" [{names}]" if names else ""))
+        text = "\n".join(lines)
+        return text if len(text) <= max_chars else text[:max_chars] + "\n  … (truncated, ask for a subdirectory)"
+
+    def search(self, query: str, limit: int = 25) -> List[str]:
+        """Files and symbols whose path or name contains `query` (case-insensitive)."""
+        needle = query.strip().lower()
+        results = []
+        for path, digest in sorted(self.files.items()):
+            if needle in path.lower():
+                results.append(f"{path} ({digest['lines']} lines)" + (f": {digest['purpose']}" if digest["purpose"] else ""))
+            results.extend(f"{path}: {symbol}" for symbol in digest["symbols"] if needle in symbol.lower())
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+    def lookup(self, query: str = "") -> str:
+        """Digest of a path, or search results for a file/symbol name."""
+        description = self.describe(query)
+        if description:
+            return description
+        results = self.search(query)
+        if not results:
+            return f"No file, directory or symbol matching '{query}' in the knowledge pack of {self.repo_url}."
+        return f"Matches for '{query}':\n" + "\n".join(f"  {result}" for result in results)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"version": KNOWLEDGE_PACK_VERSION, "repo_url": self.repo_url, "commit_sha": self.commit_sha,
+                "built_at": self.built_at, "files": self.files}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "KnowledgePack":
+        return cls(data["repo_url"], data.get("commit_sha"), data["files"], data.get("built_at"))
+
+
+def knowledge_pack_path(repo_url: str) -> str:
+    owner, repo = extract_github_owner_repo(repo_url) or ("unknown", hashlib.sha1(repo_url.encode()).hexdigest()[:12])
+    return str(get_cache_dir() / "knowledge" / f"{owner}__{repo}.json")
+
+
+def load_knowledge_pack(path: str) -> Optional[KnowledgePack]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != KNOWLEDGE_PACK_VERSION:
+            return None
+        return KnowledgePack.from_dict(data)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable knowledge pack {path}: {e}")
+        return None
+
+
+def save_knowledge_pack(pack: KnowledgePack, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(pack.to_dict(), f)
+    os.replace(tmp_path, path)
+
+
+async def fetch_commit_sha(repo_url: str, timeout: float = 15.0) -> Optional[str]:
+    """SHA of the default branch's HEAD (git ls-remote), or None if it cannot be determined."""
+
+    async def ls_remote() -> str:
+        process = await asyncio.create_subprocess_exec(
+            "git", "ls-remote", repo_url, "HEAD", stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            raise
+        return stdout.decode("utf-8", "replace")
+
+    try:
+        cassette = get_cassette()
+        output = await (cassette.tool_call("git_ls_remote", {"repo_url": repo_url}, ls_remote)
+                        if cassette is not None else ls_remote())
+    except (OSError, asyncio.TimeoutError) as e:
+        logger.warning(f"Could not get the commit SHA of {repo_url}: {e}")
+        return None
+    sha = str(output).split("\t", 1)[0].strip()
+    return sha if re.fullmatch(r"[0-9a-f]{40}", sha) else None
+
+
+def build_pack_from_files(repo_url: str, commit_sha: Optional[str], files: Dict[str, str],
+                          previous: Optional[KnowledgePack] = None) -> Tuple[KnowledgePack, int]:
+    """
+    Builds a pack, reusing the previous pack's digests of unchanged files.
+
+    Returns:
+        The pack and the number of files (re)digested.
+    """
+    digests, digested = {}, 0
+    for path, text in files.items():
+        old = previous.files.get(path) if previous else None
+        if old and old["hash"] == hashlib.sha1(text.encode("utf-8", "replace")).hexdigest():
+            digests[path] = old
+        else:
+            digests[path] = digest_file(path, text)
+            digested += 1
+    return KnowledgePack(repo_url, commit_sha, digests), digested
+
+
+async def build_knowledge_pack(repo_url: str, ingest_content: Optional[str]) -> Optional[KnowledgePack]:
+    """
+    Returns the knowledge pack of a repository from its gitingest content, reusing the pack stored
+    on disk if the commit is unchanged, and otherwise re-digesting only the files that changed.
+    Returns None if disabled (KNOWLEDGE_PACK_ENABLED=false) or on error.
+    """
+    if os.getenv("KNOWLEDGE_PACK_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    try:
+        path = knowledge_pack_path(repo_url)
+        commit_sha, previous = await asyncio.gather(fetch_commit_sha(repo_url),
+                                                    asyncio.to_thread(load_knowledge_pack, path))
+        if previous and commit_sha and previous.commit_sha == commit_sha:
+            CACHE_HITS.inc(cache="knowledge_pack")
+            logger.info(f"Knowledge pack of {repo_url} is up to date ({commit_sha[:10]}, {len(previous.files)} files).")
+            return previous
+        if not ingest_content:
+            return previous
+        started = time.time()
+        files = split_ingest_files(ingest_content)
+        pack, digested = await asyncio.to_thread(build_pack_from_files, repo_url, commit_sha, files, previous)
+        await asyncio.to_thread(save_knowledge_pack, pack, path)
+        logger.info(f"Built knowledge pack of {repo_url} at {(commit_sha or 'unknown commit')[:10]}: "
+                    f"{len(files)} files, {digested} digested, in {time.time() - started:.2f}s.")
+        return pack
+    except Exception as e:
+        logger.error(f"Failed to build the knowledge pack of {repo_url}: {e}", exc_info=True)
+        return None
+
+
+def make_knowledge_tool(pack: KnowledgePack) -> BaseTool:
+    """The `repo_knowledge` lookup tool over a pack (answers from memory, no network)."""
+    return StructuredTool.from_function(
+        func=pack.lookup,
+        name="repo_knowledge",
+        description=(
+            f"Instant overview of the repository {pack.repo_url} (precomputed at commit "
+            f"{(pack.commit_sha or 'unknown')[:10]}). Pass a directory path (\"\" for the root) to list its "
+            "subdirectories and files with their purpose, size and main symbols; a file path for its purpose "
+            "and symbols with line numbers; or a name to search files, classes and functions. Use it to find "
+            "where things are before reading files with get_file_contents."),
+    )
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from src.agent import ingest_repo
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Build (or refresh) the knowledge pack of a GitHub repository.")
+    parser.add_argument("repo_url", help="e.g. https://github.com/owner/repo")
+    parser.add_argument("--show", default=None, help="Print the digest of a path after building")
+    args = parser.parse_args()
+
+    async def _build():
+        _, _, content = await ingest_repo(args.repo_url)
+        return await build_knowledge_pack(args.repo_url, content)
+
+    built = asyncio.run(_build())
+    if built is not None:
+        print(f"{knowledge_pack_path(args.repo_url)}: {len(built.files)} files at {built.commit_sha}")
+        if args.show is not None:
+            print(built.lookup(args.show))
@@ -5,16 +5,24 @@ import pdb
 from typing import List, Tuple, Optional
 from langchain_core.tools import BaseTool
 from langchain_mcp_adapters.client import MultiServerMCPClient
+from mcp.types import ClientNotification, CancelledNotification, CancelledNotificationParams
 from src.utils import logger
 import base64
+import hashlib
 import json
 import logging
-from typing import Optional, Dict, Any, Type
-from langchain_core.tools import BaseTool
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, Type, Callable
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
 from pydantic.v1 import BaseModel, Field
 from langchain_core.runnables import RunnableConfig
 
 from . import utils, tools
+from .metrics import instrument_tools, CACHE_HITS
+from .cassette import get_cassette, wrap_tools_for_cassette, replay_tools
+from .tool_cache import wrap_tools_with_cache
+from .resilience import wrap_tools_with_resilience, tool_servers
 
 
 class DecodingWrapperTool(BaseTool):
@@ -114,23 +122,15 @@ class DecodingWrapperTool(BaseTool):
         return tools.parse_and_decode_raw_result(raw_result)
 
 
-async def setup_mcp_client_and_tools() -> Tuple[Optional[List[BaseTool]], Optional[MultiServerMCPClient]]:
-    """
-    Initializes the MultiServerMCPClient, connects to servers, fetches tools,
-    filters them, and returns a flat list of usable tools and the client instance.
-
-    Returns:
-        A tuple containing:
-        - list[BaseTool]: The filtered list of usable LangChain tools.
-        - MultiServerMCPClient | None: The initialized and started client instance, or None on failure.
-    """
+def _build_server_config() -> Optional[Dict[str, Dict[str, Any]]]:
+    """Builds the MultiServerMCPClient connection config, or None if the GitHub token is missing."""
     GITHUB_TOKEN = os.getenv("GITHUB_PERSONAL_ACCESS_TOKEN", "")
     if not GITHUB_TOKEN:
         logger.error("GitHub token is missing. Cannot start MCP client.")
-        return [], None
+        return None
 
     # Configuration for the MCP servers to connect to
-    server_config = {
+    return {
         "github": {
             "command": "docker",
             "args": [
@@ -155,58 +155,384 @@ async def setup_mcp_client_and_tools() -> Tuple[Optional[List[BaseTool]], Option
         }
     }
 
-    logger.info("Initializing MultiServerMCPClient...")
+
+def _filter_and_wrap_tools(raw_tools: List[BaseTool]) -> List[BaseTool]:
+    """Drops excluded tools and replaces 'get_file_contents' with the decoding wrapper."""
     all_tools_list: List[BaseTool] = []
+    # Filter and flatten the tools list
+    for tool in raw_tools:
+        if not hasattr(tool, 'name'):  # Basic check for valid tool object
+            logger.warning(f"Skipping invalid tool object from server: {tool}")
+            continue
+
+        EXCLUDED_GITHUB_TOOLS = os.getenv("EXCLUDED_GITHUB_TOOLS", [])
+        is_excluded = False
+        if tool.name in EXCLUDED_GITHUB_TOOLS:
+            is_excluded = True
+            logger.info(f"Excluding GitHub tool based on config: {tool.name}")
+
+        if not is_excluded:
+            all_tools_list.append(tool)
+            logger.debug(f"Included tool: {tool.name}")
+
+    logger.info(f"Total usable tools collected: {len(all_tools_list)}")
+
+    combined_tools: List[BaseTool] = []
+    original_tool_instance = None
+
+    # Find the original tool instance
+    for tool in all_tools_list:
+        if tool.name == "get_file_contents":  # Or isinstance check
+            original_tool_instance = tool
+            break  # Found it
+
+    if original_tool_instance:
+        logger.info(f"Wrapping original '{original_tool_instance.name}' with decoding wrapper.")
+        # Create the wrapper instance, passing the original tool
+        decoding_wrapper = DecodingWrapperTool(original_tool=original_tool_instance)
+
+        # Rebuild the tool list, replacing the original with the wrapper
+        for tool in all_tools_list:
+            if tool is original_tool_instance:
+                combined_tools.append(decoding_wrapper)  # Add the wrapper instead
+            else:
+                combined_tools.append(tool)  # Add other tools
+    else:
+        logger.warning("Original 'get_file_contents' tool not found. Cannot wrap.")
+        combined_tools = all_tools_list
+
+    return combined_tools
+
+
+def _finalize_tools(tools_list: List[BaseTool], server_of: Optional[Dict[str, str]] = None) -> List[BaseTool]:
+    """
+    Adds retries and per-server circuit breakers (`server_of` maps tool names to MCP servers), routes
+    tools through the cassette when recording, instruments them for metrics and serves read-only ones
+    through the tool result cache (not when recording, so recordings replay identically).
+    """
+    tools_list = wrap_tools_with_resilience(tools_list, server_of)
+    cassette = get_cassette()
+    if cassette is not None:
+        return instrument_tools(wrap_tools_for_cassette(tools_list, cassette))
+    return wrap_tools_with_cache(instrument_tools(tools_list))
+
+
+def _replay_tools_or_none() -> Optional[List[BaseTool]]:
+    """In cassette replay mode, returns tools served from the cassette (no MCP servers are started)."""
+    cassette = get_cassette()
+    if cassette is None or cassette.mode != "replay":
+        return None
+    logger.info(f"Cassette replay mode: serving {len(cassette.tool_manifest)} tools from {cassette.path}")
+    return instrument_tools(replay_tools(cassette))
+
+
+def _propagate_cancellation(client: MultiServerMCPClient):
+    """
+    Makes cancelled tool calls (e.g. an agent run hitting its deadline) send an MCP
+    `notifications/cancelled` for the in-flight request, so the server stops working on it
+    instead of finishing a long browse/search nobody waits for.
+
+    This reads the request id counter of mcp's BaseSession (`_request_id`, private as of mcp 1.6,
+    the version in uv.lock); sessions without it are left as they are, so calls still work but
+    cancelled ones are not announced to the server.
+    """
+    for server_name, session in client.sessions.items():
+        if not isinstance(getattr(session, "_request_id", None), int):
+            logger.warning(f"MCP session of '{server_name}' has no request id counter (mcp version change?); "
+                           f"cancelled calls will not be announced to the server.")
+            continue
+        original_send_request = session.send_request
+
+        async def send_request(request, result_type, _session=session, _send=original_send_request,
+                               _server=server_name):
+            request_id = _session._request_id  # The id the wrapped call is about to use
+            try:
+                return await _send(request, result_type)
+            except asyncio.CancelledError:
+                notification = ClientNotification(CancelledNotification(
+                    method="notifications/cancelled",
+                    params=CancelledNotificationParams(requestId=request_id, reason="Cancelled by client")))
+                try:
+                    await asyncio.shield(_session.send_notification(notification))
+                    logger.info(f"Sent cancellation for in-flight MCP request {request_id} to '{_server}'.")
+                except Exception as e:
+                    logger.debug(f"Could not send MCP cancellation for request {request_id}: {e}")
+                raise
+
+        session.send_request = send_request
+
+
+async def setup_mcp_client_and_tools() -> Tuple[Optional[List[BaseTool]], Optional[MultiServerMCPClient]]:
+    """
+    Initializes the MultiServerMCPClient, connects to servers, fetches tools,
+    filters them, and returns a flat list of usable tools and the client instance.
+
+    Returns:
+        A tuple containing:
+        - list[BaseTool]: The filtered list of usable LangChain tools.
+        - MultiServerMCPClient | None: The initialized and started client instance, or None on failure.
+    """
+    cassette_tools = _replay_tools_or_none()
+    if cassette_tools is not None:
+        return cassette_tools, None
+
+    server_config = _build_server_config()
+    if server_config is None:
+        return [], None
+
+    logger.info("Initializing MultiServerMCPClient...")
 
     try:
         client = MultiServerMCPClient(server_config)
         await client.__aenter__()
-        tools_by_server = client.get_tools()
-        # Filter and flatten the tools list
-        for tool in tools_by_server:
-            if not hasattr(tool, 'name'):  # Basic check for valid tool object
-                logger.warning(f"Skipping invalid tool object from server: {tool}")
-                continue
-
-            EXCLUDED_GITHUB_TOOLS = os.getenv("EXCLUDED_GITHUB_TOOLS", [])
-            is_excluded = False
-            if tool.name in EXCLUDED_GITHUB_TOOLS:
-                is_excluded = True
-                logger.info(f"Excluding GitHub tool based on config: {tool.name}")
-
-            if not is_excluded:
-                all_tools_list.append(tool)
-                logger.debug(f"Included tool: {tool.name}")
-
-        logger.info(f"Total usable tools collected: {len(all_tools_list)}")
+        _propagate_cancellation(client)
         # Return the list of tools and the active client instance
+        return _finalize_tools(_filter_and_wrap_tools(client.get_tools()),
+                               tool_servers(client.server_name_to_tools)), client
 
-        combined_tools: List[BaseTool] = []
-        original_tool_instance = None
+    except Exception as e:
+        logger.error(f"Failed to setup MCP client or fetch tools: {e}", exc_info=True)
+        return [], None
 
-        # Find the original tool instance
-        for tool in all_tools_list:
-            if tool.name == "get_file_contents":  # Or isinstance check
-                original_tool_instance = tool
-                break  # Found it
-
-        if original_tool_instance:
-            logger.info(f"Wrapping original '{original_tool_instance.name}' with decoding wrapper.")
-            # Create the wrapper instance, passing the original tool
-            decoding_wrapper = DecodingWrapperTool(original_tool=original_tool_instance)
-
-            # Rebuild the tool list, replacing the original with the wrapper
-            for tool in all_tools_list:
-                if tool is original_tool_instance:
-                    combined_tools.append(decoding_wrapper)  # Add the wrapper instead
-                else:
-                    combined_tools.append(tool)  # Add other tools
+
+# --- Tool Manifest Cache ---
+# Starting the MCP servers (docker pull/run, npx) and listing their tools takes seconds. The manifest
+# (names, descriptions, arg schemas) of each server is cached on disk, keyed by the server's command and
+# args (i.e. image / package version), so agents can be built from it immediately while the real
+# connection comes up in the background.
+
+def _manifest_path(server_name: str, connection: Dict[str, Any]) -> Path:
+    """
+    Returns the cache file for a server; the key deliberately excludes env (secrets).
+
+    The key covers the command and its arguments, so pinning an image tag/digest or a package version
+    there gives each version its own manifest. Unpinned servers (e.g. ghcr.io/github/github-mcp-server,
+    @playwright/mcp@latest) keep one manifest across upgrades: it only serves the first calls at
+    startup and is checked against the live tool list once connected (see _refresh_manifests).
+    """
+    key_source = json.dumps({
+        "command": connection.get("command"),
+        "args": connection.get("args"),
+        "url": connection.get("url"),
+        "transport": connection.get("transport"),
+    }, sort_keys=True)
+    key = hashlib.sha256(key_source.encode("utf-8")).hexdigest()[:16]
+    return utils.get_cache_dir("mcp_manifests") / f"{server_name}-{key}.json"
+
+
+def _tool_to_manifest_entry(tool: BaseTool) -> Dict[str, Any]:
+    """Serializes a tool's name, description and JSON arg schema."""
+    args_schema = tool.args_schema
+    if args_schema is not None and not isinstance(args_schema, dict):
+        args_schema = args_schema.model_json_schema() if hasattr(args_schema, "model_json_schema") \
+            else args_schema.schema()
+    return {"name": tool.name, "description": tool.description, "args_schema": args_schema or {}}
+
+
+def load_tool_manifest(server_name: str, connection: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Loads the cached tool manifest for a server, or None if there is no usable cache entry."""
+    path = _manifest_path(server_name, connection)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["tools"]
+    except (OSError, json.JSONDecodeError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable MCP tool manifest {path}: {e}")
+        return None
+
+
+def save_tool_manifest(server_name: str, connection: Dict[str, Any], manifest: List[Dict[str, Any]]):
+    """Writes a server's tool manifest to the cache (atomically, via a temp file)."""
+    path = _manifest_path(server_name, connection)
+    tmp_path = path.with_suffix(".tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"server": server_name, "saved_at": time.time(), "tools": manifest}, f)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved MCP tool manifest for '{server_name}' ({len(manifest)} tools) to {path}")
+    except OSError as e:
+        logger.warning(f"Failed to save MCP tool manifest for '{server_name}': {e}")
+
+
+def _make_manifest_proxy_tool(entry: Dict[str, Any], live_tools: "asyncio.Future") -> BaseTool:
+    """Builds a tool from a manifest entry that forwards calls to the live tool once connected."""
+    tool_name = entry["name"]
+
+    async def call_live_tool(**arguments: Any) -> Any:
+        tools_by_name = await asyncio.shield(live_tools)
+        live_tool = tools_by_name.get(tool_name)
+        if live_tool is None:
+            raise ToolException(f"Tool '{tool_name}' is no longer provided by the MCP server.")
+        return await live_tool.ainvoke(arguments)
+
+    return StructuredTool(
+        name=tool_name,
+        description=entry.get("description") or "",
+        args_schema=entry.get("args_schema") or {"type": "object", "properties": {}},
+        coroutine=call_live_tool,
+    )
+
+
+def _refresh_manifests(
+        client: MultiServerMCPClient,
+        server_config: Dict[str, Dict[str, Any]],
+        cached_manifests: Dict[str, Optional[List[Dict[str, Any]]]]
+):
+    """Re-checks each cached manifest against the live tool list and rewrites stale entries."""
+    for server_name, server_tools in client.server_name_to_tools.items():
+        live_manifest = [_tool_to_manifest_entry(tool) for tool in server_tools]
+        cached_manifest = cached_manifests.get(server_name)
+        if cached_manifest == live_manifest:
+            logger.info(f"MCP tool manifest for '{server_name}' is up to date.")
+            continue
+        if cached_manifest is not None:
+            cached_names = {entry["name"] for entry in cached_manifest}
+            live_names = {entry["name"] for entry in live_manifest}
+            logger.warning(
+                f"MCP tool manifest for '{server_name}' is stale "
+                f"(removed: {sorted(cached_names - live_names)}, added: {sorted(live_names - cached_names)}). "
+                f"Refreshing cache; agents built from the old manifest pick up added tools after a restart.")
+        save_tool_manifest(server_name, server_config[server_name], live_manifest)
+
+
+class MCPConnection:
+    """
+    Owns a MultiServerMCPClient running in a background task.
+
+    The client is entered and exited inside that task (anyio cancel scopes must be exited by
+    the task that entered them), so callers wait on `wait_ready()` and stop it with `aclose()`.
+    """
+
+    def __init__(
+            self,
+            server_config: Dict[str, Dict[str, Any]],
+            cached_manifests: Dict[str, Optional[List[Dict[str, Any]]]]
+    ):
+        self.server_config = server_config
+        self.cached_manifests = cached_manifests
+        self.client: Optional[MultiServerMCPClient] = None
+        loop = asyncio.get_running_loop()
+        # Raw (unfiltered) live tools by name, used to resolve manifest proxies
+        self.live_tools: asyncio.Future = loop.create_future()
+        self._ready: asyncio.Future = loop.create_future()
+        self._stop_event = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        logger.info("Initializing MultiServerMCPClient (background)...")
+        client = MultiServerMCPClient(self.server_config)
+        # A server that exits during the handshake leaves the stdio session waiting forever
+        connect_timeout = float(os.getenv("MCP_CONNECT_TIMEOUT_SECONDS", 300))
+        try:
+            async with asyncio.timeout(connect_timeout or None):  # Same task: the client's cancel scopes need it
+                try:
+                    await client.__aenter__()
+                except BaseException as e:
+                    # __aenter__ only cleans up on Exception; make sure a cancelled startup doesn't leak servers
+                    if not isinstance(e, Exception):
+                        try:
+                            await client.exit_stack.aclose()
+                        except Exception as cleanup_error:  # e.g. the server process is already gone
+                            logger.debug(f"Error cleaning up the MCP client: {cleanup_error}")
+                    raise
+        except BaseException as e:
+            if isinstance(e, TimeoutError):
+                e = TimeoutError(f"no response from the MCP servers within {connect_timeout:.0f}s")
+            logger.error(f"Failed to setup MCP client or fetch tools: {e}", exc_info=isinstance(e, Exception))
+            self._fail(ToolException(f"MCP connection failed: {e}"))
+            if isinstance(e, Exception):
+                return
+            raise
+
+        self.client = client
+        _propagate_cancellation(client)
+        raw_tools = client.get_tools()
+        self.live_tools.set_result({tool.name: tool for tool in raw_tools})
+        self._ready.set_result((_filter_and_wrap_tools(raw_tools), client))
+        try:
+            _refresh_manifests(client, self.server_config, self.cached_manifests)
+            await self._stop_event.wait()
+        finally:
+            logger.info("Stopping MCP client...")
+            self.client = None
+            try:
+                await client.__aexit__(None, None, None)
+                logger.info("MCP client stopped successfully.")
+            except Exception as e:
+                logger.error(f"Error stopping MCP client: {e}", exc_info=True)
+
+    def _fail(self, error: Exception):
+        for future in (self.live_tools, self._ready):
+            if not future.done():
+                future.set_exception(error)
+                future.exception()  # Mark as retrieved; awaiting callers re-raise it
+
+    def add_failure_callback(self, callback: Callable[[Exception], Any]):
+        """
+        Calls `callback` with the error if the connection attempt fails. With a warm manifest cache the
+        tools are already in use by then and every call would fail, so callers stop on it.
+        """
+        def on_ready(future: asyncio.Future):
+            if not future.cancelled() and future.exception() is not None:
+                callback(future.exception())
+
+        self._ready.add_done_callback(on_ready)
+
+    def done(self) -> bool:
+        """True once the connection attempt has finished (connected or failed)."""
+        return self._ready.done()
+
+    async def wait_ready(self) -> Tuple[List[BaseTool], MultiServerMCPClient]:
+        """Waits for the live connection and returns the filtered live tools and the client."""
+        return await asyncio.shield(self._ready)
+
+    async def aclose(self):
+        """Stops the client, cancelling the connection attempt if it is still starting."""
+        if self._task.done():
+            return
+        if self._ready.done():
+            self._stop_event.set()
         else:
-            logger.warning("Original 'get_file_contents' tool not found. Cannot wrap.")
-            combined_tools = all_tools_list
+            self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
 
-        return combined_tools, client
 
-    except Exception as e:
-        logger.error(f"Failed to setup MCP client or fetch tools: {e}", exc_info=True)
+async def setup_mcp_tools_from_manifest_cache() -> Tuple[List[BaseTool], Optional[MCPConnection]]:
+    """
+    Returns usable tools immediately from the on-disk manifest cache while the MCP servers
+    start in the background. On a cold cache this waits for the live connection instead.
+
+    Returns:
+        A tuple containing:
+        - list[BaseTool]: The filtered list of usable LangChain tools (manifest proxies on a warm cache).
+        - MCPConnection | None: The background connection, or None if the MCP configuration
+          is invalid or the connection failed on a cold cache.
+    """
+    cassette_tools = _replay_tools_or_none()
+    if cassette_tools is not None:
+        return cassette_tools, None
+
+    server_config = _build_server_config()
+    if server_config is None:
         return [], None
+
+    cached_manifests = {name: load_tool_manifest(name, connection) for name, connection in server_config.items()}
+    connection = MCPConnection(server_config, cached_manifests)
+
+    if any(manifest is None for manifest in cached_manifests.values()):
+        logger.info("MCP tool manifest cache is cold. Waiting for the live MCP connection...")
+        try:
+            live_tools_list, client = await connection.wait_ready()
+        except ToolException:
+            return [], None
+        return _finalize_tools(live_tools_list, tool_servers(client.server_name_to_tools)), connection
+
+    proxy_tools = [
+        _make_manifest_proxy_tool(entry, connection.live_tools)
+        for manifest in cached_manifests.values()
+        for entry in manifest
+    ]
+    CACHE_HITS.inc(len(cached_manifests), cache="mcp_manifest")
+    logger.info(f"Built {len(proxy_tools)} tools from the cached MCP manifest; connecting in the background.")
+    return _finalize_tools(_filter_and_wrap_tools(proxy_tools), tool_servers(cached_manifests)), connection
@@ -0,0 +1,380 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tools import BaseTool
+
+from src.utils import logger
+
+# Latency buckets (seconds) covering fast tool calls up to multi-minute agent runs
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(label_names: Sequence[str], label_values: Sequence[str],
+                   extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Base class for labelled metrics. All methods are thread-safe."""
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Metric {self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._callbacks: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, func: Callable[[], float], **labels):
+        """Evaluates `func` at scrape time instead of storing a value."""
+        key = self._label_values(labels)
+        with self._lock:
+            self._callbacks[key] = func
+
+    def value(self, **labels) -> float:
+        key = self._label_values(labels)
+        with self._lock:
+            func = self._callbacks.get(key)
+            if func is None:
+                return self._values.get(key, 0)
+        return func()
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            values = dict(self._values)
+            callbacks = dict(self._callbacks)
+        for key, func in callbacks.items():
+            try:
+                values[key] = func()
+            except Exception as e:
+                logger.debug(f"Gauge callback for {self.name}{key} failed: {e}")
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., sum, count]
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Context manager observing the wall-clock duration of its block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> float:
+        with self._lock:
+            series = self._series.get(self._label_values(labels))
+            return series[-1] if series else 0
+
+    def sum(self, **labels) -> float:
+        with self._lock:
+            series = self._series.get(self._label_values(labels))
+            return series[-2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            series_items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in series_items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', _format_value(bound)))} "
+                             f"{_format_value(cumulative)}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', '+Inf'))} "
+                         f"{_format_value(series[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {_format_value(series[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# --- Processing Loop Metrics ---
+CYCLE_DURATION = REGISTRY.histogram(
+    "repo_assistant_cycle_duration_seconds", "Duration of one fetch/select/process cycle.", ["loop"])
+LISTING_LATENCY = REGISTRY.histogram(
+    "repo_assistant_listing_latency_seconds", "Latency of listing all open items (all pages).", ["item_type"])
+ELIGIBILITY_CHECK_LATENCY = REGISTRY.histogram(
+    "repo_assistant_eligibility_check_latency_seconds", "Latency of one last-update-by-owner check.", ["item_type"])
+AGENT_RUN_DURATION = REGISTRY.histogram(
+    "repo_assistant_agent_run_duration_seconds", "Duration of one agent run on an item.", ["item_type"])
+AGENT_RUNS = REGISTRY.counter(
+    "repo_assistant_agent_runs_total",
+    "Agent runs by outcome (completed, timeout, step_limit, budget_exceeded, skipped_budget, error).",
+    ["item_type", "status"])
+MCP_TOOL_LATENCY = REGISTRY.histogram(
+    "repo_assistant_mcp_tool_latency_seconds", "Latency of MCP tool calls.", ["tool"])
+LLM_LATENCY = REGISTRY.histogram(
+    "repo_assistant_llm_latency_seconds", "Latency of LLM calls.", ["model"])
+ITEMS_PROCESSED = REGISTRY.counter(
+    "repo_assistant_items_processed_total", "Items handed to the agent.", ["item_type"])
+ITEMS_SKIPPED = REGISTRY.counter(
+    "repo_assistant_items_skipped_total", "Items skipped during selection.", ["item_type", "reason"])
+CACHE_HITS = REGISTRY.counter(
+    "repo_assistant_cache_hits_total", "Cache hits by cache name.", ["cache"])
+ERRORS = REGISTRY.counter(
+    "repo_assistant_errors_total", "Errors by stage.", ["stage"])
+QUEUE_DEPTH = REGISTRY.gauge(
+    "repo_assistant_queue_depth", "Open items listed in the latest cycle, i.e. still waiting for a run.",
+    ["item_type"])
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Records MCP tool and LLM call latencies from LangChain callbacks.
+
+    Calls that get no end or error callback (cancelled ones, e.g. on a run deadline) would keep
+    their start entry forever: entries older than `max_age` seconds, or beyond `max_entries`, are
+    evicted (oldest first) when a call starts.
+    """
+    run_inline = True  # Cheap bookkeeping; avoid the executor hop for sync handlers
+
+    def __init__(self, max_age: float = 3600.0, max_entries: int = 10000):
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._started: Dict[UUID, Tuple[str, float]] = {}  # In start order
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, name: str):
+        now = time.perf_counter()
+        with self._lock:
+            while self._started:
+                oldest = next(iter(self._started))
+                if len(self._started) < self.max_entries and now - self._started[oldest][1] <= self.max_age:
+                    break
+                del self._started[oldest]
+            self._started[run_id] = (name, now)
+
+    def _finish(self, run_id: UUID) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            return self._started.pop(run_id, None)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, serialized.get("name") or kwargs.get("name") or "unknown")
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+        started = self._finish(run_id)
+        if started:
+            MCP_TOOL_LATENCY.observe(time.perf_counter() - started[1], tool=started[0])
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        started = self._finish(run_id)
+        if started:
+            MCP_TOOL_LATENCY.observe(time.perf_counter() - started[1], tool=started[0])
+        ERRORS.inc(stage="mcp_tool")
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID,
+                            **kwargs: Any):
+        metadata = kwargs.get("metadata") or {}
+        invocation_params = kwargs.get("invocation_params") or {}
+        model = (metadata.get("ls_model_name") or invocation_params.get("model")
+                 or invocation_params.get("model_name") or serialized.get("name") or "unknown")
+        self._start(run_id, model)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any):
+        started = self._finish(run_id)
+        if started:
+            LLM_LATENCY.observe(time.perf_counter() - started[1], model=started[0])
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        started = self._finish(run_id)
+        if started:
+            LLM_LATENCY.observe(time.perf_counter() - started[1], model=started[0])
+        ERRORS.inc(stage="llm")
+
+
+METRICS_CALLBACK_HANDLER = MetricsCallbackHandler()
+
+
+def _attach_callback(obj: Any):
+    callbacks = obj.callbacks
+    if callbacks is None:
+        obj.callbacks = [METRICS_CALLBACK_HANDLER]
+    elif isinstance(callbacks, list):
+        if METRICS_CALLBACK_HANDLER not in callbacks:
+            callbacks.append(METRICS_CALLBACK_HANDLER)
+    else:  # A callback manager
+        callbacks.add_handler(METRICS_CALLBACK_HANDLER, inherit=False)
+
+
+def instrument_tools(tools: List[BaseTool]) -> List[BaseTool]:
+    """Attaches the metrics handler to each tool so every call (agent or direct) is timed."""
+    for tool in tools:
+        _attach_callback(tool)
+    return tools
+
+
+def instrument_llm(llm: Any) -> Any:
+    """Attaches the metrics handler to a chat model so every call is timed."""
+    _attach_callback(llm)
+    return llm
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any):
+        logger.debug(f"Metrics endpoint: {format % args}")
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """
+    Serves the metrics registry at http://host:port/metrics from a daemon thread.
+
+    Returns:
+        The running server, or None if it could not be started.
+    """
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    except OSError as e:
+        logger.error(f"Failed to start metrics endpoint on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    logger.info(f"Metrics endpoint listening on http://{host}:{server.server_address[1]}/metrics")
+    return server
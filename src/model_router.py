@@ -0,0 +1,232 @@
+import asyncio
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from langchain_core.callbacks import AsyncCallbackManager, BaseCallbackManager, CallbackManager
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langgraph.constants import TAG_NOSTREAM
+
+from .usage import ECONOMY_METADATA_KEY, BudgetExceededError, estimate_cost
+from .utils import logger
+from .metrics import REGISTRY
+
+LLM_ROUTES = REGISTRY.counter(
+    "repo_assistant_llm_routes_total", "Cascade routing decisions per LLM step, by final tier and reason.",
+    ["tier", "reason"])
+LLM_ROUTING_SAVINGS = REGISTRY.counter(
+    "repo_assistant_llm_routing_savings_usd_total",
+    "Estimated USD saved by steps answered by the small model (saved), and spent on small-model attempts "
+    "that were escalated (overhead).", ["kind"])
+
+# Replies that signal the small model is out of its depth
+_LOW_CONFIDENCE = re.compile(
+    r"\b(I'?m not (sure|certain)|I am not (sure|certain)|I (cannot|can't|could not|couldn't) (determine|tell|find)|"
+    r"unclear to me|I don'?t know)\b", re.IGNORECASE)
+
+# Escalation reasons that mean the small model gave no usable answer (the only ones applied in economy mode)
+_FAILURE_REASONS = ("small_error", "small_timeout", "empty", "invalid_tool_call")
+
+
+def _child_callbacks(run_manager: Any, manager_class: Type[BaseCallbackManager]) -> Optional[BaseCallbackManager]:
+    """Callbacks for the inner calls, as children of this model's run (LLM run managers have no get_child)."""
+    if run_manager is None:
+        return None
+    manager = manager_class(handlers=[], parent_run_id=run_manager.run_id)
+    manager.set_handlers(run_manager.inheritable_handlers)
+    manager.add_tags(run_manager.inheritable_tags)
+    manager.add_metadata(run_manager.inheritable_metadata)
+    return manager
+
+
+def _mean_logprob(message: BaseMessage) -> Optional[float]:
+    """Mean token log-probability, when the provider returned logprobs (e.g. OpenAI with logprobs=True)."""
+    content = ((message.response_metadata or {}).get("logprobs") or {}).get("content") or []
+    values = [token["logprob"] for token in content if isinstance(token, dict) and "logprob" in token]
+    return sum(values) / len(values) if values else None
+
+
+class CascadeChatModel(BaseChatModel):
+    """
+    Chat model that answers each step with a small, cheap model and escalates to the large one when:
+
+    - the step is large (more than `max_small_input_tokens` of input), or its type needs the large
+      model: a call of one of `large_tools` (e.g. posting the final comment) or a long final reply
+      (over `simple_reply_chars`) of an agent step with tools bound; calls without tools (e.g. chunk
+      or conversation summaries) are expected to answer at length;
+    - the small model is not confident: it fails, exceeds `small_timeout` seconds, returns nothing
+      or an invalid tool call, hedges, or has a mean token logprob under `min_mean_logprob`.
+
+    Forced tool calls (structured output, e.g. classification) stay on the small model unless invalid.
+    In runs flagged as economy mode (run metadata ECONOMY_METADATA_KEY, set when the daily LLM budget
+    runs low), steps only escalate when the small model fails (error, timeout, empty or invalid answer).
+    The inner models report their own usage (so costs are priced per model); routing decisions and
+    estimated savings are logged and counted.
+    """
+    small: Any
+    large: Any
+    small_model_name: str = "small"
+    large_model_name: str = "large"
+    small_timeout: float = 30.0
+    max_small_input_tokens: int = 16000
+    simple_reply_chars: int = 600
+    large_tools: List[str] = []
+    min_mean_logprob: float = -1.0
+    tool_names: List[str] = []
+    forced_tool: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "cascade"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"small": self.small_model_name, "large": self.large_model_name}
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        tool_names = [convert_to_openai_tool(tool)["function"]["name"] for tool in tools]
+        return self.model_copy(update={
+            "small": self.small.bind_tools(tools, **kwargs), "large": self.large.bind_tools(tools, **kwargs),
+            "tool_names": tool_names, "forced_tool": kwargs.get("tool_choice") not in (None, "auto", "none")})
+
+    def _escalation_reason(self, message: AIMessage) -> Optional[str]:
+        """Why the small model's answer should not be used, or None to keep it."""
+        if message.invalid_tool_calls or any(call["name"] not in self.tool_names for call in message.tool_calls):
+            return "invalid_tool_call"
+        if self.forced_tool:
+            return None if message.tool_calls else "invalid_tool_call"
+        text = message.content if isinstance(message.content, str) else str(message.content)
+        if not message.tool_calls and not text.strip():
+            return "empty"
+        large_tool = next((call["name"] for call in message.tool_calls if call["name"] in self.large_tools), None)
+        if large_tool:
+            return f"step:{large_tool}"
+        if self.tool_names and not message.tool_calls and len(text) > self.simple_reply_chars:
+            return "long_reply"
+        if _LOW_CONFIDENCE.search(text):
+            return "low_confidence"
+        mean_logprob = _mean_logprob(message)
+        if mean_logprob is not None and mean_logprob < self.min_mean_logprob:
+            return "low_logprob"
+        return None
+
+    def _cost(self, model: str, message: Optional[BaseMessage]) -> float:
+        usage = getattr(message, "usage_metadata", None) or {}
+        return estimate_cost(model, usage.get("input_tokens", 0), usage.get("output_tokens", 0),
+                             (usage.get("input_token_details") or {}).get("cache_read", 0) or 0)
+
+    def _settle(self, small_message: Optional[AIMessage], reason: Optional[str], input_tokens: int,
+                economy: bool) -> Tuple[Optional[AIMessage], str]:
+        """(the small model's answer, why it is kept), or (None, escalation reason) after logging the escalation."""
+        if economy and reason not in _FAILURE_REASONS:
+            reason = None
+        if reason is None:
+            saved = self._cost(self.large_model_name, small_message) - self._cost(self.small_model_name, small_message)
+            LLM_ROUTING_SAVINGS.inc(max(saved, 0.0), kind="saved")
+            logger.info(f"LLM route: {self.small_model_name} answered "
+                        f"({'tool call' if small_message.tool_calls else 'reply'}, ~{input_tokens} input tokens), "
+                        f"saving ~${max(saved, 0.0):.5f}")
+            return small_message, "economy" if economy else "confident"
+        overhead = self._cost(self.small_model_name, small_message)
+        LLM_ROUTING_SAVINGS.inc(overhead, kind="overhead")
+        logger.info(f"LLM route: escalating to {self.large_model_name} ({reason}); "
+                    f"small attempt cost ~${overhead:.5f}")
+        return None, reason
+
+    async def _route(self, messages: List[BaseMessage], config: Dict[str, Any], kwargs: Dict[str, Any],
+                     economy: bool = False) -> Tuple[AIMessage, str, str]:
+        input_tokens = count_tokens_approximately(messages)
+        if not economy and self.max_small_input_tokens and input_tokens > self.max_small_input_tokens:
+            return await self.large.ainvoke(messages, config=config, **kwargs), "large", "item_size"
+        small_message = None
+        try:
+            small_message = await asyncio.wait_for(self.small.ainvoke(messages, config=config, **kwargs),
+                                                   timeout=self.small_timeout or None)
+            reason = self._escalation_reason(small_message)
+        except asyncio.TimeoutError:
+            reason = "small_timeout"
+        except BudgetExceededError:
+            raise  # Stops the run, as with a single model
+        except Exception as e:
+            logger.warning(f"Small model {self.small_model_name} failed, escalating: {e}")
+            reason = "small_error"
+        kept, reason = self._settle(small_message, reason, input_tokens, economy)
+        if kept is not None:
+            return kept, "small", reason
+        return await self.large.ainvoke(messages, config=config, **kwargs), "large", reason
+
+    def _route_sync(self, messages: List[BaseMessage], config: Dict[str, Any], kwargs: Dict[str, Any],
+                    economy: bool = False) -> Tuple[AIMessage, str, str]:
+        """_route for synchronous calls; a blocking call cannot be cut short, so `small_timeout` does not apply."""
+        input_tokens = count_tokens_approximately(messages)
+        if not economy and self.max_small_input_tokens and input_tokens > self.max_small_input_tokens:
+            return self.large.invoke(messages, config=config, **kwargs), "large", "item_size"
+        small_message = None
+        try:
+            small_message = self.small.invoke(messages, config=config, **kwargs)
+            reason = self._escalation_reason(small_message)
+        except BudgetExceededError:
+            raise
+        except Exception as e:
+            logger.warning(f"Small model {self.small_model_name} failed, escalating: {e}")
+            reason = "small_error"
+        kept, reason = self._settle(small_message, reason, input_tokens, economy)
+        if kept is not None:
+            return kept, "small", reason
+        return self.large.invoke(messages, config=config, **kwargs), "large", reason
+
+    @staticmethod
+    def _result(message: AIMessage, tier: str, reason: str) -> ChatResult:
+        LLM_ROUTES.inc(tier=tier, reason=reason)
+        message = message.model_copy(update={
+            "usage_metadata": None,
+            "response_metadata": {**(message.response_metadata or {}), "cascade_tier": tier, "cascade_reason": reason}})
+        return ChatResult(generations=[ChatGeneration(message=message)],
+                          llm_output={"usage_reported_by_children": True})
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        # Inner calls report their own usage/latency; they are not streamed (this model emits the final message)
+        config = {"callbacks": _child_callbacks(run_manager, AsyncCallbackManager), "tags": [TAG_NOSTREAM]}
+        if stop:
+            kwargs["stop"] = stop
+        economy = bool(run_manager and (run_manager.metadata or {}).get(ECONOMY_METADATA_KEY))
+        return self._result(*await self._route(messages, config, kwargs, economy))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        config = {"callbacks": _child_callbacks(run_manager, CallbackManager), "tags": [TAG_NOSTREAM]}
+        if stop:
+            kwargs["stop"] = stop
+        economy = bool(run_manager and (run_manager.metadata or {}).get(ECONOMY_METADATA_KEY))
+        return self._result(*self._route_sync(messages, config, kwargs, economy))
+
+
+def build_cascade_model(large: BaseChatModel, large_model_name: str, build_small) -> BaseChatModel:
+    """
+    Wraps `large` in a CascadeChatModel when LLM_SMALL_MODEL_NAME is set (otherwise returns it as is).
+
+    Settings: LLM_SMALL_PROVIDER (default: LLM_PROVIDER), LLM_SMALL_MODEL_NAME, LLM_SMALL_TIMEOUT_SECONDS,
+    LLM_CASCADE_MAX_SMALL_INPUT_TOKENS, LLM_CASCADE_SIMPLE_REPLY_CHARS, LLM_CASCADE_LARGE_TOOLS (comma-separated)
+    and LLM_CASCADE_MIN_MEAN_LOGPROB.
+
+    Args:
+        build_small: Called with (provider, model_name) to build the small model.
+    """
+    small_model_name = os.getenv("LLM_SMALL_MODEL_NAME", "")
+    if not small_model_name or small_model_name == large_model_name:
+        return large
+    small = build_small(os.getenv("LLM_SMALL_PROVIDER") or os.getenv("LLM_PROVIDER", "openai"), small_model_name)
+    large_tools = os.getenv("LLM_CASCADE_LARGE_TOOLS", "add_issue_comment,create_pull_request_review,update_issue")
+    logger.info(f"LLM cascade routing: {small_model_name} first, escalating to {large_model_name}")
+    return CascadeChatModel(
+        small=small, large=large, small_model_name=small_model_name, large_model_name=large_model_name,
+        small_timeout=float(os.getenv("LLM_SMALL_TIMEOUT_SECONDS", 30)),
+        max_small_input_tokens=int(os.getenv("LLM_CASCADE_MAX_SMALL_INPUT_TOKENS", 16000)),
+        simple_reply_chars=int(os.getenv("LLM_CASCADE_SIMPLE_REPLY_CHARS", 600)),
+        large_tools=[name.strip() for name in large_tools.split(",") if name.strip()],
+        min_mean_logprob=float(os.getenv("LLM_CASCADE_MIN_MEAN_LOGPROB", -1.0)))
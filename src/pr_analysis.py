@@ -0,0 +1,248 @@
+import asyncio
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.tools import BaseTool
+
+from .utils import logger
+from .metrics import REGISTRY
+
+PR_ANALYSIS_RUNS = REGISTRY.counter(
+    "repo_assistant_pr_analysis_total",
+    "Local PR diff analyses run before the PR agent, by result (ok, partial, failed).", ["result"])
+
+LANGUAGES = {
+    ".py": "Python", ".pyi": "Python", ".ipynb": "Jupyter", ".js": "JavaScript", ".jsx": "JavaScript",
+    ".mjs": "JavaScript", ".cjs": "JavaScript", ".ts": "TypeScript", ".tsx": "TypeScript", ".go": "Go",
+    ".rs": "Rust", ".java": "Java", ".kt": "Kotlin", ".scala": "Scala", ".c": "C", ".h": "C/C++",
+    ".cc": "C++", ".cpp": "C++", ".hpp": "C++", ".cs": "C#", ".rb": "Ruby", ".php": "PHP", ".swift": "Swift",
+    ".sh": "Shell", ".bash": "Shell", ".sql": "SQL", ".html": "HTML", ".css": "CSS", ".scss": "CSS",
+    ".vue": "Vue", ".md": "Markdown", ".rst": "reStructuredText", ".txt": "Text", ".json": "JSON",
+    ".yml": "YAML", ".yaml": "YAML", ".toml": "TOML", ".ini": "INI", ".cfg": "INI", ".xml": "XML",
+    ".proto": "Protobuf", ".tf": "Terraform",
+}
+_LANGUAGE_BY_NAME = {"Dockerfile": "Docker", "Makefile": "Make", "CMakeLists.txt": "CMake"}
+
+# Lockfiles, vendored dependencies, build output and code generators' files: counted but not worth reviewing
+_GENERATED_PATTERNS = [re.compile(pattern) for pattern in (
+    r"(^|/)(package-lock\.json|yarn\.lock|pnpm-lock\.yaml|poetry\.lock|uv\.lock|Pipfile\.lock|Cargo\.lock|"
+    r"go\.sum|composer\.lock|Gemfile\.lock)$",
+    r"(^|/)(vendor|third_party|node_modules|dist|build|site-packages|__generated__)/",
+    r"\.min\.(js|css)$", r"\.(map|snap|pb\.go|lock)$", r"_pb2(_grpc)?\.pyi?$", r"\.generated\.\w+$", r"\.g\.dart$",
+)]
+_GENERATED_MARKER = re.compile(r"(Code generated .* DO NOT EDIT|@generated|auto-generated|autogenerated)", re.I)
+
+# Paths whose changes deserve a closer look, with the reason given to the agent
+_SENSITIVE_PATHS = [(re.compile(pattern, re.I), reason) for pattern, reason in (
+    (r"(^|/)\.github/workflows/", "CI workflow"),
+    (r"(^|/)(Dockerfile|docker-compose[^/]*\.ya?ml)$", "container build"),
+    (r"(^|/)(setup\.py|setup\.cfg|pyproject\.toml|requirements[^/]*\.txt|package\.json|Cargo\.toml|go\.mod|"
+     r"Gemfile|pom\.xml|build\.gradle(\.kts)?)$", "dependencies/packaging"),
+    (r"(^|[/_.-])(auth\w*|login|passw\w*|secrets?|tokens?|crypto\w*|permissions?|security|sessions?|oauth\w*)"
+     r"([/_.-]|$)", "security-sensitive"),
+    (r"(^|/)(migrations?|alembic)/|\.sql$", "database migration"),
+    (r"(^|/)\.env|(^|/)(settings|config)\.\w+$", "configuration"),
+)]
+# Added lines that deserve a closer look
+_RISKY_ADDITIONS = [(re.compile(pattern), reason) for pattern, reason in (
+    (r"\b(eval|exec)\s*\(", "eval/exec"),
+    (r"subprocess\.\w+\(|os\.system\(|shell\s*=\s*True|child_process", "process execution"),
+    (r"pickle\.loads?\(|yaml\.load\((?![^)]*SafeLoader)|marshal\.loads", "unsafe deserialization"),
+    (r"(?i)(api[_-]?key|secret|password|token)\s*[:=]\s*['\"][^'\"]{8,}['\"]", "possible hardcoded secret"),
+    (r"verify\s*=\s*False|InsecureSkipVerify|rejectUnauthorized\s*:\s*false", "TLS verification disabled"),
+    (r"(?i)\b(TODO|FIXME|XXX|HACK)\b", "TODO/FIXME added"),
+)]
+_TEST_PATH = re.compile(r"(^|/)(tests?|__tests__|spec)/|(^|/)test_[^/]+$|_test\.\w+$|\.(test|spec)\.\w+$", re.I)
+
+
+def language_of(path: str) -> Optional[str]:
+    name = path.rsplit("/", 1)[-1]
+    return _LANGUAGE_BY_NAME.get(name) or LANGUAGES.get(os.path.splitext(name)[1].lower())
+
+
+def is_generated(path: str, patch: Optional[str] = None) -> bool:
+    """Whether a changed file is a lockfile, vendored, built or generated (by path, or a marker in its diff)."""
+    if any(pattern.search(path) for pattern in _GENERATED_PATTERNS):
+        return True
+    return bool(patch and _GENERATED_MARKER.search(patch[:2000]))
+
+
+def _parse_json_result(result: Any) -> Any:
+    if isinstance(result, str):
+        try:
+            return json.loads(result)
+        except json.JSONDecodeError:
+            return None
+    return result
+
+
+@dataclass
+class FileChange:
+    filename: str
+    status: str
+    additions: int
+    deletions: int
+    patch: Optional[str]
+    previous_filename: Optional[str] = None
+
+    @property
+    def churn(self) -> int:
+        return self.additions + self.deletions
+
+
+@dataclass
+class PRAnalysis:
+    """Locally computed overview of a PR's diff, injected into the PR agent's prompt."""
+    files: List[FileChange]
+    total_files: int  # As reported by GitHub (may exceed len(files) if the file list was truncated)
+    commits: Optional[int] = None
+    languages: Dict[str, int] = field(default_factory=dict)  # language -> changed lines
+    generated: List[str] = field(default_factory=list)
+    hotspots: List[Tuple[str, List[str]]] = field(default_factory=list)  # (file, reasons), riskiest first
+    tests_changed: bool = False
+
+    @property
+    def additions(self) -> int:
+        return sum(change.additions for change in self.files)
+
+    @property
+    def deletions(self) -> int:
+        return sum(change.deletions for change in self.files)
+
+    def to_prompt(self, max_files: int = 15, max_hotspots: int = 8) -> str:
+        """Compact text summary (a few hundred tokens at most, whatever the size of the PR)."""
+        reviewable = [change for change in self.files if change.filename not in self.generated]
+        lines = [f"*   Size: {self.total_files} files changed, +{self.additions} / -{self.deletions} lines"
+                 + (f", {self.commits} commits" if self.commits is not None else "")
+                 + (f" (file list truncated to the first {len(self.files)} files)" if self.total_files > len(self.files) else "")]
+        if self.languages:
+            lines.append("*   Languages (changed lines): " + ", ".join(
+                f"{language} {count}" for language, count in sorted(self.languages.items(), key=lambda kv: -kv[1])))
+        lines.append(f"*   Tests changed: {'yes' if self.tests_changed else 'no'}")
+        if self.generated:
+            shown = ", ".join(self.generated[:8]) + (f", … ({len(self.generated) - 8} more)" if len(self.generated) > 8 else "")
+            lines.append(f"*   Generated/vendored/lockfiles (no need to review): {shown}")
+        if reviewable:
+            lines.append("*   Files (largest changes first):")
+            for change in sorted(reviewable, key=lambda c: -c.churn)[:max_files]:
+                renamed = f" (renamed from {change.previous_filename})" if change.previous_filename else ""
+                no_patch = "" if change.patch or change.status == "removed" else ", diff not shown by GitHub (large or binary)"
+                lines.append(f"    - {change.filename}: {change.status}{renamed}, +{change.additions}/-{change.deletions}{no_patch}")
+            if len(reviewable) > max_files:
+                lines.append(f"    - … and {len(reviewable) - max_files} more files")
+        if self.hotspots:
+            lines.append("*   Risk hotspots:")
+            lines.extend(f"    - {filename}: {', '.join(reasons)}" for filename, reasons in self.hotspots[:max_hotspots])
+        return "\n".join(lines)
+
+
+def analyze_pr_files(files: List[Dict[str, Any]], total_files: Optional[int] = None,
+                     commits: Optional[int] = None) -> PRAnalysis:
+    """Computes diff statistics, languages, generated files and risk hotspots from GitHub's PR file list."""
+    changes = [FileChange(filename=f.get("filename", ""), status=f.get("status", "modified"),
+                          additions=int(f.get("additions") or 0), deletions=int(f.get("deletions") or 0),
+                          patch=f.get("patch"), previous_filename=f.get("previous_filename"))
+               for f in files if f.get("filename")]
+    analysis = PRAnalysis(files=changes, total_files=max(total_files or 0, len(changes)), commits=commits)
+    source_changed = False
+    scored = []
+    for change in changes:
+        if is_generated(change.filename, change.patch):
+            analysis.generated.append(change.filename)
+            continue
+        language = language_of(change.filename) or "Other"
+        if change.churn:
+            analysis.languages[language] = analysis.languages.get(language, 0) + change.churn
+        if _TEST_PATH.search(change.filename):
+            analysis.tests_changed = True
+            continue
+        if language not in ("Markdown", "reStructuredText", "Text"):
+            source_changed = True
+
+        reasons, score = [], 0
+        for pattern, reason in _SENSITIVE_PATHS:
+            if pattern.search(change.filename):
+                reasons.append(reason)
+                score += 3
+        if change.status == "removed":
+            reasons.append("file deleted")
+            score += 2
+        elif change.deletions > 50 and change.deletions > change.additions:
+            reasons.append(f"mostly deletions (-{change.deletions})")
+            score += 1
+        if change.churn >= 300:
+            reasons.append(f"large change ({change.churn} lines)")
+            score += 2
+        added = "\n".join(line[1:] for line in (change.patch or "").splitlines()
+                          if line.startswith("+") and not line.startswith("+++"))
+        for pattern, reason in _RISKY_ADDITIONS:
+            if pattern.search(added):
+                reasons.append(reason)
+                score += 1 if reason.startswith("TODO") else 3
+        if reasons:
+            scored.append((score, change.churn, change.filename, reasons))
+    analysis.hotspots = [(filename, reasons) for _, _, filename, reasons in sorted(scored, key=lambda s: (-s[0], -s[1]))]
+    if source_changed and not analysis.tests_changed:
+        analysis.hotspots.append(("(whole PR)", ["source code changed without test changes"]))
+    return analysis
+
+
+async def analyze_pull_request(files_tool: BaseTool, details_tool: Optional[BaseTool], owner: str, repo: str,
+                               pr_number: int, pr_data: Optional[Dict[str, Any]] = None) -> Optional[PRAnalysis]:
+    """
+    Fetches a PR's details and changed files concurrently (and the remaining file pages concurrently
+    when the tool supports pagination and the PR is large), then analyzes them locally.
+
+    Args:
+        files_tool: The get_pull_request_files tool.
+        details_tool: The get_pull_request tool, for the total file and commit counts (optional).
+        pr_data: The PR as listed, used instead of get_pull_request if it has the counts.
+
+    Returns:
+        The analysis, or None, after logging, if the files could not be fetched.
+    """
+    params = {"owner": owner, "repo": repo, "pullNumber": pr_number}
+    paginated = "page" in (files_tool.args or {})
+    per_page = 100
+    max_files = int(os.getenv("PR_ANALYSIS_MAX_FILES", 300))
+
+    async def fetch_files(page: Optional[int] = None) -> List[Dict[str, Any]]:
+        result = _parse_json_result(await files_tool.ainvoke(
+            {**params, "page": page, "perPage": per_page} if page else params))
+        if not isinstance(result, list):
+            raise ValueError(f"unexpected {files_tool.name} result: {str(result)[:200]}")
+        return result
+
+    async def fetch_details() -> Dict[str, Any]:
+        # list_pull_requests items lack the counts (changed_files, commits, ...) of the PR detail endpoint
+        if pr_data and "changed_files" in pr_data:
+            return pr_data
+        if details_tool is None:
+            return pr_data or {}
+        result = _parse_json_result(await details_tool.ainvoke(params))
+        return result if isinstance(result, dict) else (pr_data or {})
+
+    try:
+        details, first_page = await asyncio.gather(fetch_details(), fetch_files(1 if paginated else None))
+        files, result = list(first_page), "ok"
+        total_files = int(details.get("changed_files") or 0) or None
+        if paginated and total_files and total_files > len(files) == per_page:
+            last_page = min(-(-total_files // per_page), -(-max_files // per_page))
+            pages = await asyncio.gather(*(fetch_files(page) for page in range(2, last_page + 1)),
+                                         return_exceptions=True)
+            for page in pages:
+                if isinstance(page, BaseException):
+                    logger.warning(f"Could not fetch all files of PR #{pr_number}: {page}")
+                    result = "partial"
+                else:
+                    files.extend(page)
+        analysis = analyze_pr_files(files, total_files=total_files, commits=details.get("commits"))
+        PR_ANALYSIS_RUNS.inc(result=result)
+        return analysis
+    except Exception as e:
+        logger.warning(f"PR #{pr_number} pre-analysis failed, the agent will inspect the diff itself: {e}")
+        PR_ANALYSIS_RUNS.inc(result="failed")
+        return None
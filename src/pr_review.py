@@ -0,0 +1,228 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.language_models import BaseChatModel
+
+from .prompts import PR_CHUNK_REVIEW_PROMPT_TEMPLATE, PR_REVIEW_MERGE_PROMPT_TEMPLATE
+from .pr_analysis import FileChange, PRAnalysis
+from .usage import BudgetExceededError
+from .utils import logger
+from .metrics import REGISTRY
+
+PR_REVIEW_CHUNKS = REGISTRY.counter(
+    "repo_assistant_pr_review_chunks_total",
+    "Chunks of large PR diffs summarized in map-reduce review mode, by result (ok, failed, skipped).", ["result"])
+PR_REVIEW_MAP_DURATION = REGISTRY.histogram(
+    "repo_assistant_pr_review_map_duration_seconds",
+    "Wall-clock duration of the map (parallel chunk summaries) and merge stages of a map-reduce PR review.")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count (~4 characters per token, as count_tokens_approximately)."""
+    return len(text) // 4 + 1
+
+
+def module_of(path: str, depth: int = 2) -> str:
+    """Directory of a file, cut at `depth` levels ("src/auth/oauth/x.py" -> "src/auth")."""
+    parts = path.split("/")[:-1]
+    return "/".join(parts[:depth]) or "(root)"
+
+
+@dataclass
+class DiffChunk:
+    """Files of a PR reviewed by one LLM call: whole modules while they fit in the token budget."""
+    modules: List[str] = field(default_factory=list)
+    files: List[str] = field(default_factory=list)
+    text: str = ""
+    tokens: int = 0
+
+    @property
+    def area(self) -> str:
+        shown = ", ".join(self.modules[:4]) + (f" and {len(self.modules) - 4} more" if len(self.modules) > 4 else "")
+        return shown or "(root)"
+
+
+def _file_diff(change: FileChange, max_tokens: int) -> str:
+    header = f"--- {change.filename} ({change.status}, +{change.additions}/-{change.deletions})"
+    patch = change.patch or "(diff not available: large or binary file)"
+    max_chars = max_tokens * 4 - len(header) - 100
+    if len(patch) > max_chars:
+        patch = f"{patch[:max_chars]}\n… (diff truncated, {len(patch) - max_chars} more characters)"
+    return f"{header}\n{patch}\n"
+
+
+def chunk_pr_diff(changes: List[FileChange], max_tokens: int = 6000) -> List[DiffChunk]:
+    """
+    Splits a PR's file changes into chunks of at most ~`max_tokens` of diff, keeping the files of a
+    module (see module_of) together and in path order; modules too large for one chunk are split
+    by file, and a single file larger than a chunk has its diff truncated.
+    """
+    modules: Dict[str, List[Tuple[str, str]]] = {}
+    for change in sorted(changes, key=lambda c: c.filename):
+        modules.setdefault(module_of(change.filename), []).append((change.filename, _file_diff(change, max_tokens)))
+    chunks: List[DiffChunk] = []
+    current = DiffChunk()
+
+    def add(module: str, filename: str, diff: str):
+        nonlocal current
+        tokens = estimate_tokens(diff)
+        if current.files and current.tokens + tokens > max_tokens:
+            chunks.append(current)
+            current = DiffChunk()
+        if module not in current.modules:
+            current.modules.append(module)
+        current.files.append(filename)
+        current.text += diff
+        current.tokens += tokens
+
+    for module, diffs in modules.items():
+        module_tokens = sum(estimate_tokens(diff) for _, diff in diffs)
+        if current.files and current.tokens + module_tokens > max_tokens >= module_tokens:
+            chunks.append(current)  # Start the module in a fresh chunk rather than splitting it
+            current = DiffChunk()
+        for filename, diff in diffs:
+            add(module, filename, diff)
+    if current.files:
+        chunks.append(current)
+    return chunks
+
+
+def needs_chunked_review(analysis: PRAnalysis) -> bool:
+    """Whether a PR is too large for the agent to read: PR_REVIEW_CHUNKED_MIN_FILES files or
+    PR_REVIEW_CHUNKED_MIN_TOKENS tokens of diff (0 disables either threshold)."""
+    min_files = int(os.getenv("PR_REVIEW_CHUNKED_MIN_FILES", 100))
+    min_tokens = int(os.getenv("PR_REVIEW_CHUNKED_MIN_TOKENS", 30000))
+    reviewable = [change for change in analysis.files if change.filename not in analysis.generated]
+    diff_tokens = sum(estimate_tokens(change.patch or "") for change in reviewable)
+    return bool((min_files and len(reviewable) >= min_files) or (min_tokens and diff_tokens >= min_tokens))
+
+
+class ChunkedPRReviewer:
+    """
+    Map-reduce review of a very large PR: the diff is split into module chunks (chunk_pr_diff) that
+    are summarized by parallel LLM calls, at most `concurrency` at a time, and the summaries are
+    merged (by further parallel calls if they exceed `reduce_tokens`) into notes from which the PR
+    agent writes its single comment. With enough concurrency, the map stage takes as long as the
+    slowest chunk.
+    """
+
+    def __init__(self, llm: BaseChatModel, chunk_tokens: int = 6000, concurrency: int = 8,
+                 reduce_tokens: int = 8000, max_chunks: int = 60):
+        self.llm = llm
+        self.chunk_tokens = chunk_tokens
+        self.concurrency = max(1, concurrency)
+        self.reduce_tokens = reduce_tokens
+        self.max_chunks = max_chunks
+
+    @classmethod
+    def from_env(cls, llm: BaseChatModel) -> "ChunkedPRReviewer":
+        return cls(llm, chunk_tokens=int(os.getenv("PR_REVIEW_CHUNK_TOKENS", 6000)),
+                   concurrency=int(os.getenv("PR_REVIEW_CONCURRENCY", 8)),
+                   reduce_tokens=int(os.getenv("PR_REVIEW_REDUCE_TOKENS", 8000)),
+                   max_chunks=int(os.getenv("PR_REVIEW_MAX_CHUNKS", 60)))
+
+    async def _ask(self, prompt: str, semaphore: asyncio.Semaphore, config: Optional[Dict[str, Any]],
+                   tag: str) -> str:
+        async with semaphore:
+            response = await self.llm.ainvoke(prompt, config={**(config or {}), "tags": ["pr_review", tag]})
+        return str(response.content).strip()
+
+    @staticmethod
+    async def _run_all(coroutines) -> List[Any]:
+        """
+        Runs `coroutines` concurrently and returns their results in order. The first BudgetExceededError
+        cancels the calls still running or waiting for the semaphore, then is raised.
+        """
+        try:
+            async with asyncio.TaskGroup() as group:
+                tasks = [group.create_task(coroutine) for coroutine in coroutines]
+        except* BudgetExceededError as errors:
+            raise errors.exceptions[0] from None
+        return [task.result() for task in tasks]
+
+    async def _merge(self, summaries: List[str], pr_title: str, semaphore: asyncio.Semaphore,
+                     config: Optional[Dict[str, Any]]) -> List[str]:
+        """Merges groups of summaries until they fit in reduce_tokens (or cannot be merged further)."""
+        while len(summaries) > 1 and estimate_tokens("\n\n".join(summaries)) > self.reduce_tokens:
+            groups, group, group_tokens = [], [], 0
+            for summary in summaries:
+                if group and group_tokens + estimate_tokens(summary) > self.reduce_tokens // 2:
+                    groups.append(group)
+                    group, group_tokens = [], 0
+                group.append(summary)
+                group_tokens += estimate_tokens(summary)
+            groups.append(group)
+            if len(groups) == len(summaries):
+                break  # Each summary is already too large to pair with another
+            async def merge(group: List[str]):
+                try:
+                    return await self._ask(PR_REVIEW_MERGE_PROMPT_TEMPLATE.format(
+                        pr_title=pr_title, summaries="\n\n".join(group)), semaphore, config, "merge")
+                except BudgetExceededError:
+                    raise
+                except Exception as e:
+                    return e
+
+            merged = iter(await self._run_all([merge(group) for group in groups if len(group) > 1]))
+            failed = False
+            next_summaries = []
+            for group in groups:
+                result = next(merged) if len(group) > 1 else group[0]
+                if isinstance(result, Exception):
+                    logger.warning(f"Merging PR review summaries failed, keeping them unmerged: {result}")
+                    failed = True
+                    next_summaries.extend(group)
+                else:
+                    next_summaries.append(result)
+            summaries = next_summaries
+            if failed:
+                break
+        return summaries
+
+    async def review(self, pr_data: Dict[str, Any], analysis: PRAnalysis,
+                     config: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Returns review notes covering the whole diff (per-area summaries, merged when too long).
+
+        Args:
+            config: Run config (callbacks) for the LLM calls, so they count towards the run's usage and budget.
+        """
+        started = time.perf_counter()
+        pr_number, pr_title = pr_data.get("number"), pr_data.get("title", "(No Title)")
+        changes = [change for change in analysis.files if change.filename not in analysis.generated]
+        chunks = chunk_pr_diff(changes, self.chunk_tokens)
+        skipped = chunks[self.max_chunks:]
+        chunks = chunks[:self.max_chunks]
+        if skipped:
+            PR_REVIEW_CHUNKS.inc(len(skipped), result="skipped")
+        logger.info(f"Map-reduce review of PR #{pr_number}: {len(changes)} files in {len(chunks)} chunks "
+                    f"({self.concurrency} at a time)" + (f", {len(skipped)} chunks over the limit skipped" if skipped else ""))
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def summarize(chunk: DiffChunk) -> str:
+            prompt = PR_CHUNK_REVIEW_PROMPT_TEMPLATE.format(
+                pr_number=pr_number, pr_title=pr_title, pr_body=(pr_data.get("body") or "(No Description)")[:2000],
+                area=chunk.area, diff=chunk.text)
+            try:
+                summary = await self._ask(prompt, semaphore, config, "map")
+                PR_REVIEW_CHUNKS.inc(result="ok")
+                return f"### {chunk.area} ({len(chunk.files)} files)\n{summary}"
+            except BudgetExceededError:
+                raise  # Stops the whole run, as in the agent
+            except Exception as e:
+                logger.warning(f"PR #{pr_number}: summary of chunk '{chunk.area}' failed: {e}")
+                PR_REVIEW_CHUNKS.inc(result="failed")
+                return f"### {chunk.area} ({len(chunk.files)} files)\n(Not reviewed: {', '.join(chunk.files[:10])})"
+
+        summaries = await self._run_all([summarize(chunk) for chunk in chunks])
+        notes = await self._merge(list(summaries), pr_title, semaphore, config)
+        PR_REVIEW_MAP_DURATION.observe(time.perf_counter() - started)
+        if skipped:
+            files = [filename for chunk in skipped for filename in chunk.files]
+            notes.append(f"### Not reviewed ({len(files)} files over the review limit)\n"
+                         + ", ".join(files[:30]) + (" …" if len(files) > 30 else ""))
+        return "\n\n".join(notes)
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from langchain_core.tools import BaseTool
+
+from .tool_cache import CachingTool
+from .utils import logger
+from .metrics import REGISTRY
+
+PREFETCH_CALLS = REGISTRY.counter(
+    "repo_assistant_prefetch_calls_total",
+    "Tool calls made to warm the cache for upcoming items, by tool and result (ok, failed).", ["tool", "result"])
+
+_ISSUE_REFERENCE = re.compile(r"(?<![\w/&])#(\d+)\b")
+# Repository paths mentioned in a body (with a source or docs extension; not the path of a URL)
+_FILE_PATH = re.compile(r"(?<![\w/.:-])((?:[\w.-]+/)*[\w-][\w.-]*\.(?:py|js|ts|tsx|jsx|go|rs|java|rb|php|c|h|cpp|"
+                        r"cs|kt|swift|md|rst|txt|toml|yaml|yml|json|cfg|ini|sh))\b")
+
+# Upcoming items whose prefetch is running, so a new cycle doesn't schedule them again
+_prefetching: Set[Tuple[str, str, str, int]] = set()
+_tasks: Set[asyncio.Task] = set()
+
+
+def prefetch_targets(item: Dict[str, Any], item_type: str, owner: str, repo: str, tools_by_name: Dict[str, BaseTool],
+                     max_linked: int = 3, max_files: int = 3) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Tool calls (name, args) the eligibility check and the agent are likely to make first for an
+    item, with the exact arguments they use: its comments, the issues its body links to, a PR's
+    details and first page of files, and the repository files its body mentions.
+    """
+    number = item.get("number")
+    body = item.get("body") or ""
+    targets: List[Tuple[str, Dict[str, Any]]] = [
+        ("get_issue_comments", {"owner": owner, "repo": repo, "issue_number": number})]
+    if item_type == "pr":
+        params = {"owner": owner, "repo": repo, "pullNumber": number}
+        files_tool = tools_by_name.get("get_pull_request_files")
+        paginated = files_tool is not None and "page" in (files_tool.args or {})
+        targets.append(("get_pull_request_files", {**params, "page": 1, "perPage": 100} if paginated else params))
+        if "changed_files" not in item:
+            targets.append(("get_pull_request", params))
+    linked = list(dict.fromkeys(int(n) for n in _ISSUE_REFERENCE.findall(body) if int(n) != number))
+    targets += [("get_issue", {"owner": owner, "repo": repo, "issue_number": n}) for n in linked[:max_linked]]
+    paths = list(dict.fromkeys(path.removeprefix("./") for path in _FILE_PATH.findall(body)))
+    targets += [("get_readable_file_content", {"owner": owner, "repo": repo, "path": path})
+                for path in paths[:max_files]]
+    return [(name, args) for name, args in targets if isinstance(tools_by_name.get(name), CachingTool)]
+
+
+async def prefetch_items(tools: List[BaseTool], owner: str, repo: str, items: List[Dict[str, Any]],
+                         item_type: str):
+    """Warms the tool cache for `items`, one call at a time in the low-priority lane; failures are only logged."""
+    tools_by_name = {tool.name: tool for tool in tools}
+    try:
+        for item in items:
+            for name, args in prefetch_targets(item, item_type, owner, repo, tools_by_name):
+                tool = tools_by_name[name]
+                if tool.cache.contains(name, args):
+                    continue
+                try:
+                    await tool.prefetch(args)
+                    PREFETCH_CALLS.inc(tool=name, result="ok")
+                except Exception as e:
+                    PREFETCH_CALLS.inc(tool=name, result="failed")
+                    logger.debug(f"Prefetch of {name} {args} failed: {e}")
+            _prefetching.discard((owner, repo, item_type, item.get("number")))
+    finally:
+        _prefetching.difference_update((owner, repo, item_type, item.get("number")) for item in items)
+
+
+def start_prefetch(tools: List[BaseTool], owner: str, repo: str, items: List[Dict[str, Any]],
+                   current: Optional[Dict[str, Any]], item_type: str) -> Optional[asyncio.Task]:
+    """
+    Starts warming the tool cache, in the background, for the PREFETCH_NEXT_ITEMS items that follow
+    `current` in `items` (the queue the next cycles pick from), so their eligibility check and
+    first agent tool calls hit the cache. 0 (or tools without a cache) disables prefetching.
+
+    Returns:
+        The background task, or None if there is nothing to prefetch.
+    """
+    count = int(os.getenv("PREFETCH_NEXT_ITEMS", 3))
+    if count <= 0 or not any(isinstance(tool, CachingTool) for tool in tools):
+        return None
+    start = next((i + 1 for i, item in enumerate(items) if item is current), 0)
+    upcoming = [item for item in items[start:] if item.get("number")
+                and not (item_type == "issue" and "/pull/" in item.get("html_url", ""))  # list_issues lists PRs too
+                and (owner, repo, item_type, item["number"]) not in _prefetching][:count]
+    if not upcoming:
+        return None
+    _prefetching.update((owner, repo, item_type, item["number"]) for item in upcoming)
+    numbers = ", ".join(f"#{item['number']}" for item in upcoming)
+    logger.debug(f"Prefetching context of {item_type}s {numbers} of {owner}/{repo}")
+    task = asyncio.create_task(prefetch_items(tools, owner, repo, upcoming, item_type))
+    _tasks.add(task)  # Keep a reference until done
+    task.add_done_callback(_tasks.discard)
+    return task
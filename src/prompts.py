@@ -139,11 +139,14 @@ Your task is to review GitHub Pull Request #{pr_number} in the '{repo_name}' rep
 {pr_body}
 ---
 
+**Change Analysis (computed from the PR's diff):**
+{pr_analysis}
+
 **Instructions:**
-1.  **Analyze:** Review the PR's purpose and clarity based on the title and body. Use tools like `get_pull_request_files` or `get_pull_request_reviews` if needed to understand the scope or existing feedback.
+1.  **Analyze:** Review the PR's purpose and clarity based on the title and body, and its scope based on the change analysis above (no need to call `get_pull_request_files` again for that). Read the patches or files of the risk hotspots only if you need their details, and use `get_pull_request_reviews` if needed to see existing feedback.
 2.  **Execute Action:** Use the `add_issue_comment` tool to post a *single*, polite, and constructive review comment on the PR.
     *   If the PR seems clear and well-scoped, thank the contributor (@{pr_author}) and state that maintainers will review the code.
-    *   If the PR needs improvement (e.g., unclear description, very large changes suggested by `get_pull_request_files`), politely suggest specific improvements (like adding detail or splitting the PR).
+    *   If the PR needs improvement (e.g., unclear description, very large changes shown by the change analysis), politely suggest specific improvements (like adding detail or splitting the PR).
     *   **CRITICAL REMINDER: DO NOT MERGE THE PR.** You are only adding a comment.
 3.  **Confirm:** After adding the comment, confirm that the comment has been posted.
 """
@@ -191,4 +194,58 @@ Example User Questions & Typical Tool Paths:
 *   "Look up the API documentation for the `/users` endpoint." -> `browser_navigate` (docs_url), `browser_snapshot`, `browser_type` (search), `browser_click`
 
 Respond clearly, explaining the steps you took and the information you found. If you cannot fulfill a request, explain why.
-"""
\ No newline at end of file
+"""
+CONVERSATION_SUMMARY_PROMPT_TEMPLATE = """Summarize the earlier part of a conversation between a user and an AI assistant that answers questions about a GitHub repository with tools. The summary replaces those messages in the assistant's context, so keep everything needed to continue the conversation:
+- the user's questions and the answers given, with the concrete facts (file paths, function names, issue/PR numbers, URLs, commands, versions);
+- which tools were called on what (e.g. file paths read, searches made), so the assistant can call them again when it needs the details;
+- open questions or follow-ups the user asked for.
+Do not include raw file contents or page snapshots. Be concise; use bullet points.
+
+{previous_summary}Conversation to summarize:
+{conversation}
+"""
+KNOWLEDGE_PACK_PROMPT_TEMPLATE = """
+
+**Repository Knowledge Pack:**
+A precomputed digest of the repository is available through the `repo_knowledge` tool (instant, no GitHub API call): pass a directory path for its files with their purpose, size and main symbols, a file path for its classes/functions with line numbers, or a name to find where it is defined. Use it to locate the relevant files before reading them with `get_file_contents`, and read only the files you need. Overview of the root:
+{root_overview}
+"""
+
+PR_CHUNK_REVIEW_PROMPT_TEMPLATE = """You are reviewing one part of a very large GitHub Pull Request #{pr_number} ("{pr_title}"), split by module because the whole diff does not fit in one review. Other parts are reviewed separately.
+
+PR description (truncated):
+---
+{pr_body}
+---
+
+Diff of the area `{area}`:
+{diff}
+
+Write concise review notes for this area only (at most 150 words, bullet points):
+- what the changes do here;
+- concrete problems or risks (bugs, security, breaking changes, missing tests or docs), citing the file;
+- anything that looks unrelated to the PR's stated purpose.
+Do not repeat the diff. If the changes look fine, say so in one line.
+"""
+
+PR_REVIEW_MERGE_PROMPT_TEMPLATE = """Merge these review notes on different areas of the same large Pull Request ("{pr_title}") into one set of notes of at most 250 words. Keep every concrete problem or risk with its file, drop repetitions, and keep the area headings short.
+
+{summaries}
+"""
+
+PR_CHUNKED_REVIEW_SECTION_TEMPLATE = """
+
+**Review Notes on the Full Diff (map-reduce review, one summary per area):**
+This PR is too large to read file by file: its diff was already reviewed in chunks and summarized below. Base your single comment on these notes and the change analysis; open individual files only to check a specific point.
+{notes}"""
+
+ISSUE_BATCH_TRIAGE_PROMPT_TEMPLATE = """You are triaging the backlog of open issues of the GitHub repository {repo_full_name}. Classify each of the {count} issues below so that only the ones that need an in-depth investigation are handed to a (costly) assistant agent.
+
+Issues to classify (number, labels, author, title, then the beginning of the body):
+{issues}
+
+Other open issues (for duplicate detection):
+{other_issues}
+
+Classify every issue above exactly once. Use duplicate_candidate only when another listed issue clearly reports the same problem, and needs_info only when the report cannot be investigated without more details from its author. When in doubt, use valid_needs_agent. Write replies in the issue's language, addressed to its author, without promising fixes.
+"""
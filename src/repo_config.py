@@ -0,0 +1,110 @@
+import os
+import tomllib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Settings a [[repos]] entry may override; defaults come from [defaults], then the environment
+_REPO_SETTINGS = ("llm_provider", "llm_model", "issue_interval", "pr_interval", "enable_issues", "enable_prs",
+                  "issue_instructions", "pr_instructions")
+
+
+@dataclass
+class RepoConfig:
+    """Settings of one repository served by the multi-repository daemon."""
+    owner: str
+    repo: str
+    llm_provider: str
+    llm_model: str
+    issue_interval: int
+    pr_interval: int
+    enable_issues: bool = True
+    enable_prs: bool = True
+    issue_instructions: Optional[str] = None  # Extra system-prompt instructions for the Issue agent
+    pr_instructions: Optional[str] = None  # Extra system-prompt instructions for the PR agent
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.owner}/{self.repo}"
+
+
+@dataclass
+class DaemonConfig:
+    repos: List[RepoConfig] = field(default_factory=list)
+    max_concurrency: int = 2  # Cycles (across all repositories) running at the same time
+    stagger_seconds: float = 5.0  # Delay between the first cycles of consecutive repositories
+
+
+def _read_instructions(value: Optional[str], base_dir: str) -> Optional[str]:
+    """Instructions are given inline, or as "@path/to/file.md" relative to the config file."""
+    if value and value.startswith("@"):
+        instructions_path = os.path.join(base_dir, value[1:])
+        try:
+            with open(instructions_path, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError as e:
+            raise ValueError(f"Cannot read instructions file {instructions_path}: {e}") from e
+    return value
+
+
+def load_daemon_config(path: str) -> DaemonConfig:
+    """
+    Loads the multi-repository configuration from a TOML file:
+
+        [daemon]
+        max_concurrency = 2
+        stagger_seconds = 5
+
+        [defaults]            # Optional; falls back to LLM_PROVIDER, LLM_MODEL_NAME, *_FETCH_INTERVAL_SECONDS
+        llm_provider = "openai"
+        llm_model = "gpt-4o"
+        issue_interval = 300
+        pr_interval = 300
+
+        [[repos]]
+        owner = "warmshao"
+        repo = "repo-assistant"
+        pr_interval = 900
+        issue_instructions = "@prompts/repo-assistant-issues.md"
+
+    Raises:
+        ValueError: If the file is invalid or a repository entry is incomplete.
+    """
+    try:
+        with open(path, "rb") as f:
+            raw = tomllib.load(f)
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        raise ValueError(f"Cannot read daemon config {path}: {e}") from e
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    defaults: Dict[str, Any] = {
+        "llm_provider": os.getenv("LLM_PROVIDER", "openai"),
+        "llm_model": os.getenv("LLM_MODEL_NAME", "gpt-4o"),
+        "issue_interval": int(os.getenv("ISSUE_FETCH_INTERVAL_SECONDS", 300)),
+        "pr_interval": int(os.getenv("PR_FETCH_INTERVAL_SECONDS", 300)),
+        **raw.get("defaults", {}),
+    }
+    daemon = raw.get("daemon", {})
+    config = DaemonConfig(max_concurrency=int(daemon.get("max_concurrency", 2)),
+                          stagger_seconds=float(daemon.get("stagger_seconds", 5.0)))
+
+    seen = set()
+    for index, entry in enumerate(raw.get("repos", [])):
+        if not entry.get("owner") or not entry.get("repo"):
+            raise ValueError(f"repos[{index}] in {path} needs both 'owner' and 'repo'")
+        unknown = set(entry) - {"owner", "repo", *_REPO_SETTINGS}
+        if unknown:
+            raise ValueError(f"repos[{index}] in {path} has unknown settings: {sorted(unknown)}")
+        settings = {key: entry.get(key, defaults.get(key)) for key in _REPO_SETTINGS if key in entry or key in defaults}
+        repo_config = RepoConfig(owner=entry["owner"], repo=entry["repo"], **settings)
+        if repo_config.issue_interval <= 0 or repo_config.pr_interval <= 0:
+            raise ValueError(f"Fetch intervals of {repo_config.full_name} must be positive integers.")
+        if repo_config.full_name in seen:
+            raise ValueError(f"{repo_config.full_name} is listed more than once in {path}")
+        seen.add(repo_config.full_name)
+        repo_config.issue_instructions = _read_instructions(repo_config.issue_instructions, base_dir)
+        repo_config.pr_instructions = _read_instructions(repo_config.pr_instructions, base_dir)
+        config.repos.append(repo_config)
+
+    if not config.repos:
+        raise ValueError(f"No [[repos]] configured in {path}")
+    return config
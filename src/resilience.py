@@ -0,0 +1,365 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool
+
+from .utils import logger, is_write_tool, WrappedTool
+from .metrics import REGISTRY
+
+CALL_RETRIES = REGISTRY.counter(
+    "repo_assistant_call_retries_total", "Tool/LLM calls retried after a transient error, by target.", ["target"])
+CALL_RETRIES_EXHAUSTED = REGISTRY.counter(
+    "repo_assistant_call_retries_exhausted_total",
+    "Tool/LLM calls that still failed with a transient error after all attempts, by target.", ["target"])
+CIRCUIT_STATE = REGISTRY.gauge(
+    "repo_assistant_circuit_state", "Circuit breaker state per endpoint: 0 closed, 1 half-open, 2 open.", ["breaker"])
+CIRCUIT_REJECTIONS = REGISTRY.counter(
+    "repo_assistant_circuit_rejections_total", "Calls failed fast because the endpoint's circuit was open.",
+    ["breaker"])
+HEDGED_CALLS = REGISTRY.counter(
+    "repo_assistant_hedged_calls_total",
+    "Duplicate requests sent for slow reads, by tool and which request answered first (original, hedge).",
+    ["tool", "winner"])
+
+T = TypeVar("T")
+
+# Exceptions (by class name, anywhere in the MRO) raised by MCP transports and provider SDKs when a
+# call may succeed if simply repeated
+_TRANSIENT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError",
+                          "ServiceUnavailableError", "TransportError", "ClosedResourceError",
+                          "BrokenResourceError", "EndOfStream"}
+_TRANSIENT_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+# Idempotent reads worth hedging (MCP_HEDGE_TOOLS overrides)
+DEFAULT_HEDGED_TOOLS = ("get_issue,get_issue_comments,get_pull_request,get_pull_request_files,"
+                        "get_readable_file_content,list_issues,list_pull_requests")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Whether an error is worth retrying: timeouts, connection failures, rate limits and 5xx responses."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    if any(cls.__name__ in _TRANSIENT_ERROR_NAMES for cls in type(error).__mro__):
+        return True
+    status_code = getattr(error, "status_code", None) or getattr(getattr(error, "error", None), "code", None)
+    return isinstance(status_code, int) and status_code in _TRANSIENT_STATUS_CODES
+
+
+class CircuitBreaker:
+    """
+    Fails calls to an endpoint fast once it is down: after `failure_threshold` consecutive transient
+    failures the circuit opens and calls raise CircuitOpenError for `reset_seconds`; then one trial
+    call is let through (half-open), which closes the circuit if it succeeds and reopens it if not.
+    A threshold of 0 disables the breaker.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        CIRCUIT_STATE.set(0, breaker=name)
+
+    def _set_state(self, state: str):
+        if state == "open":
+            logger.warning(f"Circuit breaker '{self.name}' opened after {self._failures} failures; "
+                           f"failing calls fast for {self.reset_seconds:.0f}s")
+        elif state != self.state:
+            logger.info(f"Circuit breaker '{self.name}': {self.state} -> {state}")
+        self.state = state
+        CIRCUIT_STATE.set({"closed": 0, "half_open": 1, "open": 2}[state], breaker=self.name)
+
+    def before_call(self):
+        """Raises CircuitOpenError if the call must not be made."""
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._set_state("half_open")
+        if self.state == "open" or (self.state == "half_open" and self._trial_running):
+            CIRCUIT_REJECTIONS.inc(breaker=self.name)
+            raise CircuitOpenError(f"'{self.name}' is unavailable (circuit open after {self._failures} failures); "
+                                   f"retrying in {self.reset_seconds:.0f}s")
+        if self.state == "half_open":
+            self._trial_running = True
+
+    def record_success(self):
+        self._failures = 0
+        self._trial_running = False
+        self._set_state("closed")
+
+    def record_cancelled(self):
+        """A call was cancelled before its outcome was known: a half-open trial gives way to the next call."""
+        if self.state == "half_open" and self._trial_running:
+            self._trial_running = False
+            self.state = "open"  # Already past reset_seconds: the next call becomes the trial
+            CIRCUIT_STATE.set(2, breaker=self.name)
+
+    def record_failure(self):
+        self._failures += 1
+        self._trial_running = False
+        if self.failure_threshold and (self.state == "half_open" or self._failures >= self.failure_threshold):
+            self._opened_at = time.monotonic()
+            self._set_state("open")
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """The process-wide breaker of an endpoint (CIRCUIT_FAILURE_THRESHOLD failures, CIRCUIT_RESET_SECONDS)."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(
+                name, failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5)),
+                reset_seconds=float(os.getenv("CIRCUIT_RESET_SECONDS", 30)))
+        return breaker
+
+
+@dataclass
+class RetryPolicy:
+    """Up to `attempts` tries per call, sleeping a random time up to base_delay * 2^n (capped at max_delay) between."""
+    attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        return cls(attempts=max(1, int(os.getenv("RETRY_MAX_ATTEMPTS", 3))),
+                   base_delay=float(os.getenv("RETRY_BASE_DELAY_SECONDS", 0.5)),
+                   max_delay=float(os.getenv("RETRY_MAX_DELAY_SECONDS", 8)))
+
+    def delay(self, retry: int) -> float:
+        """Full-jitter backoff before the given retry (0-based), so clients that failed together don't retry together."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+async def _hedged(func: Callable[[], Awaitable[T]], hedge_after: float, name: str) -> T:
+    """Runs `func`, and a duplicate if it has not answered after `hedge_after` seconds; the first success wins."""
+    original = asyncio.ensure_future(func())
+    pending = {original}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=hedge_after)
+        if done:
+            return original.result()
+        hedge = asyncio.ensure_future(func())
+        pending.add(hedge)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    HEDGED_CALLS.inc(tool=name, winner="hedge" if task is hedge else "original")
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _after_failure(error: Exception, attempt: int, attempts: int, name: str, policy: RetryPolicy,
+                   breaker: Optional[CircuitBreaker]) -> float:
+    """Records a failed attempt; returns the delay before the next one, or raises `error` if there is none."""
+    if not is_transient_error(error):
+        if breaker:
+            breaker.record_success()  # The endpoint answered; the request itself was refused
+        raise error
+    target = breaker.name if breaker else name
+    if breaker:
+        breaker.record_failure()
+    if attempt + 1 >= attempts:
+        if attempts > 1:
+            CALL_RETRIES_EXHAUSTED.inc(target=target)
+        raise error
+    delay = policy.delay(attempt)
+    CALL_RETRIES.inc(target=target)
+    logger.warning(f"{name} failed ({type(error).__name__}: {error}); retry {attempt + 1}/{attempts - 1} "
+                   f"in {delay:.1f}s")
+    return delay
+
+
+async def call_with_retries(func: Callable[[], Awaitable[T]], name: str, policy: RetryPolicy,
+                            breaker: Optional[CircuitBreaker] = None, retry: bool = True,
+                            hedge_after: float = 0.0) -> T:
+    """
+    Calls `func` through `breaker`, retrying transient errors (see is_transient_error) with jittered backoff.
+
+    Args:
+        name: What is called (for logs and hedging metrics).
+        retry: False for non-idempotent calls: they go through the breaker but are made only once.
+        hedge_after: If > 0, a duplicate request is sent when an attempt takes longer (idempotent reads only).
+
+    Raises:
+        CircuitOpenError: The breaker is open.
+        Exception: The call's last error.
+    """
+    attempts = policy.attempts if retry else 1
+    for attempt in range(attempts):
+        if breaker:
+            breaker.before_call()
+        try:
+            result = await (_hedged(func, hedge_after, name) if hedge_after > 0 else func())
+        except asyncio.CancelledError:
+            # e.g. a deadline or the cascade's small-model timeout; CancelledError is not an Exception
+            if breaker:
+                breaker.record_cancelled()
+            raise
+        except Exception as e:
+            await asyncio.sleep(_after_failure(e, attempt, attempts, name, policy, breaker))
+        else:
+            if breaker:
+                breaker.record_success()
+            return result
+
+
+def call_with_retries_sync(func: Callable[[], T], name: str, policy: RetryPolicy,
+                           breaker: Optional[CircuitBreaker] = None, retry: bool = True) -> T:
+    """call_with_retries for blocking calls (without hedging): the backoff sleeps the calling thread."""
+    attempts = policy.attempts if retry else 1
+    for attempt in range(attempts):
+        if breaker:
+            breaker.before_call()
+        try:
+            result = func()
+        except Exception as e:
+            time.sleep(_after_failure(e, attempt, attempts, name, policy, breaker))
+        else:
+            if breaker:
+                breaker.record_success()
+            return result
+
+
+class ResilientTool(WrappedTool):
+    """
+    Calls a tool through its server's circuit breaker, retrying transient errors unless it writes
+    (`retry`), and sending a duplicate request when a read takes more than `hedge_after` seconds.
+    """
+    breaker: Any
+    policy: Any
+    retry: bool = True
+    hedge_after: float = 0.0
+
+    def _run(self, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return call_with_retries_sync(lambda: self.inner.invoke(kwargs), self.name, self.policy, self.breaker,
+                                      retry=self.retry)
+
+    async def _arun(self, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return await call_with_retries(lambda: self.inner.ainvoke(kwargs), self.name, self.policy, self.breaker,
+                                       retry=self.retry, hedge_after=self.hedge_after)
+
+
+def wrap_tools_with_resilience(tools: List[BaseTool], server_of: Optional[Dict[str, str]] = None) -> List[BaseTool]:
+    """
+    Routes tool calls through retries (RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY_SECONDS, RETRY_MAX_DELAY_SECONDS)
+    and one circuit breaker per MCP server (`server_of` maps tool names to servers). Write tools are
+    not retried. Reads in MCP_HEDGE_TOOLS get a duplicate request after MCP_HEDGE_AFTER_SECONDS (0, the
+    default, disables hedging). Tools are returned in the same order.
+    """
+    policy = RetryPolicy.from_env()
+    hedge_after = float(os.getenv("MCP_HEDGE_AFTER_SECONDS", 0))
+    hedged = {name.strip() for name in os.getenv("MCP_HEDGE_TOOLS", DEFAULT_HEDGED_TOOLS).split(",")}
+    server_of = server_of or {}
+    return [ResilientTool.wrap(tool, policy=policy, breaker=get_breaker(f"mcp:{server_of.get(tool.name, 'default')}"),
+                               retry=not is_write_tool(tool.name),
+                               hedge_after=hedge_after if tool.name in hedged else 0.0)
+            for tool in tools]
+
+
+def tool_servers(server_tools: Dict[str, Iterable[Any]]) -> Dict[str, str]:
+    """Tool name -> server name, from tools (or manifest entries) grouped by server."""
+    server_of = {}
+    for server, server_tools_list in server_tools.items():
+        for tool in server_tools_list:
+            server_of[tool["name"] if isinstance(tool, dict) else tool.name] = server
+    if "get_file_contents" in server_of:
+        server_of["get_readable_file_content"] = server_of["get_file_contents"]  # The decoding wrapper
+    return server_of
+
+
+class ResilientChatModel(BaseChatModel):
+    """
+    A provider chat model called with retries of transient errors and through its endpoint's circuit
+    breaker, in both the async and the sync (blocking) API. It is transparent otherwise: callbacks, token
+    streaming and usage are those of the inner model. A streamed call is only retried if it fails before
+    its first chunk; sync streaming (_stream) is not overridden and goes through _generate.
+    """
+    inner: Any
+    breaker: Any
+    policy: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return self.inner._llm_type
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return self.inner._identifying_params
+
+    def _get_ls_params(self, stop: Optional[List[str]] = None, **kwargs: Any) -> Dict[str, Any]:
+        return self.inner._get_ls_params(stop=stop, **kwargs)
+
+    def _get_invocation_params(self, stop: Optional[List[str]] = None, **kwargs: Any) -> Dict[str, Any]:
+        return self.inner._get_invocation_params(stop=stop, **kwargs)
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        # Let the provider format the tools, then bind the same arguments to this model
+        return self.bind(**self.inner.bind_tools(tools, **kwargs).kwargs)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return await call_with_retries(
+            lambda: self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            f"LLM call to {self.breaker.name}", self.policy, self.breaker)
+
+    def _should_stream(self, *, async_api: bool, run_manager: Any = None, **kwargs: Any) -> bool:
+        if not async_api:
+            return False  # No _stream: sync streaming falls back to _generate
+        return self.inner._should_stream(async_api=async_api, run_manager=run_manager, **kwargs)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        streams = []
+
+        async def first_chunk() -> Optional[ChatGenerationChunk]:
+            # A new stream per attempt: once chunks were emitted, the call can no longer be retried
+            streams.append(self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs))
+            try:
+                return await streams[-1].__anext__()
+            except StopAsyncIteration:
+                return None
+
+        first = await call_with_retries(first_chunk, f"LLM stream from {self.breaker.name}", self.policy,
+                                        self.breaker)
+        if first is None:
+            return
+        yield first
+        async for chunk in streams[-1]:
+            yield chunk
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return call_with_retries_sync(
+            lambda: self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            f"LLM call to {self.breaker.name}", self.policy, self.breaker)
+
+
+def wrap_llm_with_resilience(llm: BaseChatModel, endpoint: str) -> BaseChatModel:
+    """Wraps a provider model in a ResilientChatModel sharing the circuit breaker of `endpoint`."""
+    return ResilientChatModel(inner=llm, breaker=get_breaker(f"llm:{endpoint}"), policy=RetryPolicy.from_env())
@@ -0,0 +1,153 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, List, Optional, Set
+
+from src.utils import logger
+from src.metrics import REGISTRY
+
+SCHEDULER_LAG = REGISTRY.histogram(
+    "repo_assistant_scheduler_lag_seconds", "Delay between a scheduled job's due time and its start.")
+SCHEDULER_RUNNING = REGISTRY.gauge(
+    "repo_assistant_scheduler_running_jobs", "Scheduled jobs currently running.")
+POLL_INTERVAL = REGISTRY.gauge(
+    "repo_assistant_poll_interval_seconds", "Effective interval before the next poll, by polling job.", ["job"])
+POLLS = REGISTRY.counter(
+    "repo_assistant_polls_total", "Polls by job and result (hit: the poll found work, miss: it did not).",
+    ["job", "result"])
+POLL_HIT_RATE = REGISTRY.gauge(
+    "repo_assistant_poll_hit_rate", "Share of the job's recent polls that found work.", ["job"])
+
+
+class AdaptiveInterval:
+    """
+    Polling interval driven by activity: a poll that finds work (a hit) brings the interval down to
+    `min_interval`, so bursts are followed closely, and each poll without work multiplies it by
+    `backoff` up to `max_interval`, so quiet repositories are polled less and less often.
+    The first interval is `base`.
+    """
+
+    def __init__(self, name: str, base: float, min_interval: float, max_interval: float, backoff: float = 2.0,
+                 window: int = 20):
+        self.name = name
+        self.min_interval = min(min_interval, base)
+        self.max_interval = max(max_interval, base)
+        self.backoff = max(backoff, 1.0)
+        self.current = float(base)
+        self._recent = deque(maxlen=window)
+        POLL_INTERVAL.set(self.current, job=name)
+
+    @classmethod
+    def from_env(cls, name: str, base: float) -> "AdaptiveInterval":
+        """
+        Built from POLL_MIN_INTERVAL_SECONDS (default: the smaller of 30 and `base`), POLL_MAX_INTERVAL_SECONDS
+        (default: 4 x `base`) and POLL_BACKOFF_FACTOR (default 2). ADAPTIVE_POLLING=false keeps `base` fixed.
+        """
+        if os.getenv("ADAPTIVE_POLLING", "true").lower() in ("0", "false", "no"):
+            return cls(name, base, base, base, 1.0)
+        return cls(name, base, min_interval=float(os.getenv("POLL_MIN_INTERVAL_SECONDS", min(30.0, base))),
+                   max_interval=float(os.getenv("POLL_MAX_INTERVAL_SECONDS", base * 4)),
+                   backoff=float(os.getenv("POLL_BACKOFF_FACTOR", 2.0)))
+
+    @property
+    def hit_rate(self) -> float:
+        return sum(self._recent) / len(self._recent) if self._recent else 0.0
+
+    def record(self, hit: bool) -> float:
+        """Records a poll's outcome and returns the interval until the next poll."""
+        self._recent.append(1 if hit else 0)
+        POLLS.inc(job=self.name, result="hit" if hit else "miss")
+        POLL_HIT_RATE.set(self.hit_rate, job=self.name)
+        previous = self.current
+        if hit:
+            self.current = self.min_interval
+        else:
+            self.current = min(self.current * self.backoff, self.max_interval)
+        POLL_INTERVAL.set(self.current, job=self.name)
+        if self.current != previous:
+            logger.info(f"[Scheduler] {self.name}: next poll in {self.current:.0f}s "
+                        f"({'activity' if hit else 'idle'}; hit rate {self.hit_rate:.0%} over {len(self._recent)} polls)")
+        return self.current
+
+
+@dataclass(order=True)
+class _ScheduledJob:
+    due: float
+    seq: int
+    name: str = field(compare=False)
+    func: Callable[[], Awaitable[Any]] = field(compare=False)
+    interval: float = field(compare=False)
+    adaptive: Optional[AdaptiveInterval] = field(default=None, compare=False)
+
+
+class PollingScheduler:
+    """
+    Runs many periodic jobs (e.g. an issue cycle and a PR cycle per repository) from a single loop,
+    with at most `max_concurrency` jobs running at a time.
+
+    Like the single-repository loops, a job's next run is due `interval` seconds after its previous
+    run started (immediately if the run took longer), and a job never overlaps with itself. With an
+    AdaptiveInterval, the interval follows the job's results (a truthy result is a hit).
+    """
+
+    def __init__(self, max_concurrency: int = 2):
+        self.max_concurrency = max(1, max_concurrency)
+        self._jobs: List[_ScheduledJob] = []
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._running: Set[asyncio.Task] = set()
+
+    def add_job(self, name: str, func: Callable[[], Awaitable[Any]], interval: float, initial_delay: float = 0.0,
+                adaptive: Optional[AdaptiveInterval] = None):
+        """Schedules `func` every `interval` seconds (or as `adaptive` decides), the first run after `initial_delay`."""
+        heapq.heappush(self._jobs, _ScheduledJob(time.time() + initial_delay, next(self._seq), name, func, interval,
+                                                 adaptive))
+        self._wake.set()
+
+    async def _run_job(self, job: _ScheduledJob, slots: asyncio.Semaphore):
+        started = time.time()
+        SCHEDULER_LAG.observe(max(started - job.due, 0))
+        SCHEDULER_RUNNING.inc()
+        result = None
+        try:
+            result = await job.func()
+        except Exception as e:
+            logger.error(f"[Scheduler] Job '{job.name}' failed: {e}", exc_info=True)
+        finally:
+            SCHEDULER_RUNNING.dec()
+            slots.release()
+            job.due = started + (job.adaptive.record(bool(result)) if job.adaptive else job.interval)
+            job.seq = next(self._seq)
+            heapq.heappush(self._jobs, job)
+            self._wake.set()
+
+    async def run(self):
+        """Runs the jobs until cancelled; cancelling also cancels the jobs in flight."""
+        slots = asyncio.Semaphore(self.max_concurrency)
+        logger.info(f"[Scheduler] Running {len(self._jobs)} jobs with up to {self.max_concurrency} concurrently.")
+        try:
+            while True:
+                self._wake.clear()
+                wait_time = self._jobs[0].due - time.time() if self._jobs else None
+                if wait_time is None or wait_time > 0:
+                    try:
+                        # Not wait_for: it drops a cancellation that arrives as the wake event is set
+                        async with asyncio.timeout(wait_time):
+                            await self._wake.wait()
+                    except TimeoutError:
+                        pass
+                    continue
+                await slots.acquire()
+                job = heapq.heappop(self._jobs)
+                logger.debug(f"[Scheduler] Starting job '{job.name}'.")
+                task = asyncio.create_task(self._run_job(job, slots), name=job.name)
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+        finally:
+            for task in list(self._running):
+                task.cancel()
+            await asyncio.gather(*self._running, return_exceptions=True)
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from src.utils import logger
+
+
+class StartupError(Exception):
+    """Raised when a startup step fails; carries the name of the failing step."""
+
+    def __init__(self, step_name: str, error: BaseException):
+        super().__init__(f"Startup step '{step_name}' failed: {error}")
+        self.step_name = step_name
+        self.error = error
+
+
+@dataclass
+class StartupStep:
+    name: str
+    func: Callable[[Dict[str, Any]], Awaitable[Any]]
+    depends_on: Sequence[str] = ()
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    status: str = "pending"
+
+
+@dataclass
+class StartupPipeline:
+    """
+    Runs async startup steps as soon as their dependencies are done.
+
+    Each step is an async callable receiving a dict with the results of the steps it depends on.
+    Independent steps run concurrently; the first failing step cancels the rest of the pipeline.
+    """
+    steps: Dict[str, StartupStep] = field(default_factory=dict)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def add_step(self, name: str, func: Callable[[Dict[str, Any]], Awaitable[Any]],
+                 depends_on: Sequence[str] = ()):
+        """Registers a step. Dependencies must be registered before their dependents."""
+        if name in self.steps:
+            raise ValueError(f"Duplicate startup step: {name}")
+        for dependency in depends_on:
+            if dependency not in self.steps:
+                raise ValueError(f"Startup step '{name}' depends on unknown step '{dependency}'")
+        self.steps[name] = StartupStep(name=name, func=func, depends_on=tuple(depends_on))
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Runs all steps and returns their results by step name.
+
+        Raises:
+            StartupError: If any step raises; pending and running steps are cancelled.
+        """
+        self.started_at = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_step(step: StartupStep) -> Any:
+            dependency_results = {}
+            for dependency in step.depends_on:
+                dependency_results[dependency] = await tasks[dependency]
+            step.started_at = time.perf_counter()
+            step.status = "running"
+            logger.debug(f"[Startup] Starting step '{step.name}'.")
+            try:
+                result = await step.func(dependency_results)
+            except asyncio.CancelledError:
+                step.status = "cancelled"
+                raise
+            except Exception as e:
+                step.status = "failed"
+                raise StartupError(step.name, e) from e
+            finally:
+                step.finished_at = time.perf_counter()
+            step.status = "done"
+            logger.debug(f"[Startup] Step '{step.name}' done in {step.finished_at - step.started_at:.2f}s.")
+            return result
+
+        for step in self.steps.values():
+            tasks[step.name] = asyncio.create_task(run_step(step), name=f"startup:{step.name}")
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            self.finished_at = time.perf_counter()
+        return {name: task.result() for name, task in tasks.items()}
+
+    def timing_report(self) -> str:
+        """Formats a per-step timing table (offsets relative to the pipeline start)."""
+        if self.started_at is None:
+            return "Startup pipeline has not run."
+        lines: List[str] = ["Startup timing report:"]
+        for step in sorted(self.steps.values(), key=lambda s: s.started_at or float("inf")):
+            if step.started_at is None:
+                lines.append(f"  {step.name:<14} {step.status}")
+                continue
+            finished_at = step.finished_at or time.perf_counter()
+            lines.append(
+                f"  {step.name:<14} start +{step.started_at - self.started_at:6.2f}s  "
+                f"took {finished_at - step.started_at:6.2f}s  {step.status}"
+                + (f"  (after {', '.join(step.depends_on)})" if step.depends_on else ""))
+        total = (self.finished_at or time.perf_counter()) - self.started_at
+        sequential = sum(
+            (step.finished_at or 0) - step.started_at for step in self.steps.values() if step.started_at)
+        lines.append(f"  total {total:.2f}s wall clock ({sequential:.2f}s if run sequentially)")
+        return "\n".join(lines)
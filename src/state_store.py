@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from src.utils import logger, get_cache_dir
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS item_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    repo TEXT NOT NULL,
+    item_type TEXT NOT NULL,
+    item_number INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    status TEXT NOT NULL,
+    model TEXT,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_item_runs_day ON item_runs (day);
+CREATE INDEX IF NOT EXISTS idx_item_runs_item ON item_runs (repo, item_type, item_number);
+"""
+
+
+def utc_day(timestamp: Optional[float] = None) -> str:
+    """Returns the UTC calendar day (YYYY-MM-DD) used to bucket daily budgets."""
+    return datetime.fromtimestamp(timestamp or time.time(), tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+class StateStore:
+    """
+    Small SQLite store for per-item run records (status, token usage, cost).
+
+    Calls are synchronous but cheap (local disk, a handful of rows per run), and are
+    serialized with a lock so the store can be shared by the asyncio loops and threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def record_run(self, repo: str, item_type: str, item_number: int, started_at: float, finished_at: float,
+                   status: str, model: Optional[str] = None, input_tokens: int = 0, output_tokens: int = 0,
+                   cached_tokens: int = 0, cost_usd: float = 0.0) -> int:
+        """Stores one finished agent run and returns its row id."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO item_runs (repo, item_type, item_number, day, started_at, finished_at, status, model, "
+                "input_tokens, output_tokens, cached_tokens, cost_usd) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (repo, item_type, item_number, utc_day(started_at), started_at, finished_at, status, model,
+                 input_tokens, output_tokens, cached_tokens, cost_usd))
+            return cursor.lastrowid
+
+    def daily_cost(self, day: Optional[str] = None) -> float:
+        """Total recorded LLM cost (USD) for a UTC day, today by default."""
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(SUM(cost_usd), 0) FROM item_runs WHERE day = ?",
+                                     (day or utc_day(),)).fetchone()
+        return float(row[0])
+
+    def recent_runs(self, repo: str, item_type: str, item_number: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """Latest run records for one item, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM item_runs WHERE repo = ? AND item_type = ? AND item_number = ? "
+                "ORDER BY started_at DESC LIMIT ?", (repo, item_type, item_number, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def recent_runs_by_item(self, repo: str, item_type: str, limit: int = 10) -> Dict[int, List[Dict[str, Any]]]:
+        """Latest run records of every item of a type in a repository (one query), newest first per item."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY item_number ORDER BY started_at DESC) "
+                "AS run_rank FROM item_runs WHERE repo = ? AND item_type = ?) WHERE run_rank <= ? "
+                "ORDER BY item_number, run_rank", (repo, item_type, limit)).fetchall()
+        runs: Dict[int, List[Dict[str, Any]]] = {}
+        for row in rows:
+            run = dict(row)
+            del run["run_rank"]
+            runs.setdefault(run["item_number"], []).append(run)
+        return runs
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_state_store: Optional[StateStore] = None
+
+
+def get_state_store() -> StateStore:
+    """Returns the process-wide state store (STATE_DB_PATH, defaulting to the local cache dir)."""
+    global _state_store
+    if _state_store is None:
+        path = os.getenv("STATE_DB_PATH") or str(get_cache_dir() / "state.sqlite3")
+        logger.info(f"Opening state store at {path}")
+        _state_store = StateStore(path)
+    return _state_store
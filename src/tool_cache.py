@@ -0,0 +1,245 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool
+
+from .comment_cache import CommentThreadCache
+from .utils import logger, is_write_tool, WrappedTool
+from .metrics import REGISTRY, CACHE_HITS
+
+TOOL_CACHE_LOOKUPS = REGISTRY.counter(
+    "repo_assistant_tool_cache_lookups_total",
+    "Cacheable tool calls by lane (foreground, prefetch) and result (hit, joined an in-flight call, miss).",
+    ["lane", "result"])
+
+# Read-only GitHub tools whose results can be reused for a short while (TOOL_CACHE_TOOLS overrides)
+DEFAULT_CACHEABLE_TOOLS = ("get_me,get_issue,get_issue_comments,get_pull_request,get_pull_request_files,"
+                           "get_readable_file_content")
+# Reads of this tool without a `since` argument are served by the incremental CommentThreadCache, one page at a time
+COMMENTS_TOOL = "get_issue_comments"
+# Comments per page when the call names none (GitHub's default)
+DEFAULT_COMMENTS_PAGE_SIZE = 30
+_PAGE_ARGS = ("page", "per_page", "perPage")
+_ITEM_ARGS = ("issue_number", "pullNumber", "pull_number")
+
+
+def _cache_key(tool_name: str, args: Dict[str, Any]) -> str:
+    return tool_name + json.dumps({k: v for k, v in args.items() if v is not None}, sort_keys=True, default=str)
+
+
+def _item_of(args: Dict[str, Any]) -> Tuple[Any, Any, Any]:
+    number = next((args[name] for name in _ITEM_ARGS if args.get(name) is not None), None)
+    return args.get("owner"), args.get("repo"), str(number) if number is not None else None
+
+
+class ToolResultCache:
+    """
+    Short-lived results of read-only tool calls, shared by everything calling the same tools (the
+    agents, the eligibility checks and the prefetcher, see src.prefetch). Comment threads are kept
+    in `threads` (see CommentThreadCache).
+
+    Identical concurrent calls share one request: a caller arriving while a call is in flight
+    (e.g. an agent asking for comments being prefetched) waits for it instead of sending another.
+    Prefetch calls run in a low-priority lane: they wait while any foreground call is in flight,
+    so warming the cache for upcoming items never delays the current one.
+    """
+
+    def __init__(self, ttl_seconds: float = 120.0, max_entries: int = 1024,
+                 threads: Optional[CommentThreadCache] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.threads = threads or CommentThreadCache(fresh_seconds=ttl_seconds)
+        self._entries: "OrderedDict[str, Tuple[float, Tuple[Any, Any, Any], Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._foreground_calls = 0
+
+    def _get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, _, result = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, result
+
+    def _put(self, key: str, item: Tuple[Any, Any, Any], result: Any):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, item, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def contains(self, tool_name: str, args: Dict[str, Any]) -> bool:
+        return self._get(_cache_key(tool_name, args))[0]
+
+    def invalidate_item(self, args: Dict[str, Any]):
+        """Drops the cached results of the item (or, without an item number, the repository) in `args`."""
+        owner, repo, number = _item_of(args)
+        stale = [key for key, (_, item, _) in self._entries.items()
+                 if item[:2] == (owner, repo) and (number is None or item[2] in (number, None))]
+        for key in stale:
+            del self._entries[key]
+        if owner and repo:
+            self.threads.mark_stale(owner, repo, number)
+
+    async def _wait_for_idle_foreground(self):
+        while self._foreground_calls:
+            await asyncio.sleep(0.05)
+
+    async def call(self, tool: BaseTool, args: Dict[str, Any], prefetch: bool = False) -> Any:
+        """
+        Returns the cached result of `tool` for `args`, or calls it (sharing an identical call in flight).
+        Errors are not cached; a caller that joined a failed or cancelled prefetch makes its own call.
+        """
+        lane = "prefetch" if prefetch else "foreground"
+        key = _cache_key(tool.name, args)
+        hit, result = self._get(key)
+        if hit:
+            TOOL_CACHE_LOOKUPS.inc(lane=lane, result="hit")
+            CACHE_HITS.inc(cache="tool_result")
+            return result
+
+        task = self._inflight.get(key)
+        if task is not None:
+            TOOL_CACHE_LOOKUPS.inc(lane=lane, result="joined")
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            except Exception:
+                if prefetch:
+                    raise
+            return await self.call(tool, args, prefetch)  # The shared call failed: make our own
+
+        TOOL_CACHE_LOOKUPS.inc(lane=lane, result="miss")
+        if prefetch:
+            await self._wait_for_idle_foreground()
+            if key in self._inflight or self._get(key)[0]:
+                return await self.call(tool, args, prefetch)
+        else:
+            self._foreground_calls += 1
+        task = asyncio.ensure_future(tool.ainvoke(args))
+        self._inflight[key] = task
+        try:
+            result = await task
+        finally:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+            if not prefetch:
+                self._foreground_calls -= 1
+        if not (isinstance(result, str) and result.startswith("Error")):  # e.g. get_readable_file_content failures
+            self._put(key, _item_of(args), result)
+        return result
+
+    async def call_uncached(self, tool: BaseTool, args: Dict[str, Any], prefetch: bool = False) -> Any:
+        """Calls a tool without caching, in the foreground lane (prefetch calls wait for it) or the prefetch lane."""
+        if prefetch:
+            await self._wait_for_idle_foreground()
+            return await tool.ainvoke(args)
+        self._foreground_calls += 1
+        try:
+            return await tool.ainvoke(args)
+        finally:
+            self._foreground_calls -= 1
+
+    async def comment_thread(self, tool: BaseTool, args: Dict[str, Any], prefetch: bool = False,
+                             full: bool = False) -> Any:
+        """
+        A get_issue_comments result from `threads` (or the tool's own result if the thread is unparsable).
+
+        Args:
+            full: Return the whole thread instead of the page named by `args` (page, per_page/perPage).
+        """
+        comments = await self.threads.get(tool, args["owner"], args["repo"], args["issue_number"],
+                                          fetch=lambda page_args: self.call_uncached(tool, page_args, prefetch))
+        if comments is None:
+            return await self.call_uncached(tool, args, prefetch)
+        if not full:
+            page = max(int(args.get("page") or 1), 1)
+            per_page = int(args.get("per_page") or args.get("perPage") or DEFAULT_COMMENTS_PAGE_SIZE)
+            comments = comments[(page - 1) * per_page:page * per_page]
+        return json.dumps(comments)
+
+
+class CachingTool(WrappedTool):
+    """
+    Calls a tool through a ToolResultCache, with the tool's name and arguments. Read-only tools
+    (`cacheable`) are served from the cache; the other calls are counted as foreground activity
+    and, for write tools (`invalidates`), drop the cached results of the item they changed.
+    """
+    cache: Any
+    cacheable: bool = False
+    invalidates: bool = False
+
+    def _run(self, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        try:
+            return super()._run(config, **kwargs)
+        finally:
+            if self.invalidates:
+                self.cache.invalidate_item(kwargs)
+
+    async def _arun(self, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        if self.reads_thread(kwargs):
+            return await self.cache.comment_thread(self.inner, kwargs)
+        if self.cacheable:
+            return await self.cache.call(self.inner, kwargs)
+        try:
+            return await self.cache.call_uncached(self.inner, kwargs)
+        finally:
+            if self.invalidates:
+                self.cache.invalidate_item(kwargs)
+
+    def reads_thread(self, args: Dict[str, Any]) -> bool:
+        """Whether a call reads (a page of) a comment thread, served by the cache's CommentThreadCache."""
+        return (self.cacheable and self.name == COMMENTS_TOOL and args.get("issue_number") is not None
+                and all(value is None for name, value in args.items()
+                        if name not in ("owner", "repo", "issue_number", *_PAGE_ARGS)))
+
+    async def read_full_thread(self, args: Dict[str, Any]) -> Any:
+        """The whole comment thread of the item in `args` (all pages), e.g. to find its last comment."""
+        if self.reads_thread(args):
+            return await self.cache.comment_thread(self.inner, args, full=True)
+        return await self.ainvoke(args)
+
+    async def prefetch(self, args: Dict[str, Any]) -> Any:
+        """Warms the cache for `args` in the low-priority lane."""
+        if self.reads_thread(args):
+            return await self.cache.comment_thread(self.inner, args, prefetch=True)
+        return await self.cache.call(self.inner, args, prefetch=True)
+
+
+def wrap_tools_with_cache(tools: List[BaseTool], cache: Optional[ToolResultCache] = None) -> List[BaseTool]:
+    """
+    Routes tool calls through a shared ToolResultCache: the cacheable tools (TOOL_CACHE_TOOLS,
+    comma-separated) are cached for TOOL_CACHE_TTL_SECONDS (0 disables the cache) and write tools
+    invalidate the entries of the item they change. Comment threads are kept in a CommentThreadCache
+    of at most COMMENT_CACHE_MAX_THREADS threads and COMMENT_CACHE_MAX_COMMENTS comments. Tools are
+    returned in the same order.
+    """
+    ttl = float(os.getenv("TOOL_CACHE_TTL_SECONDS", 120))
+    if ttl <= 0:
+        return tools
+    cache = cache or ToolResultCache(ttl_seconds=ttl, threads=CommentThreadCache(
+        max_threads=int(os.getenv("COMMENT_CACHE_MAX_THREADS", 500)),
+        max_comments=int(os.getenv("COMMENT_CACHE_MAX_COMMENTS", 20000)), fresh_seconds=ttl))
+    cacheable = {name.strip() for name in os.getenv("TOOL_CACHE_TOOLS", DEFAULT_CACHEABLE_TOOLS).split(",")}
+    wrapped = [CachingTool.wrap(tool, cache=cache, cacheable=tool.name in cacheable,
+                                invalidates=is_write_tool(tool.name))
+               for tool in tools]
+    logger.info(f"Tool result cache ({ttl:.0f}s TTL) enabled for: "
+                f"{', '.join(sorted(tool.name for tool in wrapped if tool.cacheable)) or 'none'}")
+    return wrapped
+
+
+def observe_listing(tools: List[BaseTool], owner: str, repo: str, items: List[Dict[str, Any]]):
+    """Passes listed issues/PRs to the comment thread cache of `tools` (if any), so unchanged threads are not re-read."""
+    comments_tool = next((tool for tool in tools if isinstance(tool, CachingTool) and tool.name == COMMENTS_TOOL), None)
+    if comments_tool is not None:
+        comments_tool.cache.threads.observe_listing(owner, repo, items)
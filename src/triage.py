@@ -0,0 +1,122 @@
+import asyncio
+import os
+from typing import Any, Dict, List, Literal, Optional
+
+from langchain_core.language_models import BaseChatModel
+from pydantic import BaseModel, Field
+
+from .prompts import ISSUE_BATCH_TRIAGE_PROMPT_TEMPLATE
+from .usage import BudgetExceededError
+from .utils import logger
+from .metrics import REGISTRY
+
+TRIAGE_DECISIONS = REGISTRY.counter(
+    "repo_assistant_issue_triage_decisions_total", "Issues classified by batch triage, by category.", ["category"])
+TRIAGE_BATCHES = REGISTRY.counter(
+    "repo_assistant_issue_triage_batches_total", "Batch triage LLM calls, by result (ok, failed).", ["result"])
+
+TriageCategory = Literal["spam", "duplicate_candidate", "needs_info", "valid_needs_agent"]
+
+
+class IssueTriage(BaseModel):
+    """Classification of one issue."""
+    number: int = Field(description="The issue number.")
+    category: TriageCategory = Field(
+        description="spam: off-topic, advertising or gibberish. duplicate_candidate: very likely the same problem "
+                    "as another listed issue. needs_info: a plausible report that lacks what is needed to act on it "
+                    "(versions, steps to reproduce, error output). valid_needs_agent: anything else, including "
+                    "whenever you are unsure.")
+    reason: str = Field(description="One short sentence justifying the category.")
+    duplicate_of: Optional[int] = Field(default=None, description="For duplicate_candidate: the other issue's number.")
+    reply: Optional[str] = Field(
+        default=None, description="For needs_info and duplicate_candidate: a short, polite comment to post on the "
+                                  "issue (what information is missing, or which issue it duplicates).")
+
+
+class TriageBatch(BaseModel):
+    """Classifications of all the issues of a batch."""
+    issues: List[IssueTriage]
+
+
+def triage_settings() -> Dict[str, int]:
+    """ISSUE_TRIAGE_BATCH_SIZE issues per LLM call (0, the default, disables batch triage), run when at
+    least ISSUE_TRIAGE_MIN_BACKLOG untriaged issues are eligible; bodies cut at ISSUE_TRIAGE_BODY_CHARS."""
+    return {"batch_size": int(os.getenv("ISSUE_TRIAGE_BATCH_SIZE", 0)),
+            "min_backlog": int(os.getenv("ISSUE_TRIAGE_MIN_BACKLOG", 3)),
+            "body_chars": int(os.getenv("ISSUE_TRIAGE_BODY_CHARS", 600))}
+
+
+def format_issue_for_triage(issue: Dict[str, Any], body_chars: int = 600) -> str:
+    body = " ".join((issue.get("body") or "(No Description)").split())
+    if len(body) > body_chars:
+        body = body[:body_chars] + "…"
+    labels = ", ".join(label.get("name", "") for label in issue.get("labels") or []) or "none"
+    author = (issue.get("user") or {}).get("login", "unknown")
+    return f"#{issue.get('number')} [{labels}] by @{author}: {issue.get('title', '(No Title)')}\n    {body}"
+
+
+async def triage_issue_batch(llm: BaseChatModel, issues: List[Dict[str, Any]], repo_full_name: str,
+                             other_open_issues: Optional[List[Dict[str, Any]]] = None,
+                             config: Optional[Dict[str, Any]] = None,
+                             body_chars: int = 600) -> Dict[int, IssueTriage]:
+    """
+    Classifies a batch of issues with one structured-output LLM call. Issues missing from the
+    answer (or with an invalid duplicate reference) are classified valid_needs_agent, so they still
+    get a full agent run. Raises on LLM errors.
+
+    Args:
+        other_open_issues: Other open issues (numbers and titles are shown) to detect duplicates against.
+    """
+    numbers = {issue["number"] for issue in issues}
+    known = numbers | {issue.get("number") for issue in other_open_issues or []}
+    other_titles = "\n".join(f"#{issue.get('number')}: {issue.get('title', '')}"
+                             for issue in other_open_issues or [] if issue.get("number") not in numbers) or "(none)"
+    prompt = ISSUE_BATCH_TRIAGE_PROMPT_TEMPLATE.format(
+        repo_full_name=repo_full_name, count=len(issues),
+        issues="\n".join(format_issue_for_triage(issue, body_chars) for issue in issues),
+        other_issues=other_titles)
+    structured_llm = llm.with_structured_output(TriageBatch)
+    batch = await structured_llm.ainvoke(prompt, config={**(config or {}), "tags": ["issue_triage"]})
+
+    results: Dict[int, IssueTriage] = {}
+    for triage in batch.issues if batch else []:
+        if triage.number not in numbers:
+            continue
+        if triage.category == "duplicate_candidate" and (triage.duplicate_of not in known
+                                                          or triage.duplicate_of == triage.number):
+            triage = triage.model_copy(update={"category": "valid_needs_agent",
+                                               "reason": f"{triage.reason} (duplicate reference not found)"})
+        if triage.category in ("needs_info", "duplicate_candidate") and not (triage.reply or "").strip():
+            triage = triage.model_copy(update={"category": "valid_needs_agent"})
+        results[triage.number] = triage
+    for number in numbers - results.keys():
+        results[number] = IssueTriage(number=number, category="valid_needs_agent", reason="Not classified by triage.")
+    for triage in results.values():
+        TRIAGE_DECISIONS.inc(category=triage.category)
+    return results
+
+
+async def triage_issues(llm: BaseChatModel, issues: List[Dict[str, Any]], repo_full_name: str,
+                        other_open_issues: Optional[List[Dict[str, Any]]] = None,
+                        config: Optional[Dict[str, Any]] = None) -> Dict[int, IssueTriage]:
+    """
+    Classifies issues in batches of ISSUE_TRIAGE_BATCH_SIZE (one LLM call each, run concurrently).
+    Issues of a failed batch are left out of the result (after logging); budget errors are raised.
+    """
+    settings = triage_settings()
+    batch_size = max(1, settings["batch_size"])
+    batches = [issues[i:i + batch_size] for i in range(0, len(issues), batch_size)]
+    outcomes = await asyncio.gather(*(
+        triage_issue_batch(llm, batch, repo_full_name, other_open_issues, config, settings["body_chars"])
+        for batch in batches), return_exceptions=True)
+    results: Dict[int, IssueTriage] = {}
+    for batch, outcome in zip(batches, outcomes):
+        if isinstance(outcome, BudgetExceededError):
+            raise outcome
+        if isinstance(outcome, BaseException):
+            TRIAGE_BATCHES.inc(result="failed")
+            logger.warning(f"Batch triage of {len(batch)} issues of {repo_full_name} failed: {outcome}")
+            continue
+        TRIAGE_BATCHES.inc(result="ok")
+        results.update(outcome)
+    return results
@@ -0,0 +1,188 @@
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.utils import logger
+from src.metrics import REGISTRY
+
+# USD per 1M tokens: input, output and cached (prompt-cache read) input.
+# Override or extend with LLM_PRICING_JSON, e.g. '{"my-model": {"input": 1.0, "output": 2.0, "cached_input": 0.5}}'
+DEFAULT_MODEL_PRICING: Dict[str, Dict[str, float]] = {
+    "gpt-4o": {"input": 2.50, "output": 10.00, "cached_input": 1.25},
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60, "cached_input": 0.075},
+    "gpt-4.1": {"input": 2.00, "output": 8.00, "cached_input": 0.50},
+    "gpt-4.1-mini": {"input": 0.40, "output": 1.60, "cached_input": 0.10},
+    "gpt-4.1-nano": {"input": 0.10, "output": 0.40, "cached_input": 0.025},
+    "o3-mini": {"input": 1.10, "output": 4.40, "cached_input": 0.55},
+    "deepseek-chat": {"input": 0.27, "output": 1.10, "cached_input": 0.07},
+    "deepseek-reasoner": {"input": 0.55, "output": 2.19, "cached_input": 0.14},
+    "claude-3-7-sonnet": {"input": 3.00, "output": 15.00, "cached_input": 0.30},
+    "claude-3-5-haiku": {"input": 0.80, "output": 4.00, "cached_input": 0.08},
+    "gemini-2.5-pro": {"input": 1.25, "output": 10.00, "cached_input": 0.31},
+    "gemini-2.0-flash": {"input": 0.10, "output": 0.40, "cached_input": 0.025},
+}
+
+LLM_TOKENS = REGISTRY.counter(
+    "repo_assistant_llm_tokens_total", "LLM tokens by kind (input, output, cached).", ["model", "kind"])
+LLM_COST = REGISTRY.counter(
+    "repo_assistant_llm_cost_usd_total", "Estimated LLM cost in USD.", ["model"])
+BUDGET_EVENTS = REGISTRY.counter(
+    "repo_assistant_llm_budget_events_total", "Budget interventions (economy mode, stopped runs, skipped items).",
+    ["scope", "action"])
+
+
+# LLM_PRICING_JSON value -> (merged pricing, model names longest first); priced on every LLM call
+_pricing_cache: Dict[str, Tuple[Dict[str, Dict[str, float]], List[str]]] = {}
+
+
+def _load_pricing() -> Tuple[Dict[str, Dict[str, float]], List[str]]:
+    raw = os.getenv("LLM_PRICING_JSON", "")
+    cached = _pricing_cache.get(raw)
+    if cached is not None:
+        return cached
+    pricing = dict(DEFAULT_MODEL_PRICING)
+    if raw:
+        try:
+            pricing.update(json.loads(raw))
+        except json.JSONDecodeError as e:
+            logger.error(f"Ignoring invalid LLM_PRICING_JSON: {e}")
+    cached = _pricing_cache[raw] = (pricing, sorted(pricing, key=len, reverse=True))
+    return cached
+
+
+def get_model_pricing(model: str) -> Optional[Dict[str, float]]:
+    """Returns the price entry for a model, matching dated variants (e.g. gpt-4o-2024-08-06) by prefix."""
+    pricing, names_by_length = _load_pricing()
+    if model in pricing:
+        return pricing[model]
+    # Longest matching prefix wins so that "gpt-4o-mini-..." does not resolve to "gpt-4o"
+    for name in names_by_length:
+        if model.startswith(name):
+            return pricing[name]
+    return None
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+    """Estimates the USD cost of a call; cached tokens are the part of input_tokens served from the cache."""
+    price = get_model_pricing(model)
+    if price is None:
+        return 0.0
+    uncached_input = max(input_tokens - cached_tokens, 0)
+    return (uncached_input * price["input"]
+            + cached_tokens * price.get("cached_input", price["input"])
+            + output_tokens * price["output"]) / 1_000_000
+
+
+class BudgetExceededError(Exception):
+    """Raised from inside an agent run to stop it once its LLM budget is spent."""
+
+
+class UsageTracker(BaseCallbackHandler):
+    """
+    Aggregates token usage and estimated cost of one agent run from LLM callbacks,
+    and stops the run (BudgetExceededError) once `budget_usd` is exceeded.
+    """
+    run_inline = True
+    raise_error = True  # Let BudgetExceededError abort the agent run
+
+    def __init__(self, budget_usd: float = 0.0, label: str = ""):
+        self.budget_usd = budget_usd
+        self.label = label
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.cost_usd = 0.0
+        self.llm_calls = 0
+        self.model: Optional[str] = None
+        self._models: Dict[UUID, str] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any):
+        metadata = kwargs.get("metadata") or {}
+        invocation_params = kwargs.get("invocation_params") or {}
+        model = metadata.get("ls_model_name") or invocation_params.get("model") or invocation_params.get("model_name")
+        if model:
+            self._models[run_id] = model
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any):
+        model = self._models.pop(run_id, None) or (response.llm_output or {}).get("model_name")
+        if (response.llm_output or {}).get("usage_reported_by_children"):
+            return  # A routing model (src.model_router): its inner calls were recorded
+        input_tokens = output_tokens = cached_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if not usage:
+                    continue
+                model = model or (message.response_metadata or {}).get("model_name")
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+                cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+        self.record(model or "unknown", input_tokens, output_tokens, cached_tokens)
+
+    def record(self, model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0):
+        """Adds one LLM call's usage; raises BudgetExceededError if the run is over budget."""
+        cost = estimate_cost(model, input_tokens, output_tokens, cached_tokens)
+        self.model = model
+        self.llm_calls += 1
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.cached_tokens += cached_tokens
+        self.cost_usd += cost
+        LLM_TOKENS.inc(input_tokens, model=model, kind="input")
+        LLM_TOKENS.inc(output_tokens, model=model, kind="output")
+        LLM_TOKENS.inc(cached_tokens, model=model, kind="cached")
+        LLM_COST.inc(cost, model=model)
+        if self.budget_usd and self.cost_usd > self.budget_usd:
+            raise BudgetExceededError(
+                f"{self.label or 'Run'} exceeded its LLM budget: ${self.cost_usd:.4f} > ${self.budget_usd:.4f}")
+
+    def summary(self) -> str:
+        return (f"{self.llm_calls} LLM calls, {self.input_tokens} input tokens "
+                f"({self.cached_tokens} cached), {self.output_tokens} output tokens, ~${self.cost_usd:.4f}")
+
+
+# Run metadata flag of economy-mode runs, read by the cascade model router
+ECONOMY_METADATA_KEY = "llm_economy"
+
+
+@dataclass
+class RunBudget:
+    """Budget decision for one agent run."""
+    mode: str  # "normal", "economy" or "exhausted"
+    budget_usd: float  # Per-run cap for UsageTracker (0 = unlimited)
+    recursion_limit: Optional[int] = None  # Lower step limit in economy mode
+    reason: str = ""
+
+
+def plan_run_budget(spent_today_usd: float) -> RunBudget:
+    """
+    Decides how the next run may spend, from LLM_BUDGET_PER_ITEM_USD and LLM_BUDGET_PER_DAY_USD
+    (0 or unset = unlimited).
+
+    - Daily budget spent: the run is skipped ("exhausted").
+    - Less than one per-item budget left today: the run goes ahead in "economy" mode, capped at
+      the remaining daily budget and with LLM_ECONOMY_RECURSION_LIMIT agent steps; with cascade
+      routing (LLM_SMALL_MODEL_NAME) its steps stay on the small model (see ECONOMY_METADATA_KEY).
+    - Otherwise: "normal" with the per-item cap.
+    """
+    per_item = float(os.getenv("LLM_BUDGET_PER_ITEM_USD", 0) or 0)
+    per_day = float(os.getenv("LLM_BUDGET_PER_DAY_USD", 0) or 0)
+    economy_recursion_limit = int(os.getenv("LLM_ECONOMY_RECURSION_LIMIT", 12))
+
+    if not per_day:
+        return RunBudget(mode="normal", budget_usd=per_item)
+    remaining = per_day - spent_today_usd
+    if remaining <= 0:
+        return RunBudget(mode="exhausted", budget_usd=0,
+                         reason=f"daily LLM budget spent (${spent_today_usd:.2f} of ${per_day:.2f})")
+    if per_item and remaining >= per_item:
+        return RunBudget(mode="normal", budget_usd=per_item)
+    if not per_item and remaining >= per_day * 0.1:
+        return RunBudget(mode="normal", budget_usd=remaining)
+    return RunBudget(mode="economy", budget_usd=remaining, recursion_limit=economy_recursion_limit,
+                     reason=f"only ${remaining:.2f} of today's ${per_day:.2f} LLM budget left")
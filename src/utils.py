@@ -11,16 +11,12 @@ from dataclasses import dataclass
 from datetime import datetime
 from pydantic import SecretStr
 import logging
-from langchain_anthropic import ChatAnthropic
-from langchain_mistralai import ChatMistralAI
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_ollama import ChatOllama
-from langchain_openai import AzureChatOpenAI, ChatOpenAI
-from langchain_aws import ChatBedrock
 import random
 import json
 import re
-from typing import Optional, Tuple
+from typing import Any, Optional, Tuple, Callable
+from importlib.metadata import entry_points
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import BaseTool
 import inspect
 import importlib
@@ -48,6 +44,18 @@ for logger_ in [
     third_party.propagate = False
 
 
+def get_cache_dir(*parts: str) -> Path:
+    """
+    Returns (and creates) a directory under the local Repo Assistant cache root.
+
+    The root defaults to ~/.cache/repo-assistant and can be overridden with REPO_ASSISTANT_CACHE_DIR.
+    """
+    root = os.getenv("REPO_ASSISTANT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "repo-assistant"))
+    cache_dir = Path(root, *parts)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
 def load_decorated_tools_from_module(module_name: str) -> List[BaseTool]:
     """
     Dynamically imports a module and discovers ONLY tools created using the
@@ -94,6 +102,33 @@ def load_decorated_tools_from_module(module_name: str) -> List[BaseTool]:
     return tools_list
 
 
+# Calls of tools with these prefixes change GitHub state (they are not retried, and invalidate cached reads)
+WRITE_TOOL_PREFIXES = ("add_", "create_", "update_", "merge_", "delete_", "push_")
+
+
+def is_write_tool(name: str) -> bool:
+    """Whether the tool called `name` changes GitHub state (see WRITE_TOOL_PREFIXES)."""
+    return name.startswith(WRITE_TOOL_PREFIXES)
+
+
+class WrappedTool(BaseTool):
+    """
+    Base of the tools that call an `inner` tool under its name, description and argument schema
+    (see wrap). The inner tool is called without the run's callbacks: the wrapper's own start/end
+    already report the call.
+    """
+    inner: BaseTool
+
+    @classmethod
+    def wrap(cls, tool: BaseTool, **fields: Any) -> "WrappedTool":
+        """Returns `tool` wrapped in this class, with the other `fields` of the wrapper."""
+        return cls(name=tool.name, description=tool.description, args_schema=tool.args_schema,
+                   handle_tool_error=tool.handle_tool_error, inner=tool, **fields)
+
+    def _run(self, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self.inner.invoke(kwargs)
+
+
 def extract_github_owner_repo(url: str) -> Optional[Tuple[str, str]]:
     """
     Extracts the owner and repository name from various GitHub URL formats using regex.
@@ -148,84 +183,193 @@ def extract_github_owner_repo(url: str) -> Optional[Tuple[str, str]]:
         return None, None
 
 
-def get_llm_model(provider: str, **kwargs):
-    seed = kwargs.get("seed", random.randint(0, int(1e8)))
-
-    if provider == "openai":
-        if not kwargs.get("base_url", ""):
-            base_url = os.getenv("OPENAI_ENDPOINT", "https://api.openai.com/v1")
-        else:
-            base_url = kwargs.get("base_url")
-
-        if not kwargs.get("api_key", ""):
-            api_key = os.getenv("OPENAI_API_KEY", "")
-        else:
-            api_key = kwargs.get("api_key")
-
-        return ChatOpenAI(
-            model=kwargs.get("model_name", "gpt-4o"),
-            temperature=kwargs.get("temperature", 0.0),
-            base_url=base_url,
-            api_key=api_key,
-            seed=seed
-        )
-    elif provider == "alibaba":
-        if not kwargs.get("base_url", ""):
-            base_url = os.getenv("DASHSCOPE_ENDPOINT", "https://dashscope.aliyuncs.com/compatible-mode/v1")
-        else:
-            base_url = kwargs.get("base_url")
-
-        if not kwargs.get("api_key", ""):
-            api_key = os.getenv("DASHSCOPE_API_KEY", "")
-        else:
-            api_key = kwargs.get("api_key")
-
-        return ChatOpenAI(
-            model=kwargs.get("model_name", "qwen-vl-max"),
-            temperature=kwargs.get("temperature", 0.0),
-            base_url=base_url,
-            api_key=api_key,
-            seed=seed
-        )
-    elif provider == "gemini":
-        return ChatGoogleGenerativeAI(
-            model=kwargs.get("model_name", "gemini-2.5-pro-preview-03-25"),
-            temperature=kwargs.get("temperature", 0.0),
-        )
-    elif provider == "ollama":
-        if not kwargs.get("base_url", ""):
-            base_url = os.getenv("OLLAMA_ENDPOINT", "http://localhost:11434")
-        else:
-            base_url = kwargs.get("base_url")
-
-        return ChatOllama(
-            model=kwargs.get("model_name", "qwen2.5:14b"),
-            temperature=kwargs.get("temperature", 0.0),
-            num_ctx=kwargs.get("num_ctx", 16000),
-            num_predict=kwargs.get("num_predict", 1024),
-            base_url=base_url,
-            seed=seed
-        )
-    elif provider == "azure_openai":
-        if not kwargs.get("base_url", ""):
-            base_url = os.getenv("AZURE_OPENAI_ENDPOINT", "")
-        else:
-            base_url = kwargs.get("base_url")
-
-        if not kwargs.get("api_key", ""):
-            api_key = os.getenv("AZURE_OPENAI_API_KEY", "")
-        else:
-            api_key = kwargs.get("api_key")
-        return AzureChatOpenAI(
-            model=kwargs.get("model_name", "gpt-4o"),
-            temperature=kwargs.get("temperature", 0.0),
-            api_version="2025-01-01-preview",
-            azure_endpoint=base_url,
-            api_key=api_key,
-            seed=seed
-        )
+# --- LLM Provider Registry ---
+# Provider backends (langchain_openai, langchain_ollama, ...) are heavy to import, so each
+# factory imports its backend lazily and only the provider selected by get_llm_model is loaded.
+# Third-party providers can be plugged in through the entry point group below; the entry point
+# must resolve to a callable accepting the same **kwargs as get_llm_model and returning a chat model.
+# The built-in HTTP providers share one connection pool per endpoint (see src.http_pool); their
+# SDK retries are turned off (max_retries=0) when src.resilience retries the calls.
+LLM_PROVIDER_ENTRY_POINT_GROUP = "repo_assistant.llm_providers"
+LLM_PROVIDERS: Dict[str, Callable] = {}
+
+
+def register_llm_provider(name: str):
+    """Decorator registering a chat model factory under the given provider name."""
+
+    def decorator(factory: Callable) -> Callable:
+        LLM_PROVIDERS[name] = factory
+        return factory
+
+    return decorator
+
+
+def _load_llm_provider_entry_point(provider: str) -> Optional[Callable]:
+    """Looks up and registers a provider factory published via entry points."""
+    for entry_point in entry_points(group=LLM_PROVIDER_ENTRY_POINT_GROUP):
+        if entry_point.name != provider:
+            continue
+        try:
+            factory = entry_point.load()
+        except Exception as e:
+            logger.error(f"Failed to load LLM provider entry point '{entry_point.value}': {e}", exc_info=True)
+            return None
+        LLM_PROVIDERS[provider] = factory
+        logger.info(f"Registered LLM provider '{provider}' from entry point: {entry_point.value}")
+        return factory
+    return None
+
+
+@register_llm_provider("openai")
+def _create_openai_model(**kwargs):
+    from langchain_openai import ChatOpenAI
+    from src.http_pool import openai_http_clients
+
+    if not kwargs.get("base_url", ""):
+        base_url = os.getenv("OPENAI_ENDPOINT", "https://api.openai.com/v1")
+    else:
+        base_url = kwargs.get("base_url")
+
+    if not kwargs.get("api_key", ""):
+        api_key = os.getenv("OPENAI_API_KEY", "")
     else:
-        raise ValueError(f"Unsupported provider: {provider}")
+        api_key = kwargs.get("api_key")
+
+    return ChatOpenAI(
+        model=kwargs.get("model_name", "gpt-4o"),
+        temperature=kwargs.get("temperature", 0.0),
+        max_retries=kwargs.get("max_retries", 2),
+        base_url=base_url,
+        api_key=api_key,
+        seed=kwargs["seed"],
+        **openai_http_clients(base_url)
+    )
+
+
+@register_llm_provider("alibaba")
+def _create_alibaba_model(**kwargs):
+    from langchain_openai import ChatOpenAI
+    from src.http_pool import openai_http_clients
+
+    if not kwargs.get("base_url", ""):
+        base_url = os.getenv("DASHSCOPE_ENDPOINT", "https://dashscope.aliyuncs.com/compatible-mode/v1")
+    else:
+        base_url = kwargs.get("base_url")
+
+    if not kwargs.get("api_key", ""):
+        api_key = os.getenv("DASHSCOPE_API_KEY", "")
+    else:
+        api_key = kwargs.get("api_key")
+
+    return ChatOpenAI(
+        model=kwargs.get("model_name", "qwen-vl-max"),
+        temperature=kwargs.get("temperature", 0.0),
+        max_retries=kwargs.get("max_retries", 2),
+        base_url=base_url,
+        api_key=api_key,
+        seed=kwargs["seed"],
+        **openai_http_clients(base_url)
+    )
+
+
+@register_llm_provider("gemini")
+def _create_gemini_model(**kwargs):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=kwargs.get("model_name", "gemini-2.5-pro-preview-03-25"),
+        temperature=kwargs.get("temperature", 0.0),
+        max_retries=kwargs.get("max_retries", 6),
+    )
+
+
+@register_llm_provider("ollama")
+def _create_ollama_model(**kwargs):
+    from langchain_ollama import ChatOllama
+    from src.http_pool import use_shared_pool_for_ollama
+
+    if not kwargs.get("base_url", ""):
+        base_url = os.getenv("OLLAMA_ENDPOINT", "http://localhost:11434")
+    else:
+        base_url = kwargs.get("base_url")
+
+    return use_shared_pool_for_ollama(ChatOllama(
+        model=kwargs.get("model_name", "qwen2.5:14b"),
+        temperature=kwargs.get("temperature", 0.0),
+        num_ctx=kwargs.get("num_ctx", 16000),
+        num_predict=kwargs.get("num_predict", 1024),
+        base_url=base_url,
+        seed=kwargs["seed"]
+    ), base_url)
+
+
+@register_llm_provider("azure_openai")
+def _create_azure_openai_model(**kwargs):
+    from langchain_openai import AzureChatOpenAI
+    from src.http_pool import openai_http_clients
+
+    if not kwargs.get("base_url", ""):
+        base_url = os.getenv("AZURE_OPENAI_ENDPOINT", "")
+    else:
+        base_url = kwargs.get("base_url")
+
+    if not kwargs.get("api_key", ""):
+        api_key = os.getenv("AZURE_OPENAI_API_KEY", "")
+    else:
+        api_key = kwargs.get("api_key")
+    return AzureChatOpenAI(
+        model=kwargs.get("model_name", "gpt-4o"),
+        temperature=kwargs.get("temperature", 0.0),
+        max_retries=kwargs.get("max_retries", 2),
+        api_version="2025-01-01-preview",
+        azure_endpoint=base_url,
+        api_key=api_key,
+        seed=kwargs["seed"],
+        **openai_http_clients(base_url)
+    )
+
+
+def _llm_endpoint(llm, provider: str) -> str:
+    """The endpoint a provider model talks to (scheme, host and port), or the provider name if it has no base URL."""
+    from src.http_pool import endpoint_key
+
+    base_url = getattr(llm, "openai_api_base", None) or getattr(llm, "azure_endpoint", None) \
+        or getattr(llm, "base_url", None)
+    return endpoint_key(base_url) if isinstance(base_url, str) and base_url else provider
+
+
+def get_llm_model(provider: str, **kwargs):
+    kwargs["seed"] = kwargs.get("seed", random.randint(0, int(1e8)))
+    # Imported here: these modules depend on this one
+    from src.metrics import instrument_llm
+    from src.cassette import get_cassette, CassetteChatModel
+    from src.resilience import RetryPolicy, wrap_llm_with_resilience
+
+    if RetryPolicy.from_env().attempts > 1:
+        kwargs.setdefault("max_retries", 0)  # Retried by the resilience wrapper, not by the provider SDK as well
+
+    cassette = get_cassette()
+    if cassette is not None and cassette.mode == "replay":
+        # Responses come from the cassette; the provider (and its API key) is not needed
+        return instrument_llm(CassetteChatModel(cassette=cassette))
+
+    def build(provider: str, **kwargs):
+        factory = LLM_PROVIDERS.get(provider) or _load_llm_provider_entry_point(provider)
+        if factory is None:
+            raise ValueError(f"Unsupported provider: {provider}")
+        llm = factory(**kwargs)
+        llm = wrap_llm_with_resilience(llm, _llm_endpoint(llm, provider))
+        if cassette is not None:
+            llm = CassetteChatModel(cassette=cassette, inner=llm)
+        return instrument_llm(llm)
+
+    llm = build(provider, **kwargs)
+    if cassette is not None:
+        return llm  # Recorded runs use a single model, so that they replay identically
+    from src.model_router import build_cascade_model
+    return build_cascade_model(llm, kwargs.get("model_name") or provider,
+                               lambda small_provider, small_model: build(small_provider, **{
+                                   **kwargs, "model_name": small_model}))
 
 
 def print_agent_step(event_data: dict):
@@ -256,7 +400,8 @@ def print_agent_step(event_data: dict):
     elif kind == "on_tool_end":
         output_data = data.get("output", "N/A")
         # Truncate potentially long tool outputs for cleaner logs
-        output_log = (str(output_data)[:300] + '...') if len(str(output_data)) > 300 else str(output_data)
+        output_text = str(output_data)
+        output_log = (output_text[:300] + '...') if len(output_text) > 300 else output_text
         logger.info(f"{log_prefix} Finished Tool -> Output (truncated): {output_log}")
 
     # elif kind == "on_chat_model_end":  # Or on_llm_end depending on exact event stream
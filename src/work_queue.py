@@ -0,0 +1,256 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Set
+
+from src.utils import logger, get_cache_dir
+from src.metrics import REGISTRY
+
+WORK_QUEUE_ITEMS = REGISTRY.gauge(
+    "repo_assistant_work_queue_items", "Items in the shared work queue by status.", ["status"])
+
+# Item statuses: pending (waiting or retry scheduled), leased (a worker holds it), done, dead (out of attempts)
+ACTIVE_STATUSES = ("pending", "leased")
+
+
+@dataclass
+class WorkItem:
+    """One issue or PR to process, as leased by a worker."""
+    id: int
+    repo: str  # "owner/repo"
+    item_type: str  # 'issue' or 'pr'
+    item_number: int
+    payload: Dict[str, Any]  # The issue/PR data as listed by the coordinator
+    attempts: int
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[float] = None
+
+
+class WorkQueue(ABC):
+    """
+    Durable queue of items between the coordinator and the workers.
+
+    Workers lease items for a limited time and must heartbeat to keep them; a lease that is not
+    renewed (e.g. the worker crashed) expires and the item can be leased by another worker.
+    """
+
+    @abstractmethod
+    def enqueue(self, repo: str, item_type: str, item_number: int, payload: Dict[str, Any]) -> bool:
+        """Adds an item unless it is already pending or leased. Returns True if it was added."""
+
+    @abstractmethod
+    def active_numbers(self, repo: str, item_type: str) -> Set[int]:
+        """Numbers of the repository's items that are pending or leased."""
+
+    @abstractmethod
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[WorkItem]:
+        """
+        Leases the oldest available item (pending, or with an expired lease), or returns None. Items whose
+        lease expired after their last allowed attempt are marked dead instead of being leased again.
+        """
+
+    @abstractmethod
+    def heartbeat(self, item_id: int, worker_id: str, lease_seconds: float) -> bool:
+        """Extends a lease. Returns False if the worker no longer holds it."""
+
+    @abstractmethod
+    def complete(self, item_id: int, worker_id: str) -> bool:
+        """Marks a leased item as done. Returns False if the worker no longer holds it."""
+
+    @abstractmethod
+    def fail(self, item_id: int, worker_id: str, error: str, retry_delay: float = 60.0) -> bool:
+        """Releases a leased item for a later retry, or marks it dead once out of attempts."""
+
+    @abstractmethod
+    def purge_done(self, older_than_seconds: float) -> int:
+        """Deletes items finished (done) more than `older_than_seconds` ago. Returns how many were deleted."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Number of items per status."""
+
+    def close(self):
+        pass
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    repo TEXT NOT NULL,
+    item_type TEXT NOT NULL,
+    item_number INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    last_error TEXT,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_work_items_status ON work_items (status, available_at);
+CREATE INDEX IF NOT EXISTS idx_work_items_item ON work_items (repo, item_type, item_number, status);
+"""
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    WorkQueue in a SQLite file, shared by the processes of one node (WAL mode; leases are taken in
+    BEGIN IMMEDIATE transactions so two workers never lease the same item).
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _transaction(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, repo: str, item_type: str, item_number: int, payload: Dict[str, Any]) -> bool:
+        def insert(conn: sqlite3.Connection) -> bool:
+            existing = conn.execute(
+                "SELECT id FROM work_items WHERE repo = ? AND item_type = ? AND item_number = ? AND status IN (?, ?)",
+                (repo, item_type, item_number, *ACTIVE_STATUSES)).fetchone()
+            if existing:
+                return False
+            now = time.time()
+            conn.execute(
+                "INSERT INTO work_items (repo, item_type, item_number, payload, status, enqueued_at, available_at) "
+                "VALUES (?, ?, ?, ?, 'pending', ?, ?)", (repo, item_type, item_number, json.dumps(payload), now, now))
+            return True
+
+        return self._transaction(insert)
+
+    def active_numbers(self, repo: str, item_type: str) -> Set[int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item_number FROM work_items WHERE repo = ? AND item_type = ? AND status IN (?, ?)",
+                (repo, item_type, *ACTIVE_STATUSES)).fetchall()
+        return {row[0] for row in rows}
+
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[WorkItem]:
+        def take(conn: sqlite3.Connection) -> Optional[WorkItem]:
+            now = time.time()
+            while True:
+                row = conn.execute(
+                    "SELECT * FROM work_items WHERE (status = 'pending' AND available_at <= ?) "
+                    "OR (status = 'leased' AND lease_expires_at < ?) ORDER BY available_at, id LIMIT 1",
+                    (now, now)).fetchone()
+                if row is None:
+                    return None
+                if row["status"] != "leased":
+                    break
+                if row["attempts"] < self.max_attempts:
+                    logger.warning(f"[Work Queue] Lease of {row['item_type']} #{row['item_number']} ({row['repo']}) "
+                                   f"held by {row['lease_owner']} expired; re-leasing it.")
+                    break
+                # The item keeps killing or stalling its workers: stop handing it out
+                logger.error(f"[Work Queue] Lease of {row['item_type']} #{row['item_number']} ({row['repo']}) "
+                             f"held by {row['lease_owner']} expired after {row['attempts']} attempts; marking it dead.")
+                conn.execute(
+                    "UPDATE work_items SET status = 'dead', finished_at = ?, last_error = 'lease expired', "
+                    "lease_owner = NULL, lease_expires_at = NULL WHERE id = ?", (now, row["id"]))
+            conn.execute(
+                "UPDATE work_items SET status = 'leased', lease_owner = ?, lease_expires_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?", (worker_id, now + lease_seconds, row["id"]))
+            return WorkItem(id=row["id"], repo=row["repo"], item_type=row["item_type"],
+                            item_number=row["item_number"], payload=json.loads(row["payload"]),
+                            attempts=row["attempts"] + 1, lease_owner=worker_id,
+                            lease_expires_at=now + lease_seconds)
+
+        return self._transaction(take)
+
+    def _update_lease(self, item_id: int, worker_id: str, assignments: str, params: tuple) -> bool:
+        def update(conn: sqlite3.Connection) -> bool:
+            cursor = conn.execute(
+                f"UPDATE work_items SET {assignments} WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (*params, item_id, worker_id))
+            return cursor.rowcount == 1
+
+        return self._transaction(update)
+
+    def heartbeat(self, item_id: int, worker_id: str, lease_seconds: float) -> bool:
+        return self._update_lease(item_id, worker_id, "lease_expires_at = ?", (time.time() + lease_seconds,))
+
+    def complete(self, item_id: int, worker_id: str) -> bool:
+        return self._update_lease(item_id, worker_id,
+                                  "status = 'done', finished_at = ?, lease_owner = NULL, lease_expires_at = NULL",
+                                  (time.time(),))
+
+    def fail(self, item_id: int, worker_id: str, error: str, retry_delay: float = 60.0) -> bool:
+        return self._update_lease(
+            item_id, worker_id,
+            "status = CASE WHEN attempts >= ? THEN 'dead' ELSE 'pending' END, available_at = ?, "
+            "last_error = ?, lease_owner = NULL, lease_expires_at = NULL",
+            (self.max_attempts, time.time() + retry_delay, error[:2000]))
+
+    def purge_done(self, older_than_seconds: float) -> int:
+        def delete(conn: sqlite3.Connection) -> int:
+            return conn.execute("DELETE FROM work_items WHERE status = 'done' AND finished_at < ?",
+                                (time.time() - older_than_seconds,)).rowcount
+
+        return self._transaction(delete)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM work_items GROUP BY status").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Queue backends by URL scheme, e.g. "sqlite:///var/lib/repo-assistant/queue.sqlite3" (the part after
+# "sqlite://" is the file path, so three slashes for an absolute path).
+# Other backends (Redis, Postgres, ...) can be added with register_work_queue_backend.
+WORK_QUEUE_BACKENDS: Dict[str, Callable[[str], WorkQueue]] = {}
+
+
+def register_work_queue_backend(scheme: str):
+    """Decorator registering a factory that builds a WorkQueue from the rest of a queue URL."""
+
+    def decorator(factory: Callable[[str], WorkQueue]) -> Callable[[str], WorkQueue]:
+        WORK_QUEUE_BACKENDS[scheme] = factory
+        return factory
+
+    return decorator
+
+
+@register_work_queue_backend("sqlite")
+def _create_sqlite_queue(location: str) -> WorkQueue:
+    return SQLiteWorkQueue(location, max_attempts=int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", 3)))
+
+
+def open_work_queue(url: Optional[str] = None) -> WorkQueue:
+    """
+    Opens the queue at `url` (default WORK_QUEUE_URL, else a SQLite file in the local cache dir).
+
+    Raises:
+        ValueError: If the URL scheme has no registered backend.
+    """
+    url = url or os.getenv("WORK_QUEUE_URL") or f"sqlite:///{get_cache_dir() / 'work_queue.sqlite3'}"
+    scheme, _, location = url.partition("://")
+    factory = WORK_QUEUE_BACKENDS.get(scheme)
+    if factory is None:
+        raise ValueError(f"Unsupported work queue backend: {scheme}")
+    logger.info(f"Opening work queue {url}")
+    return factory(location)
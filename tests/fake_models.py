@@ -0,0 +1,9 @@
+"""Chat models shared by the tests (and benchmarks) that run agents without a real LLM."""
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+
+
+class ToolCallingFakeChatModel(FakeMessagesListChatModel):
+    """Scripted chat model that accepts bind_tools, as create_react_agent requires."""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
@@ -0,0 +1,47 @@
+import asyncio
+import io
+import json
+import sys
+
+sys.path.append(".")
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+from tests.fake_models import ToolCallingFakeChatModel
+
+
+def test_sink_logs_tool_events_as_json_lines():
+    from src.agent_events import AgentEventSink, setup_agent_event_logging, stop_agent_event_logging, PREVIEW_CHARS
+
+    @tool
+    def get_file_contents(path: str) -> str:
+        """Returns a large file."""
+        return "x" * 1_000_000
+
+    llm = ToolCallingFakeChatModel(responses=[
+        AIMessage(content="", tool_calls=[{"name": "get_file_contents", "args": {"path": "a.py"}, "id": "call_1"}]),
+        AIMessage(content="done"),
+    ])
+    agent = create_react_agent(llm, [get_file_contents])
+
+    stream = io.StringIO()
+    stop_agent_event_logging()
+    setup_agent_event_logging(stream=stream)
+    try:
+        result = asyncio.run(agent.ainvoke({"messages": [("user", "hi")]},
+                                           config={"callbacks": [AgentEventSink("issue", 3)]}))
+    finally:
+        stop_agent_event_logging()
+
+    assert result["messages"][-1].content == "done"
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [e["event"] for e in events] == ["tool_start", "tool_end"]
+    assert events[0]["tool"] == "get_file_contents" and events[0]["input"] == {"path": "a.py"}
+    assert events[1]["tool"] == "get_file_contents" and events[1]["item_number"] == 3
+    assert len(events[1]["output_preview"]) <= PREVIEW_CHARS + 3
+
+
+if __name__ == '__main__':
+    test_sink_logs_tool_events_as_json_lines()
@@ -0,0 +1,37 @@
+import asyncio
+import sys
+
+sys.path.append(".")
+
+from src.agent_pool import AgentPool
+
+
+def test_builds_are_single_flight_and_lru_evicted():
+    builds = []
+
+    async def build(key):
+        builds.append(key)
+        await asyncio.sleep(0.05)
+        return None if key == "broken" else f"agent:{key}"
+
+    async def run():
+        pool = AgentPool(build, max_size=2, name="test")
+        agents = await asyncio.gather(*(pool.get("a") for _ in range(5)))
+        assert agents == ["agent:a"] * 5
+        assert builds == ["a"]
+
+        await pool.get("b")
+        await pool.get("a")  # "b" becomes the least recently used
+        await pool.get("c")
+        assert "a" in pool and "c" in pool and "b" not in pool
+
+        assert await pool.get("broken") is None
+        assert await pool.get("broken") is None  # Failed builds are retried, not cached
+        assert builds == ["a", "b", "c", "broken", "broken"]
+        assert len(pool) == 2
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    test_builds_are_single_flight_and_lru_evicted()
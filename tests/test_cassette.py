@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.append(".")
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+from tests.fake_models import ToolCallingFakeChatModel
+
+
+def test_record_then_replay_without_model_or_tools():
+    from src.cassette import Cassette, CassetteChatModel, wrap_tools_for_cassette, replay_tools, summarize_cassette
+
+    live_calls = []
+
+    @tool
+    async def get_issue_comments(issue_number: int) -> str:
+        """Get comments for a GitHub issue."""
+        live_calls.append(issue_number)
+        return '[{"user": {"login": "someone"}, "body": "still broken"}]'
+
+    def make_agent(llm, tools):
+        return create_react_agent(llm, tools)
+
+    async def run(agent):
+        result = await agent.ainvoke({"messages": [("user", "Process Issue #5")]})
+        return [message.content for message in result["messages"]]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "run.jsonl.gz")
+
+        recorder = Cassette(path, "record")
+        real_llm = ToolCallingFakeChatModel(responses=[
+            AIMessage(content="", tool_calls=[{"name": "get_issue_comments", "args": {"issue_number": 5},
+                                               "id": "call_1"}],
+                      usage_metadata={"input_tokens": 100, "output_tokens": 10, "total_tokens": 110}),
+            AIMessage(content="Replied to #5.",
+                      usage_metadata={"input_tokens": 150, "output_tokens": 5, "total_tokens": 155}),
+        ])
+        recorded = asyncio.run(run(make_agent(CassetteChatModel(cassette=recorder, inner=real_llm),
+                                              wrap_tools_for_cassette([get_issue_comments], recorder))))
+        assert live_calls == [5]
+
+        player = Cassette(path, "replay", strict=True)
+        replayed = asyncio.run(run(make_agent(CassetteChatModel(cassette=player), replay_tools(player))))
+        assert replayed == recorded
+        assert live_calls == [5]  # Served from the cassette
+
+        summary = summarize_cassette(path)
+        assert summary["tool_calls"] == {"get_issue_comments": 1}
+        assert summary["llm_calls"] == 2 and summary["input_tokens"] == 250
+
+
+def test_sync_calls_are_recorded_and_replayed_inside_a_running_loop():
+    from src.cassette import Cassette, CassetteChatModel
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "run.jsonl.gz")
+
+        async def scenario():  # e.g. a sync tool or callback calling the model from the agent's loop
+            recorder = Cassette(path, "record")
+            real_llm = ToolCallingFakeChatModel(responses=[AIMessage(content="sync answer")])
+            assert CassetteChatModel(cassette=recorder, inner=real_llm).invoke("hi").content == "sync answer"
+            player = Cassette(path, "replay", strict=True)
+            assert CassetteChatModel(cassette=player).invoke("hi").content == "sync answer"
+
+        asyncio.run(scenario())
+
+
+if __name__ == '__main__':
+    test_record_then_replay_without_model_or_tools()
+    test_sync_calls_are_recorded_and_replayed_inside_a_running_loop()
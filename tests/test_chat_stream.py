@@ -0,0 +1,61 @@
+import asyncio
+import sys
+
+sys.path.append(".")
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+from tests.fake_models import ToolCallingFakeChatModel
+from src.chat_stream import ChatTurnRenderer, cap_history, TIME_TO_FIRST_TOKEN
+
+
+@tool
+def read_file(path: str) -> str:
+    """Reads a file of the repository."""
+    return "x" * 5000
+
+
+def test_agent_turn_renders_tool_summaries_and_answer():
+    llm = ToolCallingFakeChatModel(responses=[
+        AIMessage(content="", tool_calls=[{"name": "read_file", "args": {"path": "a.py"}, "id": "call_1"}]),
+        AIMessage(content="a.py is big."),
+    ])
+    agent = create_react_agent(llm, [read_file])
+    history = [{"role": "user", "content": "What is in a.py?"}]
+    renderer = ChatTurnRenderer(history, preview_chars=100)
+    ttft_before = TIME_TO_FIRST_TOKEN.count()
+
+    async def run():
+        async for message, _ in agent.astream({"messages": [HumanMessage(content="What is in a.py?")]},
+                                             stream_mode="messages"):
+            renderer.on_message(message)
+
+    asyncio.run(run())
+    tool_entry, answer = history[1], history[2]
+    assert tool_entry["metadata"]["title"] == '🔧 read_file({"path": "a.py"})'
+    assert tool_entry["metadata"]["status"] == "done"
+    assert tool_entry["content"] == "```\n" + "x" * 100 + "\n… (4900 more characters)\n```"
+    assert answer == {"role": "assistant", "content": "a.py is big."}
+    assert TIME_TO_FIRST_TOKEN.count() == ttft_before + 1
+
+
+def test_token_chunks_accumulate_into_one_message():
+    history = []
+    renderer = ChatTurnRenderer(history)
+    for token in ["The ", "repo ", "is small."]:
+        assert renderer.on_message(AIMessageChunk(content=token, id="run-1"))
+    renderer.on_message(AIMessageChunk(content="", id="run-1", tool_call_chunks=[
+        {"name": "get_file_contents", "args": '{"path": ', "id": "call_9", "index": 0}]))
+    renderer.on_message(AIMessageChunk(content="", id="run-1", tool_call_chunks=[
+        {"name": None, "args": '"README.md"}', "id": None, "index": 0}]))
+    assert history[0] == {"role": "assistant", "content": "The repo is small."}
+    assert history[1]["metadata"]["title"] == '🔧 get_file_contents({"path": "README.md"})'
+    assert history[1]["metadata"]["status"] == "pending"
+    assert cap_history(history, 1) == [history[1]]
+
+
+if __name__ == '__main__':
+    test_agent_turn_renders_tool_summaries_and_answer()
+    test_token_chunks_accumulate_into_one_message()
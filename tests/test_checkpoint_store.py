@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.append(".")
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+from tests.fake_models import ToolCallingFakeChatModel
+from src.checkpoint_store import SQLiteCheckpointSaver, compact_messages
+
+
+@tool
+def read_file(path: str) -> str:
+    """Reads a file of the repository."""
+    return "x" * 5000
+
+
+def test_conversations_persist_compacted_and_bounded():
+    def turn():  # Fresh messages per turn: the agent assigns ids to the model's messages
+        return [AIMessage(content="", tool_calls=[{"name": "read_file", "args": {"path": "a.py"}, "id": "call_1"}]),
+                AIMessage(content="It is a big file.")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "checkpoints.sqlite3")
+        config = {"configurable": {"thread_id": "t1"}}
+
+        async def chat(saver, question):
+            agent = create_react_agent(ToolCallingFakeChatModel(responses=turn()), [read_file], checkpointer=saver)
+            return await agent.ainvoke({"messages": [HumanMessage(content=question)]}, config=config)
+
+        saver = SQLiteCheckpointSaver(path, max_messages=8, tool_output_chars=100)
+        asyncio.run(chat(saver, "What is in a.py?"))
+        saver.close()
+
+        # A new process sees the conversation; the previous turn's tool output is compacted
+        saver = SQLiteCheckpointSaver(path, max_messages=8, tool_output_chars=100)
+        result = asyncio.run(chat(saver, "And now?"))
+        assert len(result["messages"]) == 8
+        stored = saver.get_tuple(config).checkpoint["channel_values"]["messages"]
+        tool_outputs = [m.content for m in stored if isinstance(m, ToolMessage)]
+        assert tool_outputs[0].endswith("[... 4900 characters compacted]")
+        assert tool_outputs[1] == "x" * 5000
+        assert len(list(saver.list(config))) == 3  # Only the latest checkpoints are kept
+
+        # The oldest turn is dropped once the thread exceeds max_messages
+        asyncio.run(chat(saver, "Once more?"))
+        stored = saver.get_tuple(config).checkpoint["channel_values"]["messages"]
+        assert [m.content for m in stored if isinstance(m, HumanMessage)] == ["And now?", "Once more?"]
+
+        saver.idle_seconds = 0.0
+        assert saver.evict_idle_threads() == 1
+        assert saver.get_tuple(config) is None
+        saver.close()
+
+
+def test_compaction_keeps_the_latest_turn_whole():
+    messages = [HumanMessage(content="q1"), ToolMessage(content="y" * 50, tool_call_id="c1"), AIMessage(content="a1"),
+                HumanMessage(content="q2"), ToolMessage(content="z" * 50, tool_call_id="c2"), AIMessage(content="a2")]
+    compacted = compact_messages(messages, max_messages=2, tool_output_chars=10)
+    assert [m.content for m in compacted] == ["q2", "z" * 50, "a2"]
+    assert compact_messages(messages, max_messages=0, tool_output_chars=10)[1].content.startswith("y" * 10 + "\n[...")
+
+
+class SummarizingFakeChatModel(ToolCallingFakeChatModel):
+    """Answers every question, and the compactor's summary requests."""
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        summary_request = "Conversation to summarize" in str(messages[-1].content)
+        message = AIMessage(content="- Earlier questions were answered." if summary_request else "An answer. " * 40)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def test_storage_bound_keeps_the_conversation_summary():
+    from src.compaction import ConversationCompactor, SUMMARY_MARKER, is_summary_message
+
+    summary = HumanMessage(content="Summary of the earlier conversation: ...", additional_kwargs={SUMMARY_MARKER: True})
+    pairs = [m for i in range(50) for m in (HumanMessage(content=f"q{i}"), AIMessage(content=f"a{i}"))]
+    compacted = compact_messages([summary, *pairs], max_messages=80, tool_output_chars=10)
+    assert compacted[0] is summary and len(compacted) <= 80 and compacted[-1].content == "a49"
+
+    # Both layers: the compactor summarizes older turns, the checkpointer bounds what is stored
+    with tempfile.TemporaryDirectory() as tmp:
+        saver = SQLiteCheckpointSaver(os.path.join(tmp, "checkpoints.sqlite3"), max_messages=6)
+        llm = SummarizingFakeChatModel(responses=[])
+        agent = create_react_agent(llm, [read_file], checkpointer=saver,
+                                   pre_model_hook=ConversationCompactor(llm, max_tokens=300, keep_recent_tokens=150))
+        config = {"configurable": {"thread_id": "t"}}
+
+        async def chat():
+            for question in range(8):
+                await agent.ainvoke({"messages": [HumanMessage(content=f"Question {question}?")]}, config=config)
+
+        asyncio.run(chat())
+        stored = saver.get_tuple(config).checkpoint["channel_values"]["messages"]
+        assert is_summary_message(stored[0]) and len(stored) <= 6
+        assert stored[-2].content == "Question 7?"
+        saver.close()
+
+
+if __name__ == '__main__':
+    test_conversations_persist_compacted_and_bounded()
+    test_compaction_keeps_the_latest_turn_whole()
+    test_storage_bound_keeps_the_conversation_summary()
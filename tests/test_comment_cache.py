@@ -0,0 +1,127 @@
+import asyncio
+import json
+import sys
+from typing import Optional
+
+sys.path.append(".")
+
+from langchain_core.tools import StructuredTool
+
+
+def comment(i: int, login: str = "someone") -> dict:
+    return {"id": i, "user": {"login": login}, "body": f"comment {i}",
+            "created_at": f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}Z"}
+
+
+def make_comments_tool(threads, calls, with_since=False):
+    async def get_issue_comments(owner: str, repo: str, issue_number: int, page: int = 1, per_page: int = 30) -> str:
+        calls.append((issue_number, page))
+        comments = threads[issue_number]
+        return json.dumps(comments[(page - 1) * per_page:page * per_page])
+
+    async def get_issue_comments_since(owner: str, repo: str, issue_number: int, since: Optional[str] = None) -> str:
+        calls.append((issue_number, since))
+        return json.dumps([c for c in threads[issue_number]
+                           if since is None or (c.get("updated_at") or c["created_at"]) >= since])
+
+    return StructuredTool.from_function(coroutine=get_issue_comments_since if with_since else get_issue_comments,
+                                        name="get_issue_comments", description="Get comments for a GitHub issue.")
+
+
+def test_threads_are_refreshed_incrementally_and_served_from_memory():
+    from src.comment_cache import CommentThreadCache
+
+    threads = {1: [comment(i) for i in range(250)]}
+    calls = []
+    tool = make_comments_tool(threads, calls)
+    cache = CommentThreadCache()
+    listed = [{"number": 1, "updated_at": "2024-01-01T01:00:00Z"}]
+
+    async def scenario():
+        cache.observe_listing("octo", "repo", listed)
+        assert len(await cache.get(tool, "octo", "repo", 1)) == 250
+        assert calls == [(1, 1), (1, 2), (1, 3)]
+        # Unchanged per the listing: served from memory
+        assert len(await cache.get(tool, "octo", "repo", 1)) == 250 and len(calls) == 3
+        # New comments: only the last page is read again
+        threads[1] += [comment(250), comment(251, "octo")]
+        cache.observe_listing("octo", "repo", [{"number": 1, "updated_at": "2024-01-01T02:00:00Z"}])
+        comments = await cache.get(tool, "octo", "repo", 1)
+        assert [c["id"] for c in comments] == list(range(252)) and calls[3:] == [(1, 3)]
+        # A deleted comment shifts the pages: the thread is read again from the start
+        del threads[1][10]
+        cache.mark_stale("octo", "repo", 1)
+        assert len(await cache.get(tool, "octo", "repo", 1)) == 251 and calls[4:] == [(1, 3), (1, 1), (1, 2), (1, 3)]
+
+    asyncio.run(scenario())
+
+
+def test_since_argument_merges_new_and_edited_comments():
+    from src.comment_cache import CommentThreadCache
+
+    threads = {1: [comment(i) for i in range(3)]}
+    calls = []
+    tool = make_comments_tool(threads, calls, with_since=True)
+    cache = CommentThreadCache()
+
+    async def scenario():
+        await cache.get(tool, "octo", "repo", 1)
+        threads[1][1] = {**threads[1][1], "body": "edited", "updated_at": "2024-01-02T00:00:00Z"}
+        threads[1].append(comment(3))
+        cache.mark_stale("octo", "repo", 1)
+        comments = await cache.get(tool, "octo", "repo", 1)
+        assert [c["id"] for c in comments] == [0, 1, 2, 3] and comments[1]["body"] == "edited"
+        assert calls == [(1, None), (1, "2024-01-01T00:00:02Z")]
+
+    asyncio.run(scenario())
+
+
+def test_cache_is_bounded():
+    from src.comment_cache import CommentThreadCache
+
+    threads = {n: [comment(i) for i in range(10)] for n in range(1, 6)}
+    tool = make_comments_tool(threads, [])
+    cache = CommentThreadCache(max_threads=3, max_comments=25)
+
+    async def scenario():
+        for number in threads:
+            await cache.get(tool, "octo", "repo", number)
+
+    asyncio.run(scenario())
+    assert len(cache) == 2  # 3 threads would hold 30 comments
+
+
+def test_eligibility_check_and_agent_share_the_thread():
+    from src.github_processor import is_last_update_by_owner
+    from src.tool_cache import ToolResultCache, observe_listing, wrap_tools_with_cache
+
+    threads = {7: [comment(i) for i in range(40)] + [comment(40, "octo")]}
+    calls = []
+
+    async def get_me() -> str:
+        calls.append("get_me")
+        return json.dumps({"login": "octo"})
+
+    raw_tools = [make_comments_tool(threads, calls),
+                 StructuredTool.from_function(coroutine=get_me, name="get_me", description="Me.")]
+    tools = wrap_tools_with_cache(raw_tools, ToolResultCache())
+
+    async def scenario():
+        observe_listing(tools, "octo", "repo", [{"number": 7, "updated_at": "2024-01-01T01:00:00Z"}])
+        assert await is_last_update_by_owner(7, "issue", "octo", "repo", tools)
+        assert await is_last_update_by_owner(7, "issue", "octo", "repo", tools)
+        # The agent gets the page it asks for, from the same cached thread
+        agent_view = await tools[0].ainvoke({"owner": "octo", "repo": "repo", "issue_number": 7})
+        assert [c["id"] for c in json.loads(agent_view)] == list(range(30))
+        second_page = await tools[0].ainvoke({"owner": "octo", "repo": "repo", "issue_number": 7, "page": 2})
+        assert [c["id"] for c in json.loads(second_page)] == list(range(30, 41))
+        assert calls == [(7, 1), "get_me"] or calls == ["get_me", (7, 1)]
+
+    asyncio.run(scenario())
+
+
+if __name__ == '__main__':
+    test_threads_are_refreshed_incrementally_and_served_from_memory()
+    test_since_argument_merges_new_and_edited_comments()
+    test_cache_is_bounded()
+    test_eligibility_check_and_agent_share_the_thread()
@@ -0,0 +1,84 @@
+import asyncio
+import sys
+
+sys.path.append(".")
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.prebuilt import create_react_agent
+
+from src.compaction import ConversationCompactor, stub_tool_outputs
+
+
+class RecordingFakeChatModel(BaseChatModel):
+    """Reads a file once per question, then answers; records the size of every agent call's input."""
+    input_tokens: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording-fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        last = messages[-1]
+        if "Conversation to summarize" in str(last.content):
+            message = AIMessage(content="- The user asked about several files; each was read with get_file.")
+        elif isinstance(last, ToolMessage):
+            self.input_tokens.append(count_tokens_approximately(messages))
+            message = AIMessage(content="That file defines a few helpers. " * 20)
+        else:
+            self.input_tokens.append(count_tokens_approximately(messages))
+            message = AIMessage(content="", tool_calls=[
+                {"name": "get_file", "args": {"path": f"f{len(self.input_tokens)}.py"},
+                 "id": f"call_{len(self.input_tokens)}"}])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+@tool
+def get_file(path: str) -> str:
+    """Returns the contents of a file."""
+    return f"# {path}\n" + "def helper():\n    return 42\n" * 300
+
+
+def test_per_turn_context_stays_bounded():
+    def run_conversation(compactor_tokens: int) -> list:
+        llm = RecordingFakeChatModel(input_tokens=[])
+        agent = create_react_agent(llm, [get_file], checkpointer=MemorySaver(), pre_model_hook=ConversationCompactor(
+            llm, max_tokens=compactor_tokens, keep_recent_tokens=compactor_tokens // 3))
+
+        async def run():
+            for question in range(15):
+                await agent.ainvoke({"messages": [HumanMessage(content=f"What is in file {question}?")]},
+                                    config={"configurable": {"thread_id": "t"}})
+
+        asyncio.run(run())
+        return llm.input_tokens
+
+    uncompacted = run_conversation(0)
+    compacted = run_conversation(6000)
+    assert uncompacted[-1] > 5 * uncompacted[1]  # Grows with every turn without compaction
+    assert max(compacted) < 6000 + 2500  # At most the threshold plus the current turn's observation
+    assert max(compacted[10:]) < 1.5 * max(compacted[2:6])
+
+
+def test_stubs_name_the_call_to_refetch():
+    messages = [HumanMessage(content="q1"),
+                AIMessage(content="", tool_calls=[{"name": "get_file", "args": {"path": "a.py"}, "id": "c1"}]),
+                ToolMessage(content="x" * 1000, tool_call_id="c1"),
+                AIMessage(content="a1"),
+                HumanMessage(content="q2")]
+    stubbed = stub_tool_outputs(messages, before=4)
+    assert stubbed[2].content.startswith('[Output of get_file({"path": "a.py"}) omitted')
+    assert stubbed[2].id == messages[2].id and stubbed[2].tool_call_id == "c1"
+    assert stub_tool_outputs(messages, before=2)[2].content == "x" * 1000  # The current turn is kept
+
+
+if __name__ == '__main__':
+    test_per_turn_context_stays_bounded()
+    test_stubs_name_the_call_to_refetch()
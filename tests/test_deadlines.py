@@ -0,0 +1,63 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.append(".")
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+from tests.fake_models import ToolCallingFakeChatModel
+
+
+def test_run_is_cancelled_at_deadline_and_item_deprioritized():
+    tool_cancelled = []
+
+    @tool
+    async def browse(url: str) -> str:
+        """Browses a web page."""
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            tool_cancelled.append(url)
+            raise
+        return "page"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["STATE_DB_PATH"] = os.path.join(tmp, "state.sqlite3")
+        os.environ["ISSUE_RUN_DEADLINE_SECONDS"] = "0.3"
+        try:
+            from src import state_store
+            from src.github_processor import run_agent_on_item, deprioritized_numbers
+            from src.metrics import AGENT_RUNS
+
+            state_store._state_store = None
+            timeouts_before = AGENT_RUNS.value(item_type="issue", status="timeout")
+            llm = ToolCallingFakeChatModel(responses=[
+                AIMessage(content="", tool_calls=[{"name": "browse", "args": {"url": "https://example.com"},
+                                                   "id": "call_1"}]),
+                AIMessage(content="done"),
+            ])
+            agent = create_react_agent(llm, [browse])
+            assert deprioritized_numbers("octo", "repo", "issue") == set()
+
+            answer = asyncio.run(run_agent_on_item(
+                agent, {"messages": [("user", "hi")]}, "issue", 9, "octo", "repo"))
+
+            assert answer is None
+            assert tool_cancelled == ["https://example.com"]
+            assert state_store.get_state_store().recent_runs("octo/repo", "issue", 9)[0]["status"] == "timeout"
+            assert AGENT_RUNS.value(item_type="issue", status="timeout") == timeouts_before + 1
+            assert deprioritized_numbers("octo", "repo", "issue") == {9}
+            assert deprioritized_numbers("octo", "repo", "pr") == set()
+        finally:
+            del os.environ["STATE_DB_PATH"]
+            del os.environ["ISSUE_RUN_DEADLINE_SECONDS"]
+            state_store.get_state_store().close()
+            state_store._state_store = None
+
+
+if __name__ == '__main__':
+    test_run_is_cancelled_at_deadline_and_item_deprioritized()
@@ -0,0 +1,55 @@
+import asyncio
+import json
+import sys
+
+sys.path.append(".")
+
+
+async def serve_chat_completions(connections):
+    """A minimal OpenAI-compatible endpoint (keep-alive HTTP/1.1) counting the connections it accepts."""
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = next(int(line.split(b":")[1]) for line in head.split(b"\r\n")
+                          if line.lower().startswith(b"content-length"))
+            await reader.readexactly(length)
+            body = json.dumps({"id": "1", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+                               "choices": [{"index": 0, "finish_reason": "stop",
+                                            "message": {"role": "assistant", "content": "hi"}}]}).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+            await writer.drain()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def test_models_of_an_endpoint_share_one_pool():
+    from src.http_pool import endpoint_key, get_endpoint_pool
+    from src.metrics import REGISTRY
+    from src.utils import get_llm_model
+
+    assert endpoint_key("https://api.openai.com/v1") == "https://api.openai.com:443"
+    connections = []
+
+    async def scenario():
+        server = await serve_chat_completions(connections)
+        base_url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/v1"
+        first = get_llm_model("openai", model_name="gpt-4o", base_url=base_url, api_key="sk-test")
+        second = get_llm_model("openai", model_name="gpt-4o-mini", base_url=base_url, api_key="sk-test")
+        assert first.inner.http_async_client is second.inner.http_async_client  # Inside the resilience wrapper
+        assert first.inner.max_retries == 0  # Retries are made by the resilience wrapper only
+        for llm in (first, second, first):
+            assert (await llm.ainvoke("hello")).content == "hi"
+        pool = get_endpoint_pool(base_url)
+        assert len(connections) == 1  # Kept alive and reused by both models
+        assert pool.stats() == {"active": 0, "idle": 1, "pending": 0}
+        assert f'repo_assistant_llm_http_connections{{endpoint="{pool.endpoint}",state="idle"}} 1' in REGISTRY.render()
+        server.close()
+
+    asyncio.run(scenario())
+
+
+if __name__ == '__main__':
+    test_models_of_an_endpoint_share_one_pool()
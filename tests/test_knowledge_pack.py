@@ -0,0 +1,71 @@
+import asyncio
+import os
+import sys
+import tempfile
+from unittest import mock
+
+sys.path.append(".")
+
+from src import knowledge_pack
+from src.knowledge_pack import KnowledgePack, build_knowledge_pack, digest_file, make_knowledge_tool, \
+    split_ingest_files
+
+SEPARATOR = "=" * 48
+
+
+def ingest_content(files: dict) -> str:
+    return "".join(f"{SEPARATOR}\nFile: {path}\n{SEPARATOR}\n{text}\n\n" for path, text in files.items())
+
+
+FILES = {
+    "README.md": "# Demo\n\nA demo project for testing.\n\n## Usage\nRun it.\n",
+    "src/__init__.py": '"""Core package of the demo."""\n',
+    "src/billing.py": '"""Invoice computations."""\nRATE = 3\n\n\nclass Invoice:\n    def __init__(self, items):\n'
+                      '        self.items = items\n\n    def total(self):\n        return sum(self.items)\n\n\n'
+                      'def calculate_total(items, discount=0):\n    return sum(items) - discount\n',
+    "web/app.ts": "// Web entry point.\nexport async function startServer(port) {}\nexport const handler = (req) => req;\n",
+}
+
+
+def test_digests_files_and_directories():
+    assert split_ingest_files(ingest_content(FILES))["src/billing.py"] == FILES["src/billing.py"].rstrip("\n")
+    billing = digest_file("src/billing.py", FILES["src/billing.py"])
+    assert billing["purpose"] == "Invoice computations."
+    assert billing["symbols"] == ["RATE L2", "class Invoice L5: __init__, total", "def calculate_total(items, discount) L13"]
+    assert digest_file("web/app.ts", FILES["web/app.ts"])["symbols"] == ["startServer L2", "handler L3"]
+
+    pack = KnowledgePack("https://github.com/o/r", "a" * 40, {path: digest_file(path, text) for path, text in FILES.items()})
+    root = pack.describe("")
+    assert root.startswith("(repository root)/ — 4 files") and "A demo project for testing." in root
+    assert "  src/ (2 files, 15 lines): Core package of the demo." in root
+    assert "calculate_total" in pack.lookup("src/billing.py")
+    assert pack.lookup("calculate") == "Matches for 'calculate':\n  src/billing.py: def calculate_total(items, discount) L13"
+    assert make_knowledge_tool(pack).invoke({"query": "web"}).startswith("web/ — 1 files")
+
+
+def test_pack_is_reused_and_rebuilt_incrementally():
+    with tempfile.TemporaryDirectory() as cache_dir, \
+            mock.patch.object(knowledge_pack, "get_cache_dir", lambda: __import__("pathlib").Path(cache_dir)), \
+            mock.patch.object(knowledge_pack, "digest_file", wraps=knowledge_pack.digest_file) as digest:
+        sha = iter(["1" * 40, "1" * 40, "2" * 40])
+
+        async def fake_sha(repo_url):
+            return next(sha)
+
+        with mock.patch.object(knowledge_pack, "fetch_commit_sha", fake_sha):
+            first = asyncio.run(build_knowledge_pack("https://github.com/o/r", ingest_content(FILES)))
+            assert digest.call_count == 4
+            assert os.path.exists(os.path.join(cache_dir, "knowledge", "o__r.json"))
+
+            same = asyncio.run(build_knowledge_pack("https://github.com/o/r", None))  # Same commit: no ingest needed
+            assert same.files == first.files and digest.call_count == 4
+
+            changed = asyncio.run(build_knowledge_pack("https://github.com/o/r", ingest_content(
+                {**FILES, "src/billing.py": FILES["src/billing.py"] + "\n\ndef refund(invoice):\n    pass\n"})))
+            assert digest.call_count == 5  # Only the changed file is digested again
+            assert changed.commit_sha == "2" * 40 and "def refund(invoice) L17" in changed.files["src/billing.py"]["symbols"]
+
+
+if __name__ == '__main__':
+    test_digests_files_and_directories()
+    test_pack_is_reused_and_rebuilt_incrementally()
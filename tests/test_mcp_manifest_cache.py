@@ -0,0 +1,115 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.append(".")
+
+# A stdio MCP server; WITH_SEARCH adds a second tool, as an upgraded server would
+SERVER_SOURCE = '''
+import os
+from mcp.server.fastmcp import FastMCP
+
+server = FastMCP("test")
+
+
+@server.tool()
+def get_issue(issue_number: int) -> str:
+    """Gets an issue."""
+    return f"issue {issue_number}"
+
+
+if os.getenv("WITH_SEARCH"):
+    @server.tool()
+    def search_issues(query: str) -> str:
+        """Searches issues."""
+        return "[]"
+
+server.run()
+'''
+
+
+def run_with_servers(scenario, make_config):
+    """Runs `scenario(config)` with the MCP server config from `make_config(tmp)` and an empty cache dir."""
+    from src import mcp_client
+
+    build_server_config = mcp_client._build_server_config
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["REPO_ASSISTANT_CACHE_DIR"] = tmp
+        config = make_config(tmp)
+        mcp_client._build_server_config = lambda: config
+        try:
+            asyncio.run(scenario(config))
+        finally:
+            mcp_client._build_server_config = build_server_config
+            del os.environ["REPO_ASSISTANT_CACHE_DIR"]
+
+
+def python_server(tmp):
+    path = os.path.join(tmp, "server.py")
+    with open(path, "w") as f:
+        f.write(SERVER_SOURCE)
+    return {"test": {"command": sys.executable, "args": [path], "transport": "stdio", "env": {}}}
+
+
+def test_cold_then_warm_cache_and_refresh():
+    from src.mcp_client import load_tool_manifest, setup_mcp_tools_from_manifest_cache
+
+    async def scenario(config):
+        # Cold cache: waits for the servers, then writes their manifest
+        assert load_tool_manifest("test", config["test"]) is None
+        tools, connection = await setup_mcp_tools_from_manifest_cache()
+        assert connection.done() and [tool.name for tool in tools] == ["get_issue"]
+        assert await tools[0].ainvoke({"issue_number": 3}) == "issue 3"
+        assert [entry["name"] for entry in load_tool_manifest("test", config["test"])] == ["get_issue"]
+        await connection.aclose()
+
+        # Warm cache: proxies are returned before the servers are up, and forward once they are.
+        # The upgraded server has a new tool: the manifest is rewritten for the next start
+        config["test"]["env"] = {"WITH_SEARCH": "1"}
+        tools, connection = await setup_mcp_tools_from_manifest_cache()
+        assert not connection.done() and [tool.name for tool in tools] == ["get_issue"]
+        assert await tools[0].ainvoke({"issue_number": 4}) == "issue 4"
+        assert [entry["name"] for entry in load_tool_manifest("test", config["test"])] == ["get_issue",
+                                                                                          "search_issues"]
+        await connection.aclose()
+
+    run_with_servers(scenario, python_server)
+
+
+def test_failed_background_connection_fires_the_failure_callback():
+    from langchain_core.tools import ToolException
+    from src.mcp_client import save_tool_manifest, setup_mcp_tools_from_manifest_cache
+
+    def missing_server(tmp):
+        return {"test": {"command": os.path.join(tmp, "no-such-server"), "args": [], "transport": "stdio"}}
+
+    def crashing_server(tmp):  # Exits before the handshake, which would otherwise be waited on forever
+        return {"test": {"command": sys.executable, "args": ["-c", "raise SystemExit(1)"], "transport": "stdio"}}
+
+    async def scenario(config):
+        save_tool_manifest("test", config["test"], [{"name": "get_issue", "description": "Gets an issue.",
+                                                     "args_schema": {}}])
+        tools, connection = await setup_mcp_tools_from_manifest_cache()
+        errors = []
+        connection.add_failure_callback(errors.append)
+        try:
+            await tools[0].ainvoke({"issue_number": 1})
+            assert False, "calls must fail once the connection failed"
+        except ToolException:
+            pass
+        await asyncio.sleep(0)  # Done callbacks run on the next loop iteration
+        assert len(errors) == 1 and "MCP connection failed" in str(errors[0])
+        await connection.aclose()
+
+    os.environ["MCP_CONNECT_TIMEOUT_SECONDS"] = "2"
+    try:
+        run_with_servers(scenario, missing_server)
+        run_with_servers(scenario, crashing_server)
+    finally:
+        del os.environ["MCP_CONNECT_TIMEOUT_SECONDS"]
+
+
+if __name__ == '__main__':
+    test_cold_then_warm_cache_and_refresh()
+    test_failed_background_connection_fires_the_failure_callback()
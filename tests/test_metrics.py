@@ -0,0 +1,71 @@
+import sys
+import time
+import urllib.request
+
+sys.path.append(".")
+
+from src.metrics import MetricsRegistry, REGISTRY, start_metrics_server, _MetricsRequestHandler
+
+
+def test_render_prometheus_text_format():
+    registry = MetricsRegistry()
+    latency = registry.histogram("test_latency_seconds", "Test latency.", ["tool"], buckets=(0.1, 1))
+    processed = registry.counter("test_processed_total", "Processed items.", ["item_type"])
+    depth = registry.gauge("test_queue_depth", "Queue depth.")
+
+    latency.observe(0.05, tool="list_issues")
+    latency.observe(0.5, tool="list_issues")
+    latency.observe(5, tool="list_issues")
+    processed.inc(item_type="issue")
+    processed.inc(2, item_type="issue")
+    depth.set_function(lambda: 7)
+
+    text = registry.render()
+    print(text)
+    assert '# TYPE test_latency_seconds histogram' in text
+    assert 'test_latency_seconds_bucket{tool="list_issues",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{tool="list_issues",le="1"} 2' in text
+    assert 'test_latency_seconds_bucket{tool="list_issues",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{tool="list_issues"} 3' in text
+    assert 'test_processed_total{item_type="issue"} 3' in text
+    assert 'test_queue_depth 7' in text
+
+
+def test_metrics_endpoint_serves_registry():
+    registry = MetricsRegistry()
+    registry.counter("test_errors_total", "Errors.", ["stage"]).inc(stage="llm")
+    _MetricsRequestHandler.registry = registry
+    server = start_metrics_server(0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert 'test_errors_total{stage="llm"} 1' in response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
+        _MetricsRequestHandler.registry = REGISTRY
+
+
+def test_callback_handler_evicts_unfinished_calls():
+    from uuid import uuid4
+    from src.metrics import MetricsCallbackHandler
+
+    handler = MetricsCallbackHandler(max_age=0.05, max_entries=3)
+    cancelled = [uuid4() for _ in range(3)]
+    for run_id in cancelled:  # Cancelled tool calls get no end callback
+        handler.on_tool_start({"name": "get_issue"}, "", run_id=run_id)
+    handler.on_tool_start({"name": "get_issue"}, "", run_id=uuid4())
+    assert cancelled[0] not in handler._started and len(handler._started) == 3  # Over max_entries
+
+    time.sleep(0.06)
+    running = uuid4()
+    handler.on_tool_start({"name": "get_issue"}, "", run_id=running)
+    assert list(handler._started) == [running]  # Older than max_age
+    handler.on_tool_end("{}", run_id=running)
+    assert not handler._started
+
+
+if __name__ == '__main__':
+    test_render_prometheus_text_format()
+    test_metrics_endpoint_serves_registry()
+    test_callback_handler_evicts_unfinished_calls()
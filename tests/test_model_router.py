@@ -0,0 +1,158 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(".")
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+from pydantic import BaseModel
+
+from tests.fake_models import ToolCallingFakeChatModel
+
+
+class SlowFakeChatModel(ToolCallingFakeChatModel):
+    async def _agenerate(self, *args, **kwargs):
+        await asyncio.sleep(1)
+        return await super()._agenerate(*args, **kwargs)
+
+
+@tool
+def get_issue(issue_number: int) -> str:
+    """Gets an issue."""
+    return "{}"
+
+
+@tool
+def add_issue_comment(issue_number: int, body: str) -> str:
+    """Comments on an issue."""
+    return "{}"
+
+
+class Label(BaseModel):
+    label: str
+
+
+def reply(model: str, content: str = "", tool_call: str = "", args=None) -> AIMessage:
+    return AIMessage(content=content, tool_calls=[{"name": tool_call, "args": args or {}, "id": "call_1"}] if tool_call else [],
+                     usage_metadata={"input_tokens": 1000, "output_tokens": 100, "total_tokens": 1100},
+                     response_metadata={"model_name": model})
+
+
+def cascade(small_responses, large_responses, small_cls=ToolCallingFakeChatModel, **kwargs):
+    from src.model_router import CascadeChatModel
+
+    return CascadeChatModel(small=small_cls(responses=small_responses), large=ToolCallingFakeChatModel(
+        responses=large_responses), small_model_name="gpt-4o-mini", large_model_name="gpt-4o",
+                            large_tools=["add_issue_comment"], **kwargs).bind_tools([get_issue, add_issue_comment])
+
+
+def test_small_model_answers_simple_steps_and_usage_is_priced_per_model():
+    from src.usage import UsageTracker, estimate_cost
+
+    llm = cascade([reply("gpt-4o-mini", tool_call="get_issue", args={"issue_number": 1})], [reply("gpt-4o", "large")])
+    tracker = UsageTracker()
+    message = asyncio.run(llm.ainvoke("Triage issue #1", config={"callbacks": [tracker]}))
+    assert message.tool_calls[0]["name"] == "get_issue"
+    assert message.response_metadata["cascade_tier"] == "small"
+    assert tracker.llm_calls == 1 and tracker.model == "gpt-4o-mini"
+    assert abs(tracker.cost_usd - estimate_cost("gpt-4o-mini", 1000, 100)) < 1e-9
+
+
+def test_escalates_on_step_type_low_confidence_timeout_and_size():
+    from src.usage import UsageTracker
+
+    # Posting the final comment is a large-model step: the small attempt is discarded
+    llm = cascade([reply("gpt-4o-mini", tool_call="add_issue_comment", args={"issue_number": 1, "body": "x"})],
+                  [reply("gpt-4o", "large answer")])
+    tracker = UsageTracker()
+    message = asyncio.run(llm.ainvoke("Answer issue #1", config={"callbacks": [tracker]}))
+    assert message.content == "large answer" and message.response_metadata["cascade_reason"] == "step:add_issue_comment"
+    assert tracker.llm_calls == 2
+
+    llm = cascade([reply("gpt-4o-mini", "I'm not sure what causes this.")], [reply("gpt-4o", "large answer")])
+    assert asyncio.run(llm.ainvoke("Why?")).response_metadata["cascade_reason"] == "low_confidence"
+
+    llm = cascade([reply("gpt-4o-mini", "ok")], [reply("gpt-4o", "large answer")], small_cls=SlowFakeChatModel,
+                  small_timeout=0.1)
+    started = time.perf_counter()
+    assert asyncio.run(llm.ainvoke("Why?")).response_metadata["cascade_reason"] == "small_timeout"
+    assert time.perf_counter() - started < 1
+
+    llm = cascade([reply("gpt-4o-mini", "ok")], [reply("gpt-4o", "large answer")], max_small_input_tokens=100)
+    tracker = UsageTracker()
+    message = asyncio.run(llm.ainvoke("x" * 2000, config={"callbacks": [tracker]}))
+    assert message.response_metadata["cascade_reason"] == "item_size" and tracker.model == "gpt-4o"
+    assert tracker.llm_calls == 1
+
+
+def test_long_replies_escalate_only_from_agent_steps():
+    from src.model_router import CascadeChatModel
+
+    summary = "A long summary. " * 100
+    llm = cascade([reply("gpt-4o-mini", summary)], [reply("gpt-4o", "large answer")])
+    assert asyncio.run(llm.ainvoke("Answer issue #1")).response_metadata["cascade_reason"] == "long_reply"
+
+    # Summaries (no tools bound) are long by design
+    llm = CascadeChatModel(small=ToolCallingFakeChatModel(responses=[reply("gpt-4o-mini", summary)]),
+                           large=ToolCallingFakeChatModel(responses=[reply("gpt-4o", "large answer")]))
+    assert asyncio.run(llm.ainvoke("Summarize this diff")).content == summary
+
+
+def test_economy_runs_stay_on_the_small_model_unless_it_fails():
+    from src.usage import ECONOMY_METADATA_KEY
+
+    economy = {"metadata": {ECONOMY_METADATA_KEY: True}}
+    llm = cascade([reply("gpt-4o-mini", tool_call="add_issue_comment", args={"issue_number": 1, "body": "x"})],
+                  [reply("gpt-4o", "large answer")], max_small_input_tokens=100)
+    message = asyncio.run(llm.ainvoke("x" * 2000, config=economy))
+    assert message.tool_calls[0]["name"] == "add_issue_comment"
+    assert (message.response_metadata["cascade_tier"], message.response_metadata["cascade_reason"]) == ("small", "economy")
+
+    llm = cascade([reply("gpt-4o-mini", "")], [reply("gpt-4o", "large answer")])
+    assert asyncio.run(llm.ainvoke("Why?", config=economy)).response_metadata["cascade_reason"] == "empty"
+
+
+def test_sync_calls_route_inside_a_running_loop():
+    from src.usage import UsageTracker
+
+    llm = cascade([reply("gpt-4o-mini", tool_call="add_issue_comment", args={"issue_number": 1, "body": "x"})],
+                  [reply("gpt-4o", "large answer")])
+    tracker = UsageTracker()
+
+    async def scenario():  # A sync invoke from code running on the event loop
+        return llm.invoke("Answer issue #1", config={"callbacks": [tracker]})
+
+    message = asyncio.run(scenario())
+    assert message.content == "large answer" and message.response_metadata["cascade_reason"] == "step:add_issue_comment"
+    assert tracker.llm_calls == 2
+
+
+def test_structured_output_stays_on_the_small_model():
+    llm = cascade([reply("gpt-4o-mini", tool_call="Label", args={"label": "bug"})], [reply("gpt-4o", "large")])
+    assert asyncio.run(llm.with_structured_output(Label).ainvoke("Label this")).label == "bug"
+
+
+def test_cascade_is_only_built_when_a_small_model_is_configured():
+    from src.model_router import CascadeChatModel, build_cascade_model
+
+    large = ToolCallingFakeChatModel(responses=[reply("gpt-4o", "large")])
+    os.environ.pop("LLM_SMALL_MODEL_NAME", None)
+    assert build_cascade_model(large, "gpt-4o", None) is large
+    os.environ["LLM_SMALL_MODEL_NAME"] = "gpt-4o-mini"
+    try:
+        built = build_cascade_model(large, "gpt-4o", lambda provider, model: ToolCallingFakeChatModel(responses=[]))
+        assert isinstance(built, CascadeChatModel) and built.small_model_name == "gpt-4o-mini"
+    finally:
+        del os.environ["LLM_SMALL_MODEL_NAME"]
+
+
+if __name__ == '__main__':
+    test_small_model_answers_simple_steps_and_usage_is_priced_per_model()
+    test_escalates_on_step_type_low_confidence_timeout_and_size()
+    test_long_replies_escalate_only_from_agent_steps()
+    test_economy_runs_stay_on_the_small_model_unless_it_fails()
+    test_sync_calls_route_inside_a_running_loop()
+    test_structured_output_stays_on_the_small_model()
+    test_cascade_is_only_built_when_a_small_model_is_configured()
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import sys
+
+sys.path.append(".")
+
+from langchain_core.tools import StructuredTool
+
+from src.pr_analysis import analyze_pr_files, analyze_pull_request, is_generated
+
+FILES = [
+    {"filename": "src/auth/session.py", "status": "modified", "additions": 40, "deletions": 5,
+     "patch": "@@ -1,3 +1,4 @@\n+import subprocess\n+subprocess.run(cmd, shell=True)\n-old = 1"},
+    {"filename": "src/utils.py", "status": "modified", "additions": 10, "deletions": 2, "patch": "+x = 1\n+# TODO: cleanup"},
+    {"filename": "package-lock.json", "status": "modified", "additions": 900, "deletions": 850, "patch": None},
+    {"filename": "api/types_pb2.py", "status": "added", "additions": 120, "deletions": 0, "patch": "+# Generated"},
+    {"filename": "docs/guide.md", "status": "modified", "additions": 3, "deletions": 1, "patch": "+text"},
+    {"filename": "assets/logo.png", "status": "added", "additions": 0, "deletions": 0},
+]
+
+
+def test_stats_languages_generated_and_hotspots():
+    analysis = analyze_pr_files(FILES, total_files=6, commits=2)
+    assert analysis.generated == ["package-lock.json", "api/types_pb2.py"]
+    assert analysis.languages == {"Python": 57, "Markdown": 4}
+    assert analysis.hotspots[0] == ("src/auth/session.py", ["security-sensitive", "process execution"])
+    assert ("src/utils.py", ["TODO/FIXME added"]) in analysis.hotspots
+    assert analysis.hotspots[-1] == ("(whole PR)", ["source code changed without test changes"])
+    assert is_generated("pkg/client.go", "// Code generated by protoc-gen-go. DO NOT EDIT.") \
+        and not is_generated("src/generator.py")
+
+    summary = analysis.to_prompt()
+    assert summary.startswith("*   Size: 6 files changed, +1073 / -858 lines, 2 commits")
+    assert "    - assets/logo.png: added, +0/-0, diff not shown by GitHub (large or binary)" in summary
+    assert "package-lock.json" not in summary.split("Generated/vendored/lockfiles")[1].split("\n", 1)[1]
+    assert not analyze_pr_files(FILES + [{"filename": "tests/test_auth.py", "additions": 5}]).hotspots[-1][0].startswith("(")
+
+
+def test_large_pr_pages_are_fetched_concurrently():
+    files = [{"filename": f"src/m{i}.py", "status": "modified", "additions": 1, "deletions": 0, "patch": "+a"}
+             for i in range(250)]
+    in_flight, max_in_flight = [0], [0]
+
+    async def get_pull_request_files(owner: str, repo: str, pullNumber: int, page: int = 1, perPage: int = 30) -> str:
+        in_flight[0] += 1
+        max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+        await asyncio.sleep(0.05)
+        in_flight[0] -= 1
+        return json.dumps(files[(page - 1) * perPage:page * perPage])
+
+    async def get_pull_request(owner: str, repo: str, pullNumber: int) -> str:
+        return json.dumps({"number": pullNumber, "changed_files": 250, "commits": 7})
+
+    files_tool = StructuredTool.from_function(coroutine=get_pull_request_files, name="get_pull_request_files",
+                                              description="files")
+    details_tool = StructuredTool.from_function(coroutine=get_pull_request, name="get_pull_request",
+                                                description="details")
+    analysis = asyncio.run(analyze_pull_request(files_tool, details_tool, "o", "r", 5, {"number": 5}))
+    assert len(analysis.files) == 250 and analysis.commits == 7
+    assert max_in_flight[0] == 2  # Pages 2 and 3 together, after the first page and the details
+
+
+if __name__ == '__main__':
+    test_stats_languages_generated_and_hotspots()
+    test_large_pr_pages_are_fetched_concurrently()
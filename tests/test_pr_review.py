@@ -0,0 +1,109 @@
+import asyncio
+import sys
+import time
+
+sys.path.append(".")
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src.pr_analysis import analyze_pr_files
+from src.pr_review import ChunkedPRReviewer, chunk_pr_diff, needs_chunked_review
+from src.usage import BudgetExceededError
+
+
+class SlowFakeChatModel(BaseChatModel):
+    """Answers after `latency` seconds; records the peak number of concurrent calls."""
+    latency: float = 0.2
+    in_flight: int = 0
+    max_in_flight: int = 0
+    prompts: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.prompts.append(str(messages[-1].content))
+        await asyncio.sleep(self.latency)
+        self.in_flight -= 1
+        prompt = str(messages[-1].content)
+        if prompt.startswith("Merge"):
+            content = "\n".join(line for line in prompt.splitlines() if line.startswith("- Notes on"))[:1200]
+        else:
+            content = f"- Notes on {prompt.split('Diff of the area `', 1)[1].split('`', 1)[0]} " + "x" * 400
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+
+def make_files(modules: int, files_per_module: int, patch_lines: int = 20):
+    return [{"filename": f"pkg{m}/sub/f{f}.py", "status": "modified", "additions": patch_lines, "deletions": 0,
+             "patch": "\n".join(f"+value_{i} = compute({i})" for i in range(patch_lines))}
+            for m in range(modules) for f in range(files_per_module)]
+
+
+def test_chunks_are_token_bounded_and_keep_modules_together():
+    analysis = analyze_pr_files(make_files(12, 10) + [{"filename": "package-lock.json", "additions": 5000}])
+    assert needs_chunked_review(analysis) and not needs_chunked_review(analyze_pr_files(make_files(2, 3)))
+    chunks = chunk_pr_diff([change for change in analysis.files if change.filename not in analysis.generated], 2000)
+    assert all(chunk.tokens <= 2000 for chunk in chunks)
+    assert sum(len(chunk.files) for chunk in chunks) == 120
+    assert all(len(chunk.modules) == 1 for chunk in chunks)  # Each module (~1600 tokens) fits in one chunk
+
+
+def test_map_stage_runs_chunks_in_parallel():
+    analysis = analyze_pr_files(make_files(40, 5))
+    llm = SlowFakeChatModel(prompts=[])
+    reviewer = ChunkedPRReviewer(llm, chunk_tokens=700, concurrency=50, reduce_tokens=3000)
+    started = time.perf_counter()
+    notes = asyncio.run(reviewer.review({"number": 9, "title": "Huge refactor"}, analysis))
+    elapsed = time.perf_counter() - started
+    map_calls = sum("Diff of the area" in prompt for prompt in llm.prompts)
+    assert map_calls == 40 and llm.max_in_flight == 40
+    assert elapsed < 3 * llm.latency + 0.5  # Map, then merge rounds; not 40 sequential calls
+    assert "Notes on" in notes and len(notes) // 4 <= 3000
+
+
+class BudgetFakeChatModel(SlowFakeChatModel):
+    """Like SlowFakeChatModel, but the call for `over_budget_area` stops the run after 0.1s."""
+    over_budget_area: str = ""
+    completed: int = 0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if f"Diff of the area `{self.over_budget_area}`" in str(messages[-1].content):
+            await asyncio.sleep(0.1)  # The other calls are in flight by then
+            raise BudgetExceededError("LLM budget of $0.01 exceeded")
+        result = await super()._agenerate(messages, stop, run_manager, **kwargs)
+        self.completed += 1
+        return result
+
+
+def test_budget_exceeded_cancels_the_other_chunks():
+    analysis = analyze_pr_files(make_files(40, 5))
+    llm = BudgetFakeChatModel(prompts=[], latency=5, over_budget_area="pkg0/sub")
+    reviewer = ChunkedPRReviewer(llm, chunk_tokens=700, concurrency=10)
+
+    async def run():
+        try:
+            await reviewer.review({"number": 9, "title": "Huge refactor"}, analysis)
+            assert False, "the budget error must stop the review"
+        except BudgetExceededError:
+            pass
+        return asyncio.all_tasks()
+
+    started = time.perf_counter()
+    pending = asyncio.run(run())
+    assert time.perf_counter() - started < llm.latency  # Not waiting for the calls in flight
+    assert len(pending) == 1 and llm.completed == 0 and llm.in_flight == 9  # Cancelled mid-call
+    assert len(llm.prompts) == 9  # Chunks waiting for the semaphore never started
+
+
+if __name__ == '__main__':
+    test_chunks_are_token_bounded_and_keep_modules_together()
+    test_map_stage_runs_chunks_in_parallel()
+    test_budget_exceeded_cancels_the_other_chunks()
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import sys
+
+sys.path.append(".")
+
+from langchain_core.tools import StructuredTool
+
+
+def make_tools(calls, delay=0.0):
+    async def get_issue_comments(owner: str, repo: str, issue_number: int) -> str:
+        calls.append(("get_issue_comments", issue_number))
+        await asyncio.sleep(delay)
+        return json.dumps([{"user": {"login": "someone"}, "body": f"comment on #{issue_number}"}])
+
+    async def get_issue(owner: str, repo: str, issue_number: int) -> str:
+        calls.append(("get_issue", issue_number))
+        return json.dumps({"number": issue_number})
+
+    async def get_readable_file_content(owner: str, repo: str, path: str) -> str:
+        calls.append(("get_readable_file_content", path))
+        return f"content of {path}"
+
+    async def add_issue_comment(owner: str, repo: str, issue_number: int, body: str) -> str:
+        calls.append(("add_issue_comment", issue_number))
+        return "{}"
+
+    return [StructuredTool.from_function(coroutine=f, name=f.__name__, description=f.__name__)
+            for f in (get_issue_comments, get_issue, get_readable_file_content, add_issue_comment)]
+
+
+def test_cache_shares_calls_and_write_tools_invalidate_the_item():
+    from src.tool_cache import ToolResultCache, wrap_tools_with_cache
+
+    calls = []
+    tools = {tool.name: tool for tool in wrap_tools_with_cache(make_tools(calls, delay=0.05), ToolResultCache())}
+    args = {"owner": "octo", "repo": "repo", "issue_number": 1}
+
+    async def scenario():
+        first, second = await asyncio.gather(tools["get_issue_comments"].ainvoke(args),
+                                             tools["get_issue_comments"].ainvoke(args))
+        assert first == second and calls == [("get_issue_comments", 1)]  # One request for both callers
+        await tools["get_issue_comments"].ainvoke(args)
+        assert len(calls) == 1
+        await tools["add_issue_comment"].ainvoke({**args, "body": "Thanks!"})
+        await tools["get_issue_comments"].ainvoke(args)  # The thread changed: fetched again
+        assert calls[-2:] == [("add_issue_comment", 1), ("get_issue_comments", 1)]
+
+    asyncio.run(scenario())
+
+
+def test_next_items_are_prefetched_and_hit_by_the_agent():
+    from src.prefetch import prefetch_targets, start_prefetch
+    from src.tool_cache import ToolResultCache, wrap_tools_with_cache
+
+    calls = []
+    tools = wrap_tools_with_cache(make_tools(calls), ToolResultCache())
+    tools_by_name = {tool.name: tool for tool in tools}
+    issues = [{"number": 9, "html_url": "https://github.com/octo/repo/issues/9", "body": ""},
+              {"number": 8, "html_url": "https://github.com/octo/repo/pull/8", "body": ""},
+              {"number": 7, "html_url": "https://github.com/octo/repo/issues/7",
+               "body": "Same as #3, see src/agent.py and https://example.com/x.py"},
+              {"number": 6, "html_url": "https://github.com/octo/repo/issues/6", "body": ""}]
+
+    targets = prefetch_targets(issues[2], "issue", "octo", "repo", tools_by_name)
+    assert [(name, args.get("issue_number") or args.get("path")) for name, args in targets] == [
+        ("get_issue_comments", 7), ("get_issue", 3), ("get_readable_file_content", "src/agent.py")]
+
+    async def scenario():
+        task = start_prefetch(tools, "octo", "repo", issues, issues[0], "issue")
+        await task
+        assert [call[1] for call in calls] == [7, 3, "src/agent.py", 6]  # The PR listed by list_issues is skipped
+        # The next cycle's eligibility check and the agent's first calls are served from the cache
+        await tools_by_name["get_issue_comments"].ainvoke({"owner": "octo", "repo": "repo", "issue_number": 7})
+        await tools_by_name["get_issue"].ainvoke({"owner": "octo", "repo": "repo", "issue_number": 3})
+        assert len(calls) == 4
+
+    asyncio.run(scenario())
+
+
+def test_prefetch_waits_for_foreground_calls():
+    from src.tool_cache import ToolResultCache, wrap_tools_with_cache
+
+    calls = []
+    tools = {tool.name: tool for tool in wrap_tools_with_cache(make_tools(calls, delay=0.2), ToolResultCache())}
+
+    async def scenario():
+        foreground = asyncio.create_task(tools["get_issue_comments"].ainvoke(
+            {"owner": "octo", "repo": "repo", "issue_number": 1}))
+        await asyncio.sleep(0.01)
+        await tools["get_issue"].prefetch({"owner": "octo", "repo": "repo", "issue_number": 2})
+        assert foreground.done()  # The prefetch only started once the foreground call was over
+        assert calls == [("get_issue_comments", 1), ("get_issue", 2)]
+
+    asyncio.run(scenario())
+
+
+if __name__ == '__main__':
+    test_cache_shares_calls_and_write_tools_invalidate_the_item()
+    test_next_items_are_prefetched_and_hit_by_the_agent()
+    test_prefetch_waits_for_foreground_calls()
@@ -0,0 +1,183 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(".")
+
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel, GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool, tool
+
+
+class FlakyFakeChatModel(FakeMessagesListChatModel):
+    failures: int = 0
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[t.name for t in tools])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connection reset")
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connection reset")
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+
+@tool
+def get_issue(issue_number: int) -> str:
+    """Gets an issue."""
+    return "{}"
+
+
+def make_tool(name, calls, failures=0, delays=()):
+    async def call(issue_number: int) -> str:
+        calls.append(issue_number)
+        if len(calls) <= failures:
+            raise ConnectionError("MCP server unreachable")
+        await asyncio.sleep(delays[len(calls) - 1] if len(calls) <= len(delays) else 0)
+        return f"issue {issue_number} (call {len(calls)})"
+
+    return StructuredTool.from_function(coroutine=call, name=name, description=name)
+
+
+def test_tools_retry_transient_errors_but_not_writes():
+    from src.resilience import wrap_tools_with_resilience
+
+    os.environ["RETRY_BASE_DELAY_SECONDS"] = "0.01"
+    try:
+        read_calls, write_calls = [], []
+        read, write = wrap_tools_with_resilience(
+            [make_tool("get_issue", read_calls, failures=2), make_tool("add_issue_comment", write_calls, failures=1)],
+            {"get_issue": "retry-test", "add_issue_comment": "retry-test"})
+    finally:
+        del os.environ["RETRY_BASE_DELAY_SECONDS"]
+
+    async def scenario():
+        assert await read.ainvoke({"issue_number": 1}) == "issue 1 (call 3)"
+        try:
+            await write.ainvoke({"issue_number": 1})
+            assert False, "a failed write must not be retried"
+        except ConnectionError:
+            pass
+        assert read_calls == [1, 1, 1] and write_calls == [1]
+
+    asyncio.run(scenario())
+
+
+def test_circuit_breaker_fails_fast_and_recovers():
+    from src.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, call_with_retries
+
+    breaker = CircuitBreaker("breaker-test", failure_threshold=2, reset_seconds=0.1)
+    calls = []
+
+    async def down():
+        calls.append("down")
+        raise ConnectionError("refused")
+
+    async def up():
+        calls.append("up")
+        return "ok"
+
+    async def scenario():
+        for _ in range(2):
+            try:
+                await call_with_retries(down, "down", RetryPolicy(attempts=1), breaker)
+            except ConnectionError:
+                pass
+        assert breaker.state == "open"
+        try:
+            await call_with_retries(up, "up", RetryPolicy(attempts=3), breaker)
+            assert False, "an open circuit must fail fast"
+        except CircuitOpenError:
+            pass
+        assert calls == ["down", "down"]
+        await asyncio.sleep(0.1)
+        assert await call_with_retries(up, "up", RetryPolicy(attempts=1), breaker) == "ok"  # The half-open trial
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_half_open_trial_does_not_block_the_breaker():
+    from src.resilience import CircuitBreaker, RetryPolicy, call_with_retries
+
+    breaker = CircuitBreaker("cancel-test", failure_threshold=1, reset_seconds=0.05)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def up():
+        return "ok"
+
+    async def scenario():
+        breaker.record_failure()
+        assert breaker.state == "open"
+        await asyncio.sleep(0.05)
+        try:
+            await asyncio.wait_for(call_with_retries(slow, "slow", RetryPolicy(attempts=1), breaker), 0.05)
+            assert False, "the trial should time out"
+        except asyncio.TimeoutError:
+            pass
+        assert breaker.state == "open"
+        assert await call_with_retries(up, "up", RetryPolicy(attempts=1), breaker) == "ok"  # The next trial runs
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_slow_reads_are_hedged():
+    from src.resilience import HEDGED_CALLS, wrap_tools_with_resilience
+
+    os.environ["MCP_HEDGE_AFTER_SECONDS"] = "0.05"
+    try:
+        calls = []
+        (hedged,) = wrap_tools_with_resilience([make_tool("get_issue", calls, delays=(1.0, 0.0))])
+    finally:
+        del os.environ["MCP_HEDGE_AFTER_SECONDS"]
+
+    async def scenario():
+        started = time.time()
+        assert await hedged.ainvoke({"issue_number": 5}) == "issue 5 (call 2)"
+        assert time.time() - started < 0.5  # The duplicate answered; the slow original was cancelled
+
+    asyncio.run(scenario())
+    assert HEDGED_CALLS.value(tool="get_issue", winner="hedge") == 1
+
+
+def test_llm_calls_are_retried_and_stay_transparent():
+    from src.resilience import CircuitBreaker, ResilientChatModel, RetryPolicy
+
+    policy = RetryPolicy(attempts=3, base_delay=0.01)
+    inner = FlakyFakeChatModel(responses=[AIMessage(content="done")], failures=2)
+    llm = ResilientChatModel(inner=inner, breaker=CircuitBreaker("llm:retry-test"), policy=policy)
+    bound = llm.bind_tools([get_issue])
+    assert bound.kwargs == {"tools": ["get_issue"]}
+
+    streaming = ResilientChatModel(inner=GenericFakeChatModel(messages=iter([AIMessage(content="hello world")])),
+                                   breaker=CircuitBreaker("llm:stream-test"), policy=policy)
+
+    async def scenario():
+        assert (await bound.ainvoke("hi")).content == "done"
+        chunks = [chunk.content async for chunk in streaming.astream("hi")]
+        assert len(chunks) > 1 and "".join(chunks) == "hello world"
+
+    asyncio.run(scenario())
+
+    inner.failures, inner.i = 2, 0
+    assert bound.invoke("hi").content == "done"  # The sync API is retried as well
+    streaming.inner.messages = iter([AIMessage(content="hello world")])
+    assert [chunk.content for chunk in streaming.stream("hi")] == ["hello world"]  # One chunk, from _generate
+
+
+if __name__ == '__main__':
+    test_tools_retry_transient_errors_but_not_writes()
+    test_circuit_breaker_fails_fast_and_recovers()
+    test_cancelled_half_open_trial_does_not_block_the_breaker()
+    test_slow_reads_are_hedged()
+    test_llm_calls_are_retried_and_stay_transparent()
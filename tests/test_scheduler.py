@@ -0,0 +1,129 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(".")
+
+
+def test_scheduler_runs_jobs_periodically_without_overlap():
+    from src.scheduler import PollingScheduler
+
+    runs = {"fast": [], "slow": []}  # (started, finished) per run
+
+    async def main():
+        enough_runs = asyncio.Event()
+        fast_ran = asyncio.Event()
+
+        def job(name, wait):
+            async def run():
+                started = time.time()
+                await wait()
+                runs[name].append((started, time.time()))
+                if name == "fast":
+                    fast_ran.set()
+                if len(runs["fast"]) >= 6 and len(runs["slow"]) >= 3:
+                    enough_runs.set()
+
+            return run
+
+        async def wait_for_a_fast_run():  # Only returns if the fast job runs while this one does
+            fast_ran.clear()
+            await asyncio.wait_for(fast_ran.wait(), timeout=5)
+            await asyncio.sleep(0.06)  # Longer than the interval
+
+        scheduler = PollingScheduler(max_concurrency=2)
+        scheduler.add_job("fast", job("fast", lambda: asyncio.sleep(0.01)), interval=0.05)
+        scheduler.add_job("slow", job("slow", wait_for_a_fast_run), interval=0.05, initial_delay=0.02)
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.wait_for(enough_runs.wait(), timeout=10)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+    for name, job_runs in runs.items():
+        for (started, finished), (next_started, _) in zip(job_runs, job_runs[1:]):
+            assert next_started >= finished, f"{name} overlapped with itself"
+            assert next_started - started >= 0.05 - 0.005  # Due one interval after the previous start
+
+
+def test_adaptive_interval_follows_activity():
+    from src.scheduler import AdaptiveInterval
+
+    poller = AdaptiveInterval("issues:a/one", base=300, min_interval=30, max_interval=1200)
+    assert [poller.record(False) for _ in range(4)] == [600, 1200, 1200, 1200]  # Backs off while idle, capped
+    assert poller.record(True) == 30  # A burst is followed closely
+    assert poller.record(False) == 60
+    assert poller.hit_rate == 1 / 6
+
+    os.environ["ADAPTIVE_POLLING"] = "false"
+    try:
+        fixed = AdaptiveInterval.from_env("prs:a/one", 300)
+        assert fixed.record(False) == 300 and fixed.record(True) == 300
+    finally:
+        del os.environ["ADAPTIVE_POLLING"]
+
+
+def test_scheduler_uses_adaptive_interval():
+    from src.scheduler import AdaptiveInterval, PollingScheduler
+
+    adaptive = AdaptiveInterval("poll", base=0.1, min_interval=0.05, max_interval=0.2)
+    runs, intervals = [], []
+
+    async def main():
+        fourth_run = asyncio.Event()
+
+        async def poll():
+            runs.append(time.time())
+            intervals.append(adaptive.current)  # The interval the scheduler waited before this run
+            if len(runs) == 4:
+                fourth_run.set()
+            return len(runs) == 1  # Only the first poll finds work
+
+        scheduler = PollingScheduler()
+        scheduler.add_job("poll", poll, interval=0.1, adaptive=adaptive)
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.wait_for(fourth_run.wait(), timeout=10)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+    assert intervals[1:4] == [0.05, 0.1, 0.2]  # Back to the minimum after a hit, then backing off
+    # Sleeps never end early (a loaded machine only makes them longer)
+    gaps = [b - a for a, b in zip(runs, runs[1:])]
+    assert all(gap >= expected - 0.005 for gap, expected in zip(gaps, intervals[1:]))
+
+
+def test_load_daemon_config():
+    from src.repo_config import load_daemon_config
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "issues.md"), "w") as f:
+            f.write("Be brief.")
+        path = os.path.join(tmp, "repos.toml")
+        with open(path, "w") as f:
+            f.write('[defaults]\nllm_model = "gpt-4o-mini"\nissue_interval = 60\n\n'
+                    '[[repos]]\nowner = "a"\nrepo = "one"\nissue_instructions = "@issues.md"\n\n'
+                    '[[repos]]\nowner = "b"\nrepo = "two"\nllm_model = "gpt-4o"\nenable_prs = false\n')
+        config = load_daemon_config(path)
+
+        assert [r.full_name for r in config.repos] == ["a/one", "b/two"]
+        assert config.repos[0].llm_model == "gpt-4o-mini" and config.repos[0].issue_interval == 60
+        assert config.repos[0].issue_instructions == "Be brief."
+        assert config.repos[1].llm_model == "gpt-4o" and not config.repos[1].enable_prs
+
+        with open(path, "w") as f:
+            f.write('[[repos]]\nowner = "a"\n')
+        try:
+            load_daemon_config(path)
+            assert False, "missing repo should be rejected"
+        except ValueError:
+            pass
+
+
+if __name__ == '__main__':
+    test_scheduler_runs_jobs_periodically_without_overlap()
+    test_adaptive_interval_follows_activity()
+    test_scheduler_uses_adaptive_interval()
+    test_load_daemon_config()
@@ -0,0 +1,73 @@
+import asyncio
+import sys
+
+sys.path.append(".")
+
+from src.startup import StartupPipeline, StartupError
+
+
+def test_independent_steps_overlap_and_dependencies_receive_results():
+    events = []
+
+    async def run():
+        started = {"a": asyncio.Event(), "b": asyncio.Event()}
+
+        async def meet(name, other, value):
+            # Each step waits until the other has started: only possible if they run concurrently
+            events.append(f"{name} started")
+            started[name].set()
+            await asyncio.wait_for(started[other].wait(), timeout=5)
+            events.append(f"{name} done")
+            return value
+
+        async def combine(deps):
+            events.append("sum started")
+            return deps["a"] + deps["b"]
+
+        pipeline = StartupPipeline()
+        pipeline.add_step("a", lambda _: meet("a", "b", 1))
+        pipeline.add_step("b", lambda _: meet("b", "a", 2))
+        pipeline.add_step("sum", combine, depends_on=("a", "b"))
+        return await pipeline.run(), pipeline.timing_report()
+
+    results, report = asyncio.run(run())
+    print(report)
+    assert results == {"a": 1, "b": 2, "sum": 3}
+    assert events.index("b started") < events.index("a done")  # a and b ran concurrently
+    assert events[-1] == "sum started"  # After both of its dependencies
+    assert "sum" in report and "after a, b" in report
+
+
+def test_failing_step_cancels_pipeline():
+    cancelled = []
+
+    async def fail(_):
+        raise RuntimeError("boom")
+
+    async def slow(_):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run():
+        pipeline = StartupPipeline()
+        pipeline.add_step("fail", fail)
+        pipeline.add_step("slow", slow)
+        pipeline.add_step("dependent", slow, depends_on=("fail",))
+        await pipeline.run()
+
+    try:
+        asyncio.run(run())
+    except StartupError as e:
+        assert e.step_name == "fail"
+        assert isinstance(e.error, RuntimeError)
+    else:
+        raise AssertionError("Expected StartupError")
+    assert cancelled == [True]
+
+
+if __name__ == '__main__':
+    test_independent_steps_overlap_and_dependencies_receive_results()
+    test_failing_step_cancels_pipeline()
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.append(".")
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+
+from tests.fake_models import ToolCallingFakeChatModel
+
+
+def issue(number, title, body="", updated_at="2024-01-01T00:00:00Z"):
+    return {"number": number, "title": title, "body": body, "labels": [], "user": {"login": f"user{number}"},
+            "html_url": f"https://github.com/octo/repo/issues/{number}", "updated_at": updated_at}
+
+
+ISSUES = [issue(6, "BUY CHEAP WATCHES"), issue(5, "Crash on start", "It crashes."),
+          issue(4, "Crash when starting", "Traceback: ... KeyError 'x' in loader.py"),
+          issue(3, "Add dark mode", "Would be nice."), issue(2, "Docs typo", "README line 3.")]
+
+
+def triage_response(*decisions):
+    return AIMessage(content="", tool_calls=[{"name": "TriageBatch", "id": "call_1", "args": {"issues": [
+        {"number": n, "category": c, "reason": "r", **extra} for n, c, extra in decisions]}}])
+
+
+def test_batch_triage_classifies_and_falls_back_to_the_agent():
+    from src.triage import triage_issue_batch
+
+    llm = ToolCallingFakeChatModel(responses=[triage_response(
+        (6, "spam", {}), (5, "duplicate_candidate", {"duplicate_of": 4, "reply": "Same as #4."}),
+        (3, "duplicate_candidate", {"duplicate_of": 99, "reply": "Dup."}), (2, "needs_info", {}))])
+    results = asyncio.run(triage_issue_batch(llm, ISSUES, "octo/repo"))
+    assert results[6].category == "spam" and results[5].duplicate_of == 4
+    assert results[3].category == "valid_needs_agent"  # Unknown duplicate reference
+    assert results[2].category == "valid_needs_agent"  # needs_info without a reply
+    assert results[4].category == "valid_needs_agent"  # Not classified
+
+
+def test_backlog_is_triaged_once_and_only_valid_issues_reach_the_agent():
+    comments = []
+
+    async def add_issue_comment(owner: str, repo: str, issue_number: int, body: str) -> str:
+        comments.append((issue_number, body))
+        return "{}"
+
+    tools = [StructuredTool.from_function(coroutine=add_issue_comment, name="add_issue_comment", description="c")]
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["STATE_DB_PATH"] = os.path.join(tmp, "state.sqlite3")
+        os.environ.update({"ISSUE_TRIAGE_BATCH_SIZE": "25", "ISSUE_TRIAGE_COMMENT": "true"})  # Opt-in mode
+        try:
+            from src import state_store
+            from src.github_processor import previous_triages, triage_issue_backlog
+
+            state_store._state_store = None
+            llm = ToolCallingFakeChatModel(responses=[triage_response(
+                (6, "spam", {}), (5, "valid_needs_agent", {}),
+                (4, "needs_info", {"reply": "Which version do you use?"}),
+                (3, "valid_needs_agent", {}), (2, "duplicate_candidate", {"duplicate_of": 3, "reply": "See above."}))])
+            target = asyncio.run(triage_issue_backlog(ISSUES, ISSUES, llm, tools, "octo", "repo"))
+            assert target["number"] == 5
+            assert comments == [(4, "Which version do you use?"),
+                                (2, "See above.\n\nThis looks like a possible duplicate of #3.")]
+            assert state_store.get_state_store().recent_runs("octo/repo", "issue_triage", 0)[0]["status"] == "completed"
+            assert previous_triages("octo", "repo", ISSUES + [issue(1, "Untouched")]) == {
+                6: "spam", 5: "valid_needs_agent", 4: "needs_info", 3: "valid_needs_agent", 2: "duplicate_candidate",
+                1: None}
+
+            # Next cycle: nothing to triage again (the fake model has no response left), #5 was processed
+            target = asyncio.run(triage_issue_backlog([ISSUES[0], ISSUES[3]], ISSUES, llm, tools, "octo", "repo"))
+            assert target["number"] == 3 and len(comments) == 2
+            # An update after the triage makes the issue eligible for triage again
+            updated = issue(6, "BUY CHEAP WATCHES", updated_at="2999-01-01T00:00:00Z")
+            assert asyncio.run(triage_issue_backlog([updated], ISSUES, llm, tools, "octo", "repo")) == updated
+        finally:
+            for name in ("STATE_DB_PATH", "ISSUE_TRIAGE_BATCH_SIZE", "ISSUE_TRIAGE_COMMENT"):
+                del os.environ[name]
+            state_store.get_state_store().close()
+            state_store._state_store = None
+
+
+if __name__ == '__main__':
+    test_batch_triage_classifies_and_falls_back_to_the_agent()
+    test_backlog_is_triaged_once_and_only_valid_issues_reach_the_agent()
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.append(".")
+
+from langchain_core.messages import AIMessage
+from langgraph.prebuilt import create_react_agent
+
+from tests.fake_models import ToolCallingFakeChatModel
+
+
+def _reply(content: str, input_tokens: int, output_tokens: int, tool_call: bool = False) -> AIMessage:
+    return AIMessage(
+        content=content,
+        tool_calls=[{"name": "noop", "args": {}, "id": f"call_{content}"}] if tool_call else [],
+        usage_metadata={"input_tokens": input_tokens, "output_tokens": output_tokens,
+                        "total_tokens": input_tokens + output_tokens,
+                        "input_token_details": {"cache_read": input_tokens // 2}},
+        response_metadata={"model_name": "gpt-4o"},
+    )
+
+
+def _noop_tool():
+    from langchain_core.tools import tool
+
+    @tool
+    def noop() -> str:
+        """Does nothing."""
+        return "ok"
+
+    return noop
+
+
+def test_estimate_cost_and_budget_plan():
+    from src.usage import estimate_cost, plan_run_budget
+
+    # 1M uncached input + 1M output on gpt-4o-2024-08-06 (prefix match)
+    assert round(estimate_cost("gpt-4o-2024-08-06", 1_000_000, 1_000_000), 2) == 12.50
+    assert estimate_cost("gpt-4o-mini", 1_000_000, 0) == 0.15
+    assert estimate_cost("unknown-model", 10, 10) == 0.0
+
+    os.environ["LLM_BUDGET_PER_ITEM_USD"] = "1"
+    os.environ["LLM_BUDGET_PER_DAY_USD"] = "10"
+    try:
+        assert plan_run_budget(0).mode == "normal"
+        economy = plan_run_budget(9.5)
+        assert economy.mode == "economy" and economy.budget_usd == 0.5 and economy.recursion_limit
+        assert plan_run_budget(10).mode == "exhausted"
+    finally:
+        del os.environ["LLM_BUDGET_PER_ITEM_USD"]
+        del os.environ["LLM_BUDGET_PER_DAY_USD"]
+
+
+def test_run_is_accounted_and_stopped_when_over_item_budget():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["STATE_DB_PATH"] = os.path.join(tmp, "state.sqlite3")
+        os.environ["LLM_BUDGET_PER_ITEM_USD"] = "0.02"
+        try:
+            from src import state_store
+            from src.github_processor import run_agent_on_item
+
+            state_store._state_store = None
+            # Each call costs ~$0.0044 for input and $0.01 for output on gpt-4o
+            llm = ToolCallingFakeChatModel(responses=[
+                _reply("a", 2000, 1000, tool_call=True),
+                _reply("b", 2000, 1000, tool_call=True),
+                _reply("done", 2000, 1000),
+            ])
+            agent = create_react_agent(llm, [_noop_tool()])
+            answer = asyncio.run(run_agent_on_item(
+                agent, {"messages": [("user", "hi")]}, "issue", 7, "octo", "repo"))
+
+            assert answer is None
+            runs = state_store.get_state_store().recent_runs("octo/repo", "issue", 7)
+            assert runs[0]["status"] == "budget_exceeded"
+            assert runs[0]["input_tokens"] == 4000 and runs[0]["cached_tokens"] == 2000
+            assert runs[0]["cost_usd"] > 0.02
+        finally:
+            del os.environ["STATE_DB_PATH"]
+            del os.environ["LLM_BUDGET_PER_ITEM_USD"]
+            state_store.get_state_store().close()
+            state_store._state_store = None
+
+
+def test_economy_mode_run_flags_the_agent_config():
+    from langchain_core.runnables import RunnableLambda
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["STATE_DB_PATH"] = os.path.join(tmp, "state.sqlite3")
+        os.environ["LLM_BUDGET_PER_DAY_USD"] = "1"
+        os.environ["LLM_BUDGET_PER_ITEM_USD"] = "5"  # Less than one item budget left: economy mode
+        try:
+            from src import state_store
+            from src.github_processor import run_agent_on_item
+            from src.usage import ECONOMY_METADATA_KEY
+
+            state_store._state_store = None
+            seen = {}
+
+            def agent(agent_input, config):
+                seen.update(metadata=config.get("metadata"), recursion_limit=config.get("recursion_limit"))
+                return {"messages": [AIMessage(content="cheap answer")]}
+
+            answer = asyncio.run(run_agent_on_item(
+                RunnableLambda(agent), {"messages": [("user", "hi")]}, "issue", 8, "octo", "repo"))
+
+            assert answer == "cheap answer"
+            assert seen["metadata"][ECONOMY_METADATA_KEY] is True
+            assert seen["recursion_limit"] == int(os.getenv("LLM_ECONOMY_RECURSION_LIMIT", 12))
+            assert state_store.get_state_store().recent_runs("octo/repo", "issue", 8)[0]["status"] == "completed"
+        finally:
+            del os.environ["STATE_DB_PATH"]
+            del os.environ["LLM_BUDGET_PER_DAY_USD"]
+            del os.environ["LLM_BUDGET_PER_ITEM_USD"]
+            state_store.get_state_store().close()
+            state_store._state_store = None
+
+
+if __name__ == '__main__':
+    test_estimate_cost_and_budget_plan()
+    test_run_is_accounted_and_stopped_when_over_item_budget()
+    test_economy_mode_run_flags_the_agent_config()
@@ -0,0 +1,59 @@
+import json
+import subprocess
+import sys
+
+sys.path.append(".")
+
+# Backends that must stay unloaded until get_llm_model selects them
+PROVIDER_MODULES = [
+    "langchain_openai",
+    "langchain_anthropic",
+    "langchain_mistralai",
+    "langchain_google_genai",
+    "langchain_ollama",
+    "langchain_aws",
+]
+
+
+def _run_in_fresh_interpreter(code: str) -> dict:
+    result = subprocess.run([sys.executable, "-c", code],
+                            capture_output=True, text=True, check=True, cwd=".")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_utils_import_is_lazy():
+    code = f"""
+import json, sys
+import src.utils
+print(json.dumps({{"loaded": [m for m in {PROVIDER_MODULES!r} if m in sys.modules]}}))
+"""
+    report = _run_in_fresh_interpreter(code)
+    assert report["loaded"] == [], f"Provider backends imported at startup: {report['loaded']}"
+
+
+def test_get_llm_model_imports_only_selected_provider():
+    code = f"""
+import json, sys
+import src.utils
+src.utils.get_llm_model("openai", model_name="gpt-4o", api_key="sk-test")
+print(json.dumps({{"loaded": [m for m in {PROVIDER_MODULES!r} if m in sys.modules]}}))
+"""
+    report = _run_in_fresh_interpreter(code)
+    assert report["loaded"] == ["langchain_openai"]
+
+
+def test_unknown_provider_raises():
+    from src.utils import get_llm_model
+
+    try:
+        get_llm_model("no-such-provider")
+    except ValueError as e:
+        assert "Unsupported provider" in str(e)
+    else:
+        raise AssertionError("Expected ValueError for an unknown provider")
+
+
+if __name__ == '__main__':
+    test_utils_import_is_lazy()
+    test_get_llm_model_imports_only_selected_provider()
+    test_unknown_provider_raises()
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(".")
+
+from src.work_queue import SQLiteWorkQueue, open_work_queue
+
+
+def test_lease_heartbeat_and_expiry():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = SQLiteWorkQueue(os.path.join(tmp, "queue.sqlite3"), max_attempts=2)
+        try:
+            assert queue.enqueue("octo/repo", "issue", 1, {"number": 1})
+            assert not queue.enqueue("octo/repo", "issue", 1, {"number": 1})  # Already pending
+            assert queue.enqueue("octo/repo", "pr", 1, {"number": 1})
+            assert queue.active_numbers("octo/repo", "issue") == {1}
+
+            item = queue.lease("worker-a", lease_seconds=0.2)
+            assert (item.item_type, item.item_number, item.payload, item.attempts) == ("issue", 1, {"number": 1}, 1)
+            assert queue.heartbeat(item.id, "worker-a", 0.2)
+            assert not queue.heartbeat(item.id, "worker-b", 0.2)
+
+            # worker-a stops heartbeating: once the lease expires the item goes to worker-b
+            other = queue.lease("worker-b", lease_seconds=60)
+            assert other.item_type == "pr"
+            time.sleep(0.3)
+            retried = queue.lease("worker-b", lease_seconds=60)
+            assert (retried.id, retried.attempts) == (item.id, 2)
+            assert not queue.complete(item.id, "worker-a")
+            assert queue.complete(retried.id, "worker-b")
+
+            # Done items can be enqueued again; failures are retried until out of attempts
+            assert queue.enqueue("octo/repo", "issue", 1, {"number": 1})
+            failing = queue.lease("worker-a", lease_seconds=60)
+            assert queue.fail(failing.id, "worker-a", "boom", retry_delay=0)
+            failing = queue.lease("worker-a", lease_seconds=60)
+            assert queue.fail(failing.id, "worker-a", "boom", retry_delay=0)
+            assert queue.lease("worker-a", lease_seconds=60) is None
+            assert queue.stats() == {"done": 1, "dead": 1, "leased": 1}
+        finally:
+            queue.close()
+
+
+def test_expired_last_attempt_is_dead_and_done_items_are_purged():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = SQLiteWorkQueue(os.path.join(tmp, "queue.sqlite3"), max_attempts=2)
+        try:
+            queue.enqueue("octo/repo", "issue", 1, {"number": 1})
+            queue.enqueue("octo/repo", "issue", 2, {"number": 2})
+            for _ in range(2):  # Each worker crashes while holding the item
+                assert queue.lease("worker-a", lease_seconds=0.05).item_number == 1
+                time.sleep(0.1)
+            last = queue.lease("worker-b", lease_seconds=60)
+            assert last.item_number == 2  # Item 1 is not handed out again
+            assert queue.stats() == {"dead": 1, "leased": 1}
+            assert queue.active_numbers("octo/repo", "issue") == {2}
+
+            assert queue.complete(last.id, "worker-b")
+            assert queue.purge_done(older_than_seconds=60) == 0  # Too recent
+            time.sleep(0.05)
+            assert queue.purge_done(older_than_seconds=0.01) == 1
+            assert queue.stats() == {"dead": 1}
+        finally:
+            queue.close()
+
+
+def test_lost_lease_cancels_the_run():
+    from cluster import QueueWorker
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = open_work_queue(f"sqlite:///{os.path.join(tmp, 'queue.sqlite3')}")
+        try:
+            queue.enqueue("octo/repo", "issue", 7, {"number": 7})
+            worker = QueueWorker(queue, tools=[], repo_configs=[], worker_id="worker-a", lease_seconds=0.3)
+            item = queue.lease(worker.worker_id, worker.lease_seconds)
+            cancelled = []
+
+            async def slow_run():
+                try:
+                    await asyncio.sleep(30)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+
+            async def steal_lease():
+                await asyncio.sleep(0.4)  # Heartbeats keep worker-a's lease alive past its initial expiry
+                assert queue.lease("worker-b", 60) is None
+                queue._conn.execute("UPDATE work_items SET lease_owner = 'worker-b'")
+
+            async def run():
+                stealer = asyncio.create_task(steal_lease())
+                kept = await worker._run_with_heartbeat(item, slow_run())
+                await stealer
+                return kept
+
+            assert asyncio.run(run()) is False
+            assert cancelled == [True]
+        finally:
+            queue.close()
+
+
+if __name__ == '__main__':
+    test_lease_heartbeat_and_expiry()
+    test_expired_last_attempt_is_dead_and_done_items_are_purged()
+    test_lost_lease_cancels_the_run()
@@ -1,5 +1,3 @@
-import json
-
 import gradio as gr
 import os
 import uuid
@@ -8,13 +6,9 @@ import argparse  # Import argparse
 from typing import List, Optional, Dict, Any, Sequence, Tuple
 
 # LangChain & LangGraph components
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, ToolMessage
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.tools import BaseTool
-# Choose your LLM provider
-# from langchain_anthropic import ChatAnthropic
-from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph.message import add_messages
 from langgraph.errors import GraphRecursionError  # To catch potential loops
 from gradio.themes import Citrus, Default, Glass, Monochrome, Ocean, Origin, Soft, Base
@@ -39,8 +33,12 @@ from langchain_mcp_adapters.client import MultiServerMCPClient
 # Best practice is often to load .env explicitly early or ensure config loads it.
 # We will load and validate config within main() for clarity here.
 from src.utils import logger, get_llm_model, load_decorated_tools_from_module
-from src.mcp_client import setup_mcp_client_and_tools
+from src.mcp_client import setup_mcp_tools_from_manifest_cache
 from src.agent import create_repo_agent, create_repo_fqa_agent
+from src.metrics import start_metrics_server
+from src.agent_pool import AgentPool
+from src.checkpoint_store import open_webui_checkpointer
+from src.chat_stream import ChatTurnRenderer, cap_history
 
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
 LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "gpt-4o")
@@ -49,10 +47,14 @@ PR_INTERVAL = int(os.getenv("PR_FETCH_INTERVAL_SECONDS", 300))
 
 llm = None
 memory = None
-mcp_client = None
+mcp_connection = None
 mcp_tools = []
 extra_tools = []
-fqa_agent = None
+agent_pool: Optional[AgentPool] = None  # FQA agents by (repo URL, docs URL), shared by all sessions
+shared_init_lock = asyncio.Lock()
+MAX_RENDERED_MESSAGES = int(os.getenv("WEBUI_MAX_RENDERED_MESSAGES", 100))  # Chat messages kept in the browser
+TOOL_PREVIEW_CHARS = int(os.getenv("WEBUI_TOOL_PREVIEW_CHARS", 800))  # Tool output shown per tool call
+STREAM_UPDATE_INTERVAL = 0.05  # Seconds between UI updates while tokens stream
 
 # --- Gradio Theme Map ---
 theme_map = {
@@ -67,20 +69,37 @@ theme_map = {
 }
 
 
-async def init_agent(repo_url, repo_docs_url="", reinit_agent=False):
-    global llm, mcp_client, mcp_tools, memory, llm, fqa_agent, extra_tools
-    if not extra_tools:
-        extra_tools = load_decorated_tools_from_module("src.tools")
-    if mcp_client is None or not mcp_tools:
-        mcp_tools, mcp_client = await setup_mcp_client_and_tools()
-    if memory is None:
-        memory = MemorySaver()
-    if llm is None:
-        llm = get_llm_model(provider=LLM_PROVIDER, model_name=LLM_MODEL_NAME)
-    if fqa_agent is None or reinit_agent:
-        fqa_agent = await create_repo_fqa_agent(llm=llm, tools=mcp_tools + extra_tools, memory=memory,
-                                                repo_url=repo_url,
-                                                repo_docs_url=repo_docs_url)
+async def init_shared_resources():
+    """Initializes the tools, memory and LLM shared by all FQA agents (once, even with concurrent sessions)."""
+    global llm, mcp_connection, mcp_tools, memory, extra_tools
+    async with shared_init_lock:
+        if not extra_tools:
+            extra_tools = load_decorated_tools_from_module("src.tools")
+        if mcp_connection is None or not mcp_tools:
+            # Tools come from the manifest cache when warm; the MCP servers connect in the background
+            mcp_tools, mcp_connection = await setup_mcp_tools_from_manifest_cache()
+        if memory is None:
+            # Bounded and persisted to disk, so long-running servers don't accumulate every conversation in memory
+            memory = await asyncio.to_thread(open_webui_checkpointer)
+        if llm is None:
+            llm = get_llm_model(provider=LLM_PROVIDER, model_name=LLM_MODEL_NAME)
+
+
+async def build_fqa_agent(key: Tuple[str, str]):
+    """Builds the FQA agent (including the repo ingest) for a (repo URL, docs URL) pool key."""
+    repo_url, repo_docs_url = key
+    await init_shared_resources()
+    return await create_repo_fqa_agent(llm=llm, tools=mcp_tools + extra_tools, memory=memory,
+                                       repo_url=repo_url,
+                                       repo_docs_url=repo_docs_url)
+
+
+async def get_fqa_agent(repo_url: str, repo_docs_url: Optional[str] = ""):
+    """Returns the pooled FQA agent for the repository and docs, building it if needed (None if that fails)."""
+    global agent_pool
+    if agent_pool is None:
+        agent_pool = AgentPool(build_fqa_agent, max_size=int(os.getenv("WEBUI_AGENT_POOL_SIZE", 8)))
+    return await agent_pool.get((repo_url, repo_docs_url or ""))
 
 
 # --- Gradio UI Creation Function ---
@@ -113,7 +132,7 @@ def create_gradio_app(theme_name: str = "Ocean", custom_css: Optional[str] = Non
             repo_docs_url_input = gr.Textbox(label="Documentation URL (Optional)",
                                              value="https://docs.browser-use.com/introduction", scale=2)
 
-        chatbot = gr.Chatbot(label="Chat History", height=600)
+        chatbot = gr.Chatbot(label="Chat History", height=600, type="messages")
         msg_input = gr.Textbox(label="Your Message", value="give me the structure of this repo", scale=4,
                                autofocus=True, show_label=False, container=False)
 
@@ -125,16 +144,17 @@ def create_gradio_app(theme_name: str = "Ocean", custom_css: Optional[str] = Non
 
         async def submit_message(
                 user_message: str,
-                history: List[List[str]],
+                history: List[Dict[str, Any]],
                 repo_url: str,
                 docs_url: Optional[str],
                 thread_id: str,  # thread_id_state
                 active_repo_url: str,  # active_repo_url_state
                 active_docs_url: Optional[str]  # active_docs_url_state
-        ) -> Tuple[List[List[str]], Any, str, str, Optional[str]]:
+        ) -> Tuple[List[Dict[str, Any]], Any, str, str, Optional[str]]:
             """Handles message submission, agent initialization/re-initialization, and streaming response."""
 
-            history = history or []
+            submitted_at = time.time()
+            history = cap_history(history or [], MAX_RENDERED_MESSAGES)
             if not user_message.strip():
                 gr.Warning("Please enter a message.")
 
@@ -144,26 +164,35 @@ def create_gradio_app(theme_name: str = "Ocean", custom_css: Optional[str] = Non
             if not repo_url:
                 gr.Warning("Please enter a GitHub Repository URL.")
 
-            # --- Agent Initialization / Re-initialization Check ---
-            agent_needs_update = False
-            global fqa_agent
+            # --- Agent Lookup: pooled per (repo URL, docs URL), built on first use ---
+            urls_changed = repo_url != active_repo_url or docs_url != active_docs_url
+            if urls_changed:
+                logger.info(f"URLs changed or session not initialized. Getting agent for: {repo_url}")
+            try:
+                fqa_agent = await get_fqa_agent(repo_url, repo_docs_url=docs_url)
+            except Exception as e:
+                logger.error(f"Failed to build agent for {repo_url}: {e}", exc_info=True)
+                fqa_agent = None
+            if fqa_agent is None:
+                history.append({"role": "user", "content": user_message})
+                history.append({"role": "assistant",
+                                "content": f"🤖 Could not initialize the assistant for {repo_url}. Please check the URL."})
+                yield history, thread_id, active_repo_url, active_docs_url
+                return
 
-            if fqa_agent is None or repo_url != active_repo_url or docs_url != active_docs_url:
-                logger.info(f"URLs changed or agent not initialized. Re-initializing agent for: {repo_url}")
-                await init_agent(repo_url, repo_docs_url=docs_url, reinit_agent=True)
-                agent_needs_update = True
+            if urls_changed:
                 active_repo_url = repo_url
                 active_docs_url = docs_url
                 # Start a new conversation thread for the new repo/context
                 thread_id = str(uuid.uuid4().hex)
                 logger.info(f"Started new conversation thread: {thread_id}")
                 # Clear history for new repo, add initialization message
-                history = [[None, f"🤖 Assistant initialized for {active_repo_url}. How can I help?"]]
+                history = [{"role": "assistant", "content": f"🤖 Assistant initialized for {active_repo_url}. How can I help?"}]
                 # Immediately yield the initialization message
                 yield history, thread_id, active_repo_url, active_docs_url
 
             # Add user message to UI history
-            history.append([user_message, None])  # Placeholder for agent response
+            history.append({"role": "user", "content": user_message})
             yield history, thread_id, active_repo_url, active_docs_url  # Update UI to show user message
 
             messages_to_send = [HumanMessage(content=user_message)]
@@ -171,47 +200,31 @@ def create_gradio_app(theme_name: str = "Ocean", custom_css: Optional[str] = Non
             # --- Stream Agent Response ---
             config = {"configurable": {"thread_id": thread_id}}
 
+            # Answer tokens are streamed into the last assistant message; tool calls render as collapsible
+            # entries with truncated payloads. UI updates are throttled, as tokens can arrive faster than
+            # the browser re-renders.
+            renderer = ChatTurnRenderer(history, started_at=submitted_at, preview_chars=TOOL_PREVIEW_CHARS)
+            last_yield = 0.0
             try:
-                async for output_chunk in fqa_agent.astream({"messages": messages_to_send}, config=config,
-                                                            stream_mode="values"):
-
-                    current_messages = output_chunk["messages"]  # Get the last message list in the stream step
-                    if isinstance(current_messages[-1], AIMessage):
-                        if hasattr(current_messages[-1], "content") and current_messages[-1].content:
-                            # Append only the new part of the message content if streaming tokens
-                            # For now, replace the whole message for simplicity per chunk
-                            full_response = current_messages[-1].content
-                            history.append([None, f"\n-------------------------\n{full_response}\n"])
-                            yield history, thread_id, active_repo_url, active_docs_url
-                        elif hasattr(current_messages[-1], "tool_calls") and current_messages[-1].tool_calls:
-                            full_response = json.dumps(current_messages[-1].tool_calls)
-                            history.append([None, f"\n-------------------------\n{full_response}\n"])
-                            yield history, thread_id, active_repo_url, active_docs_url
-                    elif isinstance(current_messages[-1], ToolMessage):
-                        if hasattr(current_messages[-1], "content") and current_messages[-1].content:
-                            # Append only the new part of the message content if streaming tokens
-                            # For now, replace the whole message for simplicity per chunk
-                            full_response = current_messages[-1].content
-                            history.append([None, f"\n-------------------------\n{full_response}\n"])
-                            yield history, thread_id, active_repo_url, active_docs_url
-                history.append([None, "\n---- Agent finish working!----\n"])
+                async for message, metadata in fqa_agent.astream({"messages": messages_to_send}, config=config,
+                                                                  stream_mode="messages"):
+                    if renderer.on_message(message) and time.time() - last_yield >= STREAM_UPDATE_INTERVAL:
+                        last_yield = time.time()
+                        yield history, thread_id, active_repo_url, active_docs_url
+                if renderer.first_token_at is not None:
+                    logger.info(f"Thread {thread_id}: first token after {renderer.first_token_at - submitted_at:.2f}s, "
+                                f"turn finished after {time.time() - submitted_at:.2f}s.")
                 yield history, thread_id, active_repo_url, active_docs_url
 
             except GraphRecursionError:
                 logger.error(f"Recursion error detected in agent execution for thread {thread_id}.")
-                error_msg = "🤖 Error: The request caused an internal loop. Please try rephrasing."
-                if history[-1][1] is None:
-                    history[-1].append(error_msg)
-                else:
-                    history[-1][1] = error_msg
+                history.append({"role": "assistant",
+                                "content": "🤖 Error: The request caused an internal loop. Please try rephrasing."})
                 yield history, thread_id, active_repo_url, active_docs_url
             except Exception as e:
                 logger.error(f"Error during agent execution for thread {thread_id}: {e}", exc_info=True)
-                error_msg = f"🤖 An error occurred: {str(e)[:500]}"  # Show first 500 chars
-                if history[-1][1] is None:
-                    history[-1].append(error_msg)
-                else:
-                    history[-1][1] = error_msg
+                # Show first 500 chars
+                history.append({"role": "assistant", "content": f"🤖 An error occurred: {str(e)[:500]}"})
                 yield history, thread_id, active_repo_url, active_docs_url
 
             # Final yield to ensure the last state is rendered (might be redundant with async for)
@@ -220,6 +233,8 @@ def create_gradio_app(theme_name: str = "Ocean", custom_css: Optional[str] = Non
         async def clear_chat(thread_id: str) -> Tuple[List, str]:
             """Clears the chatbot history and starts a new memory thread."""
             logger.info(f"Clearing chat. Old thread ID: {thread_id}")
+            if memory is not None:
+                await memory.adelete_thread(thread_id)
             new_thread_id = str(uuid.uuid4().hex)
             logger.info(f"Started new conversation thread after clear: {new_thread_id}")
             # Memory is implicitly cleared for the UI by changing thread_id
@@ -262,8 +277,13 @@ def main():
     parser.add_argument("--port", type=int, default=7788, help="Port to listen on")
     # Use choices from the theme_map keys
     parser.add_argument("--theme", type=str, default="Ocean", choices=theme_map.keys(), help="Theme to use for the UI")
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv("METRICS_PORT", 0)),
+                        help="Port for the Prometheus metrics endpoint (0 disables it)")
     args = parser.parse_args()
 
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port, host=os.getenv("METRICS_HOST", "127.0.0.1"))
+
     # Define custom CSS (optional)
     custom_css = """
     .gradio-container {